@@ -0,0 +1,52 @@
+"""Add status rollups
+
+Revision ID: b7d1e0c4a2f3
+Revises: <REPLACE_WITH_ACTUAL_REVISION_ID>
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d1e0c4a2f3'
+down_revision: Union[str, None] = '<REPLACE_WITH_ACTUAL_REVISION_ID>' # Initial structure revision
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('status_rollups',
+    sa.Column('endpoint_id', sa.String(length=255), nullable=False),
+    sa.Column('granularity', sa.String(length=10), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('up_seconds', sa.Float(), nullable=False),
+    sa.Column('covered_seconds', sa.Float(), nullable=False),
+    sa.Column('check_count', sa.Integer(), nullable=False),
+    sa.Column('up_count', sa.Integer(), nullable=False),
+    sa.Column('rt_count', sa.Integer(), nullable=False),
+    sa.Column('rt_sum', sa.BigInteger(), nullable=False),
+    sa.Column('rt_min', sa.Integer(), nullable=True),
+    sa.Column('rt_max', sa.Integer(), nullable=True),
+    sa.Column('rt_p95', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('endpoint_id', 'granularity', 'bucket_start')
+    )
+    op.create_index('idx_status_rollups_granularity_bucket', 'status_rollups', ['granularity', 'bucket_start'], unique=False)
+    op.create_table('rollup_watermarks',
+    sa.Column('granularity', sa.String(length=10), nullable=False),
+    sa.Column('rolled_from', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('rolled_until', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('granularity')
+    )
+    # The compactor scans status_history by time range across all endpoints
+    op.create_index('idx_status_history_ts', 'status_history', ['timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_status_history_ts', table_name='status_history')
+    op.drop_table('rollup_watermarks')
+    op.drop_index('idx_status_rollups_granularity_bucket', table_name='status_rollups')
+    op.drop_table('status_rollups')
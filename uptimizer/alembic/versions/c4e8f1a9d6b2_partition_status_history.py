@@ -0,0 +1,105 @@
+"""Partition status_history by day (or month)
+
+Revision ID: c4e8f1a9d6b2
+Revises: b7d1e0c4a2f3
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8f1a9d6b2'
+down_revision: Union[str, None] = 'b7d1e0c4a2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS_AHEAD = 3 # Same default as HISTORY_PARTITIONS_AHEAD; the app keeps creating them afterwards
+# Must match the app's HISTORY_PARTITION_INTERVAL (same env/.env), or its partitions would overlap these
+INTERVAL = os.getenv('HISTORY_PARTITION_INTERVAL', 'day')
+
+
+def _period_start(ts):
+    ts = ts.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(day=1) if INTERVAL == 'month' else ts
+
+
+def _next_period(start):
+    if INTERVAL == 'month':
+        return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start + timedelta(days=1)
+
+
+def _create_partition(start):
+    name = f"status_history_p{start:%Y%m}" if INTERVAL == 'month' else f"status_history_p{start:%Y%m%d}"
+    op.execute(f"CREATE TABLE {name} PARTITION OF status_history "
+               f"FOR VALUES FROM ('{start.isoformat()}') TO ('{_next_period(start).isoformat()}')")
+
+
+def upgrade() -> None:
+    if INTERVAL not in ('day', 'month'):
+        raise ValueError(f"HISTORY_PARTITION_INTERVAL must be 'day' or 'month', not '{INTERVAL}'")
+
+    # Keep the old table aside; index names are schema-wide, so move them out of the way too
+    op.rename_table('status_history', 'status_history_legacy')
+    op.execute('ALTER INDEX idx_status_history_endpoint_ts RENAME TO idx_status_history_legacy_endpoint_ts')
+    op.execute('ALTER INDEX idx_status_history_ts RENAME TO idx_status_history_legacy_ts')
+
+    # Partitioned tables need the partition key in every unique constraint
+    op.create_table('status_history',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('endpoint_id', sa.String(length=255), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('status_code', sa.Integer(), nullable=True),
+    sa.Column('response_time_ms', sa.Integer(), nullable=True),
+    sa.Column('details', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id', 'timestamp'),
+    postgresql_partition_by='RANGE (timestamp)'
+    )
+    op.create_index('idx_status_history_endpoint_ts', 'status_history', ['endpoint_id', sa.text('timestamp DESC')], unique=False)
+    op.create_index('idx_status_history_ts', 'status_history', ['timestamp'], unique=False)
+    op.execute('CREATE TABLE status_history_default PARTITION OF status_history DEFAULT')
+
+    # One partition per day/month that holds legacy rows, plus the current one and a few ahead
+    bind = op.get_bind()
+    current = _period_start(datetime.now(timezone.utc))
+    earliest = bind.execute(sa.text('SELECT min("timestamp") FROM status_history_legacy')).scalar()
+    start = min(current, _period_start(earliest)) if earliest else current
+    last = current
+    for _ in range(PARTITIONS_AHEAD): last = _next_period(last)
+    while start <= last:
+        _create_partition(start)
+        start = _next_period(start)
+
+    op.execute('INSERT INTO status_history (id, "timestamp", endpoint_id, status, status_code, response_time_ms, details) '
+               'SELECT id, "timestamp", endpoint_id, status, status_code, response_time_ms, details FROM status_history_legacy')
+    op.execute("SELECT setval(pg_get_serial_sequence('status_history', 'id'), COALESCE((SELECT max(id) FROM status_history), 0) + 1, false)")
+    op.drop_table('status_history_legacy')
+
+
+def downgrade() -> None:
+    op.rename_table('status_history', 'status_history_partitioned')
+    op.execute('ALTER INDEX idx_status_history_endpoint_ts RENAME TO idx_status_history_partitioned_endpoint_ts')
+    op.execute('ALTER INDEX idx_status_history_ts RENAME TO idx_status_history_partitioned_ts')
+    op.create_table('status_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('endpoint_id', sa.String(length=255), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('status_code', sa.Integer(), nullable=True),
+    sa.Column('response_time_ms', sa.Integer(), nullable=True),
+    sa.Column('details', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_status_history_endpoint_ts', 'status_history', ['endpoint_id', sa.text('timestamp DESC')], unique=False)
+    op.create_index('idx_status_history_ts', 'status_history', ['timestamp'], unique=False)
+    op.execute('INSERT INTO status_history (id, "timestamp", endpoint_id, status, status_code, response_time_ms, details) '
+               'SELECT id, "timestamp", endpoint_id, status, status_code, response_time_ms, details FROM status_history_partitioned')
+    op.execute("SELECT setval(pg_get_serial_sequence('status_history', 'id'), COALESCE((SELECT max(id) FROM status_history), 0) + 1, false)")
+    op.drop_table('status_history_partitioned') # Drops every partition with it
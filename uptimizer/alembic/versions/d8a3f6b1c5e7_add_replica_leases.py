@@ -0,0 +1,35 @@
+"""Add replica leases for check sharding
+
+Revision ID: d8a3f6b1c5e7
+Revises: c4e8f1a9d6b2
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a3f6b1c5e7'
+down_revision: Union[str, None] = 'c4e8f1a9d6b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('replica_leases',
+    sa.Column('replica_id', sa.String(length=255), nullable=False),
+    sa.Column('hostname', sa.String(length=255), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('replica_id')
+    )
+    op.create_index('idx_replica_leases_expires', 'replica_leases', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_replica_leases_expires', table_name='replica_leases')
+    op.drop_table('replica_leases')
@@ -0,0 +1,31 @@
+"""Add probe phase timings to status_history
+
+Revision ID: e2f7a4c9b8d1
+Revises: d8a3f6b1c5e7
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f7a4c9b8d1'
+down_revision: Union[str, None] = 'd8a3f6b1c5e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PHASE_COLUMNS = ('dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'transfer_ms')
+
+
+def upgrade() -> None:
+    # Nullable without a default: a metadata-only change, and it cascades to every partition
+    for name in PHASE_COLUMNS:
+        op.add_column('status_history', sa.Column(name, sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    for name in reversed(PHASE_COLUMNS):
+        op.drop_column('status_history', name)
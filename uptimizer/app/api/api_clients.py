@@ -6,9 +6,12 @@ from werkzeug.exceptions import NotFound, BadRequest, InternalServerError
 from copy import deepcopy
 
 # Use absolute imports (adjust based on actual project structure if needed)
-from app.state import (current_state, state_lock, CONFIG_PATH, DEFAULT_CLIENT_ID,
+from app.state import (state_store, DEFAULT_CLIENT_ID,
                        DEFAULT_CLIENT_SETTINGS, DEFAULT_GLOBAL_SETTINGS)
-from app.config_manager import save_config_to_file
+from app.config_manager import append_config_changes
+from app.deadline_scheduler import notify_config_changed
+from app.status_feed import status_feed
+from app.api.api_general import not_modified_response, gzip_response, etag_inputs
 from app.auth import token_required, generate_client_api_token # Import auth functions
 
 # Create Blueprint for client-related API endpoints
@@ -17,11 +20,8 @@ clients_api_bp = Blueprint('api_clients', __name__)
 
 # --- Helper Function ---
 def _get_client_or_404(client_id):
-    """Helper to get client data or return 404 if not found."""
-    with state_lock:
-        client_data = current_state.get("clients", {}).get(client_id)
-        # Important: Create a deep copy before returning
-        return deepcopy(client_data) if client_data else None
+    """Helper to get client data from the current snapshot (read-only: copy before modifying), or None."""
+    return state_store.snapshot().get("clients", {}).get(client_id)
 
 # --- Client Management API ---
 
@@ -29,15 +29,14 @@ def _get_client_or_404(client_id):
 @clients_api_bp.route('/clients', methods=['GET'])
 def list_clients():
     """API endpoint to list all configured clients (ID, name, type)."""
-    with state_lock:
-        clients_list = [
-            {
-                "id": client_id,
-                "name": client_data.get("settings", {}).get("name", client_id),
-                "type": client_data.get("settings", {}).get("client_type", "local")
-            }
-            for client_id, client_data in current_state.get("clients", {}).items()
-        ]
+    clients_list = [
+        {
+            "id": client_id,
+            "name": client_data.get("settings", {}).get("name", client_id),
+            "type": client_data.get("settings", {}).get("client_type", "local")
+        }
+        for client_id, client_data in state_store.snapshot().get("clients", {}).items()
+    ]
     clients_list.sort(key=lambda x: x.get('name', x['id']))
     current_app.logger.debug("API: Responding to GET /clients request.")
     return jsonify({"clients": clients_list})
@@ -65,8 +64,8 @@ def create_client():
         if not remote_url.startswith(('http://', 'https://')):
              raise BadRequest("Invalid remote_url format.")
 
-    with state_lock:
-        if new_client_id in current_state["clients"]:
+    with state_store.write() as draft:
+        if new_client_id in draft.clients:
              raise InternalServerError("Failed to generate unique client ID.")
 
         new_client_settings = deepcopy(DEFAULT_CLIENT_SETTINGS)
@@ -79,26 +78,24 @@ def create_client():
             "disable_floating_elements": False
         })
 
-        current_state["clients"][new_client_id] = {
+        draft.add_client(new_client_id, {
             "settings": new_client_settings,
             "endpoints": [],
             "statuses": {}
-        }
-        current_app.logger.info(f"API: Created new client '{client_name}' (ID: {new_client_id}, Type: {client_type}).")
+        })
 
-        global_settings_now = deepcopy(current_state["global_settings"])
-        clients_data_now = deepcopy(current_state["clients"])
+        # Journal the edit; raising here discards the draft
+        if not append_config_changes([{"op": "put_client", "client_id": new_client_id, "settings": new_client_settings, "endpoints": []}]):
+            current_app.logger.error(f"API: Discarded creation of client '{new_client_id}' due to save failure.")
+            raise InternalServerError("Failed to save configuration after creating client.")
+        draft["status_version"] = status_feed.reset(new_client_id)
+        current_app.logger.info(f"API: Created new client '{client_name}' (ID: {new_client_id}, Type: {client_type}).")
 
-    if save_config_to_file(CONFIG_PATH, global_settings_now, clients_data_now):
-         return jsonify({
-             "id": new_client_id,
-             "settings": new_client_settings
-         }), 201
-    else:
-        with state_lock:
-             current_state["clients"].pop(new_client_id, None)
-             current_app.logger.error(f"API: Rolled back creation of client '{new_client_id}' due to save failure.")
-        raise InternalServerError("Failed to save configuration after creating client.")
+    notify_config_changed()
+    return jsonify({
+        "id": new_client_id,
+        "settings": new_client_settings
+    }), 201
 
 
 # DELETE /clients/<client_id> - Delete a client
@@ -108,24 +105,19 @@ def delete_client(client_id):
     if client_id == DEFAULT_CLIENT_ID:
          raise BadRequest("Cannot delete the default client.")
 
-    original_client_data = None
-    with state_lock:
-        if client_id not in current_state["clients"]:
+    with state_store.write() as draft:
+        if draft.remove_client(client_id) is None:
             raise NotFound("Client not found")
-        original_client_data = deepcopy(current_state["clients"][client_id])
-        del current_state["clients"][client_id]
-        current_app.logger.info(f"API: Deleted client '{client_id}' from memory.")
 
-        global_settings_now = deepcopy(current_state["global_settings"])
-        clients_data_now = deepcopy(current_state["clients"])
+        # Journal the edit; raising here discards the draft
+        if not append_config_changes([{"op": "delete_client", "client_id": client_id}]):
+            current_app.logger.error(f"API: Discarded deletion of client '{client_id}' due to save failure.")
+            raise InternalServerError("Failed to save configuration after deleting client.")
+        draft["status_version"] = status_feed.reset(client_id)
+        current_app.logger.info(f"API: Deleted client '{client_id}'.")
 
-    if save_config_to_file(CONFIG_PATH, global_settings_now, clients_data_now):
-        return jsonify({"message": f"Client '{client_id}' deleted successfully."}), 200
-    else:
-        with state_lock:
-             current_state["clients"][client_id] = original_client_data
-             current_app.logger.error(f"API: Rolled back deletion of client '{client_id}' due to save failure.")
-        raise InternalServerError("Failed to save configuration after deleting client.")
+    notify_config_changed()
+    return jsonify({"message": f"Client '{client_id}' deleted successfully."}), 200
 
 
 # --- Client Settings API ---
@@ -137,7 +129,7 @@ def get_client_settings(client_id):
     client_data = _get_client_or_404(client_id)
     if client_data is None: raise NotFound("Client not found")
 
-    settings_copy = client_data.get("settings", {})
+    settings_copy = dict(client_data.get("settings", {})) # Snapshot is read-only
     for key, default_value in DEFAULT_CLIENT_SETTINGS.items():
         if key not in settings_copy:
             settings_copy[key] = default_value
@@ -154,18 +146,16 @@ def update_client_settings(client_id):
     data = request.get_json()
     updated_settings_log = {}
     settings_changed = False
-    original_client_settings = None
 
-    with state_lock:
-        if client_id not in current_state["clients"]:
+    with state_store.write() as draft:
+        client = draft.client(client_id)
+        if client is None:
             raise NotFound("Client not found")
 
-        if "settings" not in current_state["clients"][client_id]:
-            current_state["clients"][client_id]["settings"] = deepcopy(DEFAULT_CLIENT_SETTINGS)
-            current_state["clients"][client_id]["settings"]['name'] = f"Client {client_id}"
-        original_client_settings = deepcopy(current_state["clients"][client_id]["settings"])
-
-        current_settings_ref = current_state["clients"][client_id]["settings"]
+        current_settings_ref = client["settings"] # Draft copy
+        if not current_settings_ref:
+            current_settings_ref.update(deepcopy(DEFAULT_CLIENT_SETTINGS))
+            current_settings_ref['name'] = f"Client {client_id}"
 
         if 'name' in data and isinstance(data['name'], str):
             new_name = data['name'].strip()
@@ -197,25 +187,19 @@ def update_client_settings(client_id):
                       settings_changed = True
                  current_app.logger.info(f"API: Regenerated API token for client '{client_id}'.")
 
-        if settings_changed:
-            global_settings_now = deepcopy(current_state["global_settings"])
-            clients_data_now = deepcopy(current_state["clients"])
-
-    if settings_changed:
-        if save_config_to_file(CONFIG_PATH, global_settings_now, clients_data_now):
-            current_app.logger.info(f"API: Updated settings for client '{client_id}': {updated_settings_log}")
-            with state_lock:
-                final_settings = deepcopy(current_state["clients"][client_id]["settings"])
-            final_settings.pop('api_token', None)
-            return jsonify({"message": "Client settings updated", "client_settings": final_settings}), 200
-        else:
-            with state_lock:
-                if client_id in current_state["clients"]:
-                     current_state["clients"][client_id]["settings"] = original_client_settings
-            current_app.logger.error(f"API Error: Failed save after updating settings for client '{client_id}'. Rolled back.");
+        if not settings_changed:
+            draft.discard() # Nothing to publish
+            return jsonify({"message": "No valid or changed client settings provided"}), 200
+
+        # Journal the edit; raising here discards the draft
+        if not append_config_changes([{"op": "put_client_settings", "client_id": client_id, "settings": current_settings_ref}]):
+            current_app.logger.error(f"API Error: Failed save after updating settings for client '{client_id}'. Discarded.");
             raise InternalServerError("Failed to save configuration after updating client settings.")
-    else:
-        return jsonify({"message": "No valid or changed client settings provided"}), 200
+        current_app.logger.info(f"API: Updated settings for client '{client_id}': {updated_settings_log}")
+        final_settings = dict(current_settings_ref)
+
+    final_settings.pop('api_token', None)
+    return jsonify({"message": "Client settings updated", "client_settings": final_settings}), 200
 
 
 # GET /clients/<client_id>/api_token - Get the current API token
@@ -243,10 +227,28 @@ def get_client_api_token(client_id):
 @clients_api_bp.route('/v1/client/<client_id>/status', methods=['GET'])
 @token_required
 def get_exposed_client_status(client_id, verified_client_id, **kwargs):
-    """API endpoint for external access to a specific client's status data."""
-    with state_lock:
-        client_data = deepcopy(current_state.get("clients", {}).get(client_id))
-        last_updated = current_state.get("last_updated", 0)
+    """
+    API endpoint for external access to a specific client's status data (linked instances poll it).
+    With ?since=<version> (the "version" of an earlier response) only endpoints changed since then
+    are returned, plus the ids of removed endpoints in "removed" ("delta": true); if that version
+    can't be resumed from (too old, client recreated, config reloaded, restart) all statuses are
+    returned ("delta": false). Bodies are gzipped when the caller accepts it.
+    """
+    since = request.args.get('since')
+    since_seq = status_feed.parse_cursor(since)
+    if since is not None and since_seq is None and ':' not in since:
+        raise BadRequest("Invalid 'since' value (use the 'version' of a previous response)")
+
+    state = state_store.snapshot() # Immutable: serialized as-is, no copy
+    client_data = state.get("clients", {}).get(client_id)
+    last_updated = state.get("last_updated", 0)
+    if client_data:
+        # Status version, name, cursor and etag_inputs are all the body depends on; answer 304 before serializing anything
+        client_name = client_data.get("settings", {}).get("name", client_id)
+        etag = status_feed.etag(state.get("status_version", 0), client_name, *etag_inputs(state, since_seq))
+        if client_data.get("settings", {}).get("api_enabled", False):
+            not_modified = not_modified_response(etag)
+            if not_modified is not None: return not_modified
 
     if not client_data:
         raise NotFound("Client not found")
@@ -256,12 +258,24 @@ def get_exposed_client_status(client_id, verified_client_id, **kwargs):
          current_app.logger.warning(f"API access attempt for disabled client '{client_id}' passed token check.")
          return jsonify({"error": "API access not enabled for this client."}), 403
 
-    statuses = client_data.get("statuses", {})
+    delta = status_feed.client_since(since_seq, client_id) if since_seq is not None else None
+    if delta is not None:
+        statuses, removed, seq = delta
+        etag = status_feed.etag(seq, client_name, *etag_inputs(state, since_seq))
+    else:
+        statuses, removed, seq = client_data.get("statuses", {}), [], state.get("status_version", 0)
+        etag = status_feed.etag(seq, client_name, *etag_inputs(state, None))
 
-    current_app.logger.info(f"Authenticated API request successful for client '{client_id}' status.")
-    return jsonify({
+    current_app.logger.info(f"Authenticated API request successful for client '{client_id}' status (delta={delta is not None}).")
+    response = jsonify({
         "client_id": client_id,
-        "client_name": settings.get("name", client_id),
+        "client_name": client_name,
         "statuses": statuses,
-        "last_updated": last_updated
+        "removed": removed,
+        "last_updated": last_updated,
+        "version": status_feed.cursor(seq),
+        "delta": delta is not None
     })
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return gzip_response(response)
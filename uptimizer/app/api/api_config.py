@@ -5,11 +5,12 @@ from werkzeug.exceptions import InternalServerError, BadRequest
 from copy import deepcopy
 
 # Use absolute imports
-from app.state import (current_state, state_lock, CONFIG_PATH, DEFAULT_CLIENT_ID,
+from app.state import (state_store, CONFIG_PATH, DEFAULT_CLIENT_ID,
                        DEFAULT_GLOBAL_SETTINGS, DEFAULT_CLIENT_SETTINGS)
 from app.config_manager import load_config_from_file, process_config_data
-# Import run_checks_task for triggering after reload
-from app.checker import run_checks_task
+# Reschedule checks after reload
+from app.deadline_scheduler import notify_config_changed
+from app.status_feed import status_feed
 
 # Create Blueprint for configuration-related API endpoints
 # *** ENSURE THIS LINE IS EXACTLY CORRECT ***
@@ -22,10 +23,9 @@ config_api_bp = Blueprint('api_config', __name__)
 @config_api_bp.route('/config_api/global_settings', methods=['GET'])
 def get_global_settings():
     """API endpoint for current global settings."""
-    with state_lock:
-        settings_copy = deepcopy(current_state.get("global_settings", DEFAULT_GLOBAL_SETTINGS))
+    global_settings = state_store.snapshot().get("global_settings", DEFAULT_GLOBAL_SETTINGS)
     current_app.logger.debug("API: Responding to GET /config_api/global_settings request.")
-    return jsonify({"global_settings": settings_copy})
+    return jsonify({"global_settings": global_settings})
 
 # POST /config/reload
 @config_api_bp.route('/config/reload', methods=['POST'])
@@ -36,52 +36,51 @@ def reload_config_from_file_route():
         config_data = load_config_from_file(CONFIG_PATH)
         global_settings, clients_data = process_config_data(config_data)
 
-        with state_lock:
-            current_state["global_settings"] = global_settings
-            current_state["clients"] = {}
-            for client_id, client_info in clients_data.items():
-                 current_state["clients"][client_id] = {
-                     "settings": client_info.get("settings", deepcopy(DEFAULT_CLIENT_SETTINGS)),
-                     "endpoints": client_info.get("endpoints", []),
-                     "statuses": {}
-                 }
-                 if client_info.get("settings", {}).get("client_type", "local") == "local":
-                      current_state["clients"][client_id]["statuses"] = {
-                          ep.get('id'): {"status": "PENDING", "last_check_ts": 0, "details": None}
-                          for ep in client_info.get("endpoints", []) if ep.get('id')
-                      }
-                 if 'name' not in current_state["clients"][client_id]["settings"]:
-                      current_state["clients"][client_id]["settings"]['name'] = f"Client {client_id}"
+        reloaded_clients = {}
+        for client_id, client_info in clients_data.items():
+             reloaded_clients[client_id] = {
+                 "settings": client_info.get("settings", deepcopy(DEFAULT_CLIENT_SETTINGS)),
+                 "endpoints": client_info.get("endpoints", []),
+                 "statuses": {}
+             }
+             if client_info.get("settings", {}).get("client_type", "local") == "local":
+                  reloaded_clients[client_id]["statuses"] = {
+                      ep.get('id'): {"status": "PENDING", "last_check_ts": 0, "details": None}
+                      for ep in client_info.get("endpoints", []) if ep.get('id')
+                  }
+             if 'name' not in reloaded_clients[client_id]["settings"]:
+                  reloaded_clients[client_id]["settings"]['name'] = f"Client {client_id}"
 
-            if DEFAULT_CLIENT_ID not in current_state["clients"]:
-                current_app.logger.warning(f"Config reload: Default client '{DEFAULT_CLIENT_ID}' not in file, adding default.")
-                current_state["clients"][DEFAULT_CLIENT_ID] = {
-                    "settings": deepcopy(DEFAULT_CLIENT_SETTINGS),
-                    "endpoints": [],
-                    "statuses": {}
-                }
+        if DEFAULT_CLIENT_ID not in reloaded_clients:
+            current_app.logger.warning(f"Config reload: Default client '{DEFAULT_CLIENT_ID}' not in file, adding default.")
+            reloaded_clients[DEFAULT_CLIENT_ID] = {
+                "settings": deepcopy(DEFAULT_CLIENT_SETTINGS),
+                "endpoints": [],
+                "statuses": {}
+            }
 
-            current_state["scheduler_interval"] = global_settings.get("check_interval_seconds", DEFAULT_GLOBAL_SETTINGS['check_interval_seconds'])
-            current_state["last_updated"] = 0
+        # Built outside the store; publishing it is a single swap
+        with state_store.write() as draft:
+            draft.replace_clients(reloaded_clients)
+            draft["global_settings"] = global_settings
+            draft["scheduler_interval"] = global_settings.get("check_interval_seconds", DEFAULT_GLOBAL_SETTINGS['check_interval_seconds'])
+            draft["last_updated"] = 0
+            draft["status_version"] = status_feed.reset()
 
-            reloaded_clients = deepcopy(current_state["clients"])
-            reloaded_globals = deepcopy(current_state["global_settings"])
-            all_ep_data = {
-                ep.get('id'): deepcopy(ep)
-                for cid, cdata in reloaded_clients.items()
-                for ep in cdata.get("endpoints", []) if ep.get('id')
-            }
-            sorted_cids = sorted(reloaded_clients.keys(), key=lambda cid: reloaded_clients[cid]['settings'].get('name', cid))
-            initial_active_cid = DEFAULT_CLIENT_ID
-            if DEFAULT_CLIENT_ID not in reloaded_clients and sorted_cids:
-                initial_active_cid = sorted_cids[0]
+        reloaded_globals = global_settings
+        all_ep_data = {
+            ep.get('id'): ep
+            for cid, cdata in reloaded_clients.items()
+            for ep in cdata.get("endpoints", []) if ep.get('id')
+        }
+        sorted_cids = sorted(reloaded_clients.keys(), key=lambda cid: reloaded_clients[cid]['settings'].get('name', cid))
+        initial_active_cid = DEFAULT_CLIENT_ID
+        if DEFAULT_CLIENT_ID not in reloaded_clients and sorted_cids:
+            initial_active_cid = sorted_cids[0]
 
-        current_app.logger.info("API: Triggering check cycle after config reload...")
-        try:
-             run_checks_task(current_state, state_lock)
-             current_app.logger.info("API: Post-reload check cycle triggered.")
-        except Exception as check_err:
-             current_app.logger.warning(f"API WARN: Error triggering check cycle after reload: {check_err}")
+        # Reloaded endpoints start PENDING (last_check_ts 0), so the scheduler runs them right away
+        notify_config_changed()
+        current_app.logger.info("API: Deadline scheduler notified of config reload.")
 
         current_app.logger.info("API: Config reloaded successfully from file.")
         return jsonify({
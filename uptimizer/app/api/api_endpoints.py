@@ -1,34 +1,64 @@
 # File Name: api_endpoints.py (NEW FILE)
 # Full Path: C:\Users\Admin\Documents\Public\philipeace.github.io\uptimizer\app\api_endpoints.py
 import uuid
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
 from werkzeug.exceptions import NotFound, BadRequest, InternalServerError
-from copy import deepcopy
 
 # Use absolute imports
-from app.state import current_state, state_lock, CONFIG_PATH
-from app.config_manager import save_config_to_file
+from app.state import state_store, BULK_IMPORT_MAX_ENDPOINTS, PROBE_MODES
+from app.config_manager import append_config_changes
+from app.deadline_scheduler import notify_config_changed
+from app.status_feed import status_feed
+from app.assertions import normalize_assertions, needs_body
+from app.protocol_probes import protocol_endpoint_error
+from app.endpoint_bulk import BulkImportError, import_format, iter_records, plan_import, export_lines
 from app.api.api_clients import _get_client_or_404 # Import helper from client API module
 
 # Create Blueprint for endpoint-related API endpoints
 endpoints_api_bp = Blueprint('api_endpoints', __name__)
 
+def _probe_options(data):
+    """
+    Validates the optional probe_mode / probe_max_bytes / assertions of a request body.
+    Returns {key: value} for the keys present; None (blank, empty list) means remove the override.
+    """
+    options = {}
+    if data.get('probe_mode') is not None:
+        mode = str(data['probe_mode']).strip().lower() or None
+        if mode is not None and mode not in PROBE_MODES:
+            raise BadRequest(f"Invalid probe_mode (must be one of {', '.join(PROBE_MODES)} or blank)")
+        options['probe_mode'] = mode
+    if data.get('probe_max_bytes') is not None:
+        max_bytes = str(data['probe_max_bytes']).strip()
+        if max_bytes == '': options['probe_max_bytes'] = None
+        else:
+            try: options['probe_max_bytes'] = int(max_bytes); assert options['probe_max_bytes'] >= 1
+            except: raise BadRequest("Invalid probe_max_bytes value (must be >= 1 or blank)")
+    if data.get('assertions') is not None:
+        try: options['assertions'] = normalize_assertions(data['assertions']) or None
+        except ValueError as e: raise BadRequest(f"Invalid assertions: {e}")
+    return options
+
+def _check_probe_settings(endpoint):
+    if endpoint.get('probe_mode') in ('head', 'headers') and needs_body(endpoint.get('assertions')):
+        raise BadRequest("Body assertions (contains, regex, json_path) need probe_mode get or partial")
+    error = protocol_endpoint_error(endpoint) # tcp:// tls:// dns:// udp:// URLs
+    if error: raise BadRequest(error[0].upper() + error[1:])
+
 # --- Endpoint Management API (Client-Specific) ---
 
 # GET /clients/<client_id>/endpoints
 @endpoints_api_bp.route('/clients/<client_id>/endpoints', methods=['GET'])
 def get_client_endpoints(client_id):
     """API endpoint to list endpoints for a specific LOCAL client."""
-    client_data = _get_client_or_404(client_id) # Gets a deep copy
+    client_data = _get_client_or_404(client_id) # Snapshot entry (read-only)
     if client_data is None: raise NotFound("Client not found")
 
     if client_data.get("settings", {}).get("client_type", "local") != "local":
          raise BadRequest("Endpoints can only be listed for 'local' clients.")
 
-    # Return the copy of endpoints
-    endpoints_copy = client_data.get('endpoints', [])
     current_app.logger.debug(f"API: Responding to GET /clients/{client_id}/endpoints request.")
-    return jsonify({"endpoints": endpoints_copy})
+    return jsonify({"endpoints": client_data.get('endpoints', [])})
 
 # POST /clients/<client_id>/endpoints
 @endpoints_api_bp.route('/clients/<client_id>/endpoints', methods=['POST'])
@@ -36,13 +66,10 @@ def add_client_endpoint(client_id):
     """API endpoint to add an endpoint to a specific LOCAL client."""
     if not request.is_json: raise BadRequest("Request must be JSON")
 
-    # Initial check outside lock (reduces lock time)
-    with state_lock:
-        client_exists = client_id in current_state.get("clients", {})
-        client_type = current_state.get("clients", {}).get(client_id, {}).get("settings", {}).get("client_type", "local")
-
-    if not client_exists: raise NotFound("Client not found")
-    if client_type != "local":
+    # Initial check against the current snapshot (no lock)
+    client_data = _get_client_or_404(client_id)
+    if client_data is None: raise NotFound("Client not found")
+    if client_data.get("settings", {}).get("client_type", "local") != "local":
         raise BadRequest("Endpoints can only be added to 'local' clients.")
 
     data = request.get_json()
@@ -64,49 +91,40 @@ def add_client_endpoint(client_id):
     if interval_str is not None and str(interval_str).strip() != '':
         try: interval_val = int(interval_str); assert interval_val >= 5
         except: raise BadRequest("Invalid interval value (must be >= 5 or blank)")
+    probe_options = _probe_options(data)
 
     new_id = f"ep_{uuid.uuid4().hex[:10]}"
     new_endpoint = {"id": new_id, "name": name, "url": url, "group": group}
     if timeout_val is not None: new_endpoint['check_timeout_seconds'] = timeout_val
     if interval_val is not None: new_endpoint['check_interval_seconds'] = interval_val
+    new_endpoint.update({key: value for key, value in probe_options.items() if value is not None})
+    _check_probe_settings(new_endpoint)
 
     # --- Update State and Save ---
-    with state_lock:
-        # Re-check client exists and type inside lock for safety
-        if client_id not in current_state["clients"]: raise NotFound("Client not found (concurrent modification?)")
-        if current_state["clients"][client_id].get("settings", {}).get("client_type", "local") != "local":
+    with state_store.write() as draft:
+        # Re-check client exists and type against the latest version
+        client = draft.client(client_id)
+        if client is None: raise NotFound("Client not found (concurrent modification?)")
+        if client.get("settings", {}).get("client_type", "local") != "local":
             raise BadRequest("Client type changed concurrently? Cannot add endpoint.")
 
-        # Ensure lists/dicts exist before appending/adding
-        if "endpoints" not in current_state["clients"][client_id]: current_state["clients"][client_id]["endpoints"] = []
-        if "statuses" not in current_state["clients"][client_id]: current_state["clients"][client_id]["statuses"] = {}
-
         # Check for duplicate ID (highly unlikely, but good practice)
-        if any(ep.get('id') == new_id for ep in current_state["clients"][client_id]["endpoints"]):
+        if any(ep.get('id') == new_id for ep in client["endpoints"]):
             raise InternalServerError("Generated duplicate endpoint ID, please try again.")
 
-        current_state["clients"][client_id]["endpoints"].append(new_endpoint)
-        current_state["clients"][client_id]["statuses"][new_id] = {"status": "PENDING", "last_check_ts": 0, "details": None}
+        client["endpoints"].append(new_endpoint)
+        client["statuses"][new_id] = {"status": "PENDING", "last_check_ts": 0, "details": None}
 
-        current_app.logger.info(f"API: Added endpoint '{new_id}' to client '{client_id}' memory.")
+        # Journal the edit; raising here discards the draft, so memory never diverges from the file
+        if not append_config_changes([{"op": "put_endpoint", "client_id": client_id, "endpoint": new_endpoint}]):
+            current_app.logger.error(f"API: Discarded add endpoint '{new_id}' for client '{client_id}' due to save failure.")
+            raise InternalServerError("Failed to save configuration after adding endpoint.")
+        draft["status_version"] = status_feed.reset(client_id, statuses={new_id: client["statuses"][new_id]})
+        current_app.logger.info(f"API: Added endpoint '{new_id}' to client '{client_id}'.")
 
-        # Prepare data for saving (use copies)
-        global_settings_now = deepcopy(current_state["global_settings"])
-        clients_data_now = deepcopy(current_state["clients"])
-
-    # Save config file (outside lock)
-    if save_config_to_file(CONFIG_PATH, global_settings_now, clients_data_now):
-         # Return the data of the newly created endpoint
-         return jsonify({"client_id": client_id, **new_endpoint}), 201
-    else: # Rollback memory state if save fails
-        with state_lock:
-             # Check if client and endpoint still exist before rollback
-             if client_id in current_state["clients"]:
-                 current_state["clients"][client_id]["endpoints"] = [ep for ep in current_state["clients"][client_id]["endpoints"] if ep.get('id') != new_id]
-                 if "statuses" in current_state["clients"][client_id]:
-                     current_state["clients"][client_id]["statuses"].pop(new_id, None)
-                 current_app.logger.error(f"API: Rolled back add endpoint '{new_id}' from client '{client_id}' due to save failure.")
-        raise InternalServerError("Failed to save configuration after adding endpoint.")
+    notify_config_changed()
+    # Return the data of the newly created endpoint
+    return jsonify({"client_id": client_id, **new_endpoint}), 201
 
 
 # PUT /clients/<client_id>/endpoints/<endpoint_id>
@@ -115,13 +133,10 @@ def update_client_endpoint(client_id, endpoint_id):
     """API endpoint to update an endpoint for a specific LOCAL client."""
     if not request.is_json: raise BadRequest("Request must be JSON")
 
-    # Initial check outside lock
-    with state_lock:
-        client_exists = client_id in current_state.get("clients", {})
-        client_type = current_state.get("clients", {}).get(client_id, {}).get("settings", {}).get("client_type", "local")
-
-    if not client_exists: raise NotFound("Client not found")
-    if client_type != "local":
+    # Initial check against the current snapshot (no lock)
+    client_data = _get_client_or_404(client_id)
+    if client_data is None: raise NotFound("Client not found")
+    if client_data.get("settings", {}).get("client_type", "local") != "local":
         raise BadRequest("Endpoints can only be updated for 'local' clients.")
 
     data = request.get_json()
@@ -147,22 +162,19 @@ def update_client_endpoint(client_id, endpoint_id):
         else:
             try: interval_val = int(interval_str_strip); assert interval_val >= 5
             except: raise BadRequest("Invalid interval value (must be >= 5 or blank)")
+    probe_options = _probe_options(data)
 
     # --- Update State and Save ---
-    updated_endpoint_data = None; original_endpoint_data = None; endpoint_found = False; endpoint_index = -1
-    with state_lock:
-        # Re-check client exists and type inside lock
-        if client_id not in current_state.get("clients", {}): raise NotFound("Client not found (concurrent modification?)")
-        if current_state["clients"][client_id].get("settings", {}).get("client_type", "local") != "local":
+    updated_endpoint_data = None; endpoint_found = False
+    with state_store.write() as draft:
+        # Re-check client exists and type against the latest version
+        client = draft.client(client_id)
+        if client is None: raise NotFound("Client not found (concurrent modification?)")
+        if client.get("settings", {}).get("client_type", "local") != "local":
             raise BadRequest("Client type changed concurrently? Cannot update endpoint.")
 
-        endpoints_list = current_state["clients"][client_id].get("endpoints", [])
-        for i, ep in enumerate(endpoints_list):
+        for ep in client["endpoints"]: # Draft copies; the published snapshot is untouched
             if ep.get('id') == endpoint_id:
-                # Store copy for rollback
-                original_endpoint_data = deepcopy(ep)
-                endpoint_index = i
-
                 # Update the endpoint data in place
                 ep['name'] = name
                 ep['url'] = url
@@ -175,101 +187,141 @@ def update_client_endpoint(client_id, endpoint_id):
                 if interval_str is not None: # Check if key was provided
                     if interval_val is None: ep.pop('check_interval_seconds', None)
                     else: ep['check_interval_seconds'] = interval_val
+                for key, value in probe_options.items():
+                    if value is None: ep.pop(key, None)
+                    else: ep[key] = value
+                _check_probe_settings(ep) # Raising discards the draft
 
-                # Store copy of final data to return
-                updated_endpoint_data = deepcopy(ep)
+                # Final data to return
+                updated_endpoint_data = dict(ep)
                 endpoint_found = True
-                current_app.logger.info(f"API: Updated endpoint '{endpoint_id}' in client '{client_id}' memory.")
                 break # Found and updated
 
         if not endpoint_found: raise NotFound("Endpoint not found within the client")
 
-        # Prepare data for saving (use copies)
-        global_settings_now = deepcopy(current_state["global_settings"])
-        clients_data_now = deepcopy(current_state["clients"])
-
-    # Save config file (outside lock)
-    if save_config_to_file(CONFIG_PATH, global_settings_now, clients_data_now):
-         return jsonify({"client_id": client_id, **updated_endpoint_data}), 200
-    else: # Rollback memory state if save fails
-        with state_lock:
-             # Check if client, endpoint, and index are still valid before rollback
-             if client_id in current_state["clients"] and \
-                "endpoints" in current_state["clients"][client_id] and \
-                len(current_state["clients"][client_id]["endpoints"]) > endpoint_index and \
-                current_state["clients"][client_id]["endpoints"][endpoint_index].get('id') == endpoint_id and \
-                original_endpoint_data:
-                  current_state["clients"][client_id]["endpoints"][endpoint_index] = original_endpoint_data
-                  current_app.logger.error(f"API: Rolled back update for endpoint '{endpoint_id}' in client '{client_id}' due to save failure.")
-             else:
-                   current_app.logger.error(f"API: Could not rollback update for endpoint '{endpoint_id}' in client '{client_id}' (state changed?).")
-        raise InternalServerError("Failed to save configuration after updating endpoint.")
+        # Journal the edit; raising here discards the draft
+        if not append_config_changes([{"op": "put_endpoint", "client_id": client_id, "endpoint": updated_endpoint_data}]):
+            current_app.logger.error(f"API: Discarded update for endpoint '{endpoint_id}' in client '{client_id}' due to save failure.")
+            raise InternalServerError("Failed to save configuration after updating endpoint.")
+        current_app.logger.info(f"API: Updated endpoint '{endpoint_id}' in client '{client_id}'.")
+
+    notify_config_changed()
+    return jsonify({"client_id": client_id, **updated_endpoint_data}), 200
 
 
 # DELETE /clients/<client_id>/endpoints/<endpoint_id>
 @endpoints_api_bp.route('/clients/<client_id>/endpoints/<endpoint_id>', methods=['DELETE'])
 def delete_client_endpoint(client_id, endpoint_id):
     """API endpoint to delete an endpoint from a specific LOCAL client."""
-    # Initial check outside lock
-    with state_lock:
-        client_exists = client_id in current_state.get("clients", {})
-        client_type = current_state.get("clients", {}).get(client_id, {}).get("settings", {}).get("client_type", "local")
-
-    if not client_exists: raise NotFound("Client not found")
-    if client_type != "local":
+    # Initial check against the current snapshot (no lock)
+    client_data = _get_client_or_404(client_id)
+    if client_data is None: raise NotFound("Client not found")
+    if client_data.get("settings", {}).get("client_type", "local") != "local":
         raise BadRequest("Endpoints can only be deleted from 'local' clients.")
 
     # --- Update State and Save ---
-    original_endpoint_data = None; endpoint_index = -1; original_status = None
-    with state_lock:
-        # Re-check client exists and type inside lock
-        if client_id not in current_state.get("clients", {}): raise NotFound("Client not found (concurrent modification?)")
-        if current_state["clients"][client_id].get("settings", {}).get("client_type", "local") != "local":
+    with state_store.write() as draft:
+        # Re-check client exists and type against the latest version
+        client = draft.client(client_id)
+        if client is None: raise NotFound("Client not found (concurrent modification?)")
+        if client.get("settings", {}).get("client_type", "local") != "local":
             raise BadRequest("Client type changed concurrently? Cannot delete endpoint.")
 
-        endpoints_list = current_state["clients"][client_id].get("endpoints", [])
-        for i, ep in enumerate(endpoints_list):
-             if ep.get('id') == endpoint_id:
-                 # Store copy for rollback
-                 original_endpoint_data = deepcopy(ep)
-                 endpoint_index = i
-                 # Also store status for rollback
-                 if "statuses" in current_state["clients"][client_id]:
-                     original_status = deepcopy(current_state["clients"][client_id]["statuses"].get(endpoint_id))
-                 break # Found
-
-        if endpoint_index != -1:
-            # Delete from endpoints list
-            del current_state["clients"][client_id]["endpoints"][endpoint_index]
-            # Delete from statuses dict
-            if "statuses" in current_state["clients"][client_id]:
-                 current_state["clients"][client_id]["statuses"].pop(endpoint_id, None)
-            current_app.logger.info(f"API: Deleted endpoint '{endpoint_id}' from client '{client_id}' memory.")
-        else:
-            raise NotFound("Endpoint not found within the client")
-
-        # Prepare data for saving (use copies)
-        global_settings_now = deepcopy(current_state["global_settings"])
-        clients_data_now = deepcopy(current_state["clients"])
-
-    # Save config file (outside lock)
-    if save_config_to_file(CONFIG_PATH, global_settings_now, clients_data_now):
-        return jsonify({"message": f"Endpoint {endpoint_id} deleted from client {client_id}"}), 200
-    else: # Rollback memory state if save fails
-        with state_lock:
-            # Check if client still exists and index is valid before rollback
-             if client_id in current_state["clients"] and original_endpoint_data:
-                 # Ensure endpoints list exists
-                 if "endpoints" not in current_state["clients"][client_id]:
-                     current_state["clients"][client_id]["endpoints"] = []
-                 # Insert endpoint back at original index
-                 current_state["clients"][client_id]["endpoints"].insert(endpoint_index, original_endpoint_data)
-                 # Restore status if it existed
-                 if original_status:
-                     if "statuses" not in current_state["clients"][client_id]:
-                         current_state["clients"][client_id]["statuses"] = {}
-                     current_state["clients"][client_id]["statuses"][endpoint_id] = original_status
-                 current_app.logger.error(f"API: Rolled back delete endpoint '{endpoint_id}' from client '{client_id}' due to save failure.")
-             else:
-                  current_app.logger.error(f"API: Could not rollback delete for endpoint '{endpoint_id}' in client '{client_id}' (state changed?).")
-        raise InternalServerError("Failed to save configuration after deleting endpoint.")
+        endpoint_index = next((i for i, ep in enumerate(client["endpoints"]) if ep.get('id') == endpoint_id), -1)
+        if endpoint_index == -1: raise NotFound("Endpoint not found within the client")
+        # Delete from endpoints list and statuses dict
+        del client["endpoints"][endpoint_index]
+        client["statuses"].pop(endpoint_id, None)
+
+        # Journal the edit; raising here discards the draft
+        if not append_config_changes([{"op": "delete_endpoint", "client_id": client_id, "endpoint_id": endpoint_id}]):
+            current_app.logger.error(f"API: Discarded delete of endpoint '{endpoint_id}' from client '{client_id}' due to save failure.")
+            raise InternalServerError("Failed to save configuration after deleting endpoint.")
+        draft["status_version"] = status_feed.reset(client_id, removed=[endpoint_id])
+        current_app.logger.info(f"API: Deleted endpoint '{endpoint_id}' from client '{client_id}'.")
+
+    notify_config_changed()
+    return jsonify({"message": f"Endpoint {endpoint_id} deleted from client {client_id}"}), 200
+
+
+# --- Bulk Import / Export ---
+
+# POST /clients/<client_id>/endpoints/bulk
+@endpoints_api_bp.route('/clients/<client_id>/endpoints/bulk', methods=['POST'])
+def bulk_import_endpoints(client_id):
+    """
+    Creates, updates and deletes many endpoints of a LOCAL client in one change.
+    Body: JSON Lines (application/x-ndjson), CSV (text/csv, header row) or a JSON list, one
+    endpoint per record with an optional 'action' ('upsert' default, or 'delete').
+    ?mode=replace deletes endpoints missing from the import; ?dry_run=1 only validates.
+    All or nothing: any invalid record rejects the whole import with per-line errors.
+    New endpoints whose id another client already uses get a fresh id ("renamed" in the response).
+    """
+    fmt = import_format(request.mimetype)
+    if fmt is None: raise BadRequest("Content-Type must be application/x-ndjson, text/csv or application/json")
+    mode = request.args.get('mode', 'merge')
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+
+    # Initial check against the current snapshot (no lock)
+    client_data = _get_client_or_404(client_id)
+    if client_data is None: raise NotFound("Client not found")
+    if client_data.get("settings", {}).get("client_type", "local") != "local":
+        raise BadRequest("Endpoints can only be imported into 'local' clients.")
+
+    # Parse and validate outside the write lock; only the merge below runs under it
+    try: records = list(iter_records(request.stream, fmt, BULK_IMPORT_MAX_ENDPOINTS))
+    except BulkImportError as e:
+        current_app.logger.warning(f"API: Rejected bulk import for client '{client_id}': {e}")
+        return jsonify({"error": "Invalid import", "invalid_records": e.total, "errors": e.errors}), 400
+
+    with state_store.write() as draft:
+        # Re-check client exists and type against the latest version
+        client = draft.clients.get(client_id)
+        if client is None: raise NotFound("Client not found (concurrent modification?)")
+        if client.get("settings", {}).get("client_type", "local") != "local":
+            raise BadRequest("Client type changed concurrently? Cannot import endpoints.")
+        # Ids of every other client (their endpoints, and the statuses linked clients hold) are taken
+        other_ids = {ep_id for other_id, other in draft.clients.items() if other_id != client_id
+                     for ep_id in [ep.get('id') for ep in other.get("endpoints", [])] + list(other.get("statuses", {}))}
+        try: endpoints, summary = plan_import(client.get("endpoints", []), records, mode, other_ids)
+        except BulkImportError as e: # Nothing was changed in the draft yet, so nothing is published
+            current_app.logger.warning(f"API: Rejected bulk import for client '{client_id}': {e}")
+            return jsonify({"error": "Invalid import", "invalid_records": e.total, "errors": e.errors}), 400
+
+        apply = not dry_run and bool(summary["created"] or summary["updated"] or summary["deleted"])
+        if apply:
+            client = draft.client(client_id)
+            kept_ids = {ep['id'] for ep in endpoints}
+            previous = client["statuses"]
+            # New endpoints start PENDING; updated ones keep their last status until rechecked
+            client["statuses"] = {ep['id']: previous.get(ep['id']) or {"status": "PENDING", "last_check_ts": 0, "details": None} for ep in endpoints}
+            client["endpoints"] = endpoints
+
+            # One journal line for the whole import; raising here discards the draft
+            if not append_config_changes([{"op": "put_endpoints", "client_id": client_id, "endpoints": endpoints}]):
+                current_app.logger.error(f"API: Discarded bulk import for client '{client_id}' due to save failure.")
+                raise InternalServerError("Failed to save configuration after bulk import.")
+            draft["status_version"] = status_feed.reset(client_id, statuses={ep_id: client["statuses"][ep_id] for ep_id in summary["ids"]},
+                                                        removed=[ep_id for ep_id in previous if ep_id not in kept_ids])
+            current_app.logger.info(f"API: Bulk import for client '{client_id}': {summary['created']} created, {summary['updated']} updated, "
+                                    f"{summary['deleted']} deleted ({len(kept_ids)} endpoints now).")
+
+    if apply: notify_config_changed()
+    return jsonify({"client_id": client_id, "mode": mode, "dry_run": dry_run, **summary}), 200
+
+
+# GET /clients/<client_id>/endpoints/export
+@endpoints_api_bp.route('/clients/<client_id>/endpoints/export', methods=['GET'])
+def export_endpoints(client_id):
+    """Streams a LOCAL client's endpoints as JSON Lines (default) or CSV (?format=csv), re-importable via /bulk."""
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in ('jsonl', 'csv'): raise BadRequest("format must be 'jsonl' or 'csv'")
+    client_data = _get_client_or_404(client_id) # Snapshot entry; immutable, so safe to stream from
+    if client_data is None: raise NotFound("Client not found")
+    if client_data.get("settings", {}).get("client_type", "local") != "local":
+        raise BadRequest("Endpoints can only be exported from 'local' clients.")
+
+    current_app.logger.debug(f"API: Exporting endpoints of client '{client_id}' as {fmt}.")
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    headers = {'Content-Disposition': f'attachment; filename="{client_id}-endpoints.{fmt}"'}
+    return Response(stream_with_context(export_lines(client_data.get('endpoints', []), fmt)), mimetype=mimetype, headers=headers)
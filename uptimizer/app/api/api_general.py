@@ -1,30 +1,107 @@
 # File Name: api_general.py
 # Full Path: C:\Users\Admin\Documents\Public\philipeace.github.io\uptimizer\app\api\api_general.py
-from flask import Blueprint, jsonify, current_app
-from copy import deepcopy
+import gzip
+from flask import Blueprint, Response, jsonify, request, current_app
+from werkzeug.exceptions import BadRequest
 
 # Use absolute imports
-from app.state import current_state, state_lock
+from app.state import state_store
+from app.status_feed import status_feed, fold_changes
+from app.sharding import shard_coordinator
+from app.leader import leader_elector
 
 # --- DEFINE THE BLUEPRINT ---
 general_api_bp = Blueprint('api_general', __name__)
 # ---------------------------
 
+GZIP_MIN_BYTES = 1024 # Smaller bodies aren't worth compressing
+
 # --- General API Routes ---
 
 # GET /status - Overall Status
 @general_api_bp.route('/status') # Route attached to the blueprint
 def get_status():
-    """API endpoint for latest status from in-memory cache (per client)."""
-    with state_lock:
+    """
+    API endpoint for latest status from in-memory cache (per client).
+    Responses carry a strong ETag of what the body is built from (If-None-Match -> 304 without
+    building it): the status version and, since latency and check times move on every run
+    without bumping it, the state version for full bodies and last_updated for deltas. With ?since=<version> (the "version" of an earlier response)
+    only endpoints changed since then are returned ("delta": true); if that version
+    can't be resumed from (too old, config changed, restart) the full state is returned.
+    """
+    since = request.args.get('since')
+    since_seq = status_feed.parse_cursor(since)
+    if since is not None and since_seq is None and ':' not in since:
+        raise BadRequest("Invalid 'since' value (use the 'version' of a previous response)")
+
+    # Cheap pre-check against the current snapshot's status version
+    state = state_store.snapshot()
+    etag = status_feed.etag(state.get("status_version", 0), *etag_inputs(state, since_seq))
+    not_modified = not_modified_response(etag)
+    if not_modified is not None: return not_modified
+
+    batches = status_feed.since(since_seq) if since_seq is not None else None
+    if batches is not None:
+        # Delta: fold the change batches, no copy of the whole state needed
+        changes, last_updated = fold_changes(batches) if batches else ([], None)
+        seq = batches[-1][0] if batches else since_seq
+        statuses = {}
+        for change in changes: statuses.setdefault(change["client_id"], {})[change["endpoint_id"]] = change["status"]
+        if last_updated is None: last_updated = state.get("last_updated", 0)
+        response_data = {"statuses": statuses, "last_updated": last_updated, "version": status_feed.cursor(seq), "delta": True}
+        etag = status_feed.etag(seq, *etag_inputs(state, since_seq))
+    else:
+        # Snapshot is immutable, so its statuses are serialized directly (no copy)
         response_data = {
             "statuses": {
-                client_id: deepcopy(client_data.get("statuses", {}))
-                for client_id, client_data in current_state.get("clients", {}).items()
+                client_id: client_data.get("statuses", {})
+                for client_id, client_data in state.get("clients", {}).items()
             },
-            "last_updated": current_state.get("last_updated", 0)
+            "last_updated": state.get("last_updated", 0)
         }
-    current_app.logger.debug("API: Responding to /status request.")
-    return jsonify(response_data)
+        seq = state.get("status_version", 0)
+        response_data.update({"version": status_feed.cursor(seq), "delta": False})
+        etag = status_feed.etag(seq, *etag_inputs(state, None))
+    current_app.logger.debug(f"API: Responding to /status request (delta={response_data['delta']}).")
+    response = jsonify(response_data)
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache' # Always revalidate
+    return gzip_response(response)
+
+def etag_inputs(state, since_seq):
+    """ETag inputs besides the status version: a full body changes with any state write, a delta with last_updated."""
+    if since_seq is None: return 'full', state.get("version", 0)
+    return since_seq, state.get("last_updated", 0)
+
+def not_modified_response(etag):
+    """Returns a 304 response if the request's If-None-Match lists etag, else None."""
+    if etag not in [value.strip() for value in request.headers.get('If-None-Match', '').split(',')]:
+        return None
+    response = Response(status=304)
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def gzip_response(response):
+    """Gzips a JSON body if the client accepts gzip (linked instances and requests do) and it is worth it."""
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip'] or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_BYTES: return response
+    response.set_data(gzip.compress(data, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+# GET /shards - Check sharding as seen by this replica
+@general_api_bp.route('/shards')
+def get_shards():
+    """Replica membership, leadership, and how many local endpoints this replica checks (all of them unless sharding is on)."""
+    state = state_store.snapshot()
+    endpoint_ids = [ep['id'] for client_data in state.get("clients", {}).values()
+                    if client_data.get("settings", {}).get("client_type", "local") == "local"
+                    for ep in client_data.get("endpoints", []) if ep.get('id')]
+    owned = sum(1 for ep_id in endpoint_ids if shard_coordinator.owns(ep_id))
+    return jsonify({**shard_coordinator.describe(), "leader": leader_elector.is_leader, "endpoints_total": len(endpoint_ids), "endpoints_owned": owned})
 
 # Add other general, non-resource-specific API endpoints here if needed
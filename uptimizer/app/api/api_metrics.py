@@ -0,0 +1,71 @@
+# File Name: api_metrics.py
+# Full Path: C:\Users\Admin\Documents\Public\philipeace.github.io\uptimizer\app\api\api_metrics.py
+from flask import Blueprint, Response
+
+# Use absolute imports
+from app.state import state_store, METRICS_PER_ENDPOINT
+from app.metrics import REGISTRY, CONTENT_TYPE, Counter, Gauge
+from app.status_feed import status_feed
+from app.history_writer import history_writer
+from app.deadline_scheduler import check_scheduler
+
+# --- DEFINE THE BLUEPRINT ---
+metrics_api_bp = Blueprint('api_metrics', __name__) # Registered without a prefix: scrapers expect /metrics
+# ---------------------------
+
+UP_VALUES = {"UP": 1, "DOWN": 0, "ERROR": 0} # PENDING (never checked) endpoints export no up sample
+
+
+# --- Scrape-time Collectors ---
+# Values that already live in state or in the background workers are read when scraped.
+
+def _runtime_metrics():
+    state = state_store.snapshot()
+    scheduler_stats = check_scheduler.stats()
+    gauges = [
+        ('uptimizer_state_version', "Version of the in-memory state snapshot.", state.get("version", 0)),
+        ('uptimizer_status_feed_version', "Sequence number of the status change feed.", status_feed.version),
+        ('uptimizer_history_queue_depth', "Status history rows waiting for the writer.", history_writer.queue_depth),
+        ('uptimizer_scheduled_items', "Endpoints and linked clients on the deadline schedule.", scheduler_stats["scheduled"]),
+        ('uptimizer_in_flight_items', "Scheduled items whose check is running.", scheduler_stats["in_flight"]),
+        ('uptimizer_last_updated_timestamp_seconds', "Time of the last status update.", state.get("last_updated", 0)),
+    ]
+    metrics = []
+    for name, documentation, value in gauges:
+        gauge = Gauge(name, documentation, registry=False)
+        gauge.set(value)
+        metrics.append(gauge)
+    rows = Counter('uptimizer_history_rows_total', "Status history rows handled by the writer.", ['result'], registry=False)
+    rows.labels('written').inc(history_writer.written_rows)
+    rows.labels('dropped').inc(history_writer.dropped_rows)
+    metrics.append(rows)
+    return metrics
+
+def _endpoint_metrics():
+    if not METRICS_PER_ENDPOINT: return []
+    labelnames = ['client_id', 'endpoint_id', 'name']
+    up = Gauge('uptimizer_endpoint_up', "1 if the endpoint's last check was UP, 0 if DOWN or ERROR.", labelnames, registry=False)
+    response_time = Gauge('uptimizer_endpoint_response_time_seconds', "Response time of the endpoint's last check.", labelnames, registry=False)
+    last_check = Gauge('uptimizer_endpoint_last_check_timestamp_seconds', "Time of the endpoint's last check.", labelnames, registry=False)
+    for client_id, client_data in state_store.snapshot().get("clients", {}).items(): # Immutable snapshot; no lock needed
+        names = {ep.get('id'): ep.get('name', '') for ep in client_data.get("endpoints", [])}
+        for endpoint_id, status in client_data.get("statuses", {}).items():
+            labels = (client_id, endpoint_id, names.get(endpoint_id, ''))
+            if status.get("status") in UP_VALUES: up.labels(*labels).set(UP_VALUES[status["status"]])
+            if status.get("response_time_ms") is not None: response_time.labels(*labels).set(status["response_time_ms"] / 1000)
+            if status.get("last_check_ts"): last_check.labels(*labels).set(status["last_check_ts"])
+    return [up, response_time, last_check]
+
+REGISTRY.add_collector(_runtime_metrics)
+REGISTRY.add_collector(_endpoint_metrics)
+
+
+# GET /metrics - Prometheus text exposition
+@metrics_api_bp.route('/metrics')
+def get_metrics():
+    """
+    Prometheus scrape target: endpoint up/latency gauges plus check loop, state lock,
+    database and config save instrumentation. Values are per process; a standalone
+    checker worker keeps its own and is not included here.
+    """
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
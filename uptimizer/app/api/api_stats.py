@@ -1,22 +1,25 @@
 # File Name: api_stats.py (NEW FILE)
 # Full Path: C:\Users\Admin\Documents\Public\philipeace.github.io\uptimizer\app\api_stats.py
 from flask import Blueprint, jsonify, request, current_app
-from werkzeug.exceptions import NotFound, ServiceUnavailable, InternalServerError
+from werkzeug.exceptions import BadRequest, NotFound, ServiceUnavailable, InternalServerError
 from datetime import datetime, timedelta, timezone
 from copy import deepcopy
 
 # Use absolute imports
-from app.state import current_state, state_lock
+from app.state import state_store
 # Import DB functions and the models module itself
 try:
-    from app.database import get_stats_last_24h, get_history_for_period
+    from app.database import get_uptime_stats_bulk, get_history_for_period, STATS_WINDOWS
     from app import models # Access DB flags like ENGINE_INITIALIZED, DB_TABLES_CREATED
 except ImportError:
      # Define dummy fallback if DB components fail to import
      class DummyModels: ENGINE_INITIALIZED = False; DB_TABLES_CREATED = False
      models = DummyModels()
-     def get_stats_last_24h(*args): return {"error": "DB N/A", "uptime_percentage_24h": None}
+     STATS_WINDOWS = {'24h': timedelta(hours=24)}
+     def get_uptime_stats_bulk(endpoint_ids, windows=('24h',)): return {eid: {"error": "DB N/A", **{f"uptime_percentage_{w}": None for w in windows}} for eid in endpoint_ids}
      def get_history_for_period(*args): return {"error": "DB N/A", "data": []}
+from app.downsampling import DEFAULT_HISTORY_MAX_POINTS, MIN_HISTORY_MAX_POINTS, MAX_HISTORY_MAX_POINTS
+from app.uptime_accumulator import uptime_accumulator
 
 # Create Blueprint for stats/history API endpoints
 stats_api_bp = Blueprint('api_stats', __name__)
@@ -25,43 +28,51 @@ stats_api_bp = Blueprint('api_stats', __name__)
 
 @stats_api_bp.route('/statistics')
 def get_statistics():
-    """API endpoint to get 24h uptime statistics for all known endpoints."""
-    stats_results = {}
+    """API endpoint to get uptime statistics for all known endpoints (?windows=24h,7d,30d,90d; default 24h)."""
+    windows = [w.strip() for w in request.args.get('windows', '24h').split(',') if w.strip() in STATS_WINDOWS] or ['24h']
     endpoint_ids_to_check = []
 
-    # Get a consistent list of endpoint IDs from the current state
-    with state_lock:
-        # Create a list of IDs for endpoints belonging to 'local' clients only
-        # Stats are calculated locally based on DB history, not relevant for linked clients.
-        endpoint_ids_to_check = [
-            ep.get('id')
-            for client_data in current_state.get("clients", {}).values()
-            if client_data.get("settings", {}).get("client_type", "local") == "local"
-            for ep in client_data.get("endpoints", []) if ep.get('id')
-        ]
+    # Get a consistent list of endpoint IDs from the current state snapshot
+    # Create a list of IDs for endpoints belonging to 'local' clients only
+    # Stats are calculated locally based on DB history, not relevant for linked clients.
+    endpoint_ids_to_check = [
+        ep.get('id')
+        for client_data in state_store.snapshot().get("clients", {}).values()
+        if client_data.get("settings", {}).get("client_type", "local") == "local"
+        for ep in client_data.get("endpoints", []) if ep.get('id')
+    ]
 
     if not endpoint_ids_to_check:
         current_app.logger.debug("API: /statistics called, but no local endpoints found.")
         return jsonify({}) # Return empty if no local endpoints
 
+    # Windows the in-memory accumulator tracks are answered without touching the DB
+    memory_windows = [w for w in windows if uptime_accumulator.covers(STATS_WINDOWS[w])]
+    windows = [w for w in windows if w not in memory_windows]
+    memory_stats = {w: uptime_accumulator.uptime_percentages(endpoint_ids_to_check) for w in memory_windows}
+    if not windows:
+        current_app.logger.debug(f"API: Responding to /statistics request for {len(endpoint_ids_to_check)} endpoints from memory.")
+        return jsonify({eid: {"error": None, **{f"uptime_percentage_{w}": memory_stats[w][eid] for w in memory_windows}}
+                        for eid in endpoint_ids_to_check})
+
     # Check DB readiness *once* before looping
     if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED:
         current_app.logger.warning(f"API WARN: /statistics returning DB N/A for all endpoints. Engine Init: {models.ENGINE_INITIALIZED}, Tables Created: {models.DB_TABLES_CREATED}")
         # Return DB N/A error for all requested local endpoints
-        return jsonify({eid: {"error": "DB N/A", "uptime_percentage_24h": None} for eid in endpoint_ids_to_check}), 503
-
-    # Calculate stats for each local endpoint
-    for ep_id in endpoint_ids_to_check:
-        try:
-            stats = get_stats_last_24h(ep_id)
-            # Handle potential errors returned from the DB function itself
-            if stats.get("error"):
-                current_app.logger.warning(f"Stats calc error for {ep_id}: {stats['error']}")
-            stats_results[ep_id] = stats
-        except Exception as calc_err:
-            # Catch unexpected errors during calculation
-            current_app.logger.error(f"Unexpected error calculating stats for {ep_id}: {calc_err}", exc_info=True)
-            stats_results[ep_id] = {"error": "Calculation error", "uptime_percentage_24h": None}
+        return jsonify({eid: {"error": "DB N/A", **{f"uptime_percentage_{w}": None for w in windows}} for eid in endpoint_ids_to_check}), 503
+
+    # Calculate stats for all local endpoints at once (rollup buckets + raw edges)
+    try:
+        stats_results = get_uptime_stats_bulk(endpoint_ids_to_check, windows)
+    except Exception as calc_err:
+        # Catch unexpected errors during calculation
+        current_app.logger.error(f"Unexpected error calculating stats for {len(endpoint_ids_to_check)} endpoints: {calc_err}", exc_info=True)
+        stats_results = {eid: {"error": "Calculation error", **{f"uptime_percentage_{w}": None for w in windows}} for eid in endpoint_ids_to_check}
+    for w in memory_windows:
+        for eid, stats in stats_results.items(): stats[f"uptime_percentage_{w}"] = memory_stats[w].get(eid)
+    failed = [eid for eid, stats in stats_results.items() if stats.get("error")]
+    if failed:
+        current_app.logger.warning(f"Stats calc error for {len(failed)} endpoints (e.g. {failed[0]}: {stats_results[failed[0]]['error']})")
 
     current_app.logger.debug(f"API: Responding to /statistics request for {len(stats_results)} endpoints.")
     return jsonify(stats_results)
@@ -69,25 +80,30 @@ def get_statistics():
 
 @stats_api_bp.route('/history/<endpoint_id>')
 def get_endpoint_history(endpoint_id):
-    """API endpoint to get history data for a specific endpoint over a period."""
+    """API endpoint to get history data for a specific endpoint over a period (?max_points=N, 0 = all points)."""
     period = request.args.get('period', '24h')
+    try: max_points = int(request.args.get('max_points', DEFAULT_HISTORY_MAX_POINTS))
+    except (ValueError, TypeError): raise BadRequest("max_points must be an integer")
+    if max_points > 0: max_points = min(MAX_HISTORY_MAX_POINTS, max(MIN_HISTORY_MAX_POINTS, max_points))
+    else: max_points = None # Full resolution
     end_time = datetime.now(timezone.utc)
 
     # Determine time window
     if period == '1h': start_time = end_time - timedelta(hours=1)
     elif period == '7d': start_time = end_time - timedelta(days=7)
+    elif period == '30d': start_time = end_time - timedelta(days=30) # Served from hourly rollups
+    elif period == '90d': start_time = end_time - timedelta(days=90) # Served from daily rollups
     else: start_time = end_time - timedelta(hours=24); period = '24h' # Default to 24h
 
     # Verify the endpoint ID exists within any client (local or linked - history is local)
     # History is only stored locally, so we just check if the ID is known.
     endpoint_exists_locally = False
-    with state_lock:
-        for client_data in current_state.get("clients", {}).values():
-             # Only check local clients, as history is stored based on local checks
-             if client_data.get("settings", {}).get("client_type", "local") == "local":
-                 if any(ep.get('id') == endpoint_id for ep in client_data.get("endpoints", [])):
-                     endpoint_exists_locally = True
-                     break
+    for client_data in state_store.snapshot().get("clients", {}).values():
+         # Only check local clients, as history is stored based on local checks
+         if client_data.get("settings", {}).get("client_type", "local") == "local":
+             if any(ep.get('id') == endpoint_id for ep in client_data.get("endpoints", [])):
+                 endpoint_exists_locally = True
+                 break
 
     if not endpoint_exists_locally:
         # If the ID doesn't belong to any known local endpoint, return 404
@@ -102,7 +118,7 @@ def get_endpoint_history(endpoint_id):
 
     # Fetch history data from the database
     try:
-        history_data = get_history_for_period(endpoint_id, start_time, end_time)
+        history_data = get_history_for_period(endpoint_id, start_time, end_time, max_points=max_points)
         # Handle errors returned from the DB function
         if history_data.get("error"):
              current_app.logger.error(f"Error fetching history for {endpoint_id}: {history_data['error']}")
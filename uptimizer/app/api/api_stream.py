@@ -0,0 +1,76 @@
+# File Name: api_stream.py
+# Full Path: C:\Users\Admin\Documents\Public\philipeace.github.io\uptimizer\app\api\api_stream.py
+import json
+import time
+from flask import Blueprint, Response, request, current_app, stream_with_context
+
+# Use absolute imports
+from app.state import state_store, STREAM_KEEPALIVE_SECONDS, STREAM_MAX_SECONDS
+from app.status_feed import status_feed, fold_changes
+
+# --- DEFINE THE BLUEPRINT ---
+stream_api_bp = Blueprint('api_stream', __name__)
+# ---------------------------
+
+def _sse(event, data, event_id=None):
+    """Formats one Server-Sent Events message."""
+    lines = []
+    if event_id is not None: lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+def _snapshot():
+    """Full status payload (same shape as /api/status) plus the feed cursor it corresponds to."""
+    state = state_store.snapshot() # Immutable; its status_version matches its statuses
+    data = {
+        "statuses": {client_id: client_data.get("statuses", {}) for client_id, client_data in state.get("clients", {}).items()},
+        "last_updated": state.get("last_updated", 0),
+    }
+    return state.get("status_version", 0), data
+
+def _changes_message(batches):
+    changes, last_updated = fold_changes(batches)
+    return _sse("statuses", {"changes": changes, "last_updated": last_updated}, status_feed.cursor(batches[-1][0]))
+
+# GET /stream - Push stream of status changes (Server-Sent Events)
+@stream_api_bp.route('/stream')
+def stream_status():
+    """
+    Server-Sent Events stream of endpoint status changes.
+    Sends a 'snapshot' first (unless Last-Event-ID / ?since=<cursor> can be resumed from the
+    feed buffer), then a 'statuses' message with only the changed endpoints per check batch.
+    """
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('since')
+    resume_seq = status_feed.parse_cursor(cursor)
+    remote = request.remote_addr
+    current_app.logger.debug(f"API: /stream opened by {remote} (cursor={cursor!r}, resumable={resume_seq is not None}).")
+
+    def generate():
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        seq = resume_seq
+        backlog = status_feed.since(seq) if seq is not None else None
+        if backlog is None: # Fresh subscriber or cursor too old / from before a restart
+            seq, data = _snapshot()
+            yield "retry: 3000\n" + _sse("snapshot", data, status_feed.cursor(seq))
+        elif backlog:
+            yield _changes_message(backlog)
+            seq = backlog[-1][0]
+
+        while time.monotonic() < deadline:
+            version = status_feed.wait(seq, timeout=min(STREAM_KEEPALIVE_SECONDS, max(0.1, deadline - time.monotonic())))
+            if version == seq:
+                yield ": keepalive\n\n" # Keeps proxies from closing an idle stream
+                continue
+            batches = status_feed.since(seq)
+            if batches is None: # Subscriber fell behind the buffer; resync
+                seq, data = _snapshot()
+                yield _sse("snapshot", data, status_feed.cursor(seq))
+                continue
+            if batches:
+                yield _changes_message(batches)
+                seq = batches[-1][0]
+        # Ending the stream lets workers recycle; EventSource reconnects with Last-Event-ID
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'} # Disable proxy buffering (nginx)
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
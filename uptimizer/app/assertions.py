@@ -0,0 +1,207 @@
+import re
+import json
+import threading
+from collections import OrderedDict
+
+# Per-endpoint content assertions: conditions a 2xx/3xx response must also meet to count as UP.
+# An endpoint's optional "assertions" is a list such as
+#   [{"type": "contains", "value": "ok"},
+#    {"type": "regex", "pattern": "\"version\": ?\"2\\."},
+#    {"type": "json_path", "path": "$.checks[0].status", "value": "pass"},
+#    {"type": "header", "name": "Content-Type", "pattern": "json"},
+#    {"type": "max_latency_ms", "value": 500}]
+# Body assertions see at most the bytes the probe read (ASSERTION_MAX_BODY_BYTES, or
+# probe_max_bytes in 'partial' mode). The first failing assertion makes the check DOWN.
+
+ASSERTION_TYPES = ('contains', 'regex', 'json_path', 'header', 'max_latency_ms')
+BODY_ASSERTION_TYPES = ('contains', 'regex', 'json_path')
+COMPILED_CACHE_SIZE = 4096 # Distinct assertion lists kept compiled
+_JSON_PATH_STEP_RE = re.compile(r"""\.([A-Za-z_][\w-]*)|\[(-?\d+)\]|\[(['"])(.*?)\3\]""")
+_CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+_MISSING = object()
+
+
+# --- Validation ---
+
+def _pattern(value):
+    if not isinstance(value, str) or value == '': raise ValueError("needs a non-empty 'pattern'")
+    try: re.compile(value)
+    except re.error as e: raise ValueError(f"invalid pattern ({e})") from None
+    return value
+
+def parse_json_path(path):
+    """
+    Parses the supported JSONPath subset ($, .key, ['key'], [index]; negative indexes count
+    from the end) into a tuple of str keys and int indexes. Raises ValueError.
+    """
+    if not isinstance(path, str) or not path.strip().startswith('$'): raise ValueError("'path' must start with '$'")
+    path = path.strip()
+    steps, position = [], 1
+    while position < len(path):
+        match = _JSON_PATH_STEP_RE.match(path, position)
+        if match is None: raise ValueError(f"unsupported path syntax at '{path[position:]}'")
+        name, index, _, quoted = match.groups()
+        steps.append(int(index) if index is not None else (name if name is not None else quoted))
+        position = match.end()
+    return tuple(steps)
+
+def _normalize(assertion):
+    if not isinstance(assertion, dict): raise ValueError("must be an object")
+    kind = str(assertion.get('type') or '').strip().lower()
+    if kind == 'contains':
+        if not isinstance(assertion.get('value'), str) or assertion['value'] == '': raise ValueError("needs a non-empty 'value'")
+        return {'type': kind, 'value': assertion['value']}
+    if kind == 'regex':
+        return {'type': kind, 'pattern': _pattern(assertion.get('pattern'))}
+    if kind == 'json_path':
+        parse_json_path(assertion.get('path'))
+        normalized = {'type': kind, 'path': assertion['path'].strip()}
+        if 'value' in assertion: normalized['value'] = assertion['value'] # Without a value the path only has to exist
+        return normalized
+    if kind == 'header':
+        if not isinstance(assertion.get('name'), str) or not assertion['name'].strip(): raise ValueError("needs a header 'name'")
+        normalized = {'type': kind, 'name': assertion['name'].strip()}
+        if assertion.get('pattern') not in (None, ''): normalized['pattern'] = _pattern(assertion['pattern'])
+        return normalized
+    if kind == 'max_latency_ms':
+        try: value = int(assertion.get('value')); assert value >= 1
+        except (ValueError, TypeError, AssertionError): raise ValueError("needs a 'value' >= 1 (ms)") from None
+        return {'type': kind, 'value': value}
+    raise ValueError(f"unknown type '{kind}' (use one of {', '.join(ASSERTION_TYPES)})")
+
+def normalize_assertions(raw):
+    """
+    Validates an endpoint's assertions (a list, or its JSON text as found in CSV imports)
+    and returns them with only the known keys. Raises ValueError naming the bad assertion.
+    """
+    if isinstance(raw, str):
+        try: raw = json.loads(raw) if raw.strip() else []
+        except ValueError as e: raise ValueError(f"assertions are not valid JSON ({e})") from None
+    if raw is None: return []
+    if not isinstance(raw, list): raise ValueError("assertions must be a list")
+    normalized = []
+    for number, assertion in enumerate(raw, start=1):
+        try: normalized.append(_normalize(assertion))
+        except ValueError as e: raise ValueError(f"assertion {number}: {e}") from None
+    return normalized
+
+def needs_body(assertions):
+    return any(assertion.get('type') in BODY_ASSERTION_TYPES for assertion in assertions or ())
+
+
+# --- Evaluation ---
+
+def _show(value):
+    text = json.dumps(value) if not isinstance(value, str) else repr(value)
+    return text[:60] + ("..." if len(text) > 60 else "")
+
+def _json_equal(actual, expected):
+    if isinstance(actual, bool) or isinstance(expected, bool): return actual is expected # 1 == True otherwise
+    return actual == expected
+
+
+class _Response:
+    """What the matchers look at; the body is decoded and parsed at most once, on first use."""
+    __slots__ = ('headers', 'body', 'truncated', 'response_time_ms', '_text', '_json')
+
+    def __init__(self, headers, body, truncated, response_time_ms):
+        self.headers, self.body, self.truncated, self.response_time_ms = headers, body, truncated, response_time_ms
+        self._text = self._json = _MISSING
+
+    @property
+    def text(self):
+        if self._text is _MISSING:
+            match = _CHARSET_RE.search(self.headers.get('Content-Type') or '')
+            try: self._text = self.body.decode(match.group(1) if match else 'utf-8', errors='replace')
+            except LookupError: self._text = self.body.decode('utf-8', errors='replace')
+        return self._text
+
+    @property
+    def json(self):
+        if self._json is _MISSING:
+            try: self._json = json.loads(self.text)
+            except ValueError: self._json = None
+            else: self._json = (self._json,) # Wrapped so a JSON null isn't mistaken for "not JSON"
+        return self._json
+
+
+def _body_matcher(check):
+    def matcher(response):
+        if response.body is None: return "response body was not read (probe_mode head/headers)"
+        return check(response)
+    return matcher
+
+def _compile(assertion):
+    """Returns matcher(response) -> failure message or None."""
+    kind = assertion['type']
+    if kind == 'contains':
+        value = assertion['value']
+        return _body_matcher(lambda response: None if value in response.text else f"body does not contain {_show(value)}")
+    if kind == 'regex':
+        pattern = re.compile(assertion['pattern'])
+        return _body_matcher(lambda response: None if pattern.search(response.text) else f"body does not match /{assertion['pattern']}/")
+    if kind == 'json_path':
+        steps, path, expected = parse_json_path(assertion['path']), assertion['path'], assertion.get('value', _MISSING)
+        def check(response):
+            if response.json is None:
+                return "body is not valid JSON" + (" (cut off at the body size cap)" if response.truncated else "")
+            value = response.json[0]
+            for step in steps:
+                if isinstance(step, int): value = value[step] if isinstance(value, list) and -len(value) <= step < len(value) else _MISSING
+                else: value = value.get(step, _MISSING) if isinstance(value, dict) else _MISSING
+                if value is _MISSING: return f"{path} not found"
+            if expected is not _MISSING and not _json_equal(value, expected): return f"{path} is {_show(value)}, expected {_show(expected)}"
+            return None
+        return _body_matcher(check)
+    if kind == 'header':
+        name, pattern = assertion['name'], re.compile(assertion['pattern']) if 'pattern' in assertion else None
+        def check(response):
+            value = response.headers.get(name)
+            if value is None: return f"header {name} missing"
+            if pattern is not None and not pattern.search(value): return f"header {name} {_show(value)} does not match /{pattern.pattern}/"
+            return None
+        return check
+    limit = assertion['value'] # max_latency_ms
+    return lambda response: f"response time {response.response_time_ms} ms > {limit} ms" if response.response_time_ms > limit else None
+
+
+class CompiledAssertions:
+    """Compiled matchers of one assertion list."""
+
+    def __init__(self, assertions):
+        self.matchers = [_compile(assertion) for assertion in assertions]
+        self.needs_body = needs_body(assertions)
+
+    def evaluate(self, headers, body, response_time_ms, truncated=False):
+        """
+        Runs the matchers in order against a response (headers: case-insensitive mapping,
+        body: the bytes read or None). Returns the first failure message, or None if all pass.
+        """
+        response = _Response(headers, body, truncated, response_time_ms)
+        for matcher in self.matchers:
+            failure = matcher(response)
+            if failure: return failure
+        return None
+
+
+_compiled = OrderedDict() # Assertion config (as canonical JSON) -> CompiledAssertions, LRU
+_compiled_lock = threading.Lock()
+
+def compiled_assertions(assertions):
+    """
+    CompiledAssertions for an endpoint's assertion list, or None without assertions.
+    Cached by the assertion config itself: every check of an endpoint reuses the compiled
+    matchers until the config is edited. Raises ValueError for an invalid list.
+    """
+    if not assertions: return None
+    key = json.dumps(assertions, sort_keys=True, separators=(',', ':'))
+    with _compiled_lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+            return compiled
+    compiled = CompiledAssertions(normalize_assertions(assertions))
+    with _compiled_lock:
+        _compiled[key] = compiled
+        while len(_compiled) > COMPILED_CACHE_SIZE: _compiled.popitem(last=False)
+    return compiled
@@ -0,0 +1,156 @@
+import queue
+import threading
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from flask import current_app, has_app_context
+
+from app.state import DEFAULT_MAX_CONCURRENT_CHECKS, DEFAULT_MAX_CHECKS_PER_HOST
+
+logger = logging.getLogger(__name__) # Engine may run outside a request/app context
+
+def _endpoint_host(endpoint):
+    """Returns the lower-cased host[:port] of an endpoint URL (used for per-host limits)."""
+    try:
+        return (urlsplit(endpoint.get('url') or '').netloc or '').lower()
+    except ValueError:
+        return ''
+
+def _interleave_by_host(endpoints):
+    """Orders endpoints round-robin by host so one busy host cannot hog the pool's queue head."""
+    by_host = OrderedDict()
+    for ep in endpoints:
+        by_host.setdefault(_endpoint_host(ep), []).append(ep)
+    pending = [list(reversed(eps)) for eps in by_host.values()]
+    ordered = []
+    while pending:
+        for host_eps in pending:
+            ordered.append(host_eps.pop())
+        pending = [eps for eps in pending if eps]
+    return ordered
+
+
+class CheckEngine:
+    """
+    Bounded thread pool that runs endpoint checks concurrently.
+    The pool size is the global concurrency limit. Checks of a host beyond
+    max_checks_per_host wait in a per-host queue, not in a pool thread, and are
+    submitted as that host's running checks finish, so the pool only ever holds
+    checks that can run right away.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock() # Guards the executor swap, submits and the per-host slots
+        self._executor = None
+        self._max_workers = 0
+        self._per_host_limit = 0
+        self._host_active = {}  # host -> checks submitted and not finished
+        self._host_waiting = {} # host -> deque of submit callables waiting for a slot
+
+    def configure(self, global_settings):
+        """Applies concurrency limits from global_settings, resizing the pool if they changed."""
+        try: max_workers = max(1, int(global_settings.get('max_concurrent_checks', DEFAULT_MAX_CONCURRENT_CHECKS)))
+        except (ValueError, TypeError): max_workers = DEFAULT_MAX_CONCURRENT_CHECKS
+        try: per_host_limit = max(1, int(global_settings.get('max_checks_per_host', DEFAULT_MAX_CHECKS_PER_HOST)))
+        except (ValueError, TypeError): per_host_limit = DEFAULT_MAX_CHECKS_PER_HOST
+
+        old_executor = None
+        with self._lock:
+            self._per_host_limit = per_host_limit # Waiting checks pick up a raised limit as slots free up
+            if self._executor is None or max_workers != self._max_workers:
+                # Submits happen under the same lock, so none can reach the old pool after this
+                old_executor = self._executor
+                self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="uptimizer-check")
+                self._max_workers = max_workers
+                logger.info(f"Check engine configured: max_concurrent_checks={max_workers}, max_checks_per_host={per_host_limit}")
+        if old_executor is not None:
+            old_executor.shutdown(wait=False) # Lets queued and running checks finish in the background
+
+    # --- Per-Host Slots ---
+
+    def _acquire_or_wait(self, host, submit):
+        """Calls submit() now if the host has a free slot, else when one of its checks finishes."""
+        with self._lock:
+            if self._host_active.get(host, 0) >= self._per_host_limit:
+                self._host_waiting.setdefault(host, deque()).append(submit)
+                return
+            self._host_active[host] = self._host_active.get(host, 0) + 1
+        submit()
+
+    def _release(self, host):
+        """Frees a finished check's slot and submits the host's waiting checks that now fit."""
+        ready = []
+        with self._lock:
+            active = self._host_active.get(host, 1) - 1
+            waiting = self._host_waiting.get(host)
+            while waiting and active < self._per_host_limit:
+                ready.append(waiting.popleft())
+                active += 1
+            if waiting is not None and not waiting: del self._host_waiting[host]
+            if active > 0: self._host_active[host] = active
+            else: self._host_active.pop(host, None)
+        for submit in ready: submit()
+
+    # --- Running Checks ---
+
+    def _run_one(self, app, endpoint, check_fn, global_settings):
+        """Worker body: runs the check inside the app context."""
+        if app is None:
+            return check_fn(endpoint, global_settings)
+        with app.app_context():
+            return check_fn(endpoint, global_settings)
+
+    def run(self, endpoints, check_fn, global_settings):
+        """
+        Runs check_fn(endpoint, global_settings) for every endpoint concurrently.
+        Yields (endpoint, result) tuples in completion order, in the caller's thread.
+        """
+        if not endpoints: return
+        if self._executor is None: self.configure(global_settings)
+        app = current_app._get_current_object() if has_app_context() else None
+        results = queue.Queue() # (endpoint, finished future or None if it never ran)
+
+        def submitter(endpoint, host):
+            def submit():
+                with self._lock:
+                    executor = self._executor
+                    try: future = executor.submit(self._run_one, app, endpoint, check_fn, global_settings) if executor is not None else None
+                    except RuntimeError: future = None # Shut down
+                if future is None:
+                    self._release(host)
+                    results.put((endpoint, None))
+                    return
+                def done(future):
+                    self._release(host)
+                    results.put((endpoint, future))
+                future.add_done_callback(done)
+            return submit
+
+        for ep in _interleave_by_host(endpoints):
+            host = _endpoint_host(ep)
+            self._acquire_or_wait(host, submitter(ep, host))
+        for _ in range(len(endpoints)):
+            endpoint, future = results.get()
+            try:
+                if future is None or future.cancelled(): raise RuntimeError("check engine shut down")
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Check engine: unhandled error checking {endpoint.get('id')}: {e}", exc_info=True)
+                result = {"status": "ERROR", "status_code": None, "response_time_ms": None, "details": "Check error"}
+            yield endpoint, result
+
+    def shutdown(self, wait=True):
+        """Stops the worker pool (called from main.cleanup); checks still waiting for a host slot end as errors."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            waiting = [(host, submit) for host, pending in self._host_waiting.items() for submit in pending]
+            self._host_waiting = {}
+            for host, _ in waiting: self._host_active[host] = self._host_active.get(host, 0) + 1 # Released by the failed submit
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        for _, submit in waiting: submit() # No pool any more: reports the check as an error
+
+
+# Shared engine instance used by the background task
+check_engine = CheckEngine()
@@ -1,4 +1,5 @@
 import time
+import queue
 import requests
 import threading
 from datetime import datetime, timedelta, timezone
@@ -14,51 +15,20 @@ except ImportError as e:
     def save_status_change(*args): print("Checker WARN: save_status_change STUB")
 
 # Import defaults and state objects
-from app.state import current_state, state_lock, DEFAULT_CHECK_INTERVAL, DEFAULT_CHECK_TIMEOUT
+from app.state import state_store, DEFAULT_CHECK_INTERVAL, DEFAULT_CHECK_TIMEOUT, LINK_CONNECT_TIMEOUT_SECONDS
+from app.probe_backends import get_probe_backend, probe_result
+from app.protocol_probes import protocol_prober, is_protocol_endpoint
+from app.link_fetcher import link_fetcher
+from app.uptime_accumulator import uptime_accumulator
+from app.status_feed import status_feed, status_changed
+from app.metrics import CHECK_BATCH_SECONDS, CHECK_BATCH_ITEMS, CHECKS, PROBE_RESPONSE_SECONDS, LINKED_FETCHES
+
+# Last payload per linked remote, revalidated with If-None-Match and advanced with ?since= deltas:
+# {api_endpoint: (etag, statuses, version)}
+_linked_status_cache = {}
 
 # --- Endpoint Check Functions ---
 
-def check_http_endpoint(endpoint, global_settings):
-    """Performs a basic HTTP GET check on a single *local* endpoint."""
-    url = endpoint.get('url')
-    if not url: return {"status": "ERROR", "details": "Missing URL"}
-
-    global_timeout = int(global_settings.get('check_timeout_seconds', DEFAULT_CHECK_TIMEOUT))
-    endpoint_timeout_str = endpoint.get('check_timeout_seconds')
-    try:
-        timeout = int(endpoint_timeout_str) if endpoint_timeout_str is not None else global_timeout
-        timeout = max(1, timeout)
-    except (ValueError, TypeError):
-        timeout = global_timeout
-
-    start_time = time.time()
-    headers = {'User-Agent': 'UptimizerChecker/1.15.0'} # Updated User-Agent
-    details_msg = None
-    status_code = None
-    response_time_ms = None
-    status = "UNKNOWN"
-
-    try:
-        response = requests.get(url, timeout=timeout, headers=headers, allow_redirects=True)
-        response_time_ms = round((time.time() - start_time) * 1000)
-        status_code = response.status_code
-        status = "UP" if 200 <= response.status_code < 400 else "DOWN"
-        if status == "DOWN": details_msg = f"HTTP {response.status_code}"
-    except requests.exceptions.Timeout: details_msg = f"Timeout >{timeout}s"; status="DOWN"
-    except requests.exceptions.TooManyRedirects: details_msg = "Too many redirects"; status="DOWN"
-    except requests.exceptions.ConnectionError: details_msg = "Connection error"; status="DOWN"
-    except requests.exceptions.RequestException as e: details_msg = str(e)[:200] + ("..." if len(str(e)) > 200 else ""); status="DOWN"
-    except Exception as e:
-        current_app.logger.error(f"Check error for {url}: {e}", exc_info=True)
-        details_msg = "Check error"; status="ERROR"
-
-    return {
-        "status": status,
-        "status_code": status_code,
-        "response_time_ms": response_time_ms,
-        "details": details_msg
-    }
-
 def fetch_remote_client_status(client_config, global_settings):
     """Fetches status data from a remote Uptimizer client API."""
     remote_url = client_config.get('remote_url')
@@ -74,29 +44,48 @@ def fetch_remote_client_status(client_config, global_settings):
     # Ensure no double slashes if remote_url already has one
     api_endpoint = f"{remote_url.rstrip('/')}/api/v1/client/{client_id_on_remote}/status"
 
-    headers = {
-        'Authorization': f'Bearer {api_token}',
-        'User-Agent': 'UptimizerLinkChecker/1.15.0'
-    }
+    headers = {'Authorization': f'Bearer {api_token}'} # User-Agent is set on the pooled session
+    cached = _linked_status_cache.get(api_endpoint)
+    params = {}
+    if cached and cached[0]: headers['If-None-Match'] = cached[0]
+    if cached and cached[2]: params['since'] = cached[2] # Remote sends only what changed since (older remotes ignore it)
     # Use global timeout for fetching remote status
     timeout = int(global_settings.get('check_timeout_seconds', DEFAULT_CHECK_TIMEOUT))
-    timeout = max(5, timeout) # Give remote checks a bit more time
+    timeout = max(5, timeout) # Give remote checks a bit more time to answer
+    connect_timeout = min(timeout, LINK_CONNECT_TIMEOUT_SECONDS) # ...but not to accept a connection
 
     start_time = time.time()
     try:
-        response = requests.get(api_endpoint, headers=headers, timeout=timeout)
+        response = link_fetcher.session().get(api_endpoint, headers=headers, params=params, timeout=(connect_timeout, timeout))
         response_time = time.time() - start_time
+        if response.status_code == 304 and cached:
+            # Remote state unchanged since our last fetch; reuse the payload we already have
+            current_app.logger.debug(f"Linked client {client_id_on_remote}@{remote_url} not modified ({response_time:.2f}s).")
+            LINKED_FETCHES.labels('not_modified').inc()
+            return dict(cached[1])
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
 
-        # Expecting JSON like: { "statuses": { "endpoint_id1": {...}, "endpoint_id2": {...} }, "last_updated": ... }
+        # Expecting JSON like: { "statuses": { "endpoint_id1": {...}, ... }, "removed": [...], "version": "...", "delta": bool, "last_updated": ... }
         remote_data = response.json()
         remote_statuses = remote_data.get('statuses')
+        removed = remote_data.get('removed') or []
 
-        if not isinstance(remote_statuses, dict):
+        if not isinstance(remote_statuses, dict) or not isinstance(removed, list):
              current_app.logger.warning(f"Linked client check for {client_id_on_remote}@{remote_url}: Invalid 'statuses' format received.")
              return {"error": "Invalid remote data format"}
 
-        current_app.logger.info(f"Successfully fetched status for {len(remote_statuses)} endpoints from linked client {client_id_on_remote}@{remote_url} in {response_time:.2f}s.")
+        received = len(remote_statuses)
+        if remote_data.get('delta') and cached and params:
+            # Changed endpoints and tombstones since our version, applied to the statuses we had
+            remote_statuses = {**cached[1], **remote_statuses}
+            for ep_id in removed: remote_statuses.pop(ep_id, None)
+
+        version = remote_data.get('version')
+        if response.headers.get('ETag') or version: _linked_status_cache[api_endpoint] = (response.headers.get('ETag'), remote_statuses, version)
+        else: _linked_status_cache.pop(api_endpoint, None)
+        mode = f"delta: {received} changed, {len(removed)} removed" if remote_data.get('delta') else "full"
+        LINKED_FETCHES.labels('delta' if remote_data.get('delta') else 'full').inc()
+        current_app.logger.info(f"Successfully fetched status for {len(remote_statuses)} endpoints ({mode}) from linked client {client_id_on_remote}@{remote_url} in {response_time:.2f}s.")
 
         # Return the dictionary of endpoint statuses from the remote client
         return remote_statuses
@@ -127,44 +116,74 @@ def fetch_remote_client_status(client_config, global_settings):
         return {"error": "Unexpected fetch error"}
 
 
+# --- Probe Result Merging ---
+
+def _drain_probe_run(endpoints, start):
+    """Yields a probe run's (endpoint, result) pairs; if the run fails, its unanswered endpoints end as ERROR."""
+    pending = {(ep.get('client_id'), ep.get('id')): ep for ep in endpoints}
+    try:
+        for endpoint, result in start():
+            pending.pop((endpoint.get('client_id'), endpoint.get('id')), None)
+            yield endpoint, result
+    except Exception as e:
+        current_app.logger.error(f"BG Task: Probe run failed; reporting {len(pending)} unanswered checks as errors: {e}", exc_info=True)
+        for endpoint in pending.values(): yield endpoint, probe_result("ERROR", details="Check error")
+
+def _merged_probe_results(runs):
+    """
+    Yields (endpoint, result) from several probe runs [(endpoints, start)] in completion order
+    across all of them: start() returns the run's result iterator. With more than one run each
+    is drained by its own thread into one queue, so protocol results don't wait for the slowest
+    HTTP probe, and a run that fails can't keep the others' results from being collected.
+    """
+    runs = [(endpoints, start) for endpoints, start in runs if endpoints]
+    if len(runs) == 1:
+        endpoints, start = runs[0]
+        yield from _drain_probe_run(endpoints, start)
+        return
+    app = current_app._get_current_object() # The HTTP backends run checks in the app context they are called from
+    completed = queue.Queue()
+    def pump(endpoints, start):
+        try:
+            with app.app_context():
+                for item in _drain_probe_run(endpoints, start): completed.put(item)
+        finally: completed.put(None)
+    for endpoints, start in runs:
+        threading.Thread(target=pump, args=(endpoints, start), name="uptimizer-probe-results", daemon=True).start()
+    remaining = len(runs)
+    while remaining:
+        item = completed.get()
+        if item is None: remaining -= 1
+        else: yield item
+
+
 # --- Main Background Task ---
 
-def run_checks_task(current_state_ref, state_lock_ref):
-    """Background task logic: runs checks for local endpoints and fetches status for linked clients."""
-    current_app.logger.info(f"BG Task: Cycle Start @ {time.strftime('%Y-%m-%d %H:%M:%S')}")
+def _collect_due_items(state_store_ref, now):
+    """Full sweep: snapshots state and returns (global_settings, due local endpoints, due linked clients)."""
     endpoints_to_check_now = []
     clients_to_fetch_now = []
-    results_this_cycle = {} # Store results per client: { client_id: { endpoint_id: {...} } or {"error": ...} }
-    now = time.time()
-    start_cycle_time = time.time()
 
-    # Access shared state under lock only when needed
-    with state_lock_ref:
-        # Deep copy relevant parts of state to avoid holding lock during checks/fetches
-        global_settings = current_state_ref.get("global_settings", {}).copy()
-        # Snapshot client configurations and last check times
-        clients_snapshot = {}
-        for client_id, client_data in current_state_ref.get("clients", {}).items():
-             clients_snapshot[client_id] = {
-                 "id": client_id, # Add client_id for remote fetch context
-                 "type": client_data.get("settings", {}).get("client_type", "local"),
-                 "endpoints": list(client_data.get("endpoints", [])), # For local checks
-                 "statuses": client_data.get("statuses", {}).copy(), # For last check times
-                 "remote_url": client_data.get("settings", {}).get("remote_url"), # For remote fetch
-                 "api_token": client_data.get("settings", {}).get("api_token") # For remote fetch
-             }
-        global_interval = int(global_settings.get("check_interval_seconds", DEFAULT_CHECK_INTERVAL))
+    # Immutable snapshot: no lock and no copies needed while checks/fetches run
+    state = state_store_ref.snapshot()
+    global_settings = state.get("global_settings", {})
+    clients_snapshot = {}
+    for client_id, client_data in state.get("clients", {}).items():
+         clients_snapshot[client_id] = {
+             "id": client_id, # Add client_id for remote fetch context
+             "type": client_data.get("settings", {}).get("client_type", "local"),
+             "endpoints": client_data.get("endpoints", []), # For local checks
+             "statuses": client_data.get("statuses", {}), # For last check times
+             "remote_url": client_data.get("settings", {}).get("remote_url"), # For remote fetch
+             "api_token": client_data.get("settings", {}).get("api_token") # For remote fetch
+         }
+    global_interval = int(global_settings.get("check_interval_seconds", DEFAULT_CHECK_INTERVAL))
 
     if not clients_snapshot:
         current_app.logger.info("BG Task: No clients configured.")
-        return
-
-    # Determine which local endpoints and remote clients are due
-    local_endpoints_due_count = 0
-    remote_clients_due_count = 0
+        return global_settings, [], []
 
     for client_id, client_config in clients_snapshot.items():
-        results_this_cycle[client_id] = {} # Init results dict for this client
         client_type = client_config.get("type", "local")
         last_check_statuses = client_config.get("statuses", {})
 
@@ -186,7 +205,6 @@ def run_checks_task(current_state_ref, state_lock_ref):
                 last_check_ts = last_check_statuses.get(ep_id, {}).get("last_check_ts", 0)
                 if (now - last_check_ts) >= check_interval:
                     endpoints_to_check_now.append({**ep, "client_id": client_id}) # Add client ID context
-                    local_endpoints_due_count += 1
 
         elif client_type == "linked":
             # Check interval for linked clients is based on the *global* interval for simplicity
@@ -200,35 +218,74 @@ def run_checks_task(current_state_ref, state_lock_ref):
 
             if (now - last_fetch_ts) >= fetch_interval:
                 clients_to_fetch_now.append(client_config)
-                remote_clients_due_count += 1
         else:
              current_app.logger.warning(f"BG Task: Unknown client type '{client_type}' for client '{client_id}'. Skipping.")
 
+    return global_settings, endpoints_to_check_now, clients_to_fetch_now
+
+
+def run_checks_task(state_store_ref, due_items=None, global_settings=None):
+    """
+    Background task logic: runs checks for local endpoints and fetches status for linked clients.
+    The deadline scheduler passes the items that are due (due_items + its global_settings);
+    without them, a full sweep of state decides what is due (initial/manual runs).
+    Returns the statuses written, [{"client_id", "endpoint_id", "status"}, ...] (the checker
+    worker publishes them to the web tier).
+    """
+    current_app.logger.info(f"BG Task: Cycle Start @ {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    results_this_cycle = {} # Store results per client: { client_id: { endpoint_id: {...} } or {"error": ...} }
+    now = time.time()
+    start_cycle_time = time.time()
+
+    if due_items is None:
+        global_settings, endpoints_to_check_now, clients_to_fetch_now = _collect_due_items(state_store_ref, now)
+    else:
+        global_settings = global_settings or {}
+        endpoints_to_check_now = [item for item in due_items if item.get("kind") == "endpoint"]
+        clients_to_fetch_now = [item for item in due_items if item.get("kind") == "linked"]
+    global_interval = int(global_settings.get("check_interval_seconds", DEFAULT_CHECK_INTERVAL))
+    # Linked client configs, needed to map a failed fetch onto the client's endpoints
+    clients_snapshot = {client_config.get('id'): client_config for client_config in clients_to_fetch_now}
 
     if not endpoints_to_check_now and not clients_to_fetch_now:
         current_app.logger.info("BG Task: No local endpoints or linked clients due this cycle.")
-        return
+        return []
 
+    local_endpoints_due_count = len(endpoints_to_check_now)
+    remote_clients_due_count = len(clients_to_fetch_now)
     current_app.logger.info(f"BG Task: Checking {local_endpoints_due_count} local endpoints and fetching {remote_clients_due_count} linked clients.")
+    CHECK_BATCH_ITEMS.labels('endpoint').inc(local_endpoints_due_count)
+    CHECK_BATCH_ITEMS.labels('linked').inc(remote_clients_due_count)
 
     # --- Perform Checks and Fetches ---
     checked_count = 0
     fetched_count = 0
 
-    # 1. Check local endpoints
-    for ep_with_context in endpoints_to_check_now:
+    # Linked clients are fetched concurrently on the link fetcher's pool while local probes run
+    linked_results = link_fetcher.run([c for c in clients_to_fetch_now if c.get('id')], fetch_remote_client_status, global_settings)
+
+    # 1. Check local endpoints (concurrently; results arrive here in completion order).
+    # tcp/tls/dns/udp endpoints go to the protocol prober's event loop, running alongside the HTTP backend.
+    probe_backend = get_probe_backend(global_settings)
+    valid_endpoints = [ep for ep in endpoints_to_check_now if ep.get('id') and ep.get('client_id')]
+    protocol_endpoints = [ep for ep in valid_endpoints if is_protocol_endpoint(ep)]
+    http_endpoints = [ep for ep in valid_endpoints if not is_protocol_endpoint(ep)] if protocol_endpoints else valid_endpoints
+    probe_runs = [(http_endpoints, lambda: probe_backend.run_batch(http_endpoints, global_settings)),
+                  (protocol_endpoints, lambda: protocol_prober.run(protocol_endpoints, global_settings))]
+    for ep_with_context, check_result in _merged_probe_results(probe_runs):
         ep_id = ep_with_context.get('id')
         client_id = ep_with_context.get('client_id')
-        if not ep_id or not client_id: continue
-
-        check_result = check_http_endpoint(ep_with_context, global_settings)
         # Store result under the correct client and endpoint ID
-        if client_id not in results_this_cycle: results_this_cycle[client_id] = {} # Should exist, but safety check
+        if client_id not in results_this_cycle: results_this_cycle[client_id] = {}
         results_this_cycle[client_id][ep_id] = {
             **check_result, # Spread the check result (status, details, code, time)
             "last_check_ts": now,
         }
         checked_count += 1
+        uptime_accumulator.record(ep_id, check_result.get('status'))
+        CHECKS.labels(check_result.get('status')).inc()
+        if check_result.get('response_time_ms') is not None:
+            PROBE_RESPONSE_SECONDS.labels(client_id).observe(check_result['response_time_ms'] / 1000)
 
         # --- Save to Database ---
         # Only save results from direct checks, not aggregated remote results
@@ -240,16 +297,14 @@ def run_checks_task(current_state_ref, state_lock_ref):
         # ----------------------
 
 
-    # 2. Fetch remote client statuses
-    for client_config in clients_to_fetch_now:
+    # 2. Collect linked client statuses (completion order)
+    for client_config, fetch_result in linked_results:
         client_id = client_config.get('id')
-        if not client_id: continue
-
-        fetch_result = fetch_remote_client_status(client_config, global_settings)
 
         if isinstance(fetch_result, dict) and "error" in fetch_result:
              # Store the error globally for this client fetch attempt
              results_this_cycle[client_id] = {"error": fetch_result["error"], "last_check_ts": now}
+             LINKED_FETCHES.labels('error').inc() # Includes fetches skipped by an open circuit breaker
              current_app.logger.warning(f"Failed to fetch status for linked client '{client_id}': {fetch_result['error']}")
         elif isinstance(fetch_result, dict):
              # Success! Store the fetched statuses. Timestamps should come from remote.
@@ -265,22 +320,24 @@ def run_checks_task(current_state_ref, state_lock_ref):
             # Handle unexpected fetch_result format
             error_msg = "Unknown error or invalid format during fetch"
             results_this_cycle[client_id] = {"error": error_msg, "last_check_ts": now}
+            LINKED_FETCHES.labels('error').inc()
             current_app.logger.error(f"BG Task: Unexpected fetch result format for linked client '{client_id}'. Result: {fetch_result}")
 
 
     cycle_duration = time.time() - start_cycle_time
     current_app.logger.info(f"BG Task: Checked {checked_count} local endpoints, Fetched {fetched_count} linked clients in {cycle_duration:.2f}s.")
     if cycle_duration > global_interval:
-        current_app.logger.warning(f"BG Task: WARNING - Check cycle duration ({cycle_duration:.2f}s) exceeded SCHEDULER interval ({global_interval}s). Consider increasing interval or optimizing checks.")
+        current_app.logger.warning(f"BG Task: WARNING - Check cycle duration ({cycle_duration:.2f}s) exceeded the global check interval ({global_interval}s). Consider raising max_concurrent_checks or the interval.")
 
     # --- Update State ---
     updates_applied = 0
-    with state_lock_ref:
+    changes = [] # Endpoint statuses that differ from what subscribers last saw
+    written = [] # Every status written this cycle
+    removed = {} # Linked client -> endpoints the remote no longer has
+    with state_store_ref.write() as draft: # Copies only the statuses of clients with results; readers keep the old snapshot
         for client_id, client_results in results_this_cycle.items():
-            if client_id in current_state_ref["clients"]:
-                 # Ensure statuses dict exists
-                 if "statuses" not in current_state_ref["clients"][client_id]:
-                     current_state_ref["clients"][client_id]["statuses"] = {}
+            if client_id in draft.clients:
+                 statuses = draft.statuses(client_id)
 
                  if "error" in client_results:
                      # If the fetch failed, update all existing endpoints for this client with an error status
@@ -290,20 +347,70 @@ def run_checks_task(current_state_ref, state_lock_ref):
                          "details": f"Link Error: {client_results['error']}",
                          "last_check_ts": client_results.get("last_check_ts", now)
                      }
-                     # We need the list of expected endpoints for this client from the config snapshot
-                     expected_endpoints = clients_snapshot.get(client_id, {}).get('endpoints', [])
-                     for ep in expected_endpoints:
-                          ep_id = ep.get('id')
+                     # Expected endpoints come from the config snapshot; linked clients have none, so use the statuses we hold
+                     expected_ids = [ep.get('id') for ep in clients_snapshot.get(client_id, {}).get('endpoints', [])] or list(statuses)
+                     for ep_id in expected_ids:
                           if ep_id:
-                              current_state_ref["clients"][client_id]["statuses"][ep_id] = error_status
+                              if status_changed(statuses.get(ep_id), error_status):
+                                  changes.append({"client_id": client_id, "endpoint_id": ep_id, "status": error_status})
+                              statuses[ep_id] = error_status
+                              written.append({"client_id": client_id, "endpoint_id": ep_id, "status": error_status})
                               updates_applied += 1
                  elif isinstance(client_results, dict):
                       # For successful local checks or remote fetches, update statuses
-                      current_state_ref["clients"][client_id]["statuses"].update(client_results)
+                      for ep_id, status_data in client_results.items():
+                          if status_changed(statuses.get(ep_id), status_data):
+                              changes.append({"client_id": client_id, "endpoint_id": ep_id, "status": status_data})
+                      statuses.update(client_results)
+                      if client_id in clients_snapshot: # A linked fetch is the remote's full list: drop endpoints it removed
+                          gone = [ep_id for ep_id in statuses if ep_id not in client_results]
+                          for ep_id in gone: del statuses[ep_id]
+                          if gone: removed[client_id] = gone
+                      written.extend({"client_id": client_id, "endpoint_id": ep_id, "status": status_data} for ep_id, status_data in client_results.items())
                       updates_applied += len(client_results) # Count individual endpoint updates
                  # Else: do nothing if format is weird (already logged error)
 
             else:
                  current_app.logger.warning(f"BG Task: Client '{client_id}' not found in state during status update (might have been deleted?).")
-        current_state_ref["last_updated"] = now
-    current_app.logger.info(f"BG Task: Updated memory status for {updates_applied} total endpoint entries across {len(results_this_cycle)} clients processed.")
\ No newline at end of file
+        draft["last_updated"] = now
+        draft["status_version"] = status_feed.publish(changes, now, written) # Inside the write so feed order matches state order
+        for client_id, gone in removed.items(): draft["status_version"] = status_feed.reset(client_id, removed=gone)
+    current_app.logger.info(f"BG Task: Updated memory status for {updates_applied} total endpoint entries across {len(results_this_cycle)} clients processed.")
+    CHECK_BATCH_SECONDS.observe(time.time() - start_cycle_time)
+    return written
+
+
+def run_scheduled_checks(due_items, global_settings):
+    """Dispatch target for the deadline scheduler: runs one batch of due items against the shared state."""
+    run_checks_task(state_store, due_items=due_items, global_settings=global_settings)
+
+
+def apply_external_results(state_store_ref, updates, last_updated=None):
+    """
+    Applies statuses checked by another process (checker worker, other shards, the leader):
+    [{"client_id", "endpoint_id", "status"}, ...]. A result only replaces a newer-or-equal
+    one if its last_check_ts is later, so replays and out-of-order deliveries are harmless.
+    Local results also feed the 24h uptime window. Returns the number applied.
+    """
+    changes, refreshed, applied = [], [], []
+    with state_store_ref.write() as draft:
+        local_ids = {}
+        for update in updates:
+            client_id, ep_id, status_data = update.get("client_id"), update.get("endpoint_id"), update.get("status") or {}
+            client = draft.clients.get(client_id)
+            if client is None or not ep_id: continue
+            is_local = client.get("settings", {}).get("client_type", "local") == "local"
+            if is_local:
+                if client_id not in local_ids: local_ids[client_id] = {ep.get('id') for ep in client.get("endpoints", [])}
+                if ep_id not in local_ids[client_id]: continue # Endpoint deleted here meanwhile
+            current = client.get("statuses", {}).get(ep_id)
+            if current and current.get("last_check_ts", 0) >= status_data.get("last_check_ts", 0): continue
+            (changes if status_changed(current, status_data) else refreshed).append({"client_id": client_id, "endpoint_id": ep_id, "status": status_data})
+            draft.statuses(client_id)[ep_id] = status_data
+            applied.append((ep_id, status_data, is_local))
+        if applied:
+            if last_updated is not None: draft["last_updated"] = max(draft.get("last_updated", 0), last_updated)
+            draft["status_version"] = status_feed.publish(changes, draft.get("last_updated", 0), refreshed)
+    for ep_id, status_data, is_local in applied:
+        if is_local: uptime_accumulator.record(ep_id, status_data.get("status"), status_data.get("last_check_ts"))
+    return len(applied)
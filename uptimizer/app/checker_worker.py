@@ -0,0 +1,104 @@
+# Standalone checker process: python -m app.checker_worker
+# Runs the deadline scheduler and probe engine without the web tier (CHECKER_MODE=external
+# on the web side). Results go to the web processes via Postgres NOTIFY; history is written here.
+import os
+import sys
+import signal
+import logging
+import threading
+
+# --- Environment Loading (before app.state reads it) ---
+from dotenv import load_dotenv
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path: sys.path.insert(0, project_root)
+load_dotenv(os.path.join(project_root, '.env'))
+
+from flask import Flask
+
+from app import models
+from app.models import create_db_tables
+from app.state import state_store, CONFIG_PATH, LEADER_LOCK_KEY
+from app.config_manager import load_initial_config
+from app.checker import run_checks_task
+from app.deadline_scheduler import check_scheduler, notify_config_changed
+from app.check_engine import check_engine
+from app.probe_backends import shutdown_probe_backends
+from app.protocol_probes import protocol_prober
+from app.link_fetcher import link_fetcher
+from app.history_writer import history_writer
+from app.partitions import ensure_partitions
+from app.sharding import shard_coordinator
+from app.leader import LeaderElector
+from app.result_bus import publish_results, NotificationListener, CONFIG_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# The checker and config loading log through current_app; this app only provides that context
+app = Flask(__name__)
+# Workers elect among themselves, independently of the web tier's leader (which runs maintenance)
+worker_elector = LeaderElector(lock_key=LEADER_LOCK_KEY + 1)
+
+
+def run_and_publish(due_items, global_settings):
+    """Deadline scheduler dispatch target: runs one due batch, then pushes its results to the web tier."""
+    results = run_checks_task(state_store, due_items=due_items, global_settings=global_settings)
+    if results and not publish_results(results):
+        app.logger.warning(f"Checker worker: could not publish {len(results)} results; the web tier will read them from history.")
+
+def start_checks():
+    app.logger.info("Checker worker: starting deadline scheduler.")
+    check_scheduler.start(run_and_publish, state_store, app=app,
+                          owns_fn=shard_coordinator.owns if shard_coordinator.enabled else None)
+
+def stop_checks():
+    if check_scheduler.running: check_scheduler.shutdown(wait=False)
+
+def reload_config(*_):
+    """Re-reads config.json + journal (written by the web tier), keeping statuses of unchanged endpoints."""
+    with app.app_context():
+        load_initial_config(CONFIG_PATH, state_store, keep_statuses=True)
+    notify_config_changed()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    if not models.ENGINE_INITIALIZED:
+        logger.critical("Checker worker needs the database (results reach the web tier through it). Exiting.")
+        return 1
+
+    with app.app_context():
+        create_db_tables()
+        ensure_partitions() # History rows are written from here
+        load_initial_config(CONFIG_PATH, state_store)
+
+    # Config edits arrive as notifications; a reconnect may have missed some, so reload then too
+    config_listener = NotificationListener([CONFIG_CHANNEL], reload_config, on_connect=reload_config, name="uptimizer-config-listener")
+    config_listener.start()
+
+    if shard_coordinator.enabled:
+        shard_coordinator.start(on_change=notify_config_changed)
+        start_checks()
+    else:
+        worker_elector.start(on_elected=start_checks, on_demoted=stop_checks)
+        if not check_scheduler.running: logger.info("Checker worker: standing by; another worker holds the checker lock.")
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT): signal.signal(signum, lambda *_: stop.set())
+    stop.wait()
+
+    logger.info("Checker worker: shutting down...")
+    config_listener.shutdown()
+    stop_checks()
+    worker_elector.shutdown()
+    shard_coordinator.shutdown()
+    shutdown_probe_backends()
+    protocol_prober.shutdown()
+    link_fetcher.shutdown()
+    check_engine.shutdown(wait=False)
+    history_writer.shutdown()
+    logger.info("Checker worker: stopped.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,23 +3,163 @@ import json
 import threading
 import uuid
 from copy import deepcopy
+from contextlib import contextmanager
+try: import fcntl
+except ImportError: fcntl = None # Not on Windows: only in-process locking
 from flask import current_app # For logging
 
 # Import central config path and defaults from state
 from app.state import (CONFIG_PATH, DEFAULT_GLOBAL_SETTINGS, DEFAULT_CLIENT_SETTINGS,
-                       DEFAULT_CLIENT_ID)
+                       DEFAULT_CLIENT_ID, PROBE_MODES)
+from app.metrics import CONFIG_SAVE_SECONDS
+from app.assertions import normalize_assertions, needs_body
+from app.protocol_probes import protocol_endpoint_error
 
-# Lock for file operations
+# Lock for file operations (config.json and its journal) in this process; other processes
+# sharing the files are excluded by an flock on the journal (see _journal_lock)
 config_file_lock = threading.Lock()
+_journal_entries = 0 # Lines in the journal not yet folded into config.json
+
+# --- Config Change Journal ---
+# Edits append one JSON line to "<config>.journal" instead of rewriting config.json;
+# loading replays the journal over config.json and compact_config() folds it back in.
+# Every op is idempotent (puts replace, deletes ignore missing), so replaying a journal
+# that was already folded in (crash between save and truncate) is harmless.
+# Every web process (and the checker worker) appends to the same journal, so it is never
+# removed or replaced, only truncated in place under an exclusive flock.
+
+def journal_path(config_path_arg=None):
+    return os.path.abspath(config_path_arg or CONFIG_PATH) + '.journal'
+
+@contextmanager
+def _journal_lock(path, exclusive=True):
+    """
+    flocks the journal across processes: exclusive to append or compact (opens it for
+    appending, creating it), shared to read config.json + journal (yields None if there is no journal).
+    """
+    try: f = open(path, 'a+b' if exclusive else 'rb')
+    except FileNotFoundError:
+        if exclusive: raise
+        yield None
+        return
+    with f:
+        if fcntl is not None: fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield f # Closing the file releases the flock
+
+def apply_config_change(config_data, change):
+    """Applies one journal op to raw config data ({"global_settings", "clients": {id: {"settings", "endpoints"}}}) in place."""
+    op = change.get('op')
+    clients = config_data.setdefault("clients", {})
+    if op == 'batch':
+        for sub_change in change.get('changes', []): apply_config_change(config_data, sub_change)
+    elif op == 'put_global_settings':
+        config_data["global_settings"] = change['settings']
+    elif op == 'put_client':
+        clients[change['client_id']] = {"settings": change['settings'], "endpoints": change.get('endpoints', [])}
+    elif op == 'delete_client':
+        clients.pop(change['client_id'], None)
+    elif op == 'put_client_settings':
+        clients.setdefault(change['client_id'], {"endpoints": []})["settings"] = change['settings']
+    elif op == 'put_endpoint':
+        endpoints = clients.setdefault(change['client_id'], {}).setdefault("endpoints", [])
+        endpoint = change['endpoint']
+        for i, ep in enumerate(endpoints):
+            if ep.get('id') == endpoint.get('id'):
+                endpoints[i] = endpoint
+                break
+        else: endpoints.append(endpoint)
+    elif op == 'put_endpoints': # Whole endpoint list of a client (bulk import); O(n) to replay
+        clients.setdefault(change['client_id'], {})["endpoints"] = change['endpoints']
+    elif op == 'delete_endpoint':
+        client = clients.get(change['client_id'])
+        if client: client["endpoints"] = [ep for ep in client.get("endpoints", []) if ep.get('id') != change['endpoint_id']]
+    else:
+        current_app.logger.warning(f"Config journal: Ignoring unknown op '{op}'.")
+
+def _replay_journal(config_data, config_path_arg=None):
+    """Applies the journal to config_data. Caller holds config_file_lock. Returns the number of entries applied."""
+    global _journal_entries
+    path = journal_path(config_path_arg)
+    if not os.path.exists(path):
+        _journal_entries = 0
+        return 0
+    applied = 0
+    with open(path, 'r') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip(): continue
+            try: change = json.loads(line)
+            except json.JSONDecodeError:
+                # Only a torn final write can leave a partial line; everything before it is intact
+                current_app.logger.warning(f"Config journal: Skipping unreadable line {line_no} in {path}.")
+                continue
+            apply_config_change(config_data, change)
+            applied += 1
+    _journal_entries = applied
+    if applied: current_app.logger.info(f"Config journal: Replayed {applied} entries from {path}.")
+    return applied
+
+def append_config_changes(changes, config_path_arg=None):
+    """
+    Durably records config edits (list of ops) as one journal line, so a batch is applied
+    all-or-nothing on replay. Cost is O(size of the change), not of the whole config.
+    Call inside the state_store.write() block that makes the same change. Returns True on success.
+    """
+    global _journal_entries
+    if not changes: return True
+    entry = changes[0] if len(changes) == 1 else {"op": "batch", "changes": changes}
+    path = journal_path(config_path_arg)
+    with config_file_lock, CONFIG_SAVE_SECONDS.labels('journal').time():
+        try:
+            with _journal_lock(path) as f:
+                line = json.dumps(entry, separators=(',', ':')).encode() + b'\n'
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n': line = b'\n' + line # Terminate a torn last line so it can't swallow this entry
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            _journal_entries += 1
+            return True
+        except Exception as e:
+            current_app.logger.error(f"ERROR appending to config journal {path}: {e}", exc_info=True)
+            return False
+
+def compact_config(config_path_arg=None):
+    """
+    Folds the journal into config.json: replays it over the file, writes the result once and
+    truncates the journal. Built from the files rather than this process's state, so edits
+    other processes journaled but this one hasn't replayed yet are kept; the exclusive journal
+    lock keeps them from appending between the two steps. Returns True if anything was folded.
+    """
+    global _journal_entries
+    resolved_path = os.path.abspath(config_path_arg or CONFIG_PATH)
+    path = journal_path(resolved_path)
+    if not os.path.exists(path): return False
+    with config_file_lock, _journal_lock(path) as journal:
+        if journal.seek(0, os.SEEK_END) == 0: return False
+        config_data = _read_config_file(resolved_path)
+        folded = _journal_entries
+        if not _write_config_file(resolved_path, config_data): return False
+        journal.truncate(0)
+        os.fsync(journal.fileno())
+        _journal_entries = 0
+    current_app.logger.info(f"Config journal: Compacted {folded} entries into config file.")
+    return True
+
 
 def load_config_from_file(config_path_arg=None):
     """Reads config from file, handles old format, ensures structure, returns data or raises error."""
     resolved_path = os.path.abspath(config_path_arg or CONFIG_PATH)
     current_app.logger.info(f"Attempting to load config from: {resolved_path}")
+    with config_file_lock, _journal_lock(journal_path(resolved_path), exclusive=False):
+        return _read_config_file(resolved_path)
+
+def _read_config_file(resolved_path):
+    """config.json (defaults if missing) with the journal replayed; raises ValueError/IOError. Caller holds the file locks."""
     if not os.path.exists(resolved_path):
         current_app.logger.warning(f"Config file not found: {resolved_path}. Returning default structure.")
         # Return structure matching new state, including default client settings
-        return {
+        config_data = {
             "global_settings": DEFAULT_GLOBAL_SETTINGS.copy(),
             "clients": {
                 DEFAULT_CLIENT_ID: {
@@ -28,89 +168,138 @@ def load_config_from_file(config_path_arg=None):
                 }
             }
         }
+        _replay_journal(config_data, resolved_path)
+        return config_data
 
-    with config_file_lock:
-        try:
-            with open(resolved_path, 'r') as f: config_data = json.load(f)
-
-            # --- Gracefully handle old format (settings/endpoints at root) ---
-            if "settings" in config_data and "endpoints" in config_data and "clients" not in config_data:
-                current_app.logger.warning("Detected old config format. Migrating to new client structure.")
-                old_settings = config_data.get("settings", {})
-                old_endpoints = config_data.get("endpoints", [])
-
-                # Create new structure
-                new_config = {
-                    "global_settings": {
-                        "check_interval_seconds": old_settings.get("check_interval_seconds", DEFAULT_GLOBAL_SETTINGS['check_interval_seconds']),
-                        "check_timeout_seconds": old_settings.get("check_timeout_seconds", DEFAULT_GLOBAL_SETTINGS['check_timeout_seconds'])
-                    },
-                    "clients": {
-                        DEFAULT_CLIENT_ID: {
-                            "settings": { # Populate default client settings from old global/defaults
-                                "name": old_settings.get('name', DEFAULT_CLIENT_SETTINGS['name']), # Use old name if exists
-                                "client_type": "local", # Assume old format is local
-                                "disable_floating_elements": old_settings.get("disable_floating_elements", DEFAULT_CLIENT_SETTINGS['disable_floating_elements']),
-                                "api_token": None, # Old format didn't have tokens
-                                "remote_url": None,
-                                "api_enabled": False # Explicitly disable API exposure
-                            },
-                            "endpoints": old_endpoints # Assign old endpoints
-                        }
+    try:
+        with open(resolved_path, 'r') as f: config_data = json.load(f)
+
+        # --- Gracefully handle old format (settings/endpoints at root) ---
+        if "settings" in config_data and "endpoints" in config_data and "clients" not in config_data:
+            current_app.logger.warning("Detected old config format. Migrating to new client structure.")
+            old_settings = config_data.get("settings", {})
+            old_endpoints = config_data.get("endpoints", [])
+
+            # Create new structure
+            new_config = {
+                "global_settings": {
+                    "check_interval_seconds": old_settings.get("check_interval_seconds", DEFAULT_GLOBAL_SETTINGS['check_interval_seconds']),
+                    "check_timeout_seconds": old_settings.get("check_timeout_seconds", DEFAULT_GLOBAL_SETTINGS['check_timeout_seconds'])
+                },
+                "clients": {
+                    DEFAULT_CLIENT_ID: {
+                        "settings": { # Populate default client settings from old global/defaults
+                            "name": old_settings.get('name', DEFAULT_CLIENT_SETTINGS['name']), # Use old name if exists
+                            "client_type": "local", # Assume old format is local
+                            "disable_floating_elements": old_settings.get("disable_floating_elements", DEFAULT_CLIENT_SETTINGS['disable_floating_elements']),
+                            "api_token": None, # Old format didn't have tokens
+                            "remote_url": None,
+                            "api_enabled": False # Explicitly disable API exposure
+                        },
+                        "endpoints": old_endpoints # Assign old endpoints
                     }
                 }
-                config_data = new_config
-                current_app.logger.info("Old config format migrated.")
-            # --- End old format handling ---
-
-            # --- Ensure basic structure and default client exist for new format ---
-            if "global_settings" not in config_data:
-                 config_data["global_settings"] = DEFAULT_GLOBAL_SETTINGS.copy()
-                 current_app.logger.warning("Config loaded: 'global_settings' key missing, added defaults.")
-            if "clients" not in config_data:
-                 config_data["clients"] = {
-                    DEFAULT_CLIENT_ID: { "settings": DEFAULT_CLIENT_SETTINGS.copy(), "endpoints": [] }
-                 }
-                 current_app.logger.warning("Config loaded: 'clients' key missing, added default client structure.")
-            elif DEFAULT_CLIENT_ID not in config_data["clients"]:
-                 config_data["clients"][DEFAULT_CLIENT_ID] = {
-                     "settings": DEFAULT_CLIENT_SETTINGS.copy(),
-                     "endpoints": []
-                 }
-                 current_app.logger.warning(f"Config loaded: Default client '{DEFAULT_CLIENT_ID}' missing, added default structure.")
-
-            # --- Ensure nested keys and default settings exist for all clients ---
-            for client_id, client_data in config_data.get("clients", {}).items():
-                if "settings" not in client_data:
-                     client_data["settings"] = DEFAULT_CLIENT_SETTINGS.copy()
-                     client_data["settings"]["name"] = f"Client {client_id}" # Default name
-                     current_app.logger.warning(f"Client '{client_id}' missing 'settings', added defaults.")
-                else:
-                    # Ensure all default setting keys are present
-                    for key, default_value in DEFAULT_CLIENT_SETTINGS.items():
-                        if key not in client_data["settings"]:
-                            client_data["settings"][key] = default_value
-                            current_app.logger.debug(f"Client '{client_id}': Added missing setting '{key}'.")
-                    # Ensure 'client_type' exists, default to 'local' if missing
-                    if "client_type" not in client_data["settings"]:
-                        client_data["settings"]["client_type"] = "local"
-                    # Ensure api_enabled exists
-                    if "api_enabled" not in client_data["settings"]:
-                        client_data["settings"]["api_enabled"] = False # Default to disabled
-
-                if "endpoints" not in client_data:
-                    client_data["endpoints"] = []
-                    current_app.logger.warning(f"Client '{client_id}' missing 'endpoints', added empty list.")
-
-            current_app.logger.info("Config file loaded successfully.")
-            return config_data
-
-        except json.JSONDecodeError as e:
-            current_app.logger.error(f"Invalid JSON in config file {resolved_path}: {e}")
-            raise ValueError(f"Invalid JSON in config file: {e}") from e
-        except Exception as e:
-            current_app.logger.error(f"Unexpected error loading config from {resolved_path}: {e}", exc_info=True)
-            raise IOError(f"Failed to load config file: {e}") from e
+            }
+            config_data = new_config
+            current_app.logger.info("Old config format migrated.")
+        # --- End old format handling ---
+
+        # Edits made since the last compaction
+        _replay_journal(config_data, resolved_path)
+
+        # --- Ensure basic structure and default client exist for new format ---
+        if "global_settings" not in config_data:
+             config_data["global_settings"] = DEFAULT_GLOBAL_SETTINGS.copy()
+             current_app.logger.warning("Config loaded: 'global_settings' key missing, added defaults.")
+        if "clients" not in config_data:
+             config_data["clients"] = {
+                DEFAULT_CLIENT_ID: { "settings": DEFAULT_CLIENT_SETTINGS.copy(), "endpoints": [] }
+             }
+             current_app.logger.warning("Config loaded: 'clients' key missing, added default client structure.")
+        elif DEFAULT_CLIENT_ID not in config_data["clients"]:
+             config_data["clients"][DEFAULT_CLIENT_ID] = {
+                 "settings": DEFAULT_CLIENT_SETTINGS.copy(),
+                 "endpoints": []
+             }
+             current_app.logger.warning(f"Config loaded: Default client '{DEFAULT_CLIENT_ID}' missing, added default structure.")
+
+        # --- Ensure nested keys and default settings exist for all clients ---
+        for client_id, client_data in config_data.get("clients", {}).items():
+            if "settings" not in client_data:
+                 client_data["settings"] = DEFAULT_CLIENT_SETTINGS.copy()
+                 client_data["settings"]["name"] = f"Client {client_id}" # Default name
+                 current_app.logger.warning(f"Client '{client_id}' missing 'settings', added defaults.")
+            else:
+                # Ensure all default setting keys are present
+                for key, default_value in DEFAULT_CLIENT_SETTINGS.items():
+                    if key not in client_data["settings"]:
+                        client_data["settings"][key] = default_value
+                        current_app.logger.debug(f"Client '{client_id}': Added missing setting '{key}'.")
+                # Ensure 'client_type' exists, default to 'local' if missing
+                if "client_type" not in client_data["settings"]:
+                    client_data["settings"]["client_type"] = "local"
+                # Ensure api_enabled exists
+                if "api_enabled" not in client_data["settings"]:
+                    client_data["settings"]["api_enabled"] = False # Default to disabled
+
+            if "endpoints" not in client_data:
+                client_data["endpoints"] = []
+                current_app.logger.warning(f"Client '{client_id}' missing 'endpoints', added empty list.")
+
+        current_app.logger.info("Config file loaded successfully.")
+        return config_data
+
+    except json.JSONDecodeError as e:
+        current_app.logger.error(f"Invalid JSON in config file {resolved_path}: {e}")
+        raise ValueError(f"Invalid JSON in config file: {e}") from e
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error loading config from {resolved_path}: {e}", exc_info=True)
+        raise IOError(f"Failed to load config file: {e}") from e
+
+def clean_endpoint(ep):
+    """
+    Applies the config rules to one raw endpoint: name and url required, group defaults to
+    'Default Group', interval clamped to >= 5s, timeout to >= 1s and probe_max_bytes to >= 1,
+    probe_mode one of PROBE_MODES (unparseable values drop the override). Invalid assertions,
+    or body assertions with probe_mode head/headers, reject the endpoint rather than be dropped,
+    as do tcp/tls/dns/udp URLs that protocol_probes can't use.
+    Returns (cleaned endpoint without 'id', None) or (None, error message).
+    """
+    name = ep.get('name')
+    url = ep.get('url')
+    if not name or not url: return None, "missing name/url"
+
+    group = ep.get('group', 'Default Group') or 'Default Group'
+    interval_str = ep.get('check_interval_seconds')
+    timeout_str = ep.get('check_timeout_seconds')
+    probe_mode = str(ep.get('probe_mode') or '').strip().lower() or None
+    max_bytes_str = ep.get('probe_max_bytes')
+    interval = None; timeout = None; max_bytes = None
+
+    if interval_str is not None:
+        try: interval = max(5, int(interval_str))
+        except (ValueError, TypeError): interval = None
+    if timeout_str is not None:
+        try: timeout = max(1, int(timeout_str))
+        except (ValueError, TypeError): timeout = None
+    if probe_mode not in PROBE_MODES: probe_mode = None
+    if max_bytes_str is not None:
+        try: max_bytes = max(1, int(max_bytes_str))
+        except (ValueError, TypeError): max_bytes = None
+    try: assertions = normalize_assertions(ep.get('assertions'))
+    except ValueError as e: return None, f"invalid assertions: {e}"
+    if probe_mode in ('head', 'headers') and needs_body(assertions):
+        return None, "body assertions need probe_mode get or partial"
+
+    cleaned_ep = {'name': name, 'url': url, 'group': group}
+    if interval is not None: cleaned_ep['check_interval_seconds'] = interval
+    if timeout is not None: cleaned_ep['check_timeout_seconds'] = timeout
+    if probe_mode is not None: cleaned_ep['probe_mode'] = probe_mode
+    if max_bytes is not None: cleaned_ep['probe_max_bytes'] = max_bytes
+    if assertions: cleaned_ep['assertions'] = assertions
+    error = protocol_endpoint_error(cleaned_ep)
+    if error: return None, error
+    return cleaned_ep, None
 
 def process_config_data(config_data):
     """Processes loaded config data, validates, sets defaults. Returns tuple: (global_settings, clients_data)."""
@@ -122,6 +311,21 @@ def process_config_data(config_data):
         loaded_global_settings = config_data.get("global_settings", {})
         global_settings['check_interval_seconds'] = max(5, loaded_global_settings.get("check_interval_seconds", DEFAULT_GLOBAL_SETTINGS['check_interval_seconds']))
         global_settings['check_timeout_seconds'] = max(1, loaded_global_settings.get("check_timeout_seconds", DEFAULT_GLOBAL_SETTINGS['check_timeout_seconds']))
+        for key in ('max_concurrent_checks', 'max_checks_per_host'):
+            try: global_settings[key] = max(1, int(loaded_global_settings.get(key, DEFAULT_GLOBAL_SETTINGS[key])))
+            except (ValueError, TypeError): global_settings[key] = DEFAULT_GLOBAL_SETTINGS[key]
+        probe_backend = loaded_global_settings.get('probe_backend', DEFAULT_GLOBAL_SETTINGS['probe_backend'])
+        if probe_backend not in ('requests', 'aiohttp', 'process'):
+            current_app.logger.warning(f"Unknown probe_backend '{probe_backend}' in config, using '{DEFAULT_GLOBAL_SETTINGS['probe_backend']}'.")
+            probe_backend = DEFAULT_GLOBAL_SETTINGS['probe_backend']
+        global_settings['probe_backend'] = probe_backend
+        try: global_settings['probe_processes'] = max(0, int(loaded_global_settings.get('probe_processes', DEFAULT_GLOBAL_SETTINGS['probe_processes'])))
+        except (ValueError, TypeError): global_settings['probe_processes'] = DEFAULT_GLOBAL_SETTINGS['probe_processes']
+        try: global_settings['schedule_jitter_ratio'] = min(0.5, max(0.0, float(loaded_global_settings.get('schedule_jitter_ratio', DEFAULT_GLOBAL_SETTINGS['schedule_jitter_ratio']))))
+        except (ValueError, TypeError): global_settings['schedule_jitter_ratio'] = DEFAULT_GLOBAL_SETTINGS['schedule_jitter_ratio']
+        for key in ('history_retention_days', 'rollup_retention_days'): # 0 keeps data forever
+            try: global_settings[key] = max(0, int(loaded_global_settings.get(key, DEFAULT_GLOBAL_SETTINGS[key])))
+            except (ValueError, TypeError): global_settings[key] = DEFAULT_GLOBAL_SETTINGS[key]
 
         # Process Clients
         loaded_clients_data = config_data.get("clients", {})
@@ -151,36 +355,18 @@ def process_config_data(config_data):
                 seen_ids = set() # Track IDs within this client
                 for i, ep in enumerate(raw_endpoints):
                     ep_id = ep.get('id')
-                    name = ep.get('name')
-                    url = ep.get('url')
-
-                    if not name or not url:
-                        current_app.logger.warning(f"Client '{client_id}': Skipping endpoint index {i} missing name/url.")
+                    cleaned_ep, error = clean_endpoint(ep)
+                    if error:
+                        current_app.logger.warning(f"Client '{client_id}': Skipping endpoint index {i}: {error}.")
                         continue
 
                     if not ep_id or ep_id in seen_ids:
                         new_ep_id = f"ep_{uuid.uuid4().hex[:8]}"
-                        current_app.logger.warning(f"Client '{client_id}': Endpoint '{name}' missing ID or ID '{ep_id}' duplicate. Generated new ID: {new_ep_id}")
+                        current_app.logger.warning(f"Client '{client_id}': Endpoint '{cleaned_ep['name']}' missing ID or ID '{ep_id}' duplicate. Generated new ID: {new_ep_id}")
                         ep_id = new_ep_id
                         ep['id'] = ep_id
                     seen_ids.add(ep_id)
-
-                    group = ep.get('group', 'Default Group') or 'Default Group'
-                    interval_str = ep.get('check_interval_seconds')
-                    timeout_str = ep.get('check_timeout_seconds')
-                    interval = None; timeout = None
-
-                    if interval_str is not None:
-                        try: interval = max(5, int(interval_str))
-                        except (ValueError, TypeError): interval = None
-                    if timeout_str is not None:
-                        try: timeout = max(1, int(timeout_str))
-                        except (ValueError, TypeError): timeout = None
-
-                    cleaned_ep = {'id': ep_id, 'name': name, 'url': url, 'group': group}
-                    if interval is not None: cleaned_ep['check_interval_seconds'] = interval
-                    if timeout is not None: cleaned_ep['check_timeout_seconds'] = timeout
-                    processed_endpoints.append(cleaned_ep)
+                    processed_endpoints.append({'id': ep_id, **cleaned_ep})
 
             # Store processed client data
             processed_clients[client_id] = {
@@ -201,49 +387,58 @@ def process_config_data(config_data):
         return DEFAULT_GLOBAL_SETTINGS.copy(), default_clients_data
 
 
-def load_initial_config(config_path, current_state_ref, state_lock_ref):
-    """Loads config on startup, processes it, and updates global state directly."""
+def load_initial_config(config_path, state_store_ref, keep_statuses=False):
+    """
+    Loads config on startup, processes it, and publishes it as the new state.
+    keep_statuses: live reload (checker worker) -- endpoints still configured keep their status,
+    and a config that fails to load leaves the current state in place.
+    """
     current_app.logger.debug("load_initial_config called.")
     try:
         config_data = load_config_from_file(config_path)
         global_settings, clients_data = process_config_data(config_data)
 
-        with state_lock_ref:
-            # Clear existing clients before loading new ones
-            current_state_ref["clients"] = {}
-            current_state_ref["global_settings"] = global_settings
-
-            for client_id, client_info in clients_data.items():
-                 client_info["statuses"] = {} # Initialize empty statuses
-                 # Set initial statuses for local endpoints only
-                 if client_info.get("settings", {}).get("client_type", "local") == "local":
-                     client_info["statuses"] = {
-                         ep.get('id'): {"status": "PENDING", "last_check_ts": 0, "details": None}
-                         for ep in client_info.get("endpoints", []) if ep.get('id')
-                     }
-                 # Else: Linked clients start with empty statuses, populated by fetch
-
-                 current_state_ref["clients"][client_id] = client_info # Load processed data
-
+        for client_id, client_info in clients_data.items():
+             client_info["statuses"] = {} # Initialize empty statuses
+             # Set initial statuses for local endpoints only
+             if client_info.get("settings", {}).get("client_type", "local") == "local":
+                 client_info["statuses"] = {
+                     ep.get('id'): {"status": "PENDING", "last_check_ts": 0, "details": None}
+                     for ep in client_info.get("endpoints", []) if ep.get('id')
+                 }
+             # Else: Linked clients start with empty statuses, populated by fetch
+
+        with state_store_ref.write() as draft:
+            if keep_statuses:
+                for client_id, client_info in clients_data.items():
+                    previous = draft.clients.get(client_id, {}).get("statuses", {})
+                    if client_info.get("settings", {}).get("client_type", "local") == "local":
+                        client_info["statuses"] = {ep_id: previous.get(ep_id, status) for ep_id, status in client_info["statuses"].items()}
+                    else: client_info["statuses"] = dict(previous)
+            draft.replace_clients(clients_data) # Load processed data
+            draft["global_settings"] = global_settings
             # Set scheduler interval based on global settings
-            current_state_ref["scheduler_interval"] = global_settings.get("check_interval_seconds", DEFAULT_GLOBAL_SETTINGS['check_interval_seconds'])
-            current_state_ref["last_updated"] = 0
-            current_app.logger.debug(f"Initial config loaded into state. Clients: {list(current_state_ref['clients'].keys())}")
+            draft["scheduler_interval"] = global_settings.get("check_interval_seconds", DEFAULT_GLOBAL_SETTINGS['check_interval_seconds'])
+            draft["last_updated"] = 0
+            current_app.logger.debug(f"Initial config loaded into state. Clients: {list(clients_data.keys())}")
 
     except Exception as e:
+        if keep_statuses:
+            current_app.logger.error(f"ERROR reloading config: {e}. Keeping the current configuration.", exc_info=True)
+            return
         current_app.logger.error(f"ERROR during initial config load/process: {e}. Starting empty/defaults.", exc_info=True)
-        with state_lock_ref:
+        with state_store_ref.write() as draft:
             # Reset state to defaults in case of error
-            current_state_ref["global_settings"] = DEFAULT_GLOBAL_SETTINGS.copy()
-            current_state_ref["clients"] = {
+            draft["global_settings"] = DEFAULT_GLOBAL_SETTINGS.copy()
+            draft.replace_clients({
                 DEFAULT_CLIENT_ID: {
                     "settings": DEFAULT_CLIENT_SETTINGS.copy(),
                     "endpoints": [],
                     "statuses": {}
                 }
-            }
-            current_state_ref["scheduler_interval"] = DEFAULT_GLOBAL_SETTINGS['check_interval_seconds']
-            current_state_ref["last_updated"] = 0
+            })
+            draft["scheduler_interval"] = DEFAULT_GLOBAL_SETTINGS['check_interval_seconds']
+            draft["last_updated"] = 0
 
 def save_config_to_file(config_path, global_settings, clients_data):
     """Saves the provided global settings and clients data (incl settings, endpoints) to config.json."""
@@ -256,9 +451,8 @@ def save_config_to_file(config_path, global_settings, clients_data):
         "clients": {}
     }
     for client_id, client_info in clients_data.items():
-        # Create a deep copy and remove 'statuses' before saving
-        client_copy = deepcopy(client_info)
-        client_copy.pop('statuses', None) # Remove statuses
+        # Deep copy everything except the runtime 'statuses' (which can be large)
+        client_copy = {key: deepcopy(value) for key, value in client_info.items() if key != 'statuses'}
         # **Security Warning:** Saving raw API tokens to config.json is insecure.
         # Consider environment variables or a proper secrets management solution for production.
         if client_copy.get("settings", {}).get("api_token"):
@@ -266,9 +460,13 @@ def save_config_to_file(config_path, global_settings, clients_data):
 
         config_to_save["clients"][client_id] = client_copy
 
-    with config_file_lock:
+    with config_file_lock: return _write_config_file(resolved_path, config_to_save)
+
+def _write_config_file(resolved_path, config_to_save):
+    """Atomically replaces config.json (temp file + rename). Caller holds config_file_lock. Returns True on success."""
+    with CONFIG_SAVE_SECONDS.labels('full').time():
+        temp_path = resolved_path + ".tmp"
         try:
-            temp_path = resolved_path + ".tmp"
             with open(temp_path, 'w') as f: json.dump(config_to_save, f, indent=4)
             os.replace(temp_path, resolved_path)
             current_app.logger.info(f"Config successfully saved to {resolved_path}")
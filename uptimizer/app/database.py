@@ -1,11 +1,26 @@
 import os
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import select, desc, and_, func, distinct, delete # Added distinct, delete
+from sqlalchemy import select, desc, and_, or_, func, distinct, delete, case, extract, literal, true, values, column, union_all, String, DateTime
 from flask import current_app # For logging
 
 # Use absolute imports and import the models module itself
 from app import models # Import the module to access flags and functions directly
-from app.models import Session, StatusHistory, session_scope # Keep specific imports
+from app.models import Session, StatusHistory, StatusRollup, session_scope # Keep specific imports
+from app.history_writer import history_writer
+from app.rollups import get_watermarks, plan_window, floor_to
+from app.downsampling import downsample_history
+from app.uptime_accumulator import uptime_accumulator
+from app.state import PROBE_TIMING_FIELDS
+
+# Windows accepted by get_uptime_stats_bulk (result key: uptime_percentage_<window>)
+STATS_WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    '90d': timedelta(days=90),
+}
+# History periods longer than this are served from rollup buckets instead of raw rows
+HISTORY_ROLLUP_THRESHOLDS = [(timedelta(days=45), 'day'), (timedelta(days=3), 'hour')]
 
 # --- Data Persistence ---
 last_saved_status = {} # Stores last saved status *per endpoint_id*
@@ -19,7 +34,7 @@ def _ensure_tables_exist():
     return False
 
 def save_status_change(endpoint_id, check_result):
-    """Saves the status check result to the database using SQLAlchemy if DB is ready."""
+    """Queues the status check result for the batched history writer if DB is ready."""
     # This function should ONLY be called for results from DIRECT checks (local endpoints),
     # not for statuses fetched from linked clients.
     if not _ensure_tables_exist(): return
@@ -42,103 +57,235 @@ def save_status_change(endpoint_id, check_result):
 
     if not should_save: return
 
-    try:
-        with session_scope() as session:
-            if session is None: return
-            new_history = StatusHistory(
-                endpoint_id=endpoint_id, # Storing globally unique endpoint ID
-                status=current_status,
-                status_code=current_status_code,
-                response_time_ms=current_response_time,
-                details=current_details
-            )
-            session.add(new_history)
-            # Update last *saved* status cache only on successful commit
-            last_saved_status[endpoint_id] = {'status': current_status, 'details': current_details}
-            current_app.logger.debug(f"Saved status change for {endpoint_id}: {current_status}")
-
-    except Exception as e:
-        current_app.logger.error(f"SQLAlchemy Error saving status for {endpoint_id}: {e}", exc_info=True)
+    # Timestamp is taken now, not at flush time, so history reflects when the check ran
+    queued = history_writer.enqueue({
+        "timestamp": datetime.now(timezone.utc),
+        "endpoint_id": endpoint_id, # Storing globally unique endpoint ID
+        "status": current_status,
+        "status_code": current_status_code,
+        "response_time_ms": current_response_time,
+        "details": current_details,
+        **{field: check_result.get(field) for field in PROBE_TIMING_FIELDS} # Phase breakdown (None if not measured)
+    })
+    if queued:
+        # Update last *saved* status cache once the row is accepted by the writer (undone by _forget_dropped_rows if it is never written)
+        last_saved_status[endpoint_id] = {'status': current_status, 'details': current_details}
+        current_app.logger.debug(f"Queued status change for {endpoint_id}: {current_status}")
+
+def _forget_dropped_rows(rows):
+    """History writer drop hook: a row that was never written must not suppress the next identical result."""
+    for row in rows:
+        cached = last_saved_status.get(row["endpoint_id"])
+        if cached is not None and cached == {'status': row["status"], 'details': row["details"]}:
+            last_saved_status.pop(row["endpoint_id"], None)
+
+history_writer.add_drop_hook(_forget_dropped_rows)
 
 # --- Statistics & History Retrieval ---
 def get_stats_last_24h(endpoint_id):
     """Calculates uptime percentage for the last 24 hours using SQLAlchemy, if DB is ready."""
-    if not _ensure_tables_exist(): return {"error": "DB N/A", "uptime_percentage_24h": None}
-    if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: return {"error": "DB N/A", "uptime_percentage_24h": None}
-
-    results = {"uptime_percentage_24h": None, "error": None}
+    return get_stats_last_24h_bulk([endpoint_id]).get(endpoint_id, {"error": "DB N/A", "uptime_percentage_24h": None})
+
+
+def _status_events(endpoint_ids, start_time, end_time):
+    """
+    Subquery of (endpoint_id, ts, status) events for many endpoints in [start_time, end_time]:
+    each endpoint's status before the window (latest row < start_time, fetched with an index
+    seek per ID via LATERAL) is carried to start_time, followed by the rows inside the window.
+    """
+    window_start = literal(start_time, DateTime(timezone=True))
+    ids = values(column('endpoint_id', String), name='ids').data([(eid,) for eid in endpoint_ids])
+
+    prev = (select(StatusHistory.status)
+            .where(and_(StatusHistory.endpoint_id == ids.c.endpoint_id, StatusHistory.timestamp < start_time))
+            .order_by(StatusHistory.timestamp.desc())
+            .limit(1)
+            .lateral('prev'))
+    prev_events = select(ids.c.endpoint_id.label('endpoint_id'), window_start.label('ts'), prev.c.status.label('status')) \
+        .select_from(ids.join(prev, true()))
+    window_events = (select(StatusHistory.endpoint_id.label('endpoint_id'), StatusHistory.timestamp.label('ts'), StatusHistory.status.label('status'))
+                     .where(and_(StatusHistory.endpoint_id.in_(endpoint_ids), StatusHistory.timestamp >= start_time, StatusHistory.timestamp <= end_time)))
+    return union_all(prev_events, window_events).subquery('events')
+
+def _bulk_up_seconds(session, endpoint_ids, start_time, end_time):
+    """
+    Returns {endpoint_id: seconds spent UP within [start_time, end_time]} for many endpoints
+    in one query. LEAD() turns the ordered events into segments that end at the next event
+    or at end_time.
+    """
+    window_end = literal(end_time, DateTime(timezone=True))
+    events = _status_events(endpoint_ids, start_time, end_time)
+    segments = select(
+        events.c.endpoint_id, events.c.status, events.c.ts,
+        func.lead(events.c.ts, 1, window_end).over(partition_by=events.c.endpoint_id, order_by=events.c.ts).label('next_ts')
+    ).subquery('segments')
+    query = (select(segments.c.endpoint_id,
+                    func.sum(case((segments.c.status == 'UP', extract('epoch', segments.c.next_ts - segments.c.ts)), else_=0)).label('up_seconds'))
+             .group_by(segments.c.endpoint_id))
+
+    return {row.endpoint_id: float(row.up_seconds or 0) for row in session.execute(query)}
+
+def get_status_events_bulk(endpoint_ids, start_time, end_time):
+    """
+    Loads status events for many endpoints (used to warm the in-memory uptime accumulator).
+    Returns {endpoint_id: [(epoch_ts, status), ...]} in time order, or None if the DB is unavailable.
+    """
+    endpoint_ids = [eid for eid in dict.fromkeys(endpoint_ids) if eid]
+    if not _ensure_tables_exist(): return None
+    if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: return None
+    if not endpoint_ids: return {}
     try:
         with session_scope() as session:
-            if session is None:
-                 results["error"] = "DB Session N/A"; return results
-
-            end_time = datetime.now(timezone.utc); start_time = end_time - timedelta(hours=24)
-
-            # Fetch events including the first event *before* the window starts
-            subquery_prev = (select(StatusHistory.status, StatusHistory.timestamp)
-                            .where(and_(StatusHistory.endpoint_id == endpoint_id, StatusHistory.timestamp < start_time))
-                            .order_by(StatusHistory.timestamp.desc())
-                            .limit(1)).subquery()
-
-            query_within = (select(StatusHistory.timestamp, StatusHistory.status)
-                         .where( and_( StatusHistory.endpoint_id == endpoint_id, StatusHistory.timestamp >= start_time, StatusHistory.timestamp <= end_time ) )
-                         )
-
-            # Combine previous status with statuses in the window
-            query = select(subquery_prev.c.timestamp, subquery_prev.c.status).union_all(
-                    select(query_within.c.timestamp, query_within.c.status)
-                    ).order_by(subquery_prev.c.timestamp.asc()) # Order should reference unioned columns correctly, maybe alias needed if complex
-
-            rows = session.execute(query).fetchall() # Execute the combined query
-
-            total_time_up = timedelta(0)
-            current_time = start_time # Start tracking from beginning of window
-            current_status = 'UNKNOWN' # Default initial status
+            if session is None: return None
+            events = _status_events(endpoint_ids, start_time, end_time)
+            rows = session.execute(select(events.c.endpoint_id, events.c.ts, events.c.status)
+                                   .order_by(events.c.endpoint_id, events.c.ts)).fetchall()
+    except Exception as e:
+        current_app.logger.error(f"SQLAlchemy Error loading status events for {len(endpoint_ids)} endpoints: {e}", exc_info=True)
+        return None
+    results = {}
+    for row in rows:
+        results.setdefault(row.endpoint_id, []).append((row.ts.timestamp(), row.status))
+    return results
 
-            # Find the effective status at the start of the window
-            if rows and rows[0].timestamp < start_time:
-                current_status = rows[0].status
-                # Start processing from the first event *within* or *at* the window start
-                process_rows = rows[1:] # Skip the one before the window start
-            else:
-                 process_rows = rows # Process all rows if none are before start_time
-
-            for record in process_rows:
-                record_time = record.timestamp
-                record_status = record.status
-                duration = record_time - current_time # Time since last event or window start
-
-                if current_status == 'UP' and duration.total_seconds() > 0:
-                     total_time_up += duration
-
-                current_time = record_time # Update time to current event
-                current_status = record_status # Update status
-
-            # Account for time from the last event until the end of the window
-            if current_status == 'UP':
-                 duration_after_last = end_time - current_time
-                 if duration_after_last.total_seconds() > 0:
-                     total_time_up += duration_after_last
-
-            total_duration = end_time - start_time
-            if total_duration.total_seconds() > 0:
-                uptime_percentage = (total_time_up.total_seconds() / total_duration.total_seconds()) * 100
-                results["uptime_percentage_24h"] = round(uptime_percentage, 2)
-            elif not rows:
-                 results["error"] = "No data available" # No data at all
+def get_latest_statuses_bulk(endpoint_ids, since=None):
+    """
+    Latest status_history row per endpoint: {endpoint_id: {"status", "status_code", "response_time_ms",
+    "details", phase timings, "last_check_ts"}}. With since, only endpoints with rows after it are returned (one
+    time-range scan, for incremental polling); without, one index seek per endpoint via LATERAL.
+    Returns None if the DB is unavailable.
+    """
+    endpoint_ids = [eid for eid in dict.fromkeys(endpoint_ids) if eid]
+    if not _ensure_tables_exist(): return None
+    if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: return None
+    if not endpoint_ids: return {}
+    columns = (StatusHistory.endpoint_id, StatusHistory.timestamp, StatusHistory.status,
+               StatusHistory.status_code, StatusHistory.response_time_ms, StatusHistory.details,
+               *(getattr(StatusHistory, field) for field in PROBE_TIMING_FIELDS))
+    try:
+        with session_scope() as session:
+            if session is None: return None
+            if since is not None:
+                query = (select(*columns)
+                         .where(and_(StatusHistory.endpoint_id.in_(endpoint_ids), StatusHistory.timestamp > since))
+                         .order_by(StatusHistory.endpoint_id, StatusHistory.timestamp.desc())
+                         .distinct(StatusHistory.endpoint_id))
             else:
-                 # Handle edge case: only data point(s) before the window
-                 results["uptime_percentage_24h"] = 100.00 if current_status == 'UP' else 0.00
-
-
+                ids = values(column('endpoint_id', String), name='ids').data([(eid,) for eid in endpoint_ids])
+                latest = (select(*columns)
+                          .where(StatusHistory.endpoint_id == ids.c.endpoint_id)
+                          .order_by(StatusHistory.timestamp.desc())
+                          .limit(1)
+                          .lateral('latest'))
+                query = select(latest).select_from(ids.join(latest, true()))
+            rows = session.execute(query).fetchall()
+    except Exception as e:
+        current_app.logger.error(f"SQLAlchemy Error loading latest statuses for {len(endpoint_ids)} endpoints: {e}", exc_info=True)
+        return None
+    return {row.endpoint_id: {"status": row.status, "status_code": row.status_code, "response_time_ms": row.response_time_ms,
+                              "details": row.details, **{field: getattr(row, field) for field in PROBE_TIMING_FIELDS},
+                              "last_check_ts": row.timestamp.timestamp()} for row in rows}
+
+def _window_up_seconds(session, endpoint_ids, start_time, end_time, watermarks):
+    """
+    Seconds spent UP in [start_time, end_time) per endpoint, reading whole rollup buckets
+    where they cover the window and raw status_history only for the uncovered edges.
+    """
+    totals = {eid: 0.0 for eid in endpoint_ids}
+    pieces = plan_window(start_time, end_time, watermarks)
+    bucket_pieces = [p for p in pieces if p[0] != 'raw']
+    if bucket_pieces:
+        in_pieces = or_(*[
+            and_(StatusRollup.granularity == granularity, StatusRollup.bucket_start >= piece_start, StatusRollup.bucket_start < piece_end)
+            for granularity, piece_start, piece_end in bucket_pieces
+        ])
+        query = (select(StatusRollup.endpoint_id, func.sum(StatusRollup.up_seconds).label('up_seconds'))
+                 .where(and_(StatusRollup.endpoint_id.in_(endpoint_ids), in_pieces))
+                 .group_by(StatusRollup.endpoint_id))
+        for row in session.execute(query):
+            totals[row.endpoint_id] += float(row.up_seconds or 0)
+    for source, piece_start, piece_end in pieces:
+        if source != 'raw': continue
+        for eid, seconds in _bulk_up_seconds(session, endpoint_ids, piece_start, piece_end).items():
+            totals[eid] += seconds
+    return totals
+
+def get_uptime_stats_bulk(endpoint_ids, windows=('24h',)):
+    """
+    Calculates uptime for many endpoints over one or more STATS_WINDOWS.
+    Returns {endpoint_id: {"uptime_percentage_<window>": float, ..., "error": None}}.
+    """
+    endpoint_ids = [eid for eid in dict.fromkeys(endpoint_ids) if eid]
+    windows = [w for w in windows if w in STATS_WINDOWS] or ['24h']
+    if not endpoint_ids: return {}
+    def all_failed(error): return {eid: {"error": error, **{f"uptime_percentage_{w}": None for w in windows}} for eid in endpoint_ids}
+    if not _ensure_tables_exist(): return all_failed("DB N/A")
+    if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: return all_failed("DB N/A")
+
+    results = {eid: {"error": None} for eid in endpoint_ids}
+    try:
+        with session_scope() as session:
+            if session is None: return all_failed("DB Session N/A")
+            end_time = datetime.now(timezone.utc)
+            watermarks = get_watermarks(session)
+            for window in windows:
+                start_time = end_time - STATS_WINDOWS[window]
+                up_seconds = _window_up_seconds(session, endpoint_ids, start_time, end_time, watermarks)
+                total_seconds = (end_time - start_time).total_seconds()
+                # Endpoints without any history count as 0% (no time known to be UP)
+                for eid in endpoint_ids:
+                    results[eid][f"uptime_percentage_{window}"] = round(min(100.0, up_seconds[eid] / total_seconds * 100), 2)
     except Exception as e:
-        current_app.logger.error(f"SQLAlchemy Error calculating stats for {endpoint_id}: {e}", exc_info=True)
-        results["error"] = "Calculation error"
+        current_app.logger.error(f"SQLAlchemy Error calculating bulk stats for {len(endpoint_ids)} endpoints: {e}", exc_info=True)
+        return all_failed("Calculation error")
     return results
 
-
-def get_history_for_period(endpoint_id, start_time, end_time):
-    """Fetches history records using SQLAlchemy, if DB is ready. No arbitrary limit."""
+def get_stats_last_24h_bulk(endpoint_ids):
+    """Calculates 24h uptime for many endpoints at once. Returns {endpoint_id: <get_stats_last_24h result>}."""
+    return get_uptime_stats_bulk(endpoint_ids, windows=('24h',))
+
+
+def _history_granularity(span):
+    for threshold, granularity in HISTORY_ROLLUP_THRESHOLDS:
+        if span > threshold: return granularity
+    return None
+
+def _rollup_point(row, granularity):
+    """Turns a status_rollups row into a chart point shaped like a raw history point."""
+    up_ratio = row.up_seconds / row.covered_seconds if row.covered_seconds else 0.0
+    if not row.covered_seconds: status = 'UNKNOWN'
+    elif up_ratio >= 0.999: status = 'UP'
+    elif up_ratio <= 0.0: status = 'DOWN'
+    else: status = 'DEGRADED'
+    return {
+        "timestamp": row.bucket_start.isoformat(),
+        "status": status,
+        "response_time_ms": round(row.rt_sum / row.rt_count) if row.rt_count else None,
+        "response_time_min_ms": row.rt_min,
+        "response_time_max_ms": row.rt_max,
+        "response_time_p95_ms": row.rt_p95,
+        "uptime_percentage": round(up_ratio * 100, 2) if row.covered_seconds else None,
+        "check_count": row.check_count,
+        "granularity": granularity,
+    }
+
+def _raw_history_points(session, endpoint_id, start_time, end_time):
+    query = ( select( StatusHistory.timestamp, StatusHistory.status, StatusHistory.response_time_ms,
+                      *(getattr(StatusHistory, field) for field in PROBE_TIMING_FIELDS) )
+             .where( and_( StatusHistory.endpoint_id == endpoint_id, StatusHistory.timestamp >= start_time, StatusHistory.timestamp <= end_time ) )
+             .order_by(StatusHistory.timestamp.asc()) ) # Order chronologically for charting
+    return [
+        {"timestamp": row.timestamp.isoformat(), "status": row.status, "response_time_ms": row.response_time_ms,
+         **{field: getattr(row, field) for field in PROBE_TIMING_FIELDS}}
+        for row in session.execute(query)
+    ]
+
+
+def get_history_for_period(endpoint_id, start_time, end_time, max_points=None):
+    """
+    Fetches history records using SQLAlchemy, if DB is ready. With max_points, the series is
+    downsampled before serialization (status transitions are always kept).
+    """
     if not _ensure_tables_exist(): return {"error": "DB N/A", "data": []}
     if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: return {"error": "DB N/A", "data": []}
 
@@ -148,18 +295,27 @@ def get_history_for_period(endpoint_id, start_time, end_time):
              if session is None:
                  results["error"] = "DB Session N/A"; return results
 
-             # Fetch status, timestamp, and response time within the period
-             # REMOVED any implicit/explicit LIMIT clause
-             query = ( select( StatusHistory.timestamp, StatusHistory.status, StatusHistory.response_time_ms )
-                      .where( and_( StatusHistory.endpoint_id == endpoint_id, StatusHistory.timestamp >= start_time, StatusHistory.timestamp <= end_time ) )
-                      .order_by(StatusHistory.timestamp.asc()) ) # Order chronologically for charting
-
-             rows = session.execute(query).fetchall()
-             results["data"] = [
-                 {"timestamp": row.timestamp.isoformat(), "status": row.status, "response_time_ms": row.response_time_ms}
-                 for row in rows
-            ]
-             current_app.logger.debug(f"Fetched {len(rows)} history records for {endpoint_id} between {start_time} and {end_time}")
+             # Long periods read rollup buckets (coarsest suitable granularity) for the span
+             # they cover and raw rows for the rest; short periods read raw rows only.
+             granularity = _history_granularity(end_time - start_time)
+             covered = get_watermarks(session).get(granularity) if granularity else None
+             if covered:
+                 bucket_from = max(floor_to(start_time, granularity), covered[0])
+                 bucket_until = min(end_time, covered[1])
+                 if bucket_from >= bucket_until: covered = None # Rollups don't reach into this period (yet)
+             if covered:
+                 data = _raw_history_points(session, endpoint_id, start_time, bucket_from) if start_time < bucket_from else []
+                 query = (select(StatusRollup)
+                          .where(and_(StatusRollup.endpoint_id == endpoint_id, StatusRollup.granularity == granularity,
+                                      StatusRollup.bucket_start >= bucket_from, StatusRollup.bucket_start < bucket_until))
+                          .order_by(StatusRollup.bucket_start.asc()))
+                 data += [_rollup_point(row, granularity) for row in session.execute(query).scalars()]
+                 if bucket_until < end_time: data += _raw_history_points(session, endpoint_id, bucket_until, end_time)
+             else:
+                 data = _raw_history_points(session, endpoint_id, start_time, end_time)
+             results["total_points"] = len(data)
+             results["data"] = downsample_history(data, max_points)
+             current_app.logger.debug(f"Fetched {len(data)} history points for {endpoint_id} between {start_time} and {end_time} (granularity: {granularity if covered else 'raw'}), returning {len(results['data'])}")
 
     except Exception as e:
         current_app.logger.error(f"SQLAlchemy Error fetching history for {endpoint_id}: {e}", exc_info=True)
@@ -193,6 +349,8 @@ def purge_endpoint_history(endpoint_id):
             stmt = delete(StatusHistory).where(StatusHistory.endpoint_id == endpoint_id)
             result = session.execute(stmt)
             deleted_count = result.rowcount
+            session.execute(delete(StatusRollup).where(StatusRollup.endpoint_id == endpoint_id))
+            uptime_accumulator.forget(endpoint_id)
             current_app.logger.info(f"Purged {deleted_count} history records for endpoint '{endpoint_id}'.")
             return deleted_count > 0 # Return True if any rows were deleted
     except Exception as e:
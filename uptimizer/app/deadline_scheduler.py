@@ -0,0 +1,254 @@
+import time
+import heapq
+import random
+import itertools
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from app.state import DEFAULT_CHECK_INTERVAL, DEFAULT_SCHEDULE_JITTER_RATIO
+from app.metrics import SCHEDULE_LAG_SECONDS
+
+logger = logging.getLogger(__name__) # Runs in its own thread
+
+MIN_CHECK_INTERVAL = 5        # Same floor as config_manager / the endpoint API
+COALESCE_WINDOW_SECONDS = 0.25 # Items due this close together are dispatched as one batch
+MAX_IDLE_WAIT_SECONDS = 5.0    # Upper bound on a single sleep (keeps shutdown/sync responsive)
+MAX_PARALLEL_BATCHES = 4       # Batches dispatched concurrently; probes themselves are bounded by the engine
+
+
+def _interval(value, fallback):
+    try: return max(MIN_CHECK_INTERVAL, int(value)) if value is not None else fallback
+    except (ValueError, TypeError): return fallback
+
+
+class DeadlineScheduler:
+    """
+    Fires every local endpoint at its own check interval, and every linked client
+    at the global interval, from a min-heap of next-due times.
+
+    The heap uses lazy invalidation: each key's current deadline lives in
+    self._entries, and popped heap items that no longer match it are dropped.
+    The schedule is only rebuilt from state when request_sync() is called after
+    a config change, so a tick costs O(due items * log N), not O(N).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []          # (due_ts, seq, key)
+        self._entries = {}       # key -> {"due", "base", "interval", "item"}; due = base + jitter
+        self._in_flight = set()
+        self._seq = itertools.count()
+        self._sync_requested = True
+        self._global_settings = {}
+        self._stopping = False
+        self._thread = None
+        self._dispatcher = None
+        self._dispatch_fn = None
+        self._state_store = None
+        self._app = None
+        self._owns = None
+
+    # --- Lifecycle ---
+
+    def start(self, dispatch_fn, state_store_ref, app=None, owns_fn=None):
+        """
+        Starts the scheduler thread. dispatch_fn(items, global_settings) runs one due batch.
+        owns_fn(endpoint_id), if given, limits local endpoints to this replica's shard (call
+        request_sync() when its answers change).
+        """
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive(): return
+            self._dispatch_fn = dispatch_fn
+            self._state_store, self._app, self._owns = state_store_ref, app, owns_fn
+            self._stopping = False
+            self._sync_requested = True
+            self._dispatcher = ThreadPoolExecutor(max_workers=MAX_PARALLEL_BATCHES, thread_name_prefix="uptimizer-batch")
+            self._thread = threading.Thread(target=self._run, name="uptimizer-deadline-scheduler", daemon=True)
+            self._thread.start()
+        logger.info("Deadline scheduler started.")
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread, dispatcher = self._thread, self._dispatcher
+            self._thread = self._dispatcher = None
+        if thread is not None: thread.join(timeout=10)
+        if dispatcher is not None: dispatcher.shutdown(wait=wait, cancel_futures=True)
+        logger.info("Deadline scheduler stopped.")
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        """Scheduled and in-flight item counts (read by the /metrics collector)."""
+        with self._cond: return {"scheduled": len(self._entries), "in_flight": len(self._in_flight)}
+
+    def request_sync(self):
+        """Marks the schedule stale; the scheduler thread re-reads endpoints from state on its next wake."""
+        with self._cond:
+            self._sync_requested = True
+            self._cond.notify_all()
+
+    # --- Schedule Maintenance ---
+
+    def _desired_items(self):
+        """Reads the schedulable items from state (only on sync, not every tick)."""
+        desired = {}
+        state = self._state_store.snapshot()
+        global_settings = state.get("global_settings", {})
+        global_interval = _interval(global_settings.get("check_interval_seconds"), DEFAULT_CHECK_INTERVAL)
+        for client_id, client_data in state.get("clients", {}).items():
+            settings = client_data.get("settings", {})
+            statuses = client_data.get("statuses", {})
+            client_type = settings.get("client_type", "local")
+            if client_type == "local":
+                for ep in client_data.get("endpoints", []):
+                    ep_id = ep.get('id')
+                    if not ep_id: continue
+                    if self._owns is not None and not self._owns(ep_id): continue # Another replica's shard
+                    desired[("endpoint", client_id, ep_id)] = {
+                        "interval": _interval(ep.get('check_interval_seconds'), global_interval),
+                        "last_check_ts": statuses.get(ep_id, {}).get("last_check_ts", 0),
+                        "item": {"kind": "endpoint", **ep, "client_id": client_id},
+                    }
+            elif client_type == "linked":
+                last_fetch_ts = max((s.get("last_check_ts", 0) for s in statuses.values()), default=0)
+                desired[("linked", client_id)] = {
+                    "interval": global_interval,
+                    "last_check_ts": last_fetch_ts,
+                    "item": {"kind": "linked", "id": client_id, "type": "linked",
+                             "endpoints": list(client_data.get("endpoints", [])),
+                             "remote_url": settings.get("remote_url"), "api_token": settings.get("api_token")},
+                }
+        return desired, global_settings
+
+    def _jitter(self, interval):
+        try: ratio = max(0.0, float(self._global_settings.get('schedule_jitter_ratio', DEFAULT_SCHEDULE_JITTER_RATIO)))
+        except (ValueError, TypeError): ratio = DEFAULT_SCHEDULE_JITTER_RATIO
+        return random.uniform(-ratio, ratio) * interval
+
+    def _push(self, key, base, jitter=0.0):
+        """Schedules key at base + jitter. Later runs follow base, so jitter never accumulates."""
+        entry = self._entries[key]
+        entry["base"], entry["due"] = base, base + jitter
+        heapq.heappush(self._heap, (entry["due"], next(self._seq), key))
+
+    def _sync(self):
+        """Diffs state against the schedule: adds, reschedules and drops entries."""
+        desired, global_settings = self._desired_items() # Lock-free state snapshot; never called holding self._cond
+        now = time.time()
+        with self._cond:
+            self._global_settings = global_settings
+            for key in list(self._entries):
+                if key not in desired: del self._entries[key] # Stale heap items are skipped lazily
+            added = 0
+            for key, spec in desired.items():
+                interval = spec["interval"]
+                entry = self._entries.get(key)
+                if entry is None:
+                    self._entries[key] = {"interval": interval, "item": spec["item"]}
+                    if spec["last_check_ts"]:
+                        due = max(now, spec["last_check_ts"] + interval)
+                    else: # Never checked: run soon, spread over a fraction of the interval
+                        due = now + abs(self._jitter(interval))
+                    self._push(key, due)
+                    added += 1
+                else:
+                    entry["item"] = spec["item"]
+                    if entry["interval"] != interval:
+                        previous_fire = entry["base"] - entry["interval"]
+                        entry["interval"] = interval
+                        self._push(key, max(now, previous_fire + interval))
+                    elif not spec["last_check_ts"] and key not in self._in_flight:
+                        # PENDING again (config reload) or never checked yet: run soon, never later than planned
+                        due = now + abs(self._jitter(interval))
+                        if due < entry["due"]: self._push(key, due)
+            # Drop dead heap items once they dominate, so the heap stays O(live entries)
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._heap = [(due, seq, key) for due, seq, key in self._heap
+                              if key in self._entries and self._entries[key]["due"] == due]
+                heapq.heapify(self._heap)
+        logger.info(f"Deadline scheduler synced: {len(desired)} scheduled items ({added} new).")
+
+    def _pop_due(self, now):
+        """Pops every live item due by now (+ coalesce window) and schedules its next run. Holds self._cond."""
+        batch = []
+        while self._heap and self._heap[0][0] <= now + COALESCE_WINDOW_SECONDS:
+            due, _, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry["due"] != due: continue # Stale heap item
+            interval = entry["interval"]
+            next_base = entry["base"] + interval
+            if next_base <= now: next_base = now + interval # Fell behind; don't fire a burst of catch-up runs
+            self._push(key, next_base, self._jitter(interval))
+            if key in self._in_flight:
+                continue # Previous run still going; skip this slot rather than stacking checks
+            self._in_flight.add(key)
+            SCHEDULE_LAG_SECONDS.observe(max(0.0, now - due))
+            batch.append((key, entry["item"]))
+        return batch
+
+    # --- Thread Bodies ---
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopping: return
+                sync_needed = self._sync_requested
+                self._sync_requested = False
+            if sync_needed:
+                try: self._sync()
+                except Exception as e: logger.error(f"Deadline scheduler sync failed: {e}", exc_info=True)
+
+            with self._cond:
+                if self._stopping: return
+                now = time.time()
+                batch = self._pop_due(now)
+                if not batch:
+                    wait = MAX_IDLE_WAIT_SECONDS
+                    if self._heap: wait = min(wait, max(0.0, self._heap[0][0] - now))
+                    if not self._sync_requested: self._cond.wait(timeout=wait)
+                    continue
+                global_settings = dict(self._global_settings)
+                dispatcher = self._dispatcher
+            try:
+                future = dispatcher.submit(self._run_batch, batch, global_settings)
+            except RuntimeError: # Dispatcher shut down underneath us
+                self._release(batch)
+                return
+            # shutdown(cancel_futures=True) drops queued batches before _run_batch's finally can run
+            future.add_done_callback(lambda future, batch=batch: future.cancelled() and self._release(batch))
+
+    def _release(self, batch):
+        with self._cond:
+            for key, _ in batch: self._in_flight.discard(key)
+
+    def _run_batch(self, batch, global_settings):
+        try:
+            items = [item for _, item in batch]
+            if self._app is not None:
+                with self._app.app_context(): self._dispatch_fn(items, global_settings)
+            else:
+                self._dispatch_fn(items, global_settings)
+        except Exception as e:
+            logger.error(f"Deadline scheduler batch failed: {e}", exc_info=True)
+        finally:
+            self._release(batch)
+
+
+# Shared scheduler instance; API handlers call notify_config_changed() after edits
+check_scheduler = DeadlineScheduler()
+_config_change_hooks = [] # Extra listeners, e.g. telling an external checker worker to reload
+
+def add_config_change_hook(hook):
+    _config_change_hooks.append(hook)
+
+def notify_config_changed():
+    """Tells the deadline scheduler (and any registered hooks) that endpoints/clients/intervals changed."""
+    check_scheduler.request_sync()
+    for hook in _config_change_hooks:
+        try: hook()
+        except Exception as e: logger.error(f"Config change hook failed: {e}", exc_info=True)
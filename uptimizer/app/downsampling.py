@@ -0,0 +1,76 @@
+from datetime import datetime
+
+# Bounds for the /api/history max_points parameter
+DEFAULT_HISTORY_MAX_POINTS = 1000
+MIN_HISTORY_MAX_POINTS = 10
+MAX_HISTORY_MAX_POINTS = 10000
+
+
+def lttb_indices(xs, ys, threshold):
+    """
+    Largest-Triangle-Three-Buckets: picks `threshold` indices of the series (xs, ys)
+    that best preserve its visual shape. First and last points are always kept.
+    """
+    n = len(xs)
+    if threshold >= n: return list(range(n))
+    if threshold < 3: return [0, n - 1]
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end: next_start, next_end = n - 1, n
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area: best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def downsample_history(points, max_points):
+    """
+    Reduces chronological history points ({"timestamp": iso, "status", "response_time_ms", ...})
+    to about max_points. Every status transition (the last point before and the first point
+    after a change) is kept, so UP/DOWN boundaries survive; the remaining budget is spread
+    over the runs between transitions and filled with LTTB on response_time_ms.
+    If transitions alone exceed max_points, only the transitions are returned.
+    """
+    n = len(points)
+    if not max_points or n <= max_points: return points
+
+    keep = {0, n - 1}
+    for i in range(1, n):
+        if points[i].get("status") != points[i - 1].get("status"): keep.update((i - 1, i))
+    anchors = sorted(keep)
+    budget = max_points - len(anchors)
+    if budget <= 0: return [points[i] for i in anchors]
+
+    xs = [datetime.fromisoformat(p["timestamp"]).timestamp() for p in points]
+    ys = [p.get("response_time_ms") or 0 for p in points]
+    interior_total = n - len(anchors)
+    selected = set(anchors)
+    for left, right in zip(anchors, anchors[1:]):
+        interior = right - left - 1
+        if interior <= 0: continue
+        share = int(budget * interior / interior_total)
+        if share <= 0: continue
+        if share >= interior:
+            selected.update(range(left + 1, right))
+            continue
+        # LTTB over the run with its anchors fixed as the first/last points
+        indices = lttb_indices(xs[left:right + 1], ys[left:right + 1], share + 2)
+        selected.update(left + j for j in indices)
+    return [points[i] for i in sorted(selected)]
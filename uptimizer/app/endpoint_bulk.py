@@ -0,0 +1,184 @@
+import io
+import csv
+import re
+import json
+import uuid
+
+from app.config_manager import clean_endpoint
+
+# Columns of the CSV format (and keys of the JSON Lines format); 'action' is import-only.
+# In CSV, 'assertions' holds the assertion list as JSON text.
+EXPORT_FIELDS = ('id', 'name', 'url', 'group', 'check_interval_seconds', 'check_timeout_seconds', 'probe_mode', 'probe_max_bytes', 'assertions')
+IMPORT_FIELDS = ('action',) + EXPORT_FIELDS
+IMPORT_ACTIONS = ('upsert', 'delete')
+IMPORT_MODES = ('merge', 'replace') # replace: endpoints missing from the import are deleted
+MAX_REPORTED_ERRORS = 100
+_ENDPOINT_ID_RE = re.compile(r'^[A-Za-z0-9_.:-]{1,64}$')
+
+JSONL_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines', 'application/json-lines')
+CSV_MIMETYPES = ('text/csv', 'application/csv')
+
+
+class BulkImportError(ValueError):
+    """Import rejected as a whole; errors is a list of {"line": n, "error": "..."}."""
+
+    def __init__(self, errors):
+        self.errors = errors[:MAX_REPORTED_ERRORS]
+        self.total = len(errors)
+        super().__init__(f"{self.total} invalid record(s)")
+
+
+def import_format(mimetype):
+    """'json', 'jsonl' or 'csv' for a request mimetype, else None."""
+    if mimetype in JSONL_MIMETYPES: return 'jsonl'
+    if mimetype in CSV_MIMETYPES: return 'csv'
+    if mimetype == 'application/json': return 'json'
+    return None
+
+# --- Parsing ---
+
+def _strip(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return value if value != '' else None
+    return value
+
+def _normalize(record):
+    return {key: _strip(record.get(key)) for key in IMPORT_FIELDS if _strip(record.get(key)) is not None}
+
+def iter_records(stream, fmt, max_records):
+    """
+    Yields (line, record) from a binary stream without reading it into memory first.
+    line is the 1-based line (CSV: data row counted from the header line, JSON: array index + 1).
+    Raises BulkImportError for malformed input or more than max_records records.
+    """
+    count = 0
+    def counted(line, record):
+        nonlocal count
+        count += 1
+        if count > max_records: raise BulkImportError([{"line": line, "error": f"Too many records (max {max_records})"}])
+        if not isinstance(record, dict): raise BulkImportError([{"line": line, "error": "Record must be an object"}])
+        return line, _normalize(record)
+
+    if fmt == 'json':
+        try: data = json.load(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+        except (ValueError, UnicodeDecodeError) as e: raise BulkImportError([{"line": 0, "error": f"Invalid JSON: {e}"}])
+        if isinstance(data, dict): data = data.get('endpoints')
+        if not isinstance(data, list): raise BulkImportError([{"line": 0, "error": "Expected a list of endpoints or {\"endpoints\": [...]}"}])
+        for index, record in enumerate(data): yield counted(index + 1, record)
+        return
+
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='') # utf-8-sig: tolerate a BOM from spreadsheet exports
+    try:
+        if fmt == 'jsonl':
+            for line_no, line in enumerate(text, start=1):
+                if not line.strip(): continue
+                try: record = json.loads(line)
+                except ValueError as e: raise BulkImportError([{"line": line_no, "error": f"Invalid JSON: {e}"}])
+                yield counted(line_no, record)
+        else:
+            reader = csv.DictReader(text)
+            unknown = [field for field in reader.fieldnames or [] if field and field.strip() not in IMPORT_FIELDS]
+            if not reader.fieldnames or unknown:
+                raise BulkImportError([{"line": 1, "error": f"CSV header must use columns {', '.join(IMPORT_FIELDS)} (unknown: {', '.join(unknown) or 'none'})"}])
+            for row in reader:
+                if not any(_strip(value) for key, value in row.items() if key): continue # Blank row
+                yield counted(reader.line_num, {key.strip(): value for key, value in row.items() if key})
+    except UnicodeDecodeError as e:
+        raise BulkImportError([{"line": 0, "error": f"Input is not UTF-8: {e}"}])
+    except csv.Error as e:
+        raise BulkImportError([{"line": 0, "error": f"Invalid CSV: {e}"}])
+
+# --- Planning ---
+
+def _new_endpoint_id(*taken):
+    ep_id = f"ep_{uuid.uuid4().hex[:10]}"
+    while any(ep_id in ids for ids in taken): ep_id = f"ep_{uuid.uuid4().hex[:10]}"
+    return ep_id
+
+def plan_import(existing_endpoints, records, mode='merge', other_ids=()):
+    """
+    Validates every record and works out the resulting endpoint list, all or nothing.
+    Upserts are cleaned with the same rules as config loading (clean_endpoint); a record
+    whose id exists replaces that endpoint, any other record creates one (with its id, or a
+    generated one). Endpoint ids are global (history, shards, peer sync), so a new endpoint
+    whose id another client uses (other_ids: e.g. a file exported from that client) gets a
+    generated id, listed in summary["renamed"] as {import id: new id}.
+    Deletes need an id; unknown ids are counted, not rejected, so an import
+    can be re-run. Returns (endpoints, summary). Raises BulkImportError listing every invalid record.
+    """
+    if mode not in IMPORT_MODES: raise BulkImportError([{"line": 0, "error": f"Unknown mode '{mode}' (use {' or '.join(IMPORT_MODES)})"}])
+    existing = {ep.get('id'): ep for ep in existing_endpoints}
+    other_ids = set(other_ids) - set(existing)
+    order = list(existing) # Existing endpoints keep their position; new ones are appended
+    result = dict(existing)
+    seen, errors, ids = set(), [], []
+    summary = {"created": 0, "updated": 0, "unchanged": 0, "deleted": 0, "not_found": 0}
+    renamed = {}
+
+    for line, record in records:
+        action = str(record.get('action', 'upsert')).lower()
+        ep_id = record.get('id')
+        if ep_id is not None: ep_id = str(ep_id)
+        if action not in IMPORT_ACTIONS:
+            errors.append({"line": line, "error": f"Unknown action '{action}'"}); continue
+        if ep_id is not None and not _ENDPOINT_ID_RE.match(ep_id):
+            errors.append({"line": line, "error": f"Invalid id '{ep_id}'"}); continue
+        if ep_id is not None and ep_id in seen:
+            errors.append({"line": line, "error": f"Duplicate id '{ep_id}' in import"}); continue
+
+        if action == 'delete':
+            if ep_id is None:
+                errors.append({"line": line, "error": "Delete requires an id"}); continue
+            seen.add(ep_id)
+            if result.pop(ep_id, None) is None: summary["not_found"] += 1
+            else: summary["deleted"] += 1
+            continue
+
+        cleaned, error = clean_endpoint(record)
+        if error:
+            errors.append({"line": line, "error": error}); continue
+        if ep_id is None: ep_id = _new_endpoint_id(existing, seen, other_ids)
+        elif ep_id in other_ids:
+            seen.add(ep_id) # Still counts as a duplicate if the import repeats it
+            renamed[ep_id] = _new_endpoint_id(existing, seen, other_ids)
+            ep_id = renamed[ep_id]
+        seen.add(ep_id)
+        ids.append(ep_id)
+        endpoint = {'id': ep_id, **cleaned}
+        if ep_id in existing:
+            if existing[ep_id] == endpoint:
+                summary["unchanged"] += 1
+                continue
+            summary["updated"] += 1
+        else:
+            order.append(ep_id)
+            summary["created"] += 1
+        result[ep_id] = endpoint
+
+    if errors: raise BulkImportError(errors)
+
+    if mode == 'replace':
+        for ep_id in [ep_id for ep_id in result if ep_id not in seen]:
+            del result[ep_id]
+            summary["deleted"] += 1
+
+    summary["ids"] = ids
+    summary["renamed"] = renamed
+    return [result[ep_id] for ep_id in order if ep_id in result], summary
+
+# --- Export ---
+
+def export_lines(endpoints, fmt):
+    """Yields the endpoints as JSON Lines or CSV (with header), one chunk per endpoint."""
+    if fmt == 'jsonl':
+        for ep in endpoints: yield json.dumps({key: ep[key] for key in EXPORT_FIELDS if key in ep}, separators=(',', ':')) + "\n"
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for ep in endpoints:
+        writer.writerow({**ep, 'assertions': json.dumps(ep['assertions'], separators=(',', ':'))} if ep.get('assertions') else ep)
+        yield buffer.getvalue()
+        buffer.seek(0); buffer.truncate()
+    if buffer.getvalue(): yield buffer.getvalue()
@@ -0,0 +1,26 @@
+import bisect
+import hashlib
+
+from app.state import SHARD_VNODES
+
+
+def _hash(value):
+    """Stable 64-bit hash (Python's hash() differs per process)."""
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring of replica ids with `vnodes` points per replica.
+    Adding or removing a replica only moves the keys on its arcs (~1/N of them).
+    """
+
+    def __init__(self, members, vnodes=SHARD_VNODES):
+        self.members = tuple(sorted(set(members)))
+        points = sorted((_hash(f"{member}#{i}"), member) for member in self.members for i in range(max(1, vnodes)))
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key):
+        if not self._hashes: return None
+        return self._owners[bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)]
@@ -0,0 +1,150 @@
+import time
+import queue
+import threading
+import logging
+from sqlalchemy import insert
+
+from app import models
+from app.models import StatusHistory, session_scope
+from app.metrics import HISTORY_FLUSH_SECONDS
+from app.state import (HISTORY_BATCH_SIZE, HISTORY_FLUSH_INTERVAL_SECONDS,
+                       HISTORY_QUEUE_MAX, HISTORY_ENQUEUE_TIMEOUT_SECONDS)
+
+logger = logging.getLogger(__name__) # Writer thread has no app context
+
+MAX_WRITE_ATTEMPTS = 3
+
+
+class HistoryWriter:
+    """
+    Write-behind queue for status_history rows.
+
+    Producers (the check loop) enqueue row dicts; a background thread drains
+    the queue and commits them with one multi-row INSERT per batch, either when
+    HISTORY_BATCH_SIZE rows are waiting or HISTORY_FLUSH_INTERVAL_SECONDS have
+    passed. The queue is bounded: when it is full, enqueue() blocks for up to
+    HISTORY_ENQUEUE_TIMEOUT_SECONDS (backpressure) and then drops the row.
+    Hooks added with add_drop_hook(hook) are called with every list of rows
+    that is dropped instead of written (from the writer thread or the producer).
+    """
+
+    def __init__(self, batch_size=HISTORY_BATCH_SIZE, flush_interval=HISTORY_FLUSH_INTERVAL_SECONDS,
+                 max_queue=HISTORY_QUEUE_MAX, enqueue_timeout=HISTORY_ENQUEUE_TIMEOUT_SECONDS):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.1, flush_interval)
+        self.enqueue_timeout = max(0.0, enqueue_timeout)
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock() # Serializes writer thread and explicit flush()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.dropped_rows = 0
+        self.written_rows = 0
+        self._drop_hooks = []
+
+    # --- Producer Side ---
+
+    def enqueue(self, row):
+        """Queues one status_history row dict. Returns False if it had to be dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put(row, timeout=self.enqueue_timeout)
+            return True
+        except queue.Full:
+            self._dropped([row])
+            logger.error(f"History writer queue full ({self._queue.maxsize} rows); dropped row for {row.get('endpoint_id')}. Total dropped: {self.dropped_rows}")
+            return False
+
+    def add_drop_hook(self, hook):
+        self._drop_hooks.append(hook)
+
+    def _dropped(self, rows):
+        with self._lock: self.dropped_rows += len(rows)
+        for hook in self._drop_hooks:
+            try: hook(rows)
+            except Exception as e: logger.error(f"History writer: drop hook failed: {e}", exc_info=True)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    # --- Lifecycle ---
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive(): return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive(): return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="uptimizer-history-writer", daemon=True)
+            self._thread.start()
+            logger.info(f"History writer started (batch={self.batch_size}, interval={self.flush_interval}s, max_queue={self._queue.maxsize}).")
+
+    def shutdown(self, timeout=10):
+        """Stops the writer thread and flushes whatever is still queued (called from main.cleanup)."""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None: thread.join(timeout=timeout)
+        self._thread = None
+        remaining = self.flush()
+        logger.info(f"History writer stopped. Flushed {remaining} rows on shutdown; {self.written_rows} written, {self.dropped_rows} dropped in total.")
+
+    def flush(self):
+        """Synchronously writes everything currently queued. Returns the number of rows written."""
+        written = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch: return written
+            written += self._write(batch)
+
+    # --- Writer Thread ---
+
+    def _drain(self, limit, first_timeout=None):
+        """Takes up to `limit` rows; optionally waits up to first_timeout for the first one."""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=first_timeout) if first_timeout else self._queue.get_nowait())
+            while len(batch) < limit:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._drain(self.batch_size, first_timeout=self.flush_interval)
+            if not batch: continue
+            # Give a partial batch until the flush deadline to fill up
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stopping.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                try: batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+                except queue.Empty: continue
+            self._write(batch)
+
+    def _write(self, rows):
+        """Bulk-inserts rows, retrying a few times before giving up on the batch."""
+        if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED:
+            self._dropped(rows)
+            logger.warning(f"History writer: DB not ready, dropped {len(rows)} rows.")
+            return 0
+        with self._write_lock, HISTORY_FLUSH_SECONDS.time():
+            for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+                try:
+                    with session_scope() as session:
+                        if session is None: raise RuntimeError("DB session unavailable")
+                        # executemany; SQLAlchemy batches this into multi-row INSERT ... VALUES statements
+                        session.execute(insert(StatusHistory), rows)
+                    with self._lock: self.written_rows += len(rows)
+                    logger.debug(f"History writer: inserted {len(rows)} rows.")
+                    return len(rows)
+                except Exception as e:
+                    logger.warning(f"History writer: bulk insert of {len(rows)} rows failed (attempt {attempt}/{MAX_WRITE_ATTEMPTS}): {e}")
+                    if attempt < MAX_WRITE_ATTEMPTS and not self._stopping.is_set(): time.sleep(attempt)
+            self._dropped(rows)
+            logger.error(f"History writer: giving up on {len(rows)} rows after {MAX_WRITE_ATTEMPTS} attempts.")
+            return 0
+
+
+# Shared writer instance used by database.save_status_change
+history_writer = HistoryWriter()
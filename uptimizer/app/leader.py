@@ -0,0 +1,112 @@
+import threading
+import logging
+from sqlalchemy import text
+
+from app import models
+from app.state import LEADER_ELECTION_ENABLED, LEADER_LOCK_KEY, LEADER_POLL_SECONDS
+
+logger = logging.getLogger(__name__) # Election runs in its own thread
+
+
+class LeaderElector:
+    """
+    Elects one process among all Uptimizer processes sharing a database to run the
+    singleton work (check scheduling without sharding, DB maintenance jobs).
+
+    Leadership is a Postgres session-level advisory lock (LEADER_LOCK_KEY) held on a
+    dedicated connection. Followers retry pg_try_advisory_lock every LEADER_POLL_SECONDS;
+    the leader pings its connection at the same rate and steps down if it fails. If the
+    leader process dies, Postgres drops its session and the lock with it, so a follower
+    takes over within one poll. Without a database there is nothing to coordinate
+    through and the process leads on its own.
+    """
+
+    def __init__(self, enabled=LEADER_ELECTION_ENABLED, lock_key=LEADER_LOCK_KEY, poll_seconds=LEADER_POLL_SECONDS):
+        self.enabled = enabled
+        self.lock_key = lock_key
+        self.poll_seconds = max(1, poll_seconds)
+        self._lock = threading.Lock()
+        self._connection = None
+        self._is_leader = False
+        self._on_elected = self._on_demoted = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def is_leader(self):
+        with self._lock: return self._is_leader
+
+    # --- Lifecycle ---
+
+    def start(self, on_elected=None, on_demoted=None):
+        """Runs the first election round synchronously, then keeps campaigning/pinging in a thread."""
+        if self._thread is not None and self._thread.is_alive(): return
+        self._on_elected, self._on_demoted = on_elected, on_demoted
+        if not self.enabled or not models.ENGINE_INITIALIZED:
+            logger.info(f"Leader election {'disabled' if not self.enabled else 'skipped (no database)'}; this process leads.")
+            self._set_leader(True)
+            return
+        self._stopping.clear()
+        self._campaign()
+        self._thread = threading.Thread(target=self._run, name="uptimizer-leader-election", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        """Steps down (releasing the lock) so a follower takes over without waiting for a timeout."""
+        self._stopping.set()
+        thread, self._thread = self._thread, None
+        if thread is not None: thread.join(timeout=self.poll_seconds + 5)
+        if self._connection is not None:
+            try: self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+            except Exception as e: logger.warning(f"Leader election: could not release the lock: {e}")
+        self._step_down("shutting down")
+
+    # --- Election ---
+
+    def _set_leader(self, is_leader):
+        with self._lock:
+            if self._is_leader == is_leader: return
+            self._is_leader = is_leader
+        callback = self._on_elected if is_leader else self._on_demoted
+        if callback is None: return
+        try: callback()
+        except Exception as e: logger.error(f"Leader election: {'elected' if is_leader else 'demoted'} callback failed: {e}", exc_info=True)
+
+    def _step_down(self, reason):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try: connection.close() # Ends the session, which releases the lock if we still held it
+            except Exception: pass
+        if self.is_leader: logger.warning(f"Leader election: stepping down ({reason}).")
+        self._set_leader(False)
+
+    def _campaign(self):
+        """One round: followers try to take the lock, the leader checks it still holds its session."""
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT 1"))
+                return
+            except Exception as e:
+                self._step_down(f"lock connection lost: {e}")
+        connection = None
+        try:
+            connection = models.engine.connect().execution_options(isolation_level="AUTOCOMMIT") # Never idle in a transaction
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}).scalar()
+        except Exception as e:
+            if connection is not None: connection.close()
+            logger.warning(f"Leader election: could not reach the database: {e}")
+            return
+        if not acquired:
+            connection.close()
+            return
+        self._connection = connection
+        logger.info(f"Leader election: this process is now the leader (lock {self.lock_key}).")
+        self._set_leader(True)
+
+    def _run(self):
+        while not self._stopping.wait(self.poll_seconds):
+            self._campaign()
+
+
+# Shared elector; main.initialize starts it and hands leadership callbacks to the schedulers
+leader_elector = LeaderElector()
@@ -0,0 +1,141 @@
+import time
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import current_app, has_app_context
+
+from app.state import (LINK_FETCH_WORKERS, LINK_BREAKER_FAILURES, LINK_BREAKER_BACKOFF_SECONDS,
+                       LINK_BREAKER_MAX_BACKOFF_SECONDS)
+
+logger = logging.getLogger(__name__) # Fetches run in pool threads
+
+LINK_USER_AGENT = 'UptimizerLinkChecker/1.15.0'
+
+
+class CircuitBreaker:
+    """
+    Per-remote breaker. After LINK_BREAKER_FAILURES consecutive failed fetches it opens and
+    the remote is skipped for a backoff that doubles on every failed trial (capped at
+    LINK_BREAKER_MAX_BACKOFF_SECONDS). Once the backoff has passed, one trial fetch is let
+    through (half-open): success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, failures=LINK_BREAKER_FAILURES, backoff_seconds=LINK_BREAKER_BACKOFF_SECONDS,
+                 max_backoff_seconds=LINK_BREAKER_MAX_BACKOFF_SECONDS, clock=time.monotonic):
+        self.failures = max(1, failures)
+        self.backoff_seconds = max(1, backoff_seconds)
+        self.max_backoff_seconds = max(self.backoff_seconds, max_backoff_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._open_until = None # None: closed
+        self._backoff = self.backoff_seconds
+        self._trial_running = False
+
+    def allow(self):
+        """Returns (True, 0) if a fetch may go out, else (False, seconds until the next trial)."""
+        with self._lock:
+            if self._open_until is None: return True, 0
+            remaining = self._open_until - self._clock()
+            if remaining > 0 or self._trial_running: return False, max(0, remaining)
+            self._trial_running = True
+            return True, 0
+
+    def record(self, ok):
+        """Returns 'opened' or 'closed' when the state changed, else None."""
+        with self._lock:
+            was_open = self._open_until is not None
+            self._trial_running = False
+            if ok:
+                self._consecutive_failures = 0
+                self._open_until = None
+                self._backoff = self.backoff_seconds
+                return 'closed' if was_open else None
+            self._consecutive_failures += 1
+            if was_open: self._backoff = min(self._backoff * 2, self.max_backoff_seconds)
+            elif self._consecutive_failures < self.failures: return None
+            self._open_until = self._clock() + self._backoff
+            return None if was_open else 'opened'
+
+
+class LinkFetcher:
+    """
+    Fetches linked clients concurrently on a small thread pool (they are few and mostly
+    waiting on the network), over keep-alive sessions (one per pool thread, like the
+    requests probe backend), with a CircuitBreaker per remote URL so a dead remote costs
+    one fast error per cycle instead of a timeout.
+    """
+
+    def __init__(self, max_workers=LINK_FETCH_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._local = threading.local()
+        self._breakers = {}
+
+    def session(self):
+        """Keep-alive session of the calling pool thread."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=100, pool_maxsize=2, max_retries=0)
+            session.mount('http://', adapter); session.mount('https://', adapter)
+            session.headers['User-Agent'] = LINK_USER_AGENT
+            self._local.session = session
+        return session
+
+    def _breaker(self, remote_url):
+        with self._lock:
+            breaker = self._breakers.get(remote_url)
+            if breaker is None: breaker = self._breakers[remote_url] = CircuitBreaker()
+            return breaker
+
+    def _run_one(self, app, client_config, fetch_fn, global_settings):
+        remote_url = (client_config.get('remote_url') or '').rstrip('/')
+        breaker = self._breaker(remote_url) if remote_url else None
+        if breaker is not None:
+            allowed, retry_in = breaker.allow()
+            if not allowed: return {"error": f"Remote unavailable, retrying in {round(retry_in)}s"}
+        if app is None: result = fetch_fn(client_config, global_settings)
+        else:
+            with app.app_context(): result = fetch_fn(client_config, global_settings)
+        if breaker is not None:
+            change = breaker.record(not (isinstance(result, dict) and "error" in result))
+            if change == 'opened': logger.warning(f"Linked remote {remote_url}: {breaker.failures} failed fetches in a row, backing off.")
+            elif change == 'closed': logger.info(f"Linked remote {remote_url}: reachable again.")
+        return result
+
+    def run(self, clients, fetch_fn, global_settings):
+        """
+        Starts fetch_fn(client_config, global_settings) for every client right away and
+        returns an iterator of (client_config, result) in completion order, so callers can
+        do other work (local probes) while the fetches are in flight.
+        """
+        if not clients: return iter(())
+        app = current_app._get_current_object() if has_app_context() else None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="uptimizer-link")
+            executor = self._executor
+        futures = {executor.submit(self._run_one, app, client, fetch_fn, global_settings): client for client in clients}
+        return self._completed(futures)
+
+    def _completed(self, futures):
+        for future in as_completed(futures):
+            client = futures[future]
+            try: result = future.result()
+            except Exception as e:
+                logger.error(f"Link fetcher: unhandled error fetching {client.get('id')}: {e}", exc_info=True)
+                result = {"error": "Unexpected fetch error"}
+            yield client, result
+
+    def shutdown(self, wait=False):
+        """Stops the fetch pool (called from main.cleanup)."""
+        with self._lock: executor, self._executor = self._executor, None
+        if executor is not None: executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Shared fetcher used by the background task
+link_fetcher = LinkFetcher()
@@ -9,8 +9,9 @@ if project_root not in sys.path: sys.path.insert(0, project_root)
 
 # --- Standard Imports ---
 import atexit
+import json
 import time # Import time for sleep
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import logging # Import logging early
 
 # --- Environment Loading ---
@@ -25,7 +26,9 @@ from werkzeug.exceptions import NotFound
 
 # --- Application Module Imports ---
 # Import shared state and config path from state.py
-from app.state import current_state, state_lock, CONFIG_PATH, APP_BASE_PATH, DEFAULT_CLIENT_ID
+from app.state import (state_store, CONFIG_PATH, APP_BASE_PATH, DEFAULT_CLIENT_ID,
+                       ROLLUP_COMPACT_INTERVAL_SECONDS, PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+                       CONFIG_COMPACT_INTERVAL_SECONDS, SHARD_STATUS_SYNC_SECONDS, CHECKER_MODE)
 
 # Import models first to define DB flags and table creation function
 try:
@@ -38,8 +41,22 @@ except ImportError as e:
     def create_db_tables(): print("FATAL: create_tables STUB (models import failed)"); return False
 
 # Import other components AFTER models and state
-from app.config_manager import load_initial_config
-from app.checker import run_checks_task
+from app.config_manager import load_initial_config, compact_config
+from app.checker import run_scheduled_checks, apply_external_results
+from app.deadline_scheduler import check_scheduler, notify_config_changed, add_config_change_hook
+from app.sharding import shard_coordinator, sync_peer_statuses
+from app.leader import leader_elector
+from app.result_bus import NotificationListener, RESULTS_CHANNEL, CONFIG_CHANNEL, PROCESS_ID, publish_config_changed
+from app.check_engine import check_engine
+from app.probe_backends import shutdown_probe_backends
+from app.protocol_probes import protocol_prober
+from app.link_fetcher import link_fetcher
+from app.history_writer import history_writer
+from app.rollups import compact_rollups
+from app.partitions import ensure_partitions, maintain_history_storage
+from app.uptime_accumulator import uptime_accumulator
+from app.status_feed import status_feed
+from app.database import get_status_events_bulk
 
 # --- Import NEW Blueprints --- CORRECTED IMPORTS ---
 # Import the blueprint OBJECTS defined in your api_*.py and views.py files
@@ -49,6 +66,8 @@ from app.api.api_clients import clients_api_bp # Check this file exists and defi
 from app.api.api_endpoints import endpoints_api_bp # Check this file exists and defines endpoints_api_bp
 from app.api.api_stats import stats_api_bp # Check this file exists and defines stats_api_bp
 from app.api.api_config import config_api_bp # Check this file exists and defines config_api_bp
+from app.api.api_stream import stream_api_bp # Server-Sent Events status stream
+from app.api.api_metrics import metrics_api_bp # Prometheus /metrics
 # --- End New Blueprint Imports ---
 
 # --- Flask App Creation ---
@@ -74,16 +93,18 @@ app.register_blueprint(clients_api_bp, url_prefix='/api') # e.g., /api/clients,
 app.register_blueprint(endpoints_api_bp, url_prefix='/api') # e.g., /api/clients/<id>/endpoints
 app.register_blueprint(stats_api_bp, url_prefix='/api') # e.g., /api/statistics, /api/history/...
 app.register_blueprint(config_api_bp, url_prefix='/api') # e.g., /api/config_api/..., /api/config/reload
+app.register_blueprint(stream_api_bp, url_prefix='/api') # e.g., /api/stream
+app.register_blueprint(metrics_api_bp) # /metrics (no prefix: the path scrapers expect)
 app.logger.info("All Blueprints registered.")
 
-# --- Scheduler Setup ---
-scheduler = BackgroundScheduler(daemon=True, timezone="UTC")
+# --- Maintenance Scheduler Setup ---
+# Endpoint checks run on the deadline scheduler; APScheduler only runs periodic DB maintenance jobs
+maintenance_scheduler = BackgroundScheduler(daemon=True, timezone="UTC")
 
 # --- Initialization and Cleanup ---
 # ... (initialize function remains the same) ...
 def initialize():
-    """Initialize database, load config, start scheduler."""
-    global scheduler
+    """Initialize database, load config, start the deadline scheduler."""
     app.logger.info("="*30 + "\nInitializing Uptimizer...\n" + "="*30)
 
     # Step 1: Ensure DB Engine is Ready
@@ -98,59 +119,165 @@ def initialize():
     if models.ENGINE_INITIALIZED:
         if create_db_tables(): app.logger.info("DB Initialization: Tables checked/created.")
         else: app.logger.warning("DB Initialization: Table creation/check failed.")
+        # History rows need a partition for today before the first check result is written
+        try: ensure_partitions()
+        except Exception as e: app.logger.error(f"DB Initialization: Could not create history partitions: {e}", exc_info=True)
     elif DB_ENABLED: app.logger.warning("DB enabled but engine failed init. Skipping table creation.")
     else: app.logger.info("DB Disabled, skipping table creation.")
 
     # Step 3: Load initial config
     app.logger.info("\nStep 2: Loading Initial Configuration from file...");
-    load_initial_config(CONFIG_PATH, current_state, state_lock)
+    load_initial_config(CONFIG_PATH, state_store)
     app.logger.info("Step 2: Initial configuration loading complete.")
 
     # Log the state *after* loading config and *before* first check
-    with state_lock:
-        initial_clients = list(current_state["clients"].keys())
-        initial_endpoints_count = sum(len(c.get("endpoints", [])) for c in current_state["clients"].values() if c.get("settings", {}).get("client_type", "local") == "local")
-        initial_linked_clients = sum(1 for c in current_state["clients"].values() if c.get("settings", {}).get("client_type") == "linked")
-        initial_interval = current_state.get("scheduler_interval")
-    app.logger.info(f"\nState After Config Load: Clients={initial_clients}, Local Endpoints={initial_endpoints_count}, Linked Clients={initial_linked_clients}, Scheduler Freq={initial_interval}s")
+    state = state_store.snapshot()
+    initial_clients = list(state["clients"].keys())
+    initial_endpoints_count = sum(len(c.get("endpoints", [])) for c in state["clients"].values() if c.get("settings", {}).get("client_type", "local") == "local")
+    initial_linked_clients = sum(1 for c in state["clients"].values() if c.get("settings", {}).get("client_type") == "linked")
+    initial_interval = state.get("scheduler_interval")
+    app.logger.info(f"\nState After Config Load: Clients={initial_clients}, Local Endpoints={initial_endpoints_count}, Linked Clients={initial_linked_clients}, Default Interval={initial_interval}s")
     app.logger.info(f"DB Status Before Initial Check: Engine Initialized={models.ENGINE_INITIALIZED}, Tables Created={models.DB_TABLES_CREATED}")
 
-    # Step 4: Run first check cycle
-    app.logger.info("\nStep 3: Running Initial Checks/Fetches...");
+    # Warm the in-memory 24h uptime window from history before any new results arrive
+    local_endpoint_ids = [ep.get('id') for c in state["clients"].values()
+                          if c.get("settings", {}).get("client_type", "local") == "local"
+                          for ep in c.get("endpoints", []) if ep.get('id')]
+    warm_end = datetime.now(timezone.utc)
+    events = get_status_events_bulk(local_endpoint_ids, warm_end - timedelta(seconds=uptime_accumulator.window_seconds), warm_end)
+    if events is not None: uptime_accumulator.warm(events, now=warm_end.timestamp())
+    else: app.logger.warning("Uptime accumulator not warmed (DB unavailable); /statistics will query the DB.")
+
+    # Step 4: Start the deadline scheduler. Endpoints that were never checked are due
+    # immediately (spread over a small jitter window), so no blocking initial cycle is needed.
+    # With sharding every replica checks its own shard (join the membership first so the first
+    # schedule only holds it); otherwise only the elected leader process runs checks.
+    app.logger.info("\nStep 3: Starting Deadline Scheduler (per-endpoint intervals)...")
     try:
-        # Pass state by reference (it's a dict)
-        run_checks_task(current_state, state_lock)
-        app.logger.info("Step 3: Initial check/fetch cycle finished.")
-    except Exception as e:
-        app.logger.error(f"ERROR during initial check cycle: {e}", exc_info=True)
-    app.logger.info(f"DB Status After Initial Check: Engine Initialized={models.ENGINE_INITIALIZED}, Tables Created={models.DB_TABLES_CREATED}")
-
-    # Step 5: Schedule recurring checks
-    app.logger.info(f"\nStep 4: Scheduling Recurring Checks (Freq: {initial_interval}s)...")
+        if CHECKER_MODE == 'external':
+            # Checks run in the checker worker; take its results from NOTIFY and tell it about config edits
+            app.logger.info("CHECKER_MODE=external: checks run in 'python -m app.checker_worker'; listening for results.")
+            result_listener.start()
+            add_config_change_hook(publish_config_changed)
+            leader_elector.start() # Leadership only gates the maintenance jobs
+        elif shard_coordinator.enabled:
+            shard_coordinator.start(on_change=notify_config_changed)
+            start_check_scheduler()
+            leader_elector.start() # Leadership only gates the maintenance jobs
+        else:
+            leader_elector.start(on_elected=start_check_scheduler, on_demoted=stop_check_scheduler)
+        if CHECKER_MODE != 'external' and (shard_coordinator.enabled or leader_elector.enabled):
+            # Edits are saved by whichever web process got the request; the checking processes reload them
+            add_config_change_hook(publish_config_changed)
+            config_listener.start()
+        if not check_scheduler.running and CHECKER_MODE != 'external': app.logger.info("Not the leader: this process serves the API; checks run on the leader.")
+    except Exception as e: app.logger.error(f"Error starting deadline scheduler: {e}", exc_info=True)
+
+    # Step 5: Schedule DB maintenance (rollup compaction, partitions + retention, config journal compaction; these run on the leader only)
+    app.logger.info(f"\nStep 4: Scheduling Maintenance Jobs (Rollups every {ROLLUP_COMPACT_INTERVAL_SECONDS}s, Partitions every {PARTITION_MAINTENANCE_INTERVAL_SECONDS}s)...")
     try:
-        with state_lock: interval_to_use = current_state["scheduler_interval"]
         job_defaults = {'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 30}
-        # Pass current_state and state_lock to the scheduled job
-        scheduler.add_job(run_checks_task, 'interval', seconds=interval_to_use,
-                          id='endpoint_checks', replace_existing=True,
-                          args=[current_state, state_lock], **job_defaults)
-        if not scheduler.running: scheduler.start(); app.logger.info("Scheduler started.")
-        else:
-            app.logger.info("Scheduler already running. Rescheduling job...")
-            scheduler.reschedule_job('endpoint_checks', trigger='interval', seconds=interval_to_use) # Reschedule only needs trigger/interval
-            app.logger.info("Job rescheduled.")
-    except Exception as e: app.logger.error(f"Error starting/scheduling job: {e}", exc_info=True)
+        maintenance_scheduler.add_job(leader_only, 'interval', seconds=ROLLUP_COMPACT_INTERVAL_SECONDS,
+                                      id='rollup_compaction', replace_existing=True,
+                                      args=[compact_rollups, state_store], **job_defaults)
+        maintenance_scheduler.add_job(leader_only, 'interval', seconds=PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+                                      id='history_storage', replace_existing=True,
+                                      args=[maintain_history_storage, state_store], **job_defaults)
+        maintenance_scheduler.add_job(leader_only, 'interval', seconds=CONFIG_COMPACT_INTERVAL_SECONDS,
+                                      id='config_compaction', replace_existing=True, args=[compact_config_job], **job_defaults)
+        if shard_coordinator.enabled or leader_elector.enabled or CHECKER_MODE == 'external':
+            maintenance_scheduler.add_job(sync_peer_statuses_job, 'interval', seconds=SHARD_STATUS_SYNC_SECONDS,
+                                          id='shard_status_sync', replace_existing=True, **job_defaults)
+        if not maintenance_scheduler.running: maintenance_scheduler.start(); app.logger.info("Maintenance scheduler started.")
+    except Exception as e: app.logger.error(f"Error starting maintenance scheduler: {e}", exc_info=True)
     app.logger.info("\nInitialization Complete.\n" + "="*30)
 
+def start_check_scheduler():
+    """Starts checking (every replica with sharding, else when this process is elected leader)."""
+    app.logger.info("Starting deadline scheduler...")
+    check_scheduler.start(run_scheduled_checks, state_store, app=app,
+                          owns_fn=shard_coordinator.owns if shard_coordinator.enabled else None)
+
+def stop_check_scheduler():
+    """Stops checking after losing leadership; the new leader takes over the schedule."""
+    if check_scheduler.running: check_scheduler.shutdown(wait=False)
+
+def apply_worker_results(channel, payload):
+    """Result listener handler (CHECKER_MODE=external): applies one NOTIFY payload of check results."""
+    data = json.loads(payload)
+    with app.app_context(): apply_external_results(state_store, data.get("results", []), last_updated=time.time())
+
+def resync_worker_results():
+    """After (re)connecting the listener: results sent while disconnected are read back from history."""
+    with app.app_context():
+        try: sync_peer_statuses(state_store, owns_fn=lambda endpoint_id: False, full=True)
+        except Exception as e: app.logger.error(f"Result resync failed: {e}", exc_info=True)
+
+result_listener = NotificationListener([RESULTS_CHANNEL], apply_worker_results, on_connect=resync_worker_results, name="uptimizer-result-listener")
+
+def reload_peer_config(channel=None, payload=None):
+    """Config listener handler: re-reads config.json + journal after another web process saved an edit."""
+    if payload and json.loads(payload).get("source") == PROCESS_ID: return # Our own edit, already in state
+    with app.app_context():
+        load_initial_config(CONFIG_PATH, state_store, keep_statuses=True)
+        with state_store.write() as draft: draft["status_version"] = status_feed.reset()
+    check_scheduler.request_sync() # Not notify_config_changed(): that would publish the change again
+
+config_listener = NotificationListener([CONFIG_CHANNEL], reload_peer_config, on_connect=reload_peer_config, name="uptimizer-config-listener")
+
+def leader_only(job, *args):
+    """Runs a singleton maintenance job only in the elected leader process."""
+    if leader_elector.is_leader: job(*args)
+
+def compact_config_job():
+    """Maintenance job: folds the config journal into config.json (needs the app context for logging)."""
+    with app.app_context():
+        try: compact_config()
+        except Exception as e: app.logger.error(f"Config compaction failed: {e}", exc_info=True)
+
+def sync_peer_statuses_job():
+    """Maintenance job: pulls results checked by other processes (other shards, or the leader) from history into state."""
+    owns_fn = shard_coordinator.owns if check_scheduler.running else (lambda endpoint_id: False)
+    with app.app_context():
+        try: sync_peer_statuses(state_store, owns_fn=owns_fn)
+        except Exception as e: app.logger.error(f"Peer status sync failed: {e}", exc_info=True)
+
 # ... (cleanup function remains the same) ...
 def cleanup():
-    """Gracefully shut down scheduler."""
+    """Gracefully shut down scheduler and check engine, then flush queued history rows."""
     app.logger.info("\n" + "="*30 + "\nShutdown signal. Cleaning up...\n" + "="*30)
     app.logger.info("Shutting down scheduler...");
-    if scheduler and scheduler.running:
-        try: scheduler.shutdown(); app.logger.info("Scheduler shut down.")
+    if check_scheduler.running:
+        try: check_scheduler.shutdown(); app.logger.info("Scheduler shut down.")
         except Exception as e: app.logger.error(f"Error shutting down scheduler: {e}", exc_info=True)
     else: app.logger.info("Scheduler was not running or not initialized.")
+    if maintenance_scheduler.running:
+        try: maintenance_scheduler.shutdown(wait=False); app.logger.info("Maintenance scheduler shut down.")
+        except Exception as e: app.logger.error(f"Error shutting down maintenance scheduler: {e}", exc_info=True)
+    result_listener.shutdown()
+    config_listener.shutdown()
+    app.logger.info("Compacting config journal...")
+    leader_only(compact_config_job) # Before stepping down
+    app.logger.info("Stepping down as leader...")
+    try: leader_elector.shutdown()
+    except Exception as e: app.logger.error(f"Error stepping down as leader: {e}", exc_info=True)
+    app.logger.info("Releasing shard lease...")
+    try: shard_coordinator.shutdown()
+    except Exception as e: app.logger.error(f"Error releasing shard lease: {e}", exc_info=True)
+    app.logger.info("Closing probe backends...")
+    try: shutdown_probe_backends(); app.logger.info("Probe backends closed.")
+    except Exception as e: app.logger.error(f"Error closing probe backends: {e}", exc_info=True)
+    try: protocol_prober.shutdown(); app.logger.info("Protocol prober stopped.")
+    except Exception as e: app.logger.error(f"Error stopping protocol prober: {e}", exc_info=True)
+    app.logger.info("Shutting down link fetcher...")
+    try: link_fetcher.shutdown(); app.logger.info("Link fetcher shut down.")
+    except Exception as e: app.logger.error(f"Error shutting down link fetcher: {e}", exc_info=True)
+    app.logger.info("Shutting down check engine...")
+    try: check_engine.shutdown(wait=False); app.logger.info("Check engine shut down.")
+    except Exception as e: app.logger.error(f"Error shutting down check engine: {e}", exc_info=True)
+    app.logger.info("Flushing history writer...")
+    try: history_writer.shutdown(); app.logger.info("History writer flushed.")
+    except Exception as e: app.logger.error(f"Error flushing history writer: {e}", exc_info=True)
     app.logger.info("\nCleanup finished.\n" + "="*30)
 
 atexit.register(cleanup)
@@ -183,8 +310,8 @@ if __name__ == '__main__':
         elif not models_ok:
             app.logger.critical("FATAL: Core 'models' module failed to load. Cannot initialize.")
         else:
-            # Only initialize if checks pass
-            initialize()
+            # Only initialize if checks pass (config loading logs through current_app)
+            with app.app_context(): initialize()
     else:
          app.logger.info("(Reloader Active: Parent process monitoring, initialization deferred to child)")
 
@@ -197,7 +324,8 @@ if __name__ == '__main__':
          app.logger.info(f"Starting Werkzeug server on 0.0.0.0:5000 (Debug: {app.debug})...")
          try:
             # Use the 'application' object which might be the original app or the middleware wrapper
-            run_simple(hostname='0.0.0.0', port=5000, application=application, use_reloader=app.debug, use_debugger=app.debug)
+            # threaded: each open /api/stream subscriber holds a request thread
+            run_simple(hostname='0.0.0.0', port=5000, application=application, use_reloader=app.debug, use_debugger=app.debug, threaded=True)
          except Exception as run_err:
              app.logger.critical(f"Failed to start server: {run_err}", exc_info=True)
     else:
@@ -0,0 +1,177 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# Minimal Prometheus text-format (0.0.4) metrics, so /metrics needs no extra dependency.
+# Metrics are defined at the bottom of this module and updated from the hot paths they
+# measure; values that already live elsewhere (queue depths, endpoint statuses) are read
+# by collectors at scrape time instead of being mirrored on every change.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values):
+    if not names: return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+def _format_value(value):
+    if value == math.inf: return '+Inf'
+    if value == -math.inf: return '-Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15: return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    def __init__(self): self._lock, self.value = threading.Lock(), 0.0
+    def inc(self, amount=1):
+        with self._lock: self.value += amount
+
+
+class _GaugeChild:
+    def __init__(self): self._lock, self.value = threading.Lock(), 0.0
+    def set(self, value):
+        with self._lock: self.value = value
+    def inc(self, amount=1):
+        with self._lock: self.value += amount
+    def dec(self, amount=1): self.inc(-amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets) # Per bucket (not cumulative); +Inf is `count`
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        with self._lock:
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try: yield
+        finally: self.observe(time.perf_counter() - started)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames: self.labels() # Unlabelled metrics export zeros before their first update
+        if registry is not False: (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames): raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock: child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def clear(self):
+        with self._lock: self._children = {}
+
+    def _samples(self, values, child):
+        """Yields (sample name, label names, label values, value)."""
+        yield self.name, self.labelnames, values, child.value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock: children = list(self._children.items())
+        for values, child in children:
+            for name, names, label_values, value in self._samples(values, child):
+                lines.append(f"{name}{_format_labels(names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    def _new_child(self): return _CounterChild()
+    def inc(self, amount=1): self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    def _new_child(self): return _GaugeChild()
+    def set(self, value): self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self): return _HistogramChild(self.buckets)
+    def observe(self, value): self.labels().observe(value)
+    def time(self): return self.labels().time()
+
+    def _samples(self, values, child):
+        with child._lock: counts, total, count = list(child.counts), child.sum, child.count
+        names = self.labelnames + ('le',)
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            yield f"{self.name}_bucket", names, values + (_format_value(float(bound)),), cumulative
+        yield f"{self.name}_bucket", names, values + ('+Inf',), count
+        yield f"{self.name}_sum", self.labelnames, values, total
+        yield f"{self.name}_count", self.labelnames, values, count
+
+
+class Registry:
+    """Registered metrics plus collectors (callables returning metrics built at scrape time)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        with self._lock: self._metrics.append(metric)
+
+    def add_collector(self, collector):
+        with self._lock: self._collectors.append(collector)
+
+    def render(self):
+        with self._lock: metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics: lines.extend(metric.render())
+        for collector in collectors:
+            for metric in collector(): lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# --- Hot-path Metrics ---
+
+CHECK_BATCH_SECONDS = Histogram('uptimizer_check_batch_duration_seconds', "Duration of one check batch (probes, linked fetches and the state update).")
+SCHEDULE_LAG_SECONDS = Histogram('uptimizer_schedule_lag_seconds', "How late items were dispatched relative to their deadline.")
+CHECK_BATCH_ITEMS = Counter('uptimizer_check_batch_items_total', "Items handled by check batches.", ['kind']) # kind: endpoint | linked
+CHECKS = Counter('uptimizer_checks_total', "Local endpoint check results.", ['status'])
+PROBE_RESPONSE_SECONDS = Histogram('uptimizer_probe_response_seconds', "Response time of probes that got a response, per client.", ['client_id'])
+LINKED_FETCHES = Counter('uptimizer_linked_fetches_total', "Linked client fetches.", ['result']) # result: full | delta | not_modified | error
+STATE_LOCK_WAIT_SECONDS = Histogram('uptimizer_state_lock_wait_seconds', "Time writers waited for the state store write lock.")
+STATE_LOCK_HOLD_SECONDS = Histogram('uptimizer_state_lock_hold_seconds', "Time writers held the state store write lock.")
+DB_SESSION_SECONDS = Histogram('uptimizer_db_session_seconds', "Duration of session_scope blocks, by outcome.", ['outcome'])
+HISTORY_FLUSH_SECONDS = Histogram('uptimizer_history_flush_seconds', "Duration of history writer bulk inserts (including retries).")
+CONFIG_SAVE_SECONDS = Histogram('uptimizer_config_save_seconds', "Time to durably save config edits.", ['kind']) # kind: journal | full
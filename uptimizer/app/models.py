@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Index, MetaData
+from sqlalchemy import create_engine, Column, Integer, BigInteger, Float, String, DateTime, Text, Index, MetaData, PrimaryKeyConstraint
 from sqlalchemy.orm import declarative_base, sessionmaker, scoped_session
 from sqlalchemy.sql import func
 import os
@@ -8,6 +8,8 @@ from dotenv import load_dotenv
 from sqlalchemy.exc import OperationalError
 import logging # Use standard logging
 
+from app.metrics import DB_SESSION_SECONDS
+
 logger = logging.getLogger(__name__) # Get logger for this module
 
 # No need to load .env here again if main.py does it early enough
@@ -68,19 +70,70 @@ metadata = MetaData()
 Base = declarative_base(metadata=metadata)
 
 class StatusHistory(Base):
+    """Raw check results. Range-partitioned by timestamp (see partitions.py), so the key includes it."""
     __tablename__ = 'status_history'
-    id = Column(Integer, primary_key=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, primary_key=True)
     endpoint_id = Column(String(255), nullable=False) # Remains endpoint-specific ID
     status = Column(String(50), nullable=False)
     status_code = Column(Integer, nullable=True)
     response_time_ms = Column(Integer, nullable=True)
     details = Column(Text, nullable=True)
-
-    __table_args__ = (Index('idx_status_history_endpoint_ts', 'endpoint_id', timestamp.desc()),)
+    # Probe phase breakdown (see probe_backends): NULL for phases a failed check never reached
+    dns_ms = Column(Integer, nullable=True)
+    connect_ms = Column(Integer, nullable=True)
+    tls_ms = Column(Integer, nullable=True)
+    ttfb_ms = Column(Integer, nullable=True)
+    transfer_ms = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index('idx_status_history_endpoint_ts', 'endpoint_id', timestamp.desc()),
+        Index('idx_status_history_ts', 'timestamp'), # Time-range scans by the rollup compactor
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
     def __repr__(self): return f"<StatusHistory(id={self.id}, ep='{self.endpoint_id}', st='{self.status}')>"
 
-logger.info("SQLAlchemy models defined (StatusHistory).")
+class StatusRollup(Base):
+    """Pre-aggregated per-endpoint buckets (minute/hour/day), maintained by rollups.py."""
+    __tablename__ = 'status_rollups'
+    endpoint_id = Column(String(255), nullable=False)
+    granularity = Column(String(10), nullable=False) # 'minute', 'hour' or 'day'
+    bucket_start = Column(DateTime(timezone=True), nullable=False) # UTC-aligned
+    up_seconds = Column(Float, nullable=False, default=0)      # Seconds spent UP inside the bucket
+    covered_seconds = Column(Float, nullable=False, default=0) # Seconds with a known status inside the bucket
+    check_count = Column(Integer, nullable=False, default=0)
+    up_count = Column(Integer, nullable=False, default=0)
+    rt_count = Column(Integer, nullable=False, default=0) # Checks that reported a response time
+    rt_sum = Column(BigInteger, nullable=False, default=0)
+    rt_min = Column(Integer, nullable=True)
+    rt_max = Column(Integer, nullable=True)
+    rt_p95 = Column(Integer, nullable=True)
+
+    __table_args__ = (PrimaryKeyConstraint('endpoint_id', 'granularity', 'bucket_start'),
+                      Index('idx_status_rollups_granularity_bucket', 'granularity', 'bucket_start'))
+    def __repr__(self): return f"<StatusRollup(ep='{self.endpoint_id}', {self.granularity}@{self.bucket_start})>"
+
+class RollupWatermark(Base):
+    """Per-granularity range [rolled_from, rolled_until) that status_rollups fully covers."""
+    __tablename__ = 'rollup_watermarks'
+    granularity = Column(String(10), primary_key=True)
+    rolled_from = Column(DateTime(timezone=True), nullable=False)
+    rolled_until = Column(DateTime(timezone=True), nullable=False)
+    def __repr__(self): return f"<RollupWatermark({self.granularity}: {self.rolled_from} -> {self.rolled_until})>"
+
+class ReplicaLease(Base):
+    """Membership lease of one replica in check sharding (see sharding.py); renewed every heartbeat."""
+    __tablename__ = 'replica_leases'
+    replica_id = Column(String(255), primary_key=True)
+    hostname = Column(String(255), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False) # Set from the DB clock, so replicas' clocks don't matter
+
+    __table_args__ = (Index('idx_replica_leases_expires', 'expires_at'),)
+    def __repr__(self): return f"<ReplicaLease({self.replica_id} until {self.expires_at})>"
+
+logger.info("SQLAlchemy models defined (StatusHistory, StatusRollup, RollupWatermark, ReplicaLease).")
 
 # --- Session Scope ---
 @contextmanager
@@ -91,11 +144,14 @@ def session_scope():
         yield None # Yield None so the 'with' block can execute but session is None
         return
 
+    started = time.perf_counter()
+    outcome = 'rollback'
     session = Session()
     logger.debug("session_scope: Session created.")
     try:
         yield session
         session.commit()
+        outcome = 'commit'
         logger.debug("session_scope: Session committed.")
     except Exception as e:
         logger.error(f"session_scope: Exception occurred, rolling back session: {e}", exc_info=True)
@@ -104,6 +160,7 @@ def session_scope():
     finally:
         logger.debug("session_scope: Removing session.")
         Session.remove()
+        DB_SESSION_SECONDS.labels(outcome).observe(time.perf_counter() - started)
 
 # --- Table Creation Function (Fallback) ---
 def create_db_tables():
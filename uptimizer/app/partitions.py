@@ -0,0 +1,190 @@
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text, delete
+
+from app import models
+from app.models import StatusRollup, RollupWatermark, session_scope
+from app.rollups import get_watermarks
+from app.state import (HISTORY_PARTITION_INTERVAL, HISTORY_PARTITIONS_AHEAD,
+                       DEFAULT_HISTORY_RETENTION_DAYS, DEFAULT_ROLLUP_RETENTION_DAYS)
+
+logger = logging.getLogger(__name__) # Runs at startup and as a maintenance job
+
+PARENT_TABLE = 'status_history'
+DEFAULT_PARTITION = 'status_history_default' # Catches rows outside every range partition
+PARTITION_INTERVALS = ('day', 'month')
+_PARTITION_NAME_RE = re.compile(r'^status_history_p(\d{8}|\d{6})$')
+
+# --- Partition Ranges ---
+
+def _interval():
+    if HISTORY_PARTITION_INTERVAL in PARTITION_INTERVALS: return HISTORY_PARTITION_INTERVAL
+    logger.warning(f"Unknown HISTORY_PARTITION_INTERVAL '{HISTORY_PARTITION_INTERVAL}', using 'day'.")
+    return 'day'
+
+def period_start(ts, interval):
+    """Start (UTC) of the day/month partition that holds ts."""
+    ts = ts.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(day=1) if interval == 'month' else ts
+
+def next_period(start, interval):
+    if interval == 'month':
+        return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start + timedelta(days=1)
+
+def partition_name(start, interval):
+    return f"{PARENT_TABLE}_p{start:%Y%m}" if interval == 'month' else f"{PARENT_TABLE}_p{start:%Y%m%d}"
+
+def partition_interval(name):
+    """'day' or 'month' for a partition this module named, else None."""
+    match = _PARTITION_NAME_RE.match(name)
+    if not match: return None
+    return 'day' if len(match.group(1)) == 8 else 'month'
+
+def partition_range(name):
+    """Parses [start, end) back out of a partition name; None for names this module didn't create."""
+    match = _PARTITION_NAME_RE.match(name)
+    if not match: return None
+    stamp = match.group(1)
+    if len(stamp) == 8:
+        start = datetime.strptime(stamp, '%Y%m%d').replace(tzinfo=timezone.utc)
+        return start, next_period(start, 'day')
+    start = datetime.strptime(stamp, '%Y%m').replace(tzinfo=timezone.utc)
+    return start, next_period(start, 'month')
+
+# --- Catalog Helpers ---
+
+def is_partitioned(session):
+    relkind = session.execute(text(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = :name AND n.nspname = current_schema()"), {"name": PARENT_TABLE}).scalar()
+    return relkind == 'p'
+
+def list_partitions(session):
+    rows = session.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent JOIN pg_class child ON child.oid = i.inhrelid "
+        "JOIN pg_namespace n ON n.oid = parent.relnamespace "
+        "WHERE parent.relname = :name AND n.nspname = current_schema()"), {"name": PARENT_TABLE}).fetchall()
+    return [row[0] for row in rows]
+
+# --- Maintenance ---
+
+def _existing_interval(existing, interval):
+    """
+    The interval of the newest existing partition when it differs from the configured one:
+    day and month ranges overlap, so switching HISTORY_PARTITION_INTERVAL after the
+    migration can't take effect, and creating the configured ranges would fail every run.
+    """
+    named = sorted((name for name in existing if partition_interval(name)), key=lambda name: partition_range(name)[0])
+    if not named or partition_interval(named[-1]) == interval: return interval
+    actual = partition_interval(named[-1])
+    logger.error(f"HISTORY_PARTITION_INTERVAL is '{interval}' but '{PARENT_TABLE}' is partitioned by {actual}; "
+                 f"continuing with '{actual}' partitions.")
+    return actual
+
+def _create_partition(session, name, start, end):
+    """
+    Creates one range partition. Rows already in the default partition for that range
+    (written while it was missing) would make CREATE ... PARTITION OF fail, so they are
+    moved into a detached table first, which is then attached.
+    """
+    # Names come from dates only, bounds are literals (DDL can't take bind parameters)
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    stray = session.execute(text(
+        f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE "timestamp" >= :start AND "timestamp" < :end)'),
+        {"start": start, "end": end}).scalar()
+    if not stray:
+        session.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES {bounds}"))
+        return
+    session.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = session.execute(text(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= :start AND "timestamp" < :end RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved'), {"start": start, "end": end}).rowcount
+    session.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    logger.info(f"Moved {moved} rows from {DEFAULT_PARTITION} into new partition {name}.")
+
+def ensure_partitions(now=None):
+    """Creates the partitions for the current period and HISTORY_PARTITIONS_AHEAD periods ahead. Returns the names created."""
+    if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: return []
+    created = []
+    with session_scope() as session:
+        if session is None: return []
+        if not is_partitioned(session):
+            logger.warning(f"'{PARENT_TABLE}' is not partitioned; run 'alembic upgrade head' to enable partitioning and retention.")
+            return []
+        existing = set(list_partitions(session))
+        if DEFAULT_PARTITION not in existing:
+            session.execute(text(f'CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT'))
+        interval = _existing_interval(existing, _interval())
+        start = period_start(now or datetime.now(timezone.utc), interval)
+        for _ in range(max(0, HISTORY_PARTITIONS_AHEAD) + 1):
+            end = next_period(start, interval)
+            name = partition_name(start, interval)
+            if name not in existing:
+                _create_partition(session, name, start, end)
+                created.append(name)
+            start = end
+    if created: logger.info(f"Created status_history partitions: {', '.join(created)}")
+    return created
+
+def expired_partitions(names, watermarks, cutoff, rollup_cutoff=None):
+    """
+    The partitions among names that end by cutoff and can go: hour and day rollups cover
+    their whole range (rolled_from <= start, end <= rolled_until), or they end by rollup_cutoff,
+    past which the rollups themselves are pruned. Partitions older than the initial rollup
+    backfill (legacy history) are therefore kept until rollup retention expires them.
+    """
+    expired = []
+    for name in sorted(names):
+        bounds = partition_range(name)
+        if bounds is None or bounds[1] > cutoff: continue
+        covered = all(granularity in watermarks and watermarks[granularity][0] <= bounds[0] and bounds[1] <= watermarks[granularity][1]
+                      for granularity in ('hour', 'day'))
+        if covered or (rollup_cutoff is not None and bounds[1] <= rollup_cutoff): expired.append(name)
+    return expired
+
+def drop_expired_partitions(retention_days, rollup_retention_days=0, now=None):
+    """
+    Drops whole raw-history partitions older than retention_days (0 = keep forever).
+    A partition is only dropped once hour and day rollups cover it, so long-window
+    stats keep working after the raw rows are gone (see expired_partitions).
+    """
+    if not retention_days or not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: return []
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=retention_days)
+    rollup_cutoff = period_start(now - timedelta(days=rollup_retention_days), 'day') if rollup_retention_days else None
+    with session_scope() as session:
+        if session is None or not is_partitioned(session): return []
+        watermarks = get_watermarks(session)
+        for granularity in ('hour', 'day'):
+            if granularity not in watermarks: logger.info(f"Retention: '{granularity}' rollups not built yet; keeping raw history partitions they would cover.")
+        dropped = expired_partitions(list_partitions(session), watermarks, cutoff, rollup_cutoff)
+        for name in dropped: session.execute(text(f'DROP TABLE IF EXISTS {name}'))
+    if dropped: logger.info(f"Retention: dropped {len(dropped)} status_history partitions older than {retention_days} days ({', '.join(dropped)}).")
+    return dropped
+
+def prune_rollups(retention_days, now=None):
+    """Deletes hour/day rollups older than retention_days (0 = keep forever)."""
+    if not retention_days or not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: return 0
+    cutoff = period_start((now or datetime.now(timezone.utc)) - timedelta(days=retention_days), 'day')
+    with session_scope() as session:
+        if session is None: return 0
+        result = session.execute(delete(StatusRollup).where(StatusRollup.granularity.in_(('hour', 'day')), StatusRollup.bucket_start < cutoff))
+        for watermark in session.query(RollupWatermark).filter(RollupWatermark.granularity.in_(('hour', 'day'))):
+            if watermark.rolled_from < cutoff: watermark.rolled_from = min(cutoff, watermark.rolled_until)
+        pruned = result.rowcount
+    if pruned: logger.info(f"Retention: deleted {pruned} rollup rows older than {retention_days} days.")
+    return pruned
+
+def maintain_history_storage(state_store_ref):
+    """Maintenance job: keeps future partitions ready and applies the retention policy from global_settings."""
+    global_settings = state_store_ref.snapshot().get("global_settings", {})
+    try:
+        ensure_partitions()
+        rollup_retention_days = int(global_settings.get('rollup_retention_days', DEFAULT_ROLLUP_RETENTION_DAYS))
+        drop_expired_partitions(int(global_settings.get('history_retention_days', DEFAULT_HISTORY_RETENTION_DAYS)), rollup_retention_days)
+        prune_rollups(rollup_retention_days)
+    except Exception as e:
+        logger.error(f"History storage maintenance failed: {e}", exc_info=True)
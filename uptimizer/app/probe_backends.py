@@ -0,0 +1,658 @@
+import os
+import sys
+import math
+import time
+import zlib
+import queue
+import socket
+import pickle
+import asyncio
+import itertools
+import threading
+import subprocess
+import logging
+import http.cookiejar
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+
+# aiohttp is optional: without it the 'aiohttp' backend falls back to 'requests'
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from app.state import (DEFAULT_CHECK_TIMEOUT, DEFAULT_PROBE_BACKEND, DEFAULT_PROBE_PROCESSES,
+                       DEFAULT_MAX_CONCURRENT_CHECKS, DEFAULT_MAX_CHECKS_PER_HOST, PROBE_TIMING_FIELDS,
+                       PROBE_MODES, DEFAULT_PROBE_MODE, DEFAULT_PROBE_MAX_BYTES, ASSERTION_MAX_BODY_BYTES)
+from app.assertions import compiled_assertions
+from app.check_engine import check_engine, _endpoint_host
+
+logger = logging.getLogger(__name__) # Probes run in worker/loop threads without an app context
+
+CHECKER_USER_AGENT = 'UptimizerChecker/1.15.0'
+PROBE_BACKENDS = ('requests', 'aiohttp', 'process')
+DNS_CACHE_TTL_SECONDS = 300
+KEEPALIVE_TIMEOUT_SECONDS = 60
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Probe workers run `python -m app.probe_worker` from here
+
+# --- Shared Helpers ---
+
+def endpoint_timeout(endpoint, global_settings):
+    """Resolves the effective timeout (seconds) for an endpoint: override > global > default."""
+    global_timeout = int(global_settings.get('check_timeout_seconds', DEFAULT_CHECK_TIMEOUT))
+    endpoint_timeout_str = endpoint.get('check_timeout_seconds')
+    try:
+        timeout = int(endpoint_timeout_str) if endpoint_timeout_str is not None else global_timeout
+        return max(1, timeout)
+    except (ValueError, TypeError):
+        return global_timeout
+
+def endpoint_probe_mode(endpoint):
+    """
+    Resolves (probe_mode, max body bytes) for an endpoint. 'get' downloads the whole body (default),
+    'head' sends HEAD, 'headers' closes the connection once the response headers are in and
+    'partial' reads at most probe_max_bytes of the body before closing.
+    """
+    mode = str(endpoint.get('probe_mode') or DEFAULT_PROBE_MODE).lower()
+    if mode not in PROBE_MODES: mode = DEFAULT_PROBE_MODE
+    try: max_bytes = max(1, int(endpoint.get('probe_max_bytes') or DEFAULT_PROBE_MAX_BYTES))
+    except (ValueError, TypeError): max_bytes = DEFAULT_PROBE_MAX_BYTES
+    return mode, max_bytes
+
+def _body_limit(mode, max_bytes, checks):
+    """Body bytes a GET probe reads: probe_max_bytes in 'partial' mode, the assertion cap when assertions look at the body, else all (None)."""
+    if mode == 'partial': return max_bytes
+    return ASSERTION_MAX_BODY_BYTES if checks is not None and checks.needs_body else None
+
+def _limits(global_settings):
+    try: max_total = max(1, int(global_settings.get('max_concurrent_checks', DEFAULT_MAX_CONCURRENT_CHECKS)))
+    except (ValueError, TypeError): max_total = DEFAULT_MAX_CONCURRENT_CHECKS
+    try: max_per_host = max(1, int(global_settings.get('max_checks_per_host', DEFAULT_MAX_CHECKS_PER_HOST)))
+    except (ValueError, TypeError): max_per_host = DEFAULT_MAX_CHECKS_PER_HOST
+    return max_total, max_per_host
+
+def _truncate(msg):
+    return msg[:200] + ("..." if len(msg) > 200 else "")
+
+def probe_result(status, status_code=None, response_time_ms=None, details=None, timings=None):
+    """A check result dict as every probe (HTTP backends, protocol probes, the checker's fallbacks) reports it."""
+    return {"status": status, "status_code": status_code, "response_time_ms": response_time_ms, "details": details, **(timings or {})}
+
+def _http_result(checks, status_code, headers, body, truncated, response_time_ms, timings):
+    """UP for a 2xx/3xx response that passes the endpoint's assertions (if any), else DOWN."""
+    if not 200 <= status_code < 400: return probe_result("DOWN", status_code, response_time_ms, f"HTTP {status_code}", timings)
+    failure = checks.evaluate(headers, body, response_time_ms, truncated) if checks is not None else None
+    if failure: return probe_result("DOWN", status_code, response_time_ms, _truncate(f"Assertion failed: {failure}"), timings)
+    return probe_result("UP", status_code, response_time_ms, None, timings)
+
+
+# --- Phase Timings ---
+# A probe's time split into DNS resolution, TCP connect, TLS handshake, time to first byte
+# (request sent -> response headers) and body transfer, in ms on the monotonic clock, summed
+# over redirect hops. On a completed probe a phase that didn't happen (keep-alive connection
+# reused, cached DNS, plain HTTP) is 0; on a failed one, phases it never reached are None.
+
+def _new_timings():
+    return dict.fromkeys(PROBE_TIMING_FIELDS)
+
+def _add_timing(timings, field, seconds):
+    timings[field] = (timings[field] or 0) + seconds * 1000
+
+def _finish_timings(timings, completed):
+    return {field: round(value) if value is not None else (0 if completed else None) for field, value in timings.items()}
+
+
+# --- requests Backend (thread pool) ---
+
+_probe_local = threading.local() # .timings of the probe running on this thread, read by the timed connections
+
+def _urllib3_supports_timings():
+    """The timed connections hook urllib3 internals (_new_conn, _dns_host, _tunnel_host); check they are still there."""
+    try: conn = HTTPConnection('localhost')
+    except Exception: return False
+    return callable(getattr(HTTPConnection, '_new_conn', None)) and hasattr(conn, '_dns_host') and hasattr(conn, '_tunnel_host')
+
+URLLIB3_PHASE_TIMINGS = _urllib3_supports_timings()
+if not URLLIB3_PHASE_TIMINGS:
+    logger.warning("This urllib3 version lacks the connection internals used for phase timings; "
+                   "the requests backend only records the total response time.")
+
+class _TimedConnectionMixin:
+    """Adds DNS, TCP connect and time-to-first-byte of urllib3 connections to the running probe's timings."""
+
+    def _new_conn(self):
+        timings = getattr(_probe_local, 'timings', None)
+        if timings is None or self._tunnel_host: return super()._new_conn() # Not a probe, or via a proxy tunnel
+        self._socket_seconds = None
+        started = time.perf_counter()
+        # Resolve here (timed on its own), then let urllib3 connect to each address in turn like create_connection does
+        try: addresses = socket.getaddrinfo(self._dns_host.strip('[]'), self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror as e: raise NewConnectionError(self, f"Failed to resolve '{self.host}' ({e})") from e
+        finally: _add_timing(timings, 'dns_ms', time.perf_counter() - started)
+        resolved, dns_host, error = time.perf_counter(), self._dns_host, None
+        try:
+            for *_, sockaddr in addresses:
+                self._dns_host = sockaddr[0]
+                try:
+                    sock = super()._new_conn()
+                    self._socket_seconds = time.perf_counter() - started
+                    return sock
+                except (NewConnectionError, ConnectTimeoutError) as e: error = e
+            raise error
+        finally:
+            self._dns_host = dns_host
+            _add_timing(timings, 'connect_ms', time.perf_counter() - resolved)
+
+    def getresponse(self, *args, **kwargs):
+        timings = getattr(_probe_local, 'timings', None)
+        started = time.perf_counter()
+        try: return super().getresponse(*args, **kwargs)
+        finally:
+            if timings is not None: _add_timing(timings, 'ttfb_ms', time.perf_counter() - started)
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        timings = getattr(_probe_local, 'timings', None)
+        self._socket_seconds = None
+        started = time.perf_counter()
+        try: super().connect()
+        finally: # The TLS handshake is what connect() spends beyond opening the socket
+            if timings is not None and self._socket_seconds is not None:
+                _add_timing(timings, 'tls_ms', time.perf_counter() - started - self._socket_seconds)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose (direct) connections record phase timings for the probe running on the thread."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        if URLLIB3_PHASE_TIMINGS: self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool, 'https': _TimedHTTPSConnectionPool}
+
+
+class RequestsProbeBackend:
+    """Blocking probes on the CheckEngine thread pool, one keep-alive requests.Session per worker thread."""
+    name = 'requests'
+
+    def __init__(self):
+        self._local = threading.local()
+        self._pool_maxsize = DEFAULT_MAX_CHECKS_PER_HOST
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None or getattr(self._local, 'pool_maxsize', None) != self._pool_maxsize:
+            session = requests.Session()
+            # Pooled across every endpoint: a Set-Cookie from one check must not be sent with the next
+            session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+            adapter = TimedHTTPAdapter(pool_connections=100, pool_maxsize=self._pool_maxsize, max_retries=0)
+            session.mount('http://', adapter); session.mount('https://', adapter)
+            session.headers['User-Agent'] = CHECKER_USER_AGENT
+            self._local.session = session
+            self._local.pool_maxsize = self._pool_maxsize
+        return session
+
+    def check(self, endpoint, global_settings):
+        """Performs an HTTP check (per probe_mode, plus any assertions) on a single *local* endpoint."""
+        url = endpoint.get('url')
+        if not url: return {"status": "ERROR", "details": "Missing URL"}
+        timeout = endpoint_timeout(endpoint, global_settings)
+        mode, max_bytes = endpoint_probe_mode(endpoint)
+        try: checks = compiled_assertions(endpoint.get('assertions'))
+        except ValueError as e: return probe_result("ERROR", details=_truncate(f"Invalid assertions: {e}"))
+        keep_body = checks is not None and checks.needs_body
+
+        timings = _new_timings()
+        if URLLIB3_PHASE_TIMINGS: _probe_local.timings = timings
+        start_time = time.perf_counter()
+        try:
+            if mode == 'head': response = self._session().head(url, timeout=timeout, allow_redirects=True)
+            else: response = self._session().get(url, timeout=timeout, allow_redirects=True, stream=True)
+            # Read the body ourselves so its transfer time is measured on its own. Closing a response
+            # whose body wasn't read to the end drops its connection instead of draining it.
+            with response:
+                body, truncated = None, False
+                if mode in ('get', 'partial'):
+                    body_started = time.perf_counter()
+                    limit = _body_limit(mode, max_bytes, checks)
+                    if limit is None: response.content
+                    else:
+                        chunks, received = [], 0
+                        for chunk in response.iter_content(chunk_size=min(limit, 16384)):
+                            received += len(chunk)
+                            if keep_body: chunks.append(chunk)
+                            if received >= limit: break
+                        if keep_body: body, truncated = b''.join(chunks)[:limit], received >= limit
+                    _add_timing(timings, 'transfer_ms', time.perf_counter() - body_started)
+            response_time_ms = round((time.perf_counter() - start_time) * 1000)
+            return _http_result(checks, response.status_code, response.headers, body, truncated,
+                                response_time_ms, self._timings(timings, True))
+        except requests.exceptions.Timeout: return probe_result("DOWN", details=f"Timeout >{timeout}s", timings=self._timings(timings, False))
+        except requests.exceptions.TooManyRedirects: return probe_result("DOWN", details="Too many redirects", timings=self._timings(timings, False))
+        except requests.exceptions.ConnectionError: return probe_result("DOWN", details="Connection error", timings=self._timings(timings, False))
+        except requests.exceptions.RequestException as e: return probe_result("DOWN", details=_truncate(str(e)), timings=self._timings(timings, False))
+        except Exception as e:
+            logger.error(f"Check error for {url}: {e}", exc_info=True)
+            return probe_result("ERROR", details="Check error")
+        finally: _probe_local.timings = None
+
+    @staticmethod
+    def _timings(timings, completed):
+        # Without the timed connections nothing was measured: report no phases rather than zeros
+        return _finish_timings(timings, completed) if URLLIB3_PHASE_TIMINGS else _new_timings()
+
+    def run_batch(self, endpoints, global_settings):
+        """Yields (endpoint, result) as checks complete."""
+        self._pool_maxsize = _limits(global_settings)[1]
+        check_engine.configure(global_settings)
+        yield from check_engine.run(endpoints, self.check, global_settings)
+
+    def shutdown(self):
+        pass # Thread-local sessions die with the engine's worker threads
+
+
+# --- aiohttp Backend (event loop thread) ---
+
+class AsyncLoopRunner:
+    """Owns an asyncio event loop running in a dedicated daemon thread."""
+
+    def __init__(self, name):
+        self._name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self._name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro):
+        """Schedules a coroutine on the loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None: thread.join(timeout=5)
+        if loop is not None and not loop.is_running():
+            loop.close()
+
+
+def _timing_trace_config():
+    """
+    aiohttp request tracing that fills the timings dict passed as trace_request_ctx. aiohttp opens
+    TCP and TLS in one step, so the TLS handshake is part of connect_ms and tls_ms stays None.
+    """
+    async def dns_start(session, ctx, params): ctx.dns_started = time.perf_counter()
+    async def dns_end(session, ctx, params):
+        _add_timing(ctx.trace_request_ctx, 'dns_ms', time.perf_counter() - ctx.dns_started)
+        ctx.dns_started = None
+    async def connect_start(session, ctx, params):
+        ctx.connect_started, ctx.dns_before = time.perf_counter(), ctx.trace_request_ctx['dns_ms'] or 0
+    async def connect_end(session, ctx, params): # Connection setup minus the DNS lookup done inside it
+        dns_seconds = ((ctx.trace_request_ctx['dns_ms'] or 0) - ctx.dns_before) / 1000
+        _add_timing(ctx.trace_request_ctx, 'connect_ms', time.perf_counter() - ctx.connect_started - dns_seconds)
+        ctx.connect_started = None
+    async def failed(session, ctx, params): # The phase that was running when the request failed still counts
+        if getattr(ctx, 'dns_started', None) is not None: await dns_end(session, ctx, params)
+        elif getattr(ctx, 'connect_started', None) is not None: await connect_end(session, ctx, params)
+        else: await response_started(session, ctx, params) # Timed out waiting for the response headers
+    async def headers_sent(session, ctx, params): ctx.sent = time.perf_counter()
+    async def response_started(session, ctx, params): # Final response (request_end) or a redirect hop
+        if getattr(ctx, 'sent', None) is not None:
+            _add_timing(ctx.trace_request_ctx, 'ttfb_ms', time.perf_counter() - ctx.sent)
+            ctx.sent = None
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_dns_resolvehost_start.append(dns_start)
+    trace_config.on_dns_resolvehost_end.append(dns_end)
+    trace_config.on_connection_create_start.append(connect_start)
+    trace_config.on_connection_create_end.append(connect_end)
+    trace_config.on_request_headers_sent.append(headers_sent)
+    trace_config.on_request_redirect.append(response_started)
+    trace_config.on_request_end.append(response_started)
+    trace_config.on_request_exception.append(failed)
+    return trace_config
+
+
+class AiohttpProbeBackend:
+    """
+    Non-blocking probes on a single event loop. One shared ClientSession keeps
+    pooled keep-alive connections per origin, caches DNS results and reuses one
+    SSL context, so repeat checks skip the TCP/TLS handshake.
+    """
+    name = 'aiohttp'
+
+    def __init__(self):
+        self._runner = AsyncLoopRunner("uptimizer-probe-loop")
+        self._session = None
+        self._semaphore = None
+        self._limits = None
+        self._session_lock = None
+        self._batches = {} # session -> batches still running on it; a replaced session closes when its last one ends
+
+    async def _acquire_session(self, limits):
+        """
+        The (session, semaphore) a batch runs on, creating (or re-creating after a limit change)
+        the pooled session. Batches already running keep theirs until they finish. Runs on the loop.
+        """
+        if self._session_lock is None: self._session_lock = asyncio.Lock()
+        async with self._session_lock:
+            await self._open_session(limits)
+            session, semaphore = self._session, self._semaphore
+        self._batches[session] = self._batches.get(session, 0) + 1
+        return session, semaphore
+
+    async def _release_session(self, session):
+        self._batches[session] -= 1
+        if self._batches[session]: return
+        del self._batches[session]
+        if session is not self._session and not session.closed: await session.close()
+
+    async def _open_session(self, limits):
+        if self._session is not None and not self._session.closed and limits == self._limits:
+            return
+        if self._session is not None and not self._session.closed and not self._batches.get(self._session):
+            await self._session.close() # Otherwise the last batch still using it closes it
+        max_total, max_per_host = limits
+        connector = aiohttp.TCPConnector(limit=max_total, limit_per_host=max_per_host,
+                                         ttl_dns_cache=DNS_CACHE_TTL_SECONDS,
+                                         keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS)
+        self._session = aiohttp.ClientSession(connector=connector, headers={'User-Agent': CHECKER_USER_AGENT},
+                                              cookie_jar=aiohttp.DummyCookieJar(), # No cookies carried between checks
+                                              trace_configs=[_timing_trace_config()])
+        self._semaphore = asyncio.Semaphore(max_total)
+        self._limits = limits
+        logger.info(f"aiohttp probe session ready (limit={max_total}, limit_per_host={max_per_host}).")
+
+    async def _check(self, session, endpoint, global_settings):
+        url = endpoint.get('url')
+        if not url: return {"status": "ERROR", "details": "Missing URL"}
+        timeout = endpoint_timeout(endpoint, global_settings)
+        # Mirrors requests' (connect, read) timeout semantics rather than a total deadline
+        client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+        mode, max_bytes = endpoint_probe_mode(endpoint)
+        try: checks = compiled_assertions(endpoint.get('assertions'))
+        except ValueError as e: return probe_result("ERROR", details=_truncate(f"Invalid assertions: {e}"))
+        keep_body = checks is not None and checks.needs_body
+        timings = _new_timings()
+        start_time = time.perf_counter()
+        try:
+            send = session.head if mode == 'head' else session.get
+            async with send(url, timeout=client_timeout, allow_redirects=True, trace_request_ctx=timings) as response:
+                body, truncated = None, False
+                if mode in ('get', 'partial'):
+                    body_started = time.perf_counter()
+                    limit = _body_limit(mode, max_bytes, checks)
+                    if limit is None: await response.read() # Download the body, like requests does without streaming
+                    else:
+                        chunks, received = [], 0
+                        while received < limit:
+                            chunk = await response.content.read(limit - received)
+                            if not chunk: break
+                            received += len(chunk)
+                            if keep_body: chunks.append(chunk)
+                        if keep_body: body, truncated = b''.join(chunks), received >= limit
+                    _add_timing(timings, 'transfer_ms', time.perf_counter() - body_started)
+                if mode != 'head' and not response.content.at_eof():
+                    response.close() # Drop the connection rather than drain the rest of the body
+                response_time_ms = round((time.perf_counter() - start_time) * 1000)
+                return _http_result(checks, response.status, response.headers, body, truncated,
+                                    response_time_ms, self._timings(timings, True))
+        except asyncio.TimeoutError: return probe_result("DOWN", details=f"Timeout >{timeout}s", timings=self._timings(timings, False))
+        except aiohttp.TooManyRedirects: return probe_result("DOWN", details="Too many redirects", timings=self._timings(timings, False))
+        except aiohttp.ClientConnectionError: return probe_result("DOWN", details="Connection error", timings=self._timings(timings, False))
+        except aiohttp.ClientError as e: return probe_result("DOWN", details=_truncate(str(e) or type(e).__name__), timings=self._timings(timings, False))
+        except Exception as e:
+            logger.error(f"Check error for {url}: {e}", exc_info=True)
+            return probe_result("ERROR", details="Check error")
+
+    @staticmethod
+    def _timings(timings, completed):
+        return {**_finish_timings(timings, completed), 'tls_ms': None} # Not measurable here (see _timing_trace_config)
+
+    def run_batch(self, endpoints, global_settings):
+        """Yields (endpoint, result) in completion order, in the caller's thread."""
+        if not endpoints: return
+        results = queue.Queue()
+
+        async def check_one(session, semaphore, endpoint):
+            try:
+                async with semaphore:
+                    result = await self._check(session, endpoint, global_settings)
+            except Exception as e: # Never lose a result, the consumer counts them
+                logger.error(f"aiohttp probe failed for {endpoint.get('id')}: {e}", exc_info=True)
+                result = probe_result("ERROR", details="Check error")
+            results.put((endpoint, result))
+
+        async def check_all():
+            session, semaphore = await self._acquire_session(_limits(global_settings))
+            try: await asyncio.gather(*(check_one(session, semaphore, ep) for ep in endpoints))
+            finally: await self._release_session(session)
+
+        batch = self._runner.submit(check_all())
+        for _ in range(len(endpoints)):
+            while True:
+                try:
+                    yield results.get(timeout=1)
+                    break
+                except queue.Empty:
+                    if batch.done() and batch.exception() is not None:
+                        raise batch.exception() # Session setup failed; nothing else will arrive
+        batch.result() # Finishes right after the last result, once the batch has released its session
+
+    async def _close_sessions(self):
+        for session in {self._session, *self._batches}:
+            if session is not None and not session.closed: await session.close()
+
+    def shutdown(self):
+        if self._session is not None or self._batches:
+            try: self._runner.submit(self._close_sessions()).result(timeout=5)
+            except Exception as e: logger.warning(f"Error closing aiohttp probe session: {e}")
+        self._session = None
+        self._session_lock = None
+        self._batches = {}
+        self._runner.stop()
+
+
+# --- Multi-process Backend (probe worker processes) ---
+
+def probe_process_count(global_settings):
+    """Worker processes for the 'process' backend: global_settings['probe_processes'], 0 = one per CPU core."""
+    try: processes = int(global_settings.get('probe_processes', DEFAULT_PROBE_PROCESSES))
+    except (ValueError, TypeError): processes = DEFAULT_PROBE_PROCESSES
+    return processes if processes > 0 else (os.cpu_count() or 1)
+
+def partition_by_host(endpoints, partitions):
+    """
+    Splits endpoints into `partitions` lists by a stable hash of their host, so all checks
+    against one host run in the same process (its per-host limit and keep-alive pool stay
+    in one place) and a host keeps its process from batch to batch.
+    """
+    parts = [[] for _ in range(max(1, partitions))]
+    for ep in endpoints:
+        parts[zlib.crc32(_endpoint_host(ep).encode('utf-8')) % len(parts)].append(ep)
+    return parts
+
+
+class ProbeWorkerProcess:
+    """
+    One `python -m app.probe_worker` child process. Requests are pickled over its stdin and
+    results stream back over its stdout, so several batches can be in flight on one process.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._process = subprocess.Popen([sys.executable, '-m', 'app.probe_worker'], cwd=PROJECT_ROOT,
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = {} # request id -> (results queue, tag)
+        self._closed = False # Result stream ended; no more requests are accepted
+        self._request_ids = itertools.count(1)
+        self._reader = threading.Thread(target=self._read, name=f"uptimizer-probe-worker-{index}", daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self):
+        with self._lock: closed = self._closed
+        return not closed and self._process.poll() is None
+
+    def submit(self, tag, endpoints, global_settings, results):
+        """Sends one request. results receives (tag, position, result) per check, then (tag, None, None) when it ends."""
+        request_id = next(self._request_ids)
+        with self._lock:
+            if self._closed: raise RuntimeError(f"probe worker {self.index} has exited")
+            self._pending[request_id] = (results, tag)
+        try:
+            with self._write_lock:
+                pickle.dump((request_id, endpoints, global_settings), self._process.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+                self._process.stdin.flush()
+        except Exception:
+            with self._lock: self._pending.pop(request_id, None)
+            raise
+
+    def _read(self):
+        try:
+            while True:
+                request_id, position, result = pickle.load(self._process.stdout)
+                with self._lock:
+                    target = self._pending.get(request_id) if position is not None else self._pending.pop(request_id, None)
+                if target is not None: target[0].put((target[1], position, result))
+        except Exception as e: # EOF: the process exited
+            if not isinstance(e, EOFError): logger.error(f"Probe worker {self.index}: unreadable result stream: {e}")
+        finally:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._closed = True
+            if pending: logger.error(f"Probe worker {self.index} (pid {self._process.pid}) exited with {len(pending)} requests in flight.")
+            for results, tag in pending.values(): results.put((tag, None, None))
+
+    def stop(self, timeout=5):
+        """Closes stdin (the worker finishes in-flight requests and exits), killing it after timeout."""
+        try: self._process.stdin.close()
+        except Exception: pass
+        try: self._process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._reader.join(timeout=timeout)
+
+
+class ProcessPoolProbeBackend:
+    """
+    Fans checks out to probe worker processes so throughput scales with CPU cores (TLS
+    handshakes, response parsing and the event loop itself are CPU-bound in one process).
+    Each worker runs its own event loop ('aiohttp', or 'requests' when aiohttp is missing);
+    endpoints are assigned to workers by host (partition_by_host) and max_concurrent_checks
+    is split evenly between them. Results are merged back in completion order. A worker that
+    dies fails its in-flight checks with ERROR and is restarted by the next batch.
+    """
+    name = 'process'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def _pool(self, processes):
+        with self._lock:
+            for worker in self._workers[processes:]: worker.stop()
+            workers = self._workers[:processes]
+            for index, worker in enumerate(workers):
+                if not worker.alive:
+                    logger.warning(f"Probe worker {index} is not running, restarting it.")
+                    worker.stop(timeout=1)
+                    workers[index] = ProbeWorkerProcess(index)
+            while len(workers) < processes: workers.append(ProbeWorkerProcess(len(workers)))
+            if len(workers) != len(self._workers): logger.info(f"Probe process pool ready ({processes} worker processes).")
+            self._workers = workers
+            return list(workers)
+
+    def run_batch(self, endpoints, global_settings):
+        """Yields (endpoint, result) in completion order, in the caller's thread."""
+        if not endpoints: return
+        workers = self._pool(probe_process_count(global_settings))
+        max_total, _ = _limits(global_settings)
+        worker_settings = {**global_settings, 'probe_backend': 'aiohttp' if aiohttp is not None else 'requests',
+                           'max_concurrent_checks': math.ceil(max_total / len(workers))}
+
+        parts = partition_by_host(endpoints, len(workers))
+        results = queue.Queue()
+        outstanding = {}
+        for index, part in enumerate(parts):
+            if not part: continue
+            try:
+                workers[index].submit(index, part, worker_settings, results)
+                outstanding[index] = set(range(len(part)))
+            except Exception as e:
+                logger.error(f"Probe worker {index}: could not send {len(part)} checks: {e}")
+                for endpoint in part: yield endpoint, probe_result("ERROR", details="Check error")
+
+        while outstanding:
+            index, position, result = results.get()
+            if position is not None:
+                outstanding[index].discard(position)
+                yield parts[index][position], result
+                continue
+            for position in outstanding.pop(index): # Request ended early (worker failed or died)
+                yield parts[index][position], probe_result("ERROR", details="Check error")
+
+    def shutdown(self):
+        with self._lock: workers, self._workers = self._workers, []
+        for worker in workers: worker.stop()
+
+
+# --- Backend Selection ---
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_probe_backend(global_settings):
+    """Returns the backend selected by global_settings['probe_backend'] (shared instance)."""
+    name = global_settings.get('probe_backend', DEFAULT_PROBE_BACKEND)
+    if name not in PROBE_BACKENDS:
+        logger.warning(f"Unknown probe_backend '{name}', using '{DEFAULT_PROBE_BACKEND}'.")
+        name = DEFAULT_PROBE_BACKEND
+    if name == 'aiohttp' and aiohttp is None:
+        logger.warning("probe_backend 'aiohttp' selected but aiohttp is not installed, using 'requests'.")
+        name = 'requests'
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backend = {'requests': RequestsProbeBackend, 'aiohttp': AiohttpProbeBackend,
+                       'process': ProcessPoolProbeBackend}[name]()
+            _backends[name] = backend
+        return backend
+
+def shutdown_probe_backends():
+    """Closes pooled sessions, stops the probe loop and probe worker processes (called from main.cleanup)."""
+    with _backends_lock:
+        backends = list(_backends.values())
+        _backends.clear()
+    for backend in backends:
+        try: backend.shutdown()
+        except Exception as e: logger.error(f"Error shutting down probe backend '{backend.name}': {e}", exc_info=True)
@@ -0,0 +1,59 @@
+# Probe worker process for the 'process' probe backend (started by probe_backends, not by hand).
+# Reads pickled (request_id, endpoints, global_settings) requests from stdin, runs each on this
+# process's own probe backend and writes (request_id, position, result) to stdout per finished
+# check, then (request_id, None, None). Exits once stdin closes and in-flight requests are done.
+import os
+import sys
+import pickle
+import signal
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# The pipe carries pickled results only; module-level prints (app.state) go to stderr
+results_out = sys.stdout.buffer
+sys.stdout = sys.stderr
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path: sys.path.insert(0, project_root)
+
+from app.probe_backends import get_probe_backend, shutdown_probe_backends
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_REQUESTS = 8 # Batches the parent may have in flight on one worker
+
+
+def main():
+    requests_in = sys.stdin.buffer
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C reaches the whole process group; the parent closes our stdin instead
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s %(levelname)s [probe-worker {os.getpid()}] %(message)s')
+    write_lock = threading.Lock()
+
+    def send(item):
+        with write_lock:
+            pickle.dump(item, results_out, protocol=pickle.HIGHEST_PROTOCOL)
+            results_out.flush()
+
+    def run(request_id, endpoints, global_settings):
+        positions = {id(ep): position for position, ep in enumerate(endpoints)}
+        try:
+            for endpoint, result in get_probe_backend(global_settings).run_batch(endpoints, global_settings):
+                send((request_id, positions[id(endpoint)], result))
+        except Exception as e: # The parent reports checks without a result as ERROR
+            logger.error(f"Probe request {request_id} failed: {e}", exc_info=True)
+        finally:
+            try: send((request_id, None, None))
+            except Exception: pass # Parent gone
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="uptimizer-probe-request") as executor:
+        while True:
+            try: request = pickle.load(requests_in)
+            except EOFError: break
+            executor.submit(run, *request)
+    shutdown_probe_backends()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
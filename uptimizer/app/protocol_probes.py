@@ -0,0 +1,230 @@
+import ssl
+import time
+import queue
+import socket
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit, parse_qs
+
+from app.state import MAX_CONCURRENT_PROTOCOL_PROBES, DEFAULT_TLS_MIN_VALID_DAYS
+from app.probe_backends import (AsyncLoopRunner, endpoint_timeout, probe_result, _truncate,
+                                _new_timings, _add_timing, _finish_timings)
+from app.assertions import compiled_assertions
+
+logger = logging.getLogger(__name__) # Probes run on the protocol probe loop thread
+
+# Lightweight non-HTTP probes, selected by the scheme of the endpoint URL:
+#   tcp://host:port                          TCP connect, then close
+#   tls://host[:443][?min_days=14]           verified TLS handshake; DOWN once the certificate expires within min_days
+#   dns://hostname[?expect=10.0.0.5,...]     the name resolves (to one of the expected addresses)
+#   udp://host:port[?payload=ping&expect=]   a datagram gets a reply containing expect (default: the payload, i.e. echo)
+# Every probe is a coroutine on one shared event loop, so thousands of ports cost a socket
+# each instead of a pool thread and an HTTP request each. More types register with @probe_type.
+
+ProbeTarget = namedtuple('ProbeTarget', 'scheme host port params')
+PROBE_TYPES = {} # URL scheme -> (default port or None if the URL must name one, async probe(target, timings))
+
+
+class ProbeFailed(Exception):
+    """The target answered, but not well enough: the check is DOWN with str(e) as details."""
+
+
+def probe_type(scheme, default_port=None):
+    """Registers `async probe(target, timings)` for URLs with this scheme; it returns the UP details (or None) or raises."""
+    def register(probe):
+        PROBE_TYPES[scheme] = (default_port, probe)
+        return probe
+    return register
+
+def is_protocol_endpoint(endpoint):
+    return (endpoint.get('url') or '').split('://', 1)[0].lower() in PROBE_TYPES
+
+def parse_target(url):
+    """Parses a protocol probe URL into a ProbeTarget. Raises ValueError."""
+    parts = urlsplit((url or '').strip())
+    scheme = parts.scheme.lower()
+    if scheme not in PROBE_TYPES: raise ValueError(f"unknown probe type '{scheme}'")
+    if not parts.hostname: raise ValueError(f"{scheme}:// needs a host")
+    try: port = parts.port or PROBE_TYPES[scheme][0]
+    except ValueError: raise ValueError("invalid port") from None
+    if port is None: raise ValueError(f"{scheme}:// needs a port")
+    return ProbeTarget(scheme, parts.hostname, port, {key: values[-1] for key, values in parse_qs(parts.query).items()})
+
+def protocol_endpoint_error(endpoint):
+    """Config error of a protocol probe endpoint, or None (also for HTTP endpoints)."""
+    if not is_protocol_endpoint(endpoint): return None
+    try: parse_target(endpoint.get('url'))
+    except ValueError as e: return f"invalid target: {e}"
+    if any(assertion.get('type') != 'max_latency_ms' for assertion in endpoint.get('assertions') or ()):
+        return "protocol probes only support max_latency_ms assertions"
+    return None
+
+
+# --- Probe Types ---
+
+async def _open_socket(host, port, kind, timings):
+    """Resolves (dns_ms), then connects a non-blocking socket to each address in turn (connect_ms)."""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try: addresses = await loop.getaddrinfo(host, port, type=kind)
+    finally: _add_timing(timings, 'dns_ms', time.perf_counter() - started)
+    resolved, error = time.perf_counter(), None
+    try:
+        for family, sock_type, proto, _, sockaddr in addresses:
+            sock = socket.socket(family, sock_type, proto)
+            sock.setblocking(False)
+            try: await loop.sock_connect(sock, sockaddr)
+            except OSError as e:
+                sock.close(); error = e
+                continue
+            except BaseException: # Cancelled by the timeout
+                sock.close()
+                raise
+            return sock
+        raise error or OSError(f"No addresses found for {host}")
+    finally: _add_timing(timings, 'connect_ms', time.perf_counter() - resolved)
+
+
+@probe_type('tcp')
+async def tcp_probe(target, timings):
+    (await _open_socket(target.host, target.port, socket.SOCK_STREAM, timings)).close()
+    return None
+
+
+_ssl_context = None
+_ssl_context_lock = threading.Lock()
+
+def _tls_context():
+    """One verifying client context for every tls:// probe (loading the CA store is the slow part)."""
+    global _ssl_context
+    with _ssl_context_lock:
+        if _ssl_context is None: _ssl_context = ssl.create_default_context()
+        return _ssl_context
+
+@probe_type('tls', default_port=443)
+async def tls_probe(target, timings):
+    sock = await _open_socket(target.host, target.port, socket.SOCK_STREAM, timings)
+    started = time.perf_counter()
+    try: _, writer = await asyncio.open_connection(sock=sock, ssl=_tls_context(), server_hostname=target.host)
+    except ssl.SSLCertVerificationError as e:
+        sock.close()
+        raise ProbeFailed(_truncate(f"Certificate invalid: {e.verify_message or e}")) from None
+    except BaseException:
+        sock.close()
+        raise
+    finally: _add_timing(timings, 'tls_ms', time.perf_counter() - started)
+    try: not_after = writer.get_extra_info('peercert')['notAfter']
+    finally: writer.transport.abort() # No close_notify round trip
+    try: min_days = int(target.params.get('min_days', DEFAULT_TLS_MIN_VALID_DAYS))
+    except ValueError: min_days = DEFAULT_TLS_MIN_VALID_DAYS
+    days_left = int((ssl.cert_time_to_seconds(not_after) - time.time()) // 86400)
+    if days_left < min_days: raise ProbeFailed(f"Certificate expires in {days_left} days ({not_after})")
+    return f"Certificate valid for {days_left} days"
+
+
+@probe_type('dns', default_port=0) # The port is not used
+async def dns_probe(target, timings):
+    started = time.perf_counter()
+    try: addresses = await asyncio.get_running_loop().getaddrinfo(target.host, None, type=socket.SOCK_STREAM)
+    finally: _add_timing(timings, 'dns_ms', time.perf_counter() - started)
+    resolved = sorted({sockaddr[0] for *_, sockaddr in addresses})
+    expected = {address.strip() for address in target.params.get('expect', '').split(',') if address.strip()}
+    if expected and not expected.intersection(resolved):
+        raise ProbeFailed(_truncate(f"Resolved to {', '.join(resolved)}, expected {', '.join(sorted(expected))}"))
+    return None
+
+
+@probe_type('udp')
+async def udp_probe(target, timings):
+    payload = target.params.get('payload', 'ping').encode('utf-8')
+    expected = target.params['expect'].encode('utf-8') if 'expect' in target.params else payload
+    sock = await _open_socket(target.host, target.port, socket.SOCK_DGRAM, timings)
+    loop = asyncio.get_running_loop()
+    try:
+        started = time.perf_counter()
+        await loop.sock_sendall(sock, payload)
+        try: reply = await loop.sock_recv(sock, 65535)
+        except ConnectionRefusedError: raise ProbeFailed("Port unreachable") from None
+        finally: _add_timing(timings, 'ttfb_ms', time.perf_counter() - started)
+    finally: sock.close()
+    if expected not in reply: raise ProbeFailed(_truncate(f"Unexpected reply {reply[:60]!r}"))
+    return None
+
+
+# --- Runner ---
+
+class ProtocolProber:
+    """
+    Runs protocol probes as coroutines on a dedicated event loop thread, at most
+    MAX_CONCURRENT_PROTOCOL_PROBES at a time, next to (not inside) the HTTP probe backend.
+    A probe's check timeout is a deadline for the whole probe.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_PROTOCOL_PROBES):
+        self._runner = AsyncLoopRunner("uptimizer-protocol-probe-loop")
+        self._max_concurrent = max(1, max_concurrent)
+        self._semaphore = None
+
+    async def check(self, endpoint, global_settings):
+        try:
+            target = parse_target(endpoint.get('url'))
+            checks = compiled_assertions(endpoint.get('assertions'))
+        except ValueError as e: return probe_result("ERROR", details=_truncate(f"Invalid target: {e}"))
+        timeout = endpoint_timeout(endpoint, global_settings)
+        timings = _new_timings()
+        start_time = time.perf_counter()
+        try: details = await asyncio.wait_for(PROBE_TYPES[target.scheme][1](target, timings), timeout)
+        except ProbeFailed as e: return probe_result("DOWN", details=str(e), timings=_finish_timings(timings, False))
+        except asyncio.TimeoutError: return probe_result("DOWN", details=f"Timeout >{timeout}s", timings=_finish_timings(timings, False))
+        except socket.gaierror as e: return probe_result("DOWN", details=_truncate(f"DNS error: {e.strerror or e}"), timings=_finish_timings(timings, False))
+        except ConnectionRefusedError: return probe_result("DOWN", details="Connection refused", timings=_finish_timings(timings, False))
+        except OSError as e: return probe_result("DOWN", details=_truncate(str(e) or type(e).__name__), timings=_finish_timings(timings, False))
+        except Exception as e:
+            logger.error(f"Check error for {endpoint.get('url')}: {e}", exc_info=True)
+            return probe_result("ERROR", details="Check error")
+        response_time_ms = round((time.perf_counter() - start_time) * 1000)
+        failure = checks.evaluate({}, None, response_time_ms) if checks is not None else None # Only max_latency_ms applies
+        if failure: return probe_result("DOWN", None, response_time_ms, _truncate(f"Assertion failed: {failure}"), _finish_timings(timings, True))
+        return probe_result("UP", None, response_time_ms, details, _finish_timings(timings, True))
+
+    def run(self, endpoints, global_settings):
+        """Starts the probes right away; returns an iterator of (endpoint, result) in completion order."""
+        if not endpoints: return iter(())
+        results = queue.Queue()
+
+        async def check_one(endpoint):
+            try:
+                async with self._semaphore:
+                    result = await self.check(endpoint, global_settings)
+            except Exception as e: # Never lose a result, the consumer counts them
+                logger.error(f"Protocol probe failed for {endpoint.get('id')}: {e}", exc_info=True)
+                result = probe_result("ERROR", details="Check error")
+            results.put((endpoint, result))
+
+        async def check_all():
+            if self._semaphore is None: self._semaphore = asyncio.Semaphore(self._max_concurrent)
+            await asyncio.gather(*(check_one(ep) for ep in endpoints))
+
+        return self._results(results, len(endpoints), self._runner.submit(check_all()))
+
+    @staticmethod
+    def _results(results, count, batch):
+        for _ in range(count):
+            while True:
+                try:
+                    yield results.get(timeout=1)
+                    break
+                except queue.Empty:
+                    if batch.done() and batch.exception() is not None:
+                        raise batch.exception()
+        batch.result() # Finishes right after the last result; the loop is then idle for shutdown()
+
+    def shutdown(self):
+        self._runner.stop()
+        self._semaphore = None
+
+
+# Shared prober; run_checks_task sends it the tcp/tls/dns/udp endpoints of each batch
+protocol_prober = ProtocolProber()
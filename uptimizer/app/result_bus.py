@@ -0,0 +1,120 @@
+import json
+import uuid
+import select
+import threading
+import logging
+from sqlalchemy import text
+
+from app import models
+from app.models import session_scope
+
+logger = logging.getLogger(__name__) # Listener runs in its own thread
+
+RESULTS_CHANNEL = 'uptimizer_results' # Checker worker -> web tier: check results
+CONFIG_CHANNEL = 'uptimizer_config'   # Web tier -> checker worker and web peers: config.json/journal changed
+MAX_PAYLOAD_BYTES = 7000  # Postgres caps NOTIFY payloads at 8000 bytes
+MAX_DETAILS_CHARS = 1000  # Keeps one result well inside a payload
+RECONNECT_DELAY_SECONDS = (1, 30)
+PROCESS_ID = uuid.uuid4().hex # Lets a process recognize (and skip) its own config notifications
+
+
+def _payloads(results):
+    """Packs results into JSON payloads under MAX_PAYLOAD_BYTES: {"results": [...]}."""
+    chunk, size = [], 0
+    for result in results:
+        status = result.get("status") or {}
+        if isinstance(status.get("details"), str) and len(status["details"]) > MAX_DETAILS_CHARS:
+            result = {**result, "status": {**status, "details": status["details"][:MAX_DETAILS_CHARS] + "..."}}
+        encoded = json.dumps(result, separators=(',', ':'), default=str)
+        if chunk and size + len(encoded) + 16 > MAX_PAYLOAD_BYTES:
+            yield '{"results":[' + ','.join(chunk) + ']}'
+            chunk, size = [], 0
+        chunk.append(encoded)
+        size += len(encoded) + 1
+    if chunk: yield '{"results":[' + ','.join(chunk) + ']}'
+
+
+def notify(channel, payloads):
+    """Sends payloads on a channel in one transaction (delivered together, in order, on commit). Returns False if the DB is unavailable."""
+    if not models.ENGINE_INITIALIZED: return False
+    try:
+        with session_scope() as session:
+            if session is None: return False
+            for payload in payloads: session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+        return True
+    except Exception as e:
+        logger.error(f"Result bus: NOTIFY on '{channel}' failed: {e}")
+        return False
+
+
+def publish_results(results):
+    """Checker worker: sends one batch of check results to every listening web process."""
+    if not results: return True
+    return notify(RESULTS_CHANNEL, list(_payloads(results)))
+
+
+def publish_config_changed():
+    """Web tier: tells checker workers and the other web processes to reload the config (journal already fsynced)."""
+    return notify(CONFIG_CHANNEL, [json.dumps({"source": PROCESS_ID})])
+
+
+class NotificationListener:
+    """
+    LISTENs on Postgres channels over a dedicated connection (outside the pool) and calls
+    handler(channel, payload) in its own thread. Notifications sent while disconnected are
+    lost, so on_connect() is called after every (re)connect to resynchronize another way.
+    """
+
+    def __init__(self, channels, handler, on_connect=None, name="uptimizer-listener"):
+        self.channels = tuple(channels)
+        self.handler = handler
+        self.on_connect = on_connect
+        self.name = name
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive(): return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._stopping.set()
+        thread, self._thread = self._thread, None
+        if thread is not None: thread.join(timeout=5)
+
+    def _connect(self):
+        connection = models.engine.raw_connection()
+        connection.detach() # LISTEN state must not leak back into the pool
+        connection.driver_connection.autocommit = True
+        with connection.cursor() as cursor:
+            for channel in self.channels: cursor.execute(f"LISTEN {channel}") # Channel names are module constants
+        return connection
+
+    def _run(self):
+        delay = RECONNECT_DELAY_SECONDS[0]
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                if not models.ENGINE_INITIALIZED: raise RuntimeError("DB engine not initialized")
+                connection = self._connect()
+                logger.info(f"Result bus: listening on {', '.join(self.channels)}.")
+                delay = RECONNECT_DELAY_SECONDS[0]
+                if self.on_connect is not None: self.on_connect()
+                driver = connection.driver_connection
+                while not self._stopping.is_set():
+                    if select.select([driver], [], [], 1.0) == ([], [], []): continue
+                    driver.poll()
+                    while driver.notifies:
+                        notification = driver.notifies.pop(0)
+                        try: self.handler(notification.channel, notification.payload)
+                        except Exception as e: logger.error(f"Result bus: handler failed for '{notification.channel}': {e}", exc_info=True)
+            except Exception as e:
+                logger.warning(f"Result bus: listener connection failed: {e}; retrying in {delay}s.")
+                self._stopping.wait(delay)
+                delay = min(delay * 2, RECONNECT_DELAY_SECONDS[1])
+            finally:
+                if connection is not None:
+                    try: connection.close()
+                    except Exception: pass
@@ -0,0 +1,189 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import models
+from app.models import StatusHistory, StatusRollup, RollupWatermark, session_scope
+from app.state import (ROLLUP_GRACE_SECONDS, ROLLUP_MINUTE_RETENTION_HOURS,
+                       HISTORY_FLUSH_INTERVAL_SECONDS)
+
+logger = logging.getLogger(__name__) # Compaction runs as a background job without an app context
+
+# Finest to coarsest
+GRANULARITIES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+# Caps a single compaction pass (initial backfill catches up over several passes)
+MAX_BUCKETS_PER_RUN = {'minute': 720, 'hour': 168, 'day': 31}
+# How far back the first pass starts when status_history already holds data
+INITIAL_BACKFILL = {'minute': timedelta(hours=ROLLUP_MINUTE_RETENTION_HOURS), 'hour': timedelta(days=90), 'day': timedelta(days=400)}
+
+# Builds buckets [start, end) for a list of endpoints straight from raw history.
+# Each endpoint's status before `start` is carried into the first bucket; LEAD()
+# turns events into segments, which are clipped to every bucket they overlap.
+# Checks (and their response times) count only in the bucket they happened in.
+ROLLUP_SQL = """
+WITH ids AS (
+    SELECT unnest(CAST(:ids AS varchar[])) AS endpoint_id
+),
+events AS (
+    SELECT ids.endpoint_id, CAST(:start AS timestamptz) AS ts, prev.status,
+           CAST(NULL AS integer) AS response_time_ms, false AS is_check
+    FROM ids JOIN LATERAL (
+        SELECT h.status FROM status_history h
+        WHERE h.endpoint_id = ids.endpoint_id AND h.timestamp < :start
+        ORDER BY h.timestamp DESC LIMIT 1
+    ) prev ON true
+    UNION ALL
+    SELECT h.endpoint_id, h.timestamp, h.status, h.response_time_ms, true
+    FROM status_history h
+    WHERE h.endpoint_id = ANY(CAST(:ids AS varchar[])) AND h.timestamp >= :start AND h.timestamp < :end
+),
+segments AS (
+    SELECT endpoint_id, status, ts, response_time_ms, is_check,
+           LEAD(ts, 1, CAST(:end AS timestamptz)) OVER (PARTITION BY endpoint_id ORDER BY ts) AS next_ts
+    FROM events
+),
+buckets AS (
+    SELECT generate_series(CAST(:start AS timestamptz), CAST(:last_bucket AS timestamptz), CAST(:step AS interval)) AS bucket_start
+),
+pieces AS (
+    SELECT s.endpoint_id, b.bucket_start, s.status, s.response_time_ms,
+           (s.is_check AND s.ts >= b.bucket_start) AS counted,
+           GREATEST(0, EXTRACT(EPOCH FROM LEAST(s.next_ts, b.bucket_start + CAST(:step AS interval)) - GREATEST(s.ts, b.bucket_start))) AS seconds
+    FROM segments s
+    JOIN buckets b ON s.ts < b.bucket_start + CAST(:step AS interval)
+                  AND (s.next_ts > b.bucket_start OR s.ts >= b.bucket_start)
+)
+INSERT INTO status_rollups (endpoint_id, granularity, bucket_start, up_seconds, covered_seconds,
+                            check_count, up_count, rt_count, rt_sum, rt_min, rt_max, rt_p95)
+SELECT endpoint_id, :granularity, bucket_start,
+       COALESCE(SUM(seconds) FILTER (WHERE status = 'UP'), 0),
+       COALESCE(SUM(seconds), 0),
+       COUNT(*) FILTER (WHERE counted),
+       COUNT(*) FILTER (WHERE counted AND status = 'UP'),
+       COUNT(response_time_ms) FILTER (WHERE counted),
+       COALESCE(SUM(response_time_ms) FILTER (WHERE counted), 0),
+       MIN(response_time_ms) FILTER (WHERE counted),
+       MAX(response_time_ms) FILTER (WHERE counted),
+       CAST(percentile_cont(0.95) WITHIN GROUP (ORDER BY response_time_ms) FILTER (WHERE counted) AS integer)
+FROM pieces
+GROUP BY endpoint_id, bucket_start
+ON CONFLICT (endpoint_id, granularity, bucket_start) DO UPDATE SET
+    up_seconds = EXCLUDED.up_seconds, covered_seconds = EXCLUDED.covered_seconds,
+    check_count = EXCLUDED.check_count, up_count = EXCLUDED.up_count,
+    rt_count = EXCLUDED.rt_count, rt_sum = EXCLUDED.rt_sum,
+    rt_min = EXCLUDED.rt_min, rt_max = EXCLUDED.rt_max, rt_p95 = EXCLUDED.rt_p95
+"""
+
+# --- Bucket Helpers ---
+
+def floor_to(ts, granularity):
+    """Floors an aware datetime to the start of its UTC bucket."""
+    step = GRANULARITIES[granularity].total_seconds()
+    return datetime.fromtimestamp((ts.timestamp() // step) * step, timezone.utc)
+
+def get_watermarks(session):
+    """Returns {granularity: (rolled_from, rolled_until)} for every granularity rolled up so far."""
+    rows = session.execute(select(RollupWatermark.granularity, RollupWatermark.rolled_from, RollupWatermark.rolled_until)).fetchall()
+    return {row.granularity: (row.rolled_from, row.rolled_until) for row in rows}
+
+def plan_window(start, end, watermarks):
+    """
+    Splits [start, end) into pieces answered by the coarsest covered granularity.
+    Returns a list of (source, piece_start, piece_end) where source is a granularity
+    name or 'raw'. Finer pieces stop at the next coarser boundary so the plan can
+    step up to hour/day buckets as soon as they are aligned.
+    """
+    order = ['day', 'hour', 'minute']
+    pieces = []
+    cursor = start
+    while cursor < end:
+        for index, granularity in enumerate(order):
+            covered = watermarks.get(granularity)
+            if not covered: continue
+            rolled_from, rolled_until = covered
+            step = GRANULARITIES[granularity]
+            limit = min(end, rolled_until)
+            if cursor < rolled_from or floor_to(cursor, granularity) != cursor or cursor + step > limit: continue
+            piece_end = cursor + step * int((limit - cursor) / step)
+            if index > 0: # Don't run past the next boundary of a coarser granularity
+                piece_end = min(piece_end, floor_to(cursor, order[index - 1]) + GRANULARITIES[order[index - 1]])
+            pieces.append((granularity, cursor, piece_end))
+            cursor = piece_end
+            break
+        else:
+            # No bucket fits here: raw rows up to the first boundary where one does
+            raw_end = end
+            for granularity, (rolled_from, rolled_until) in watermarks.items():
+                step = GRANULARITIES[granularity]
+                edge = max(floor_to(cursor, granularity) + step, rolled_from)
+                if edge + step <= min(end, rolled_until): raw_end = min(raw_end, edge)
+            pieces.append(('raw', cursor, raw_end))
+            cursor = raw_end
+    return pieces
+
+# --- Compaction ---
+
+def _initial_start(session, granularity, closed_until):
+    """First bucket to roll up when a granularity has no watermark yet."""
+    earliest = session.execute(select(func.min(StatusHistory.timestamp))).scalar()
+    if earliest is None: return closed_until
+    return min(closed_until, max(floor_to(earliest, granularity), floor_to(closed_until - INITIAL_BACKFILL[granularity], granularity)))
+
+def _compact_granularity(session, granularity, endpoint_ids, now):
+    """Rolls up the next run of closed buckets for one granularity. Returns the number of buckets processed."""
+    step = GRANULARITIES[granularity]
+    # Rows are timestamped when the check ran but land after the write-behind flush
+    closed_until = floor_to(now - timedelta(seconds=HISTORY_FLUSH_INTERVAL_SECONDS + ROLLUP_GRACE_SECONDS), granularity)
+    watermark = session.get(RollupWatermark, granularity)
+    start = watermark.rolled_until if watermark else _initial_start(session, granularity, closed_until)
+    rolled_from = watermark.rolled_from if watermark else start
+    if start >= closed_until:
+        if watermark is None: # Nothing to roll yet; record an empty range so reads know where coverage begins
+            session.add(RollupWatermark(granularity=granularity, rolled_from=start, rolled_until=start))
+        return 0
+
+    end = min(closed_until, start + step * MAX_BUCKETS_PER_RUN[granularity])
+    if endpoint_ids:
+        session.execute(text(ROLLUP_SQL), {
+            "ids": list(endpoint_ids), "start": start, "end": end, "last_bucket": end - step,
+            "step": step, "granularity": granularity,
+        })
+    stmt = pg_insert(RollupWatermark).values(granularity=granularity, rolled_from=rolled_from, rolled_until=end)
+    session.execute(stmt.on_conflict_do_update(index_elements=['granularity'], set_={"rolled_until": end}))
+    return int((end - start) / step)
+
+def _prune_minute_rollups(session, now):
+    """Minute buckets only serve window edges; drop the ones past retention and move rolled_from up."""
+    cutoff = floor_to(now - timedelta(hours=ROLLUP_MINUTE_RETENTION_HOURS), 'minute')
+    watermark = session.get(RollupWatermark, 'minute')
+    if watermark is None or watermark.rolled_from >= cutoff: return 0
+    result = session.execute(delete(StatusRollup).where(StatusRollup.granularity == 'minute', StatusRollup.bucket_start < cutoff))
+    watermark.rolled_from = min(cutoff, watermark.rolled_until)
+    return result.rowcount
+
+def compact_rollups(state_store_ref):
+    """Maintenance job: rolls up closed minute/hour/day buckets for all local endpoints."""
+    if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: return
+    endpoint_ids = sorted({
+        ep['id']
+        for client_data in state_store_ref.snapshot().get("clients", {}).values()
+        if client_data.get("settings", {}).get("client_type", "local") == "local"
+        for ep in client_data.get("endpoints", []) if ep.get('id')
+    })
+
+    now = datetime.now(timezone.utc)
+    for granularity in GRANULARITIES:
+        try:
+            with session_scope() as session: # One transaction per granularity keeps each pass short
+                if session is None: return
+                buckets = _compact_granularity(session, granularity, endpoint_ids, now)
+                pruned = _prune_minute_rollups(session, now) if granularity == 'minute' else 0
+            if buckets or pruned:
+                logger.info(f"Rollups: {granularity} compacted {buckets} buckets for {len(endpoint_ids)} endpoints" + (f", pruned {pruned} rows." if pruned else "."))
+        except Exception as e:
+            logger.error(f"Rollup compaction failed for '{granularity}' buckets: {e}", exc_info=True)
@@ -0,0 +1,176 @@
+import os
+import time
+import socket
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import models
+from app.models import ReplicaLease, session_scope
+from app.hash_ring import HashRing
+from app.state import (SHARDING_ENABLED, SHARD_REPLICA_ID, SHARD_LEASE_SECONDS, SHARD_HEARTBEAT_SECONDS,
+                       SHARD_VNODES, HISTORY_FLUSH_INTERVAL_SECONDS)
+
+logger = logging.getLogger(__name__) # Heartbeat runs in its own thread
+
+STALE_LEASE_PURGE_SECONDS = 3600 # Leases of replicas gone this long are deleted
+PEER_SYNC_OVERLAP_SECONDS = 30   # Re-read this much history per sync: rows are inserted up to a flush interval after their timestamp
+
+
+class ShardCoordinator:
+    """
+    Splits local endpoint checks between replicas sharing one database.
+
+    Each replica holds a lease row in replica_leases, renewed every SHARD_HEARTBEAT_SECONDS
+    with an expiry of SHARD_LEASE_SECONDS on the DB clock. Live leases form the membership;
+    endpoint ids are assigned to members by a consistent hash ring, so every replica computes
+    the same owner without talking to the others. When a replica stops renewing (crash) its
+    lease expires and the others take over its endpoints on their next heartbeat; a clean
+    shutdown deletes the lease so that happens right away.
+
+    If this replica can't renew its lease, it keeps its last ring until the lease would have
+    expired and then checks everything (duplicate checks beat unmonitored endpoints).
+    Linked clients are not sharded: fetching them writes no history.
+    """
+
+    def __init__(self, enabled=SHARDING_ENABLED, replica_id=SHARD_REPLICA_ID, lease_seconds=SHARD_LEASE_SECONDS,
+                 heartbeat_seconds=SHARD_HEARTBEAT_SECONDS, vnodes=SHARD_VNODES):
+        self.enabled = enabled
+        self.replica_id = replica_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = max(2, lease_seconds)
+        self.heartbeat_seconds = max(1, min(heartbeat_seconds, self.lease_seconds / 2))
+        self.vnodes = vnodes
+        self._lock = threading.Lock()
+        self._ring = None
+        self._valid_until = 0.0 # monotonic time our lease runs out without a renewal
+        self._degraded = False
+        self._on_change = None
+        self._stopping = threading.Event()
+        self._thread = None
+        self._started_at = datetime.now(timezone.utc)
+        self.peer_sync_since = None
+
+    # --- Ownership ---
+
+    def owns(self, key):
+        """True if this replica should check key (always, when sharding is off or membership is unknown)."""
+        if not self.enabled: return True
+        with self._lock: ring, valid_until = self._ring, self._valid_until
+        if ring is None or time.monotonic() > valid_until: return True
+        return ring.owner(key) == self.replica_id
+
+    def describe(self):
+        with self._lock: ring, degraded = self._ring, self._degraded
+        return {"enabled": self.enabled, "replica_id": self.replica_id,
+                "members": list(ring.members) if ring else [], "degraded": degraded}
+
+    # --- Lifecycle ---
+
+    def start(self, on_change=None):
+        """Joins the membership (first heartbeat runs synchronously, so the first schedule is already sharded)."""
+        if not self.enabled: return
+        if self._thread is not None and self._thread.is_alive(): return
+        self._on_change = on_change
+        self._stopping.clear()
+        self._tick()
+        self._thread = threading.Thread(target=self._run, name="uptimizer-shard-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info(f"Sharding: replica '{self.replica_id}' started (lease {self.lease_seconds}s, heartbeat {self.heartbeat_seconds}s).")
+
+    def shutdown(self):
+        """Stops heartbeating and releases the lease so the other replicas take over immediately."""
+        if not self.enabled or self._thread is None: return
+        self._stopping.set()
+        self._thread.join(timeout=self.heartbeat_seconds + 5)
+        self._thread = None
+        if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: return
+        try:
+            with session_scope() as session:
+                if session is not None: session.execute(delete(ReplicaLease).where(ReplicaLease.replica_id == self.replica_id))
+            logger.info(f"Sharding: released lease of replica '{self.replica_id}'.")
+        except Exception as e:
+            logger.warning(f"Sharding: could not release lease of replica '{self.replica_id}': {e}")
+
+    # --- Heartbeat ---
+
+    def _heartbeat(self):
+        """Renews our lease and returns the ids of all replicas with a live lease."""
+        if not models.ENGINE_INITIALIZED or not models.DB_TABLES_CREATED: raise RuntimeError("DB not ready")
+        with session_scope() as session:
+            if session is None: raise RuntimeError("DB session unavailable")
+            expires_at = func.now() + timedelta(seconds=self.lease_seconds)
+            upsert = pg_insert(ReplicaLease).values(replica_id=self.replica_id, hostname=socket.gethostname(),
+                                                    started_at=self._started_at, heartbeat_at=func.now(), expires_at=expires_at)
+            session.execute(upsert.on_conflict_do_update(index_elements=[ReplicaLease.replica_id],
+                                                         set_={"heartbeat_at": func.now(), "expires_at": expires_at}))
+            members = session.execute(select(ReplicaLease.replica_id).where(ReplicaLease.expires_at > func.now())).scalars().all()
+            session.execute(delete(ReplicaLease).where(ReplicaLease.expires_at < func.now() - timedelta(seconds=STALE_LEASE_PURGE_SECONDS)))
+        return members
+
+    def _tick(self):
+        started = time.monotonic()
+        try:
+            members = self._heartbeat()
+        except Exception as e:
+            with self._lock:
+                lost = not self._degraded and started > self._valid_until
+                if lost: self._degraded = True
+            if lost:
+                logger.error(f"Sharding: lease of replica '{self.replica_id}' expired without renewal ({e}); checking all endpoints until it is renewed.")
+                self._changed()
+            else:
+                logger.warning(f"Sharding: heartbeat failed: {e}")
+            return
+
+        ring = HashRing(set(members) | {self.replica_id}, self.vnodes)
+        with self._lock:
+            changed = self._ring is None or self._ring.members != ring.members or self._degraded
+            self._ring = ring
+            self._valid_until = started + self.lease_seconds
+            self._degraded = False
+        if changed:
+            logger.info(f"Sharding: membership is now {len(ring.members)} replicas ({', '.join(ring.members)}); rebalancing.")
+            self._changed()
+
+    def _changed(self):
+        if self._on_change is None: return
+        try: self._on_change()
+        except Exception as e: logger.error(f"Sharding: membership change callback failed: {e}", exc_info=True)
+
+    def _run(self):
+        while not self._stopping.wait(self.heartbeat_seconds):
+            self._tick()
+
+
+# Shared coordinator; the deadline scheduler asks it which endpoints this replica checks
+shard_coordinator = ShardCoordinator()
+
+
+def sync_peer_statuses(state_store_ref, owns_fn=None, full=False, coordinator=shard_coordinator):
+    """
+    Maintenance job: copies the latest results of endpoints this process doesn't check (other
+    shards, the leader, or the checker worker) from status_history into its state, so every
+    process's dashboard, API and 24h uptime window show all endpoints.
+    owns_fn(endpoint_id) defaults to the shard ownership. Incremental unless full (or the first run).
+    """
+    from app.database import get_latest_statuses_bulk # Need the app context (log via current_app)
+    from app.checker import apply_external_results
+    owns_fn = owns_fn or coordinator.owns
+    state = state_store_ref.snapshot()
+    foreign = {ep['id']: client_id
+               for client_id, client_data in state.get("clients", {}).items()
+               if client_data.get("settings", {}).get("client_type", "local") == "local"
+               for ep in client_data.get("endpoints", []) if ep.get('id') and not owns_fn(ep['id'])}
+    if not foreign: return 0
+
+    sync_started = datetime.now(timezone.utc)
+    latest = get_latest_statuses_bulk(list(foreign), since=None if full else coordinator.peer_sync_since)
+    if latest is None: return 0
+    coordinator.peer_sync_since = sync_started - timedelta(seconds=PEER_SYNC_OVERLAP_SECONDS + HISTORY_FLUSH_INTERVAL_SECONDS)
+
+    applied = apply_external_results(state_store_ref, [{"client_id": foreign[ep_id], "endpoint_id": ep_id, "status": result}
+                                                       for ep_id, result in latest.items()])
+    if applied: logger.debug(f"Sharding: applied {applied} results checked by other processes.")
+    return applied
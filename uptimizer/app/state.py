@@ -1,6 +1,7 @@
-import threading
 import os
 
+from app.state_store import StateStore
+
 # --- Constants ---
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.getenv('UPTIMER_CONFIG_PATH', os.path.join(APP_DIR, 'config.json'))
@@ -10,9 +11,85 @@ DEFAULT_CHECK_INTERVAL = 30
 DEFAULT_CHECK_TIMEOUT = 10
 DEFAULT_CLIENT_ID = "default_client"
 
+# History write-behind queue (see history_writer.py)
+HISTORY_BATCH_SIZE = int(os.getenv('HISTORY_BATCH_SIZE', '500'))                         # Rows per bulk INSERT
+HISTORY_FLUSH_INTERVAL_SECONDS = float(os.getenv('HISTORY_FLUSH_INTERVAL_SECONDS', '2'))  # Max age of a partial batch
+HISTORY_QUEUE_MAX = int(os.getenv('HISTORY_QUEUE_MAX', '50000'))                          # Memory cap (rows)
+HISTORY_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv('HISTORY_ENQUEUE_TIMEOUT_SECONDS', '1')) # Backpressure before dropping
+
+# Rollup compaction (see rollups.py)
+ROLLUP_COMPACT_INTERVAL_SECONDS = int(os.getenv('ROLLUP_COMPACT_INTERVAL_SECONDS', '60'))  # How often closed buckets are rolled up
+ROLLUP_GRACE_SECONDS = float(os.getenv('ROLLUP_GRACE_SECONDS', '30'))                      # Extra wait for late history rows
+ROLLUP_MINUTE_RETENTION_HOURS = int(os.getenv('ROLLUP_MINUTE_RETENTION_HOURS', '48'))      # Minute buckets only serve window edges
+
+# status_history partitioning (see partitions.py); the interval must not change once partitions exist
+HISTORY_PARTITION_INTERVAL = os.getenv('HISTORY_PARTITION_INTERVAL', 'day')                    # 'day' or 'month'
+HISTORY_PARTITIONS_AHEAD = int(os.getenv('HISTORY_PARTITIONS_AHEAD', '3'))                    # Future partitions kept ready
+PARTITION_MAINTENANCE_INTERVAL_SECONDS = int(os.getenv('PARTITION_MAINTENANCE_INTERVAL_SECONDS', '3600'))
+DEFAULT_HISTORY_RETENTION_DAYS = 14 # Raw status_history kept this long (0 = forever)
+DEFAULT_ROLLUP_RETENTION_DAYS = 0   # Hour/day rollups kept this long (0 = forever)
+
+# Config change journal (see config_manager.py); edits append, compaction rewrites config.json
+CONFIG_COMPACT_INTERVAL_SECONDS = int(os.getenv('CONFIG_COMPACT_INTERVAL_SECONDS', '300'))
+
+# Bulk endpoint import (see endpoint_bulk.py); the whole import is applied and journaled as one change
+BULK_IMPORT_MAX_ENDPOINTS = int(os.getenv('BULK_IMPORT_MAX_ENDPOINTS', '50000'))
+
+# 'embedded': the web process runs the checks; 'external': they run in `python -m app.checker_worker` (see result_bus.py)
+CHECKER_MODE = os.getenv('CHECKER_MODE', 'embedded').lower()
+
+# Leader election (see leader.py): one process per database runs the singleton scheduling/maintenance work
+LEADER_ELECTION_ENABLED = os.getenv('LEADER_ELECTION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LEADER_LOCK_KEY = int(os.getenv('LEADER_LOCK_KEY', '6156548686771485298'))  # Advisory lock id; use distinct keys for installs sharing a database
+LEADER_POLL_SECONDS = int(os.getenv('LEADER_POLL_SECONDS', '5'))            # Followers retry / the leader pings this often
+
+# Check sharding across replicas (see sharding.py); off by default, the operator enables it for replicas > 1
+SHARDING_ENABLED = os.getenv('SHARDING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+SHARD_REPLICA_ID = os.getenv('SHARD_REPLICA_ID', '')                                # Default: <hostname>:<pid>
+SHARD_LEASE_SECONDS = int(os.getenv('SHARD_LEASE_SECONDS', '30'))                    # A replica is dead once its lease expires
+SHARD_HEARTBEAT_SECONDS = int(os.getenv('SHARD_HEARTBEAT_SECONDS', '10'))            # Lease renewal / membership poll period
+SHARD_VNODES = int(os.getenv('SHARD_VNODES', '128'))                                 # Hash ring points per replica
+SHARD_STATUS_SYNC_SECONDS = int(os.getenv('SHARD_STATUS_SYNC_SECONDS', '15'))        # How often results checked elsewhere (other shards, the leader) are read from history
+
+# Linked client fetches (see link_fetcher.py)
+LINK_FETCH_WORKERS = int(os.getenv('LINK_FETCH_WORKERS', '64'))                            # Linked clients fetched at the same time
+LINK_CONNECT_TIMEOUT_SECONDS = float(os.getenv('LINK_CONNECT_TIMEOUT_SECONDS', '3'))        # A remote that doesn't accept a connection this fast is down
+LINK_BREAKER_FAILURES = int(os.getenv('LINK_BREAKER_FAILURES', '3'))                        # Consecutive failed fetches before a remote is skipped
+LINK_BREAKER_BACKOFF_SECONDS = int(os.getenv('LINK_BREAKER_BACKOFF_SECONDS', '30'))         # First skip period; doubles per failed retry
+LINK_BREAKER_MAX_BACKOFF_SECONDS = int(os.getenv('LINK_BREAKER_MAX_BACKOFF_SECONDS', '600'))
+
+# Push status stream (see status_feed.py, /api/stream)
+STATUS_FEED_BUFFER_SIZE = int(os.getenv('STATUS_FEED_BUFFER_SIZE', '2000'))    # Change batches kept for resume
+STREAM_KEEPALIVE_SECONDS = int(os.getenv('STREAM_KEEPALIVE_SECONDS', '15'))    # Comment line sent when idle
+STREAM_MAX_SECONDS = int(os.getenv('STREAM_MAX_SECONDS', '300'))               # Streams end after this; browsers reconnect and resume
+STATUS_REFRESH_SECONDS = int(os.getenv('STATUS_REFRESH_SECONDS', str(STREAM_KEEPALIVE_SECONDS))) # Latency/check-time-only updates go out at most this often
+
+# Prometheus metrics (see metrics.py, /metrics)
+METRICS_PER_ENDPOINT = os.getenv('METRICS_PER_ENDPOINT', 'true').lower() in ('1', 'true', 'yes') # Per-endpoint series (one set per endpoint; turn off for very large installs)
+
+DEFAULT_MAX_CONCURRENT_CHECKS = 50 # Global cap on checks running at the same time
+DEFAULT_MAX_CHECKS_PER_HOST = 6    # Cap on simultaneous checks against a single host
+DEFAULT_PROBE_BACKEND = 'requests' # 'requests' (thread pool), 'aiohttp' (asyncio, pooled keep-alive) or 'process' (worker processes)
+DEFAULT_PROBE_PROCESSES = 0        # Worker processes of the 'process' backend (0 = one per CPU core)
+PROBE_TIMING_FIELDS = ('dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'transfer_ms') # Per-phase probe durations kept with each result
+PROBE_MODES = ('get', 'head', 'headers', 'partial') # Endpoint probe_mode: full GET (default), HEAD, GET closed after the headers, GET reading at most probe_max_bytes
+DEFAULT_PROBE_MODE = 'get'
+DEFAULT_PROBE_MAX_BYTES = 65536    # Body bytes read by the 'partial' probe mode
+ASSERTION_MAX_BODY_BYTES = int(os.getenv('ASSERTION_MAX_BODY_BYTES', 1048576)) # Body bytes content assertions see in 'get' mode ('partial' reads probe_max_bytes)
+MAX_CONCURRENT_PROTOCOL_PROBES = int(os.getenv('MAX_CONCURRENT_PROTOCOL_PROBES', '500')) # tcp/tls/dns/udp probes in flight at once (one socket each)
+DEFAULT_TLS_MIN_VALID_DAYS = 14    # tls:// probes are DOWN once the certificate expires within this many days (?min_days= overrides)
+DEFAULT_SCHEDULE_JITTER_RATIO = 0.1 # +/- fraction of an endpoint's interval added to each deadline
+
 DEFAULT_GLOBAL_SETTINGS = {
     'check_interval_seconds': DEFAULT_CHECK_INTERVAL,
     'check_timeout_seconds': DEFAULT_CHECK_TIMEOUT,
+    'max_concurrent_checks': DEFAULT_MAX_CONCURRENT_CHECKS,
+    'max_checks_per_host': DEFAULT_MAX_CHECKS_PER_HOST,
+    'probe_backend': DEFAULT_PROBE_BACKEND,
+    'probe_processes': DEFAULT_PROBE_PROCESSES,
+    'schedule_jitter_ratio': DEFAULT_SCHEDULE_JITTER_RATIO,
+    'history_retention_days': DEFAULT_HISTORY_RETENTION_DAYS,
+    'rollup_retention_days': DEFAULT_ROLLUP_RETENTION_DAYS,
 }
 
 DEFAULT_CLIENT_SETTINGS = { # Default structure for client-specific settings
@@ -26,8 +103,11 @@ DEFAULT_CLIENT_SETTINGS = { # Default structure for client-specific settings
 
 
 # --- Shared Application State ---
-# Structure:
+# Versioned copy-on-write store (see state_store.py). Readers call state_store.snapshot()
+# (no lock, never mutate the result); writers use `with state_store.write() as draft:`.
+# Snapshot structure:
 # {
+#   "version": 0, // Bumped on every published write
 #   "global_settings": { ... },
 #   "clients": {
 #       "client_id_1": {
@@ -42,9 +122,10 @@ DEFAULT_CLIENT_SETTINGS = { # Default structure for client-specific settings
 #       }
 #   },
 #   "last_updated": 0,
-#   "scheduler_interval": 30
+#   "status_version": 0, // status_feed sequence the statuses correspond to (ETags, ?since=, /api/stream)
+#   "scheduler_interval": 30 // Global default interval; endpoints are scheduled individually by deadline_scheduler.py
 # }
-current_state = {
+state_store = StateStore({
     "global_settings": DEFAULT_GLOBAL_SETTINGS.copy(),
     "clients": {
         DEFAULT_CLIENT_ID: {
@@ -54,11 +135,9 @@ current_state = {
         }
     },
     "last_updated": 0,
+    "status_version": 0,
     "scheduler_interval": DEFAULT_CHECK_INTERVAL
-}
-
-# Lock for accessing/modifying the shared state
-state_lock = threading.Lock()
+})
 
 print("DEBUG: state.py loaded and initialized shared state.")
 print(f"DEBUG: state.py determined APP_BASE_PATH: '{APP_BASE_PATH}'")
@@ -0,0 +1,136 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from app.metrics import STATE_LOCK_WAIT_SECONDS, STATE_LOCK_HOLD_SECONDS
+
+CLIENT_PARTS = ("settings", "endpoints", "statuses")
+
+
+def _copy_part(part, value):
+    if part == "endpoints": return [dict(ep) for ep in value or []]
+    return dict(value or {})
+
+
+class StateDraft:
+    """
+    Private working copy of one snapshot, handed out by StateStore.write().
+
+    Copy-on-write at client granularity: untouched clients (and their settings/endpoints/
+    statuses) are shared with the published snapshot, so a write costs what it touches.
+    Reads through the draft see shared objects and must not mutate them; get mutable
+    copies with client()/statuses() instead.
+    """
+
+    def __init__(self, base):
+        self._top = {key: value for key, value in base.items() if key not in ("clients", "version")}
+        self._clients = dict(base.get("clients", {}))
+        self._copied = set() # client_id or (client_id, part) already private to this draft
+        self.changed = False
+
+    # --- Top-level values (global_settings, last_updated, scheduler_interval, status_version) ---
+
+    def __getitem__(self, key):
+        if key == "clients": return self._clients
+        return self._top[key]
+
+    def __setitem__(self, key, value):
+        """Replaces a top-level value (assign a new global_settings dict rather than editing the shared one)."""
+        if key == "clients": raise KeyError("Use add_client()/remove_client()/replace_clients() to change clients")
+        self._top[key] = value
+        self.changed = True
+
+    def get(self, key, default=None):
+        try: return self[key]
+        except KeyError: return default
+
+    # --- Clients ---
+
+    @property
+    def clients(self):
+        """Read-only view of the clients as they stand in this draft."""
+        return self._clients
+
+    def _client(self, client_id):
+        if client_id not in self._clients: return None
+        if client_id not in self._copied:
+            self._clients[client_id] = dict(self._clients[client_id])
+            self._copied.add(client_id)
+        self.changed = True
+        return self._clients[client_id]
+
+    def _part(self, client_id, part):
+        client = self._client(client_id)
+        if client is None: return None
+        if (client_id, part) not in self._copied:
+            client[part] = _copy_part(part, client.get(part))
+            self._copied.add((client_id, part))
+        return client[part]
+
+    def client(self, client_id):
+        """Mutable copy of a client (settings, endpoints and statuses copied), or None if unknown."""
+        if client_id not in self._clients: return None
+        for part in CLIENT_PARTS: self._part(client_id, part)
+        return self._clients[client_id]
+
+    def statuses(self, client_id):
+        """Mutable copy of just one client's statuses dict (cheaper than client()), or None if unknown."""
+        return self._part(client_id, "statuses")
+
+    def add_client(self, client_id, client_data):
+        self._clients[client_id] = client_data
+        self._copied.update([client_id] + [(client_id, part) for part in CLIENT_PARTS])
+        self.changed = True
+
+    def remove_client(self, client_id):
+        self.changed = True
+        return self._clients.pop(client_id, None)
+
+    def replace_clients(self, clients):
+        """Swaps in a whole new clients mapping (config load/reload); the draft owns it from here."""
+        self._clients = dict(clients)
+        self._copied = set(self._clients) | {(cid, part) for cid in self._clients for part in CLIENT_PARTS}
+        self.changed = True
+
+    def discard(self):
+        """Drops all changes made so far; nothing is published unless the draft changes again."""
+        self.changed = False
+
+    def build(self, version):
+        return {**self._top, "clients": self._clients, "version": version}
+
+
+class StateStore:
+    """
+    Versioned copy-on-write application state.
+
+    snapshot() returns the current state dict without locking: published snapshots are
+    never mutated, so readers may use (and jsonify) them directly but must copy before
+    changing anything. Writers serialize on a writer-only lock, change a StateDraft and
+    publish it as the next version with a single reference swap; if the write block
+    raises, nothing is published (no manual rollback needed).
+    """
+
+    def __init__(self, initial_state):
+        self._write_lock = threading.RLock()
+        self._snapshot = StateDraft(initial_state).build(0)
+
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot["version"]
+
+    @contextmanager
+    def write(self):
+        """Yields a StateDraft of the latest version; publishes it on normal exit if anything changed."""
+        requested = time.perf_counter()
+        with self._write_lock:
+            acquired = time.perf_counter()
+            STATE_LOCK_WAIT_SECONDS.observe(acquired - requested)
+            try:
+                draft = StateDraft(self._snapshot)
+                yield draft
+                if draft.changed: self._snapshot = draft.build(self._snapshot["version"] + 1)
+            finally: STATE_LOCK_HOLD_SECONDS.observe(time.perf_counter() - acquired)
@@ -6,18 +6,14 @@
 
 async function fetchAndUpdateStatus() {
     const footerStatus = document.getElementById('footer-status');
-    let hasPending = false;
     try {
         // Fetch combined status first
         // Ensure statusEndpoint is defined (likely '/api/status' after refactor)
         const statusResponse = await fetch('/api/status'); // Use refactored endpoint
-        let clientStatuses = {};
-        let lastUpdatedTimestamp = 0;
 
         if (statusResponse.ok) {
             const statusResult = await statusResponse.json();
-            clientStatuses = statusResult.statuses || {};
-            lastUpdatedTimestamp = statusResult.last_updated;
+            applyStatusSnapshot(statusResult.statuses || {}, statusResult.last_updated);
         } else {
             console.error(`Error fetching status: ${statusResponse.status}`);
             if (footerStatus) footerStatus.textContent = `Status fetch failed! (${statusResponse.status})`;
@@ -29,77 +25,109 @@ async function fetchAndUpdateStatus() {
             return; // Don't proceed without status
         }
 
-        // Update UI based on fetched statuses
-        const allKnownEndpointIds = Object.keys(endpointData || {}); // endpointData assumed global
-        const remotelyReportedEndpointIds = new Set();
+        await fetchAndUpdateStats();
 
-        for (const clientId in clientStatuses) {
-            // Ensure clientsData is defined and accessible
-            if (typeof clientsData === 'undefined') {
-                 console.error("clientsData is not defined in api.js");
-                 continue;
-            }
-            const endpointsStatusMap = clientStatuses[clientId];
-            const clientConfig = clientsData[clientId]; // clientsData assumed global
+    } catch (error) {
+        console.error("Error during fetch polling:", error);
+        if (footerStatus) footerStatus.textContent = `Update failed: Network Error`;
+    }
+}
 
-            if (!clientConfig) continue;
+function applyStatusSnapshot(clientStatuses, lastUpdatedTimestamp) {
+    // Full status map ({ clientId: { endpointId: statusData } }), from /api/status or a stream snapshot
+    let hasPending = false;
+    const remotelyReportedEndpointIds = new Set();
+
+    for (const clientId in clientStatuses) {
+        // Ensure clientsData is defined and accessible
+        if (typeof clientsData === 'undefined') {
+             console.error("clientsData is not defined in api.js");
+             continue;
+        }
+        const endpointsStatusMap = clientStatuses[clientId];
+        const clientConfig = clientsData[clientId]; // clientsData assumed global
+
+        if (!clientConfig) continue;
+
+        // Handle global error for the client (e.g., link fetch failure)
+        if (typeof endpointsStatusMap === 'object' && endpointsStatusMap !== null && endpointsStatusMap.error) {
+            // Ensure updateEndpointStatusUI is defined and accessible
+            if (typeof updateEndpointStatusUI === 'function') {
+                updateEndpointStatusUI(null, { status: 'ERROR', details: `Link Error: ${endpointsStatusMap.error}` }, clientId);
+            } else { console.error("updateEndpointStatusUI function not found."); }
+            continue; // Skip individual endpoint updates for this client
+        }
 
-            // Handle global error for the client (e.g., link fetch failure)
-            if (typeof endpointsStatusMap === 'object' && endpointsStatusMap !== null && endpointsStatusMap.error) {
-                // Ensure updateEndpointStatusUI is defined and accessible
+        // Process individual endpoint statuses
+        if (typeof endpointsStatusMap === 'object' && endpointsStatusMap !== null) {
+            for (const endpointId in endpointsStatusMap) {
+                const statusData = endpointsStatusMap[endpointId];
                 if (typeof updateEndpointStatusUI === 'function') {
-                    updateEndpointStatusUI(null, { status: 'ERROR', details: `Link Error: ${endpointsStatusMap.error}` }, clientId);
+                    updateEndpointStatusUI(endpointId, statusData, clientId);
                 } else { console.error("updateEndpointStatusUI function not found."); }
-                continue; // Skip individual endpoint updates for this client
-            }
-
-            // Process individual endpoint statuses
-            if (typeof endpointsStatusMap === 'object' && endpointsStatusMap !== null) {
-                for (const endpointId in endpointsStatusMap) {
-                    const statusData = endpointsStatusMap[endpointId];
-                    if (typeof updateEndpointStatusUI === 'function') {
-                        updateEndpointStatusUI(endpointId, statusData, clientId);
-                    } else { console.error("updateEndpointStatusUI function not found."); }
-                    if (statusData?.status === 'PENDING') {
-                        hasPending = true;
-                    }
-                    // Ensure clientConfig has settings before accessing type
-                    if (clientConfig.settings && clientConfig.settings.client_type === 'linked') {
-                        remotelyReportedEndpointIds.add(endpointId);
-                    }
+                if (statusData?.status === 'PENDING') {
+                    hasPending = true;
+                }
+                // Ensure clientConfig has settings before accessing type
+                if (clientConfig.settings && clientConfig.settings.client_type === 'linked') {
+                    remotelyReportedEndpointIds.add(endpointId);
                 }
-            } else {
-                 console.warn(`Received unexpected status format for client ${clientId}:`, endpointsStatusMap);
             }
+        } else {
+             console.warn(`Received unexpected status format for client ${clientId}:`, endpointsStatusMap);
         }
+    }
 
-        // Remove stale rows for linked endpoints
-        document.querySelectorAll('.endpoint-item[data-client-id]').forEach(row => {
-            const rowClientId = row.dataset.clientId;
-            const rowEndpointId = row.dataset.endpointId;
-            // Ensure clientsData exists before access
-            const clientType = (typeof clientsData !== 'undefined' && clientsData[rowClientId]?.settings?.client_type);
-            if (clientType === 'linked' && !remotelyReportedEndpointIds.has(rowEndpointId)) {
-                console.log(`Removing stale linked endpoint row: ${rowEndpointId} from client ${rowClientId}`);
-                row.remove();
-                 // Optionally add back placeholder if list becomes empty
-                 const listElement = document.getElementById(`endpoint-list-${rowClientId}-linked`);
-                 if (listElement && listElement.children.length === 0) {
-                     const statusPlaceholder = document.getElementById(`linked-status-${rowClientId}`);
-                     if (!statusPlaceholder) { // Avoid adding multiple placeholders
-                         const placeholder = document.createElement('li');
-                         placeholder.className = 'italic-placeholder';
-                         placeholder.id = `linked-status-${rowClientId}`;
-                         placeholder.textContent = 'No endpoints reported by remote.';
-                         listElement.appendChild(placeholder);
-                     }
+    // Remove stale rows for linked endpoints
+    document.querySelectorAll('.endpoint-item[data-client-id]').forEach(row => {
+        const rowClientId = row.dataset.clientId;
+        const rowEndpointId = row.dataset.endpointId;
+        // Ensure clientsData exists before access
+        const clientType = (typeof clientsData !== 'undefined' && clientsData[rowClientId]?.settings?.client_type);
+        if (clientType === 'linked' && !remotelyReportedEndpointIds.has(rowEndpointId)) {
+            console.log(`Removing stale linked endpoint row: ${rowEndpointId} from client ${rowClientId}`);
+            row.remove();
+             // Optionally add back placeholder if list becomes empty
+             const listElement = document.getElementById(`endpoint-list-${rowClientId}-linked`);
+             if (listElement && listElement.children.length === 0) {
+                 const statusPlaceholder = document.getElementById(`linked-status-${rowClientId}`);
+                 if (!statusPlaceholder) { // Avoid adding multiple placeholders
+                     const placeholder = document.createElement('li');
+                     placeholder.className = 'italic-placeholder';
+                     placeholder.id = `linked-status-${rowClientId}`;
+                     placeholder.textContent = 'No endpoints reported by remote.';
+                     listElement.appendChild(placeholder);
                  }
-            }
-        });
+             }
+        }
+    });
 
+    updateFooterStatus(lastUpdatedTimestamp, hasPending);
+}
 
-        // Fetch stats separately
-        // Ensure statsEndpoint is defined (likely /api/statistics)
+function applyStatusChanges(changes, lastUpdatedTimestamp) {
+    // Incremental update from the status stream: only endpoints whose status changed
+    (changes || []).forEach(change => {
+        if (typeof updateEndpointStatusUI === 'function') {
+            updateEndpointStatusUI(change.endpoint_id, change.status, change.client_id);
+        } else { console.error("updateEndpointStatusUI function not found."); }
+    });
+    updateFooterStatus(lastUpdatedTimestamp, false);
+}
+
+function updateFooterStatus(lastUpdatedTimestamp, hasPending, suffix = '') {
+    const footerStatus = document.getElementById('footer-status');
+    if (!footerStatus) return;
+    const timestamp = lastUpdatedTimestamp ? new Date(lastUpdatedTimestamp * 1000).toLocaleTimeString() : 'N/A';
+    footerStatus.textContent = hasPending
+        ? `Status updated: ${timestamp} (Checks ongoing...)${suffix}`
+        : `Status updated: ${timestamp}${suffix}`;
+}
+
+async function fetchAndUpdateStats() {
+    // Ensure statsEndpoint is defined (likely /api/statistics)
+    const allKnownEndpointIds = Object.keys(endpointData || {}); // endpointData assumed global
+    try {
         const statsResponse = await fetch('/api/statistics'); // Use refactored endpoint
         if (statsResponse.ok) {
             const statsResult = await statsResponse.json() || {};
@@ -109,28 +137,44 @@ async function fetchAndUpdateStatus() {
                     updateEndpointStatsUI(endpointId, statsResult[endpointId]);
                 } else { console.error("updateEndpointStatsUI function not found."); }
             });
-        } else {
-            console.error(`Error fetching statistics: ${statsResponse.status}`);
-            allKnownEndpointIds.forEach(endpointId => {
-                // Ensure updateEndpointStatsUI is defined
-                if (typeof updateEndpointStatsUI === 'function') {
-                    updateEndpointStatsUI(endpointId, { error: "Stats Fetch failed" });
-                } else { console.error("updateEndpointStatsUI function not found."); }
-            });
+            return;
         }
-
-        // Update footer
-        const timestamp = lastUpdatedTimestamp ? new Date(lastUpdatedTimestamp * 1000).toLocaleTimeString() : 'N/A';
-        if (footerStatus) {
-            footerStatus.textContent = hasPending
-                ? `Status updated: ${timestamp} (Checks ongoing...)`
-                : `Status updated: ${timestamp}`;
-        }
-
+        console.error(`Error fetching statistics: ${statsResponse.status}`);
     } catch (error) {
-        console.error("Error during fetch polling:", error);
-        if (footerStatus) footerStatus.textContent = `Update failed: Network Error`;
+        console.error("Error fetching statistics:", error);
     }
+    allKnownEndpointIds.forEach(endpointId => {
+        // Ensure updateEndpointStatsUI is defined
+        if (typeof updateEndpointStatsUI === 'function') {
+            updateEndpointStatsUI(endpointId, { error: "Stats Fetch failed" });
+        } else { console.error("updateEndpointStatsUI function not found."); }
+    });
+}
+
+// --- Status Stream (Server-Sent Events) ---
+let statusStream = null;
+
+function subscribeToStatusStream() {
+    // Returns false if the browser has no EventSource support (caller falls back to polling)
+    if (typeof EventSource === 'undefined') return false;
+    if (statusStream) statusStream.close();
+
+    // The browser reconnects on its own and sends Last-Event-ID, so the server resumes
+    // from the last change we saw (or sends a fresh snapshot if that is no longer possible)
+    statusStream = new EventSource('/api/stream');
+    statusStream.addEventListener('snapshot', event => {
+        const data = JSON.parse(event.data);
+        applyStatusSnapshot(data.statuses || {}, data.last_updated);
+    });
+    statusStream.addEventListener('statuses', event => {
+        const data = JSON.parse(event.data);
+        applyStatusChanges(data.changes, data.last_updated);
+    });
+    statusStream.onerror = () => {
+        const footerStatus = document.getElementById('footer-status');
+        if (footerStatus && statusStream.readyState !== EventSource.OPEN) footerStatus.textContent = 'Live updates disconnected, reconnecting...';
+    };
+    return true;
 }
 
 
@@ -146,7 +190,9 @@ async function fetchAndRenderHistory(endpointId, period) {
 
     try {
         // Ensure endpoint uses refactored path
-        const response = await fetch(`/api/history/${endpointId}?period=${period}`);
+        // About one point per horizontal pixel; the server downsamples (keeping status changes)
+        const maxPoints = Math.max(200, Math.min(4000, Math.round(ctxElem.clientWidth || 1000)));
+        const response = await fetch(`/api/history/${endpointId}?period=${period}&max_points=${maxPoints}`);
         if (!response.ok) { const errData = await response.json().catch(() => ({ error: `HTTP ${response.status}` })); throw new Error(errData.error || `HTTP ${response.status}`); }
         const historyResult = await response.json();
         if (historyResult.error) throw new Error(historyResult.error);
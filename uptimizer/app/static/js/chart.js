@@ -13,12 +13,14 @@ function renderHistoryChart(ctx, historyData, period) {
     }
 
     const labels = historyData.map(point => new Date(point.timestamp));
-    const responseTimes = historyData.map(point => point.status === 'UP' ? point.response_time_ms : null);
+    // Rollup buckets (30d/90d) may be DEGRADED: part UP, part DOWN; they still carry an average response time
+    const responseTimes = historyData.map(point => (point.status === 'UP' || point.status === 'DEGRADED') ? point.response_time_ms : null);
     const statusColors = historyData.map(point => {
         switch (point.status) {
             case 'UP': return 'rgba(30, 138, 70, 0.7)'; // Green
             case 'DOWN': return 'rgba(235, 72, 54, 0.7)'; // Red
             case 'ERROR': return 'rgba(226, 113, 29, 0.7)'; // Orange
+            case 'DEGRADED': return 'rgba(214, 170, 40, 0.7)'; // Amber
             default: return 'rgba(90, 90, 90, 0.7)'; // Gray
         }
     });
@@ -140,6 +142,8 @@ function inferTimeScaleUnit(period) {
         case '1h': return 'minute';
         case '24h': return 'hour';
         case '7d': return 'day';
+        case '30d': return 'day';
+        case '90d': return 'week';
         default: return 'hour';
     }
 }
\ No newline at end of file
@@ -120,6 +120,9 @@ function openAddEditModal(event, endpointId = null, clientId = null) {
 
     const intervalInput = addEditForm.elements['check_interval_seconds'];
     const timeoutInput = addEditForm.elements['check_timeout_seconds'];
+    const probeModeSelect = addEditForm.elements['probe_mode'];
+    const maxBytesInput = addEditForm.elements['probe_max_bytes'];
+    const assertionsInput = addEditForm.elements['assertions'];
 
     if (endpointId) {
         // Ensure endpointData is defined
@@ -131,6 +134,9 @@ function openAddEditModal(event, endpointId = null, clientId = null) {
         addEditForm.elements['group'].value = data.group || '';
         if (intervalInput) { intervalInput.value = data.check_interval_seconds ?? ''; intervalInput.placeholder = intervalPlaceholder; }
         if (timeoutInput) { timeoutInput.value = data.check_timeout_seconds ?? ''; timeoutInput.placeholder = timeoutPlaceholder; }
+        if (probeModeSelect) probeModeSelect.value = data.probe_mode || 'get';
+        if (maxBytesInput) maxBytesInput.value = data.probe_max_bytes ?? '';
+        if (assertionsInput) assertionsInput.value = data.assertions?.length ? JSON.stringify(data.assertions) : '';
     } else {
         // Adding new - clear fields and set placeholders
         addEditForm.elements['id'].value = '';
@@ -165,23 +171,35 @@ addEditForm?.addEventListener('submit', async (event) => {
     // Prepare payload, handling empty strings for optional numbers
     const intervalStr = formData.get('check_interval_seconds').trim();
     const timeoutStr = formData.get('check_timeout_seconds').trim();
+    const maxBytesStr = (formData.get('probe_max_bytes') || '').trim();
+    const assertionsStr = (formData.get('assertions') || '').trim();
+    let assertions = [];
+    if (assertionsStr !== '') {
+        try { assertions = JSON.parse(assertionsStr); } catch (e) { assertions = null; }
+        if (!Array.isArray(assertions)) { if(addEditErrorElement){ addEditErrorElement.textContent = 'Assertions must be a JSON list or blank.'; addEditErrorElement.style.display = 'block'; } return; }
+    }
 
     const endpointPayload = {
         name: formData.get('name').trim(),
         url: url,
         group: formData.get('group').trim() || 'Default Group',
         check_interval_seconds: intervalStr === '' ? null : intervalStr,
-        check_timeout_seconds: timeoutStr === '' ? null : timeoutStr
+        check_timeout_seconds: timeoutStr === '' ? null : timeoutStr,
+        probe_mode: formData.get('probe_mode') || 'get',
+        probe_max_bytes: maxBytesStr === '' ? null : maxBytesStr,
+        assertions: assertions // [] removes them
     };
 
     // Validation
     if (!endpointPayload.name || !endpointPayload.url) { if(addEditErrorElement){ addEditErrorElement.textContent = 'Name and URL required.'; addEditErrorElement.style.display = 'block'; } return; }
     if (endpointPayload.check_interval_seconds !== null && (isNaN(parseInt(endpointPayload.check_interval_seconds)) || parseInt(endpointPayload.check_interval_seconds) < 5)) { if(addEditErrorElement){ addEditErrorElement.textContent = 'Interval must be >= 5s or blank.'; addEditErrorElement.style.display = 'block'; } return; }
     if (endpointPayload.check_timeout_seconds !== null && (isNaN(parseInt(endpointPayload.check_timeout_seconds)) || parseInt(endpointPayload.check_timeout_seconds) < 1)) { if(addEditErrorElement){ addEditErrorElement.textContent = 'Timeout must be >= 1s or blank.'; addEditErrorElement.style.display = 'block'; } return; }
+    if (endpointPayload.probe_max_bytes !== null && (isNaN(parseInt(endpointPayload.probe_max_bytes)) || parseInt(endpointPayload.probe_max_bytes) < 1)) { if(addEditErrorElement){ addEditErrorElement.textContent = 'Max bytes must be >= 1 or blank.'; addEditErrorElement.style.display = 'block'; } return; }
 
     // Convert valid numbers to int, keep null if blank/invalid was handled
     endpointPayload.check_interval_seconds = endpointPayload.check_interval_seconds !== null ? parseInt(endpointPayload.check_interval_seconds) : null;
     endpointPayload.check_timeout_seconds = endpointPayload.check_timeout_seconds !== null ? parseInt(endpointPayload.check_timeout_seconds) : null;
+    endpointPayload.probe_max_bytes = endpointPayload.probe_max_bytes !== null ? parseInt(endpointPayload.probe_max_bytes) : null;
 
     // Clean payload: Remove keys with null values before sending
     Object.keys(endpointPayload).forEach(key => (endpointPayload[key] === null) && delete endpointPayload[key]);
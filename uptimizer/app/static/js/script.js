@@ -12,7 +12,8 @@ let currentActiveClientId = ''; // Track active client tab
 const defaultClient = typeof defaultClientId !== 'undefined' ? defaultClientId : "default_client";
 
 // --- Constants ---
-const POLLING_INTERVAL_MS = 5000; // How often to fetch status updates
+const POLLING_INTERVAL_MS = 5000; // How often to fetch status updates (fallback without EventSource)
+const STATS_REFRESH_INTERVAL_MS = 60000; // Uptime percentages move slowly; statuses are pushed
 
 // --- Initialization ---
 document.addEventListener('DOMContentLoaded', () => {
@@ -44,9 +45,12 @@ document.addEventListener('DOMContentLoaded', () => {
     // Assumes ui_interactions.js and ui_updater.js are loaded
     setupUI(); // From this file
 
-    // 4. Fetch initial data and start polling
+    // 4. Subscribe to pushed status changes (snapshot first, then deltas); poll only as a fallback
     // Assumes api.js is loaded
-    if (typeof fetchAndUpdateStatus === 'function') {
+    if (typeof subscribeToStatusStream === 'function' && subscribeToStatusStream()) {
+        fetchAndUpdateStats(); // Initial stats
+        setInterval(fetchAndUpdateStats, STATS_REFRESH_INTERVAL_MS);
+    } else if (typeof fetchAndUpdateStatus === 'function') {
         fetchAndUpdateStatus(); // Initial fetch
         setInterval(fetchAndUpdateStatus, POLLING_INTERVAL_MS); // Start polling
     } else { console.error("fetchAndUpdateStatus function not found."); }
@@ -0,0 +1,177 @@
+import time
+import uuid
+import zlib
+import threading
+from collections import deque
+
+from app.state import STATUS_FEED_BUFFER_SIZE, STATUS_REFRESH_SECONDS
+
+# A result only counts as a change if one of these differs. Latency is left out: it moves on
+# nearly every check, which would make every run a change. New response times and check times
+# are coalesced into a refresh batch instead, at most once per STATUS_REFRESH_SECONDS.
+CHANGE_FIELDS = ('status', 'status_code', 'details')
+
+
+def status_changed(old, new):
+    if not old: return True
+    return any(old.get(field) != new.get(field) for field in CHANGE_FIELDS)
+
+
+class StatusFeed:
+    """
+    Ordered log of endpoint status changes; its sequence number is the version of
+    the status state served by /api/status (ETags, ?since= deltas) and /api/stream.
+
+    Every publish()/reset() gets the next sequence number; the last STATUS_FEED_BUFFER_SIZE
+    batches stay in a ring buffer so a reconnecting subscriber can resume from the
+    last sequence it saw. Cursors are "<boot_id>:<seq>" so a cursor from before a
+    restart is recognized as stale and answered with a full snapshot instead.
+    Both are called inside a state_store.write() block and the returned sequence is stored
+    as the snapshot's "status_version", so a snapshot's statuses and its version always match.
+    Results that only refresh latency/check time are held back and go out together, as one
+    extra batch at most every refresh_interval seconds, so the version doesn't move every run.
+    """
+
+    def __init__(self, max_batches=STATUS_FEED_BUFFER_SIZE, refresh_interval=STATUS_REFRESH_SECONDS):
+        self.boot_id = uuid.uuid4().hex[:12]
+        self._cond = threading.Condition()
+        self._batches = deque(maxlen=max(1, max_batches)) # (seq, changes or None for a reset, last_updated)
+        self._reset_scopes = {} # seq -> (client_id, edits) for resets confined to one client
+        self._seq = 0
+        self._refresh_interval = refresh_interval
+        self._refreshed = {} # (client_id, endpoint_id) -> latest result that changed nothing, not yet sent
+        self._last_refresh = time.monotonic()
+
+    @property
+    def version(self):
+        with self._cond: return self._seq
+
+    def cursor(self, seq=None):
+        return f"{self.boot_id}:{self.version if seq is None else seq}"
+
+    def etag(self, seq, *extra):
+        """Strong ETag for a response built from state at version seq (extra: other inputs of the body)."""
+        suffix = "".join(f"-{zlib.crc32(str(value).encode()):08x}" for value in extra)
+        return f'"{self.boot_id}-{seq}{suffix}"'
+
+    def parse_cursor(self, cursor):
+        """Returns the sequence number of a cursor from this process, else None."""
+        if not cursor: return None
+        boot_id, _, seq = str(cursor).partition(':')
+        if boot_id != self.boot_id: return None
+        try: return int(seq)
+        except ValueError: return None
+
+    def _append(self, changes, last_updated, scope=None):
+        with self._cond:
+            self._seq += 1
+            self._batches.append((self._seq, changes, last_updated))
+            if scope is not None: self._reset_scopes[self._seq] = scope
+            if self._reset_scopes and len(self._batches) == self._batches.maxlen: # Forget scopes of evicted resets
+                oldest = self._batches[0][0]
+                for seq in [seq for seq in self._reset_scopes if seq < oldest]: del self._reset_scopes[seq]
+            self._cond.notify_all()
+            return self._seq
+
+    def publish(self, changes, last_updated, refreshed=()):
+        """
+        Appends one check run's changes [{"client_id", "endpoint_id", "status"}, ...].
+        refreshed are the run's other results (same shape): they are held until refresh_interval
+        has passed since the last refresh, then go out with this run's changes. A run with
+        nothing to send returns the current version without a new batch, so cursors stay valid.
+        Called by run_checks_task inside its state write, so feed order matches state order.
+        """
+        with self._cond:
+            changes = list(changes)
+            changed = {(change["client_id"], change["endpoint_id"]) for change in changes}
+            for key in changed: self._refreshed.pop(key, None) # The change carries the newer result
+            for update in refreshed:
+                key = (update["client_id"], update["endpoint_id"])
+                if key not in changed: self._refreshed[key] = update
+            now = time.monotonic()
+            if self._refreshed and now - self._last_refresh >= self._refresh_interval:
+                changes.extend(self._refreshed.values())
+                self._refreshed.clear()
+                self._last_refresh = now
+            if not changes: return self._seq
+            return self._append(changes, last_updated)
+
+    def reset(self, client_id=None, statuses=None, removed=None):
+        """
+        Records a change that can't be expressed per endpoint (endpoint/client added or removed,
+        config reloaded). Subscribers whose cursor is older get a full snapshot.
+        A reset confined to one client names it; with the statuses of its added/replaced endpoints
+        and/or the ids of removed ones, per-client readers (client_since) carry on with a delta,
+        otherwise only that client needs a snapshot.
+        Call inside the state write that modifies the statuses; store the result as draft["status_version"].
+        """
+        scope = None
+        if client_id is not None:
+            edits = None if statuses is None and removed is None else (dict(statuses or {}), tuple(removed or ()))
+            scope = (client_id, edits)
+        with self._cond: # Held-back results of reset endpoints must not resurface after the reset
+            if client_id is None: self._refreshed.clear()
+            else:
+                for key in [key for key in self._refreshed if key[0] == client_id]: del self._refreshed[key]
+            return self._append(None, None, scope)
+
+    def since(self, seq):
+        """Batches after seq as a list, or None if a snapshot is needed (seq left the buffer, or a reset follows it)."""
+        with self._cond:
+            if seq > self._seq: return None
+            if seq == self._seq: return []
+            if not self._batches or self._batches[0][0] > seq + 1: return None
+            batches = [batch for batch in self._batches if batch[0] > seq]
+        if any(changes is None for _, changes, _ in batches): return None
+        return batches
+
+    def client_since(self, seq, client_id):
+        """
+        One client's changes after seq: (statuses {endpoint_id: status}, removed endpoint ids, new seq),
+        or None if a snapshot is needed (seq left the buffer, or a reset not confined to another client follows it).
+        """
+        with self._cond:
+            if seq > self._seq: return None
+            if seq == self._seq: return {}, [], seq
+            if not self._batches or self._batches[0][0] > seq + 1: return None
+            batches = [batch for batch in self._batches if batch[0] > seq]
+            scopes = {batch[0]: self._reset_scopes.get(batch[0]) for batch in batches if batch[1] is None}
+        statuses, removed = {}, set()
+        for batch_seq, changes, _ in batches:
+            if changes is not None:
+                for change in changes:
+                    if change["client_id"] != client_id: continue
+                    statuses[change["endpoint_id"]] = change["status"]
+                    removed.discard(change["endpoint_id"])
+                continue
+            scope = scopes[batch_seq]
+            if scope is None: return None
+            scope_client, edits = scope
+            if scope_client != client_id: continue
+            if edits is None: return None
+            scope_statuses, scope_removed = edits
+            for endpoint_id in scope_removed:
+                statuses.pop(endpoint_id, None)
+                removed.add(endpoint_id)
+            for endpoint_id, status in scope_statuses.items():
+                statuses[endpoint_id] = status
+                removed.discard(endpoint_id)
+        return statuses, sorted(removed), batches[-1][0]
+
+    def wait(self, seq, timeout):
+        """Blocks until a batch newer than seq exists or timeout expires. Returns the current version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq, timeout=timeout)
+            return self._seq
+
+
+def fold_changes(batches):
+    """Folds feed batches into (changes, last_updated); later results for an endpoint replace earlier ones."""
+    latest = {}
+    for _, changes, _ in batches:
+        for change in changes: latest[(change["client_id"], change["endpoint_id"])] = change
+    return list(latest.values()), batches[-1][2]
+
+
+# Shared feed; run_checks_task and config edits publish, /api/status and /api/stream read it
+status_feed = StatusFeed()
@@ -0,0 +1,118 @@
+import time
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__) # Fed from check batches, read from API requests
+
+UP_STATUS = 'UP'
+DEFAULT_WINDOW_SECONDS = 24 * 3600
+
+
+class _EndpointWindow:
+    """
+    Status segments of one endpoint inside the sliding window.
+
+    `events` holds (ts, is_up) only where the UP/not-UP state changes; each event
+    starts a segment that lasts until the next one (the last lasts until now).
+    `closed_up` is the UP time of all segments except the last, so a query only
+    has to add the open segment and clip the first one at the window start.
+    """
+    __slots__ = ("events", "closed_up")
+
+    def __init__(self):
+        self.events = deque()
+        self.closed_up = 0.0
+
+    def add(self, ts, is_up):
+        if self.events:
+            last_ts, last_up = self.events[-1]
+            if ts < last_ts or last_up == is_up: return # Out of order, or no state change
+            if last_up: self.closed_up += ts - last_ts
+        self.events.append((ts, is_up))
+
+    def evict(self, window_start):
+        # Keep the last event at/before window_start: its state carries into the window
+        while len(self.events) >= 2 and self.events[1][0] <= window_start:
+            ts, is_up = self.events.popleft()
+            if is_up: self.closed_up -= self.events[0][0] - ts
+
+    def up_seconds(self, window_start, now):
+        if not self.events: return 0.0
+        up = self.closed_up
+        last_ts, last_up = self.events[-1]
+        if last_up: up += max(0.0, now - last_ts)
+        first_ts, first_up = self.events[0]
+        if first_up and first_ts < window_start: up -= window_start - first_ts
+        return max(0.0, up)
+
+
+class UptimeAccumulator:
+    """
+    In-memory sliding-window uptime per endpoint, updated as check results arrive.
+    Answers /api/statistics for its window in O(1) per endpoint (amortized eviction)
+    with the same semantics as the DB calculation: time before an endpoint's first
+    known status counts as not UP, and the latest status carries forward.
+    Warmed from status_history at startup, so restarts don't reset the window.
+    """
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._windows = {}
+        self.warmed = False
+
+    def covers(self, window):
+        """True if a stats window (timedelta) can be answered from memory."""
+        return self.warmed and window.total_seconds() == self.window_seconds
+
+    def record(self, endpoint_id, status, ts=None):
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            window = self._windows.get(endpoint_id)
+            if window is None: window = self._windows[endpoint_id] = _EndpointWindow()
+            window.add(ts, status == UP_STATUS)
+            window.evict(ts - self.window_seconds)
+
+    def warm(self, events_by_endpoint, now=None):
+        """
+        Rebuilds the window from DB history: {endpoint_id: [(ts, status), ...]} in time order,
+        including each endpoint's last status before the window. Results recorded while
+        the DB query ran are kept (they are newer than anything the query returned).
+        """
+        now = time.time() if now is None else now
+        rebuilt = {}
+        for endpoint_id, events in events_by_endpoint.items():
+            window = _EndpointWindow()
+            for ts, status in events: window.add(ts, status == UP_STATUS)
+            rebuilt[endpoint_id] = window
+        with self._lock:
+            for endpoint_id, live in self._windows.items():
+                window = rebuilt.setdefault(endpoint_id, _EndpointWindow())
+                for ts, is_up in live.events: window.add(ts, is_up)
+            for window in rebuilt.values(): window.evict(now - self.window_seconds)
+            self._windows = rebuilt
+            self.warmed = True
+        logger.info(f"Uptime accumulator warmed for {len(rebuilt)} endpoints ({self.window_seconds}s window).")
+
+    def forget(self, endpoint_id):
+        with self._lock: self._windows.pop(endpoint_id, None)
+
+    def uptime_percentages(self, endpoint_ids, now=None):
+        """Returns {endpoint_id: uptime % over the window, rounded like the DB stats}."""
+        now = time.time() if now is None else now
+        window_start = now - self.window_seconds
+        results = {}
+        with self._lock:
+            for endpoint_id in endpoint_ids:
+                window = self._windows.get(endpoint_id)
+                if window is None:
+                    results[endpoint_id] = 0.0
+                    continue
+                window.evict(window_start)
+                results[endpoint_id] = round(min(100.0, window.up_seconds(window_start, now) / self.window_seconds * 100), 2)
+        return results
+
+
+# Shared accumulator for the 24h statistics window
+uptime_accumulator = UptimeAccumulator()
@@ -114,7 +114,10 @@ def manage_uptimizer_app(spec, name, namespace, uid, logger, body, patch, **kwar
                             # Example: {"name": "DATABASE_URL", "valueFrom": {"secretKeyRef": {"name": "db-secret", "key": "url"}}}
                              {"name": "FLASK_RUN_PORT", "value": str(app_port)},
                              {"name": "FLASK_APP", "value": "main.py"}, # From your Dockerfile
-                             {"name": "FLASK_RUN_HOST", "value": "0.0.0.0"} # From your Dockerfile
+                             {"name": "FLASK_RUN_HOST", "value": "0.0.0.0"}, # From your Dockerfile
+                             # Replicas share the DB; shard the checks between them instead of each checking everything
+                             {"name": "SHARDING_ENABLED", "value": "true" if replicas > 1 else "false"},
+                             {"name": "SHARD_REPLICA_ID", "valueFrom": {"fieldRef": {"fieldPath": "metadata.name"}}} # Pod name
                         ],
                         "volumeMounts": [{
                             "name": "config-volume",
@@ -0,0 +1,68 @@
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from app.state import state_store
+from app.status_feed import status_feed
+from app.checker import apply_external_results
+from app.api.api_general import general_api_bp
+
+CLIENT_ID = 'api-status-test'
+
+
+def _status(response_time_ms, last_check_ts):
+    return {"status": "UP", "status_code": 200, "details": None, "response_time_ms": response_time_ms, "last_check_ts": last_check_ts}
+
+
+class StatusEtagTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(general_api_bp, url_prefix='/api')
+        self.client = app.test_client()
+        patcher = mock.patch.object(status_feed, '_refresh_interval', 3600) # No latency refresh batch during the test
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with state_store.write() as draft:
+            draft.add_client(CLIENT_ID, {"settings": {"client_type": "linked"}, "endpoints": [], "statuses": {"ep": _status(10, 1.0)}})
+            draft["status_version"] = status_feed.reset(CLIENT_ID)
+        self.addCleanup(self._remove_client)
+
+    def _remove_client(self):
+        with state_store.write() as draft:
+            draft.remove_client(CLIENT_ID)
+            draft["status_version"] = status_feed.reset(CLIENT_ID)
+
+    def _get(self, etag=None, **params):
+        return self.client.get('/api/status', query_string=params, headers={'If-None-Match': etag} if etag else {})
+
+    def test_full_body_revalidates_after_a_latency_only_run(self):
+        first = self._get()
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        self.assertEqual(self._get(etag).status_code, 304)
+
+        version = status_feed.version
+        now = time.time()
+        apply_external_results(state_store, [{"client_id": CLIENT_ID, "endpoint_id": "ep", "status": _status(42, now)}], now)
+        self.assertEqual(status_feed.version, version) # Not a status change...
+
+        refreshed = self._get(etag)
+        self.assertEqual(refreshed.status_code, 200) # ...but the body did change
+        self.assertEqual(refreshed.get_json()["statuses"][CLIENT_ID]["ep"]["response_time_ms"], 42)
+        self.assertNotEqual(refreshed.headers['ETag'], etag)
+        self.assertEqual(self._get(refreshed.headers['ETag']).status_code, 304)
+
+    def test_delta_revalidates_when_last_updated_moves(self):
+        cursor = self._get().get_json()["version"]
+        delta = self._get(since=cursor)
+        self.assertTrue(delta.get_json()["delta"])
+        self.assertEqual(self._get(delta.headers['ETag'], since=cursor).status_code, 304)
+        with state_store.write() as draft: draft["last_updated"] = time.time() + 1
+        self.assertEqual(self._get(delta.headers['ETag'], since=cursor).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
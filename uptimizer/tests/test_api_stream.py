@@ -0,0 +1,73 @@
+import json
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from app.state import state_store
+from app.status_feed import status_feed
+from app.checker import apply_external_results
+from app.api import api_stream
+
+CLIENT_ID = 'api-stream-test'
+
+
+def _status(status, response_time_ms, last_check_ts):
+    return {"status": status, "status_code": 200, "details": None, "response_time_ms": response_time_ms, "last_check_ts": last_check_ts}
+
+
+def _event(message):
+    """(event name, data) of one SSE message, or (None, None) for a comment line."""
+    fields = dict(line.split(': ', 1) for line in message.decode().strip().splitlines() if not line.startswith((':', 'retry')))
+    return fields.get('event'), json.loads(fields['data']) if 'data' in fields else None
+
+
+class StatusStreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(api_stream.stream_api_bp, url_prefix='/api')
+        self.client = app.test_client()
+        for patcher in (mock.patch.object(api_stream, 'STREAM_KEEPALIVE_SECONDS', 0.2),
+                        mock.patch.object(status_feed, '_refresh_interval', 3600)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        with state_store.write() as draft:
+            draft.add_client(CLIENT_ID, {"settings": {"client_type": "linked"}, "endpoints": [], "statuses": {"ep": _status("UP", 10, 1.0)}})
+            draft["status_version"] = status_feed.reset(CLIENT_ID)
+        self.addCleanup(self._remove_client)
+
+    def _remove_client(self):
+        with state_store.write() as draft:
+            draft.remove_client(CLIENT_ID)
+            draft["status_version"] = status_feed.reset(CLIENT_ID)
+
+    def _apply(self, status, response_time_ms):
+        now = time.time()
+        apply_external_results(state_store, [{"client_id": CLIENT_ID, "endpoint_id": "ep", "status": _status(status, response_time_ms, now)}], now)
+
+    def test_snapshot_then_changes_and_throttled_latency(self):
+        response = self.client.get('/api/stream', buffered=False)
+        self.addCleanup(response.close)
+        messages = iter(response.response)
+        event, data = _event(next(messages))
+        self.assertEqual(event, 'snapshot')
+        self.assertEqual(data["statuses"][CLIENT_ID]["ep"]["response_time_ms"], 10)
+
+        self._apply("DOWN", 30) # A status change goes out right away
+        event, data = _event(next(messages))
+        self.assertEqual(event, 'statuses')
+        self.assertEqual([(c["endpoint_id"], c["status"]["status"]) for c in data["changes"]], [('ep', 'DOWN')])
+
+        self._apply("DOWN", 55) # Latency alone waits for the refresh interval
+        self.assertEqual(_event(next(messages)), (None, None)) # keepalive
+        status_feed._last_refresh -= 3600
+        self._apply("DOWN", 60)
+        event, data = _event(next(messages))
+        self.assertEqual(event, 'statuses')
+        self.assertEqual([c["status"]["response_time_ms"] for c in data["changes"]], [60])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from requests.structures import CaseInsensitiveDict
+
+from app.assertions import compiled_assertions, normalize_assertions, parse_json_path
+
+HEADERS = CaseInsensitiveDict({'Content-Type': 'application/json; charset=utf-8'}) # Like both backends' response headers
+BODY = '{"status": "ok", "version": "2.4.1", "checks": [{"name": "db", "up": true}, {"name": "cache", "up": 1}], "note": null}'.encode()
+
+
+def _evaluate(assertions, body=BODY, response_time_ms=50, truncated=False):
+    return compiled_assertions(assertions).evaluate(HEADERS, body, response_time_ms, truncated)
+
+
+class AssertionsTestCase(unittest.TestCase):
+
+    def test_matchers(self):
+        self.assertIsNone(_evaluate([{'type': 'contains', 'value': '"ok"'},
+                                     {'type': 'regex', 'pattern': r'"version": "2\.\d+'},
+                                     {'type': 'json_path', 'path': "$.checks[-1]['name']", 'value': 'cache'},
+                                     {'type': 'json_path', 'path': '$.note', 'value': None},
+                                     {'type': 'json_path', 'path': '$.checks[0].up'},
+                                     {'type': 'header', 'name': 'content-type', 'pattern': '^application/json'},
+                                     {'type': 'max_latency_ms', 'value': 50}]))
+        self.assertEqual(_evaluate([{'type': 'json_path', 'path': '$.checks[1].up', 'value': True}]),
+                         "$.checks[1].up is 1, expected true") # JSON types are compared strictly
+        self.assertEqual(_evaluate([{'type': 'json_path', 'path': '$.checks[2].name'}]), "$.checks[2].name not found")
+        self.assertEqual(_evaluate([{'type': 'json_path', 'path': '$.status.code'}]), "$.status.code not found")
+        self.assertEqual(_evaluate([{'type': 'header', 'name': 'ETag'}]), "header ETag missing")
+        self.assertEqual(_evaluate([{'type': 'max_latency_ms', 'value': 50}], response_time_ms=51), "response time 51 ms > 50 ms")
+        self.assertEqual(_evaluate([{'type': 'json_path', 'path': '$.status'}], body=BODY[:20], truncated=True),
+                         "body is not valid JSON (cut off at the body size cap)")
+        self.assertEqual(_evaluate([{'type': 'contains', 'value': 'ok'}], body=None),
+                         "response body was not read (probe_mode head/headers)")
+
+    def test_validation(self):
+        self.assertEqual(normalize_assertions('[{"type": "Contains", "value": "ok", "extra": 1}]'), [{'type': 'contains', 'value': 'ok'}])
+        self.assertEqual(normalize_assertions(''), [])
+        self.assertEqual(parse_json_path("$.a['b c'][0][-2]"), ('a', 'b c', 0, -2))
+        for invalid in ('{"type": "contains"}', [{'type': 'regex', 'pattern': '('}], [{'type': 'json_path', 'path': 'a.b'}],
+                        [{'type': 'json_path', 'path': '$.a[x]'}], [{'type': 'max_latency_ms', 'value': 0}], [{'type': 'teapot'}], '[1', 'x'):
+            with self.assertRaises(ValueError, msg=invalid): normalize_assertions(invalid)
+
+    def test_compiled_once_per_config(self):
+        assertions = [{'type': 'regex', 'pattern': 'ok'}]
+        compiled = compiled_assertions(assertions)
+        self.assertIs(compiled_assertions([{'pattern': 'ok', 'type': 'regex'}]), compiled) # Same config, e.g. after a pickle round trip
+        self.assertIsNot(compiled_assertions([{'type': 'regex', 'pattern': 'ok!'}]), compiled) # Edited
+        self.assertIsNone(compiled_assertions([]))
+
+
+if __name__ == '__main__':
+    unittest.main()
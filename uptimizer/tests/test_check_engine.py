@@ -0,0 +1,89 @@
+import time
+import threading
+import unittest
+
+from app.check_engine import CheckEngine
+
+
+class _Probe:
+    """check_fn that records how many checks run at once, overall and per host."""
+
+    def __init__(self, duration=0.05):
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+        self.finished = []
+
+    def __call__(self, endpoint, global_settings):
+        host = endpoint['url'].split('/')[2]
+        with self.lock:
+            self.running[host] = self.running.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.running[host])
+        time.sleep(self.duration)
+        with self.lock:
+            self.running[host] -= 1
+            self.finished.append(endpoint['id'])
+        return {"status": "UP"}
+
+
+def _endpoints(host, count):
+    return [{'id': f"{host}-{i}", 'url': f"http://{host}/{i}"} for i in range(count)]
+
+
+class CheckEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = CheckEngine()
+        self.addCleanup(self.engine.shutdown)
+
+    def test_per_host_limit_does_not_hold_pool_threads(self):
+        probe = _Probe()
+        settings = {'max_concurrent_checks': 4, 'max_checks_per_host': 2}
+        endpoints = _endpoints('busy', 12) + _endpoints('quiet', 2)
+        results = list(self.engine.run(endpoints, probe, settings))
+        self.assertEqual(sorted(ep['id'] for ep, _ in results), sorted(ep['id'] for ep in endpoints))
+        self.assertEqual(probe.peak['busy'], 2)
+        # The quiet host got the free threads instead of waiting behind the busy one
+        self.assertLess(max(probe.finished.index('quiet-0'), probe.finished.index('quiet-1')), 4)
+
+    def test_concurrent_batches_share_the_host_limit(self):
+        probe = _Probe()
+        settings = {'max_concurrent_checks': 8, 'max_checks_per_host': 3}
+        batches = [_endpoints('shared', 6), [{**ep, 'id': f"b-{ep['id']}"} for ep in _endpoints('shared', 6)]]
+        threads = [threading.Thread(target=lambda batch=batch: list(self.engine.run(batch, probe, settings))) for batch in batches]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join(5)
+        self.assertEqual(len(probe.finished), 12)
+        self.assertEqual(probe.peak['shared'], 3)
+
+    def test_resizing_while_a_batch_is_submitting(self):
+        probe = _Probe(duration=0.01)
+        errors, results = [], []
+        def run_batches():
+            try:
+                for n in range(20): results.extend(self.engine.run(_endpoints(f"h{n % 3}", 10), probe, {'max_checks_per_host': 2}))
+            except Exception as e: errors.append(e)
+        worker = threading.Thread(target=run_batches)
+        worker.start()
+        while worker.is_alive(): # Swaps the pool underneath the running batches
+            for workers in (2, 5): self.engine.configure({'max_concurrent_checks': workers, 'max_checks_per_host': 2})
+            time.sleep(0.005)
+        self.assertEqual(errors, [])
+        self.assertEqual([result['status'] for _, result in results], ['UP'] * 200)
+
+    def test_waiting_checks_fail_on_shutdown(self):
+        release = threading.Event()
+        def blocked(endpoint, global_settings):
+            release.wait(5)
+            return {"status": "UP"}
+        results = self.engine.run(_endpoints('slow', 3), blocked, {'max_concurrent_checks': 4, 'max_checks_per_host': 1})
+        stop = threading.Timer(0.1, lambda: (self.engine.shutdown(wait=False), release.set()))
+        stop.start()
+        statuses = sorted(result['status'] for _, result in results)
+        stop.join()
+        self.assertEqual(statuses, ['ERROR', 'ERROR', 'UP'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import time
+import unittest
+
+from flask import Flask
+
+from app.checker import _merged_probe_results
+
+
+def _endpoints(prefix, count):
+    return [{'id': f"{prefix}{i}", 'client_id': 'c1'} for i in range(count)]
+
+
+class MergedProbeResultsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ctx = Flask(__name__).app_context()
+        self.ctx.push()
+        self.addCleanup(self.ctx.pop)
+
+    def test_fast_results_are_not_held_back_by_a_slow_run(self):
+        slow, fast = _endpoints('http', 2), _endpoints('tcp', 2)
+        def slow_run():
+            time.sleep(0.3)
+            for ep in slow: yield ep, {"status": "UP"}
+        def fast_run():
+            for ep in fast: yield ep, {"status": "UP"}
+        order = [ep['id'] for ep, _ in _merged_probe_results([(slow, slow_run), (fast, fast_run)])]
+        self.assertEqual(order, ['tcp0', 'tcp1', 'http0', 'http1'])
+
+    def test_a_failing_run_reports_its_unanswered_endpoints_as_errors(self):
+        failing, other = _endpoints('http', 3), _endpoints('tcp', 2)
+        def failing_run():
+            yield failing[0], {"status": "UP"}
+            raise RuntimeError("probe worker died")
+        def other_run():
+            time.sleep(0.1)
+            for ep in other: yield ep, {"status": "DOWN"}
+        results = {ep['id']: result['status'] for ep, result in _merged_probe_results([(failing, failing_run), (other, other_run)])}
+        self.assertEqual(results, {'http0': 'UP', 'http1': 'ERROR', 'http2': 'ERROR', 'tcp0': 'DOWN', 'tcp1': 'DOWN'})
+
+    def test_single_run_is_drained_in_the_calling_thread(self):
+        endpoints = _endpoints('http', 2)
+        def run():
+            raise RuntimeError("session setup failed")
+        self.assertEqual([result['status'] for _, result in _merged_probe_results([(endpoints, run), ([], None)])], ['ERROR', 'ERROR'])
+
+
+if __name__ == '__main__':
+    unittest.main()
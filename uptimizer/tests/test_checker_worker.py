@@ -0,0 +1,36 @@
+import unittest
+from unittest import mock
+
+from app import checker_worker
+
+
+class CheckerWorkerTestCase(unittest.TestCase):
+
+    def test_results_of_a_batch_are_published(self):
+        results = [{"client_id": "c1", "endpoint_id": "ep", "status": {"status": "UP"}}]
+        with mock.patch.object(checker_worker, 'run_checks_task', return_value=results) as run, \
+             mock.patch.object(checker_worker, 'publish_results', return_value=True) as publish:
+            checker_worker.run_and_publish([{"kind": "endpoint", "id": "ep"}], {"check_timeout_seconds": 5})
+        self.assertEqual(run.call_args.kwargs["due_items"], [{"kind": "endpoint", "id": "ep"}])
+        publish.assert_called_once_with(results)
+
+    def test_empty_batches_and_publish_failures(self):
+        with mock.patch.object(checker_worker, 'run_checks_task', return_value=[]), \
+             mock.patch.object(checker_worker, 'publish_results') as publish:
+            checker_worker.run_and_publish([], {})
+        publish.assert_not_called()
+        with mock.patch.object(checker_worker, 'run_checks_task', return_value=[{"endpoint_id": "ep"}]), \
+             mock.patch.object(checker_worker, 'publish_results', return_value=False), \
+             self.assertLogs(checker_worker.app.logger, 'WARNING'): # History is the fallback; just say so
+            checker_worker.run_and_publish([], {})
+
+    def test_config_notification_reloads_and_reschedules(self):
+        with mock.patch.object(checker_worker, 'load_initial_config') as load, \
+             mock.patch.object(checker_worker, 'notify_config_changed') as reschedule:
+            checker_worker.reload_config(checker_worker.CONFIG_CHANNEL, '{"source": "web"}')
+        load.assert_called_once_with(checker_worker.CONFIG_PATH, checker_worker.state_store, keep_statuses=True)
+        reschedule.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
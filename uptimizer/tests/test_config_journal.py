@@ -0,0 +1,63 @@
+import os
+import json
+import tempfile
+import unittest
+
+from flask import Flask
+
+from app.config_manager import append_config_changes, journal_path, _replay_journal, compact_config, load_config_from_file
+
+
+class ConfigJournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.tmp.name, 'config.json')
+
+    def tearDown(self):
+        self.ctx.pop()
+        self.tmp.cleanup()
+
+    def _replay(self):
+        config = {"global_settings": {}, "clients": {"c1": {"settings": {}, "endpoints": [{"id": "a", "name": "A"}]}}}
+        _replay_journal(config, self.config_path)
+        return config
+
+    def test_replay_applies_edits_idempotently(self):
+        append_config_changes([{"op": "put_endpoint", "client_id": "c1", "endpoint": {"id": "a", "name": "renamed"}}], self.config_path)
+        append_config_changes([{"op": "put_endpoint", "client_id": "c1", "endpoint": {"id": "b", "name": "B"}},
+                               {"op": "delete_endpoint", "client_id": "c1", "endpoint_id": "missing"}], self.config_path)
+        once = self._replay()
+        self.assertEqual(once["clients"]["c1"]["endpoints"], [{"id": "a", "name": "renamed"}, {"id": "b", "name": "B"}])
+
+        # Replaying over an already-compacted config gives the same result
+        config = once
+        _replay_journal(config, self.config_path)
+        self.assertEqual(config, once)
+
+    def test_torn_line_only_loses_itself(self):
+        append_config_changes([{"op": "delete_client", "client_id": "c1"}], self.config_path)
+        with open(journal_path(self.config_path), 'a') as f: f.write('{"op": "put_cli') # Crash mid-write
+        append_config_changes([{"op": "put_client", "client_id": "c2", "settings": {"name": "Two"}}], self.config_path)
+        self.assertEqual(list(self._replay()["clients"]), ["c2"])
+
+    def test_compaction_folds_the_journal_from_the_files(self):
+        with open(self.config_path, 'w') as f:
+            json.dump({"global_settings": {}, "clients": {"c1": {"settings": {"name": "One"}, "endpoints": []}}}, f)
+        # Journaled by another process; this one never replayed it
+        append_config_changes([{"op": "put_endpoint", "client_id": "c1", "endpoint": {"id": "a", "name": "A", "url": "http://a/"}}], self.config_path)
+        self.assertTrue(compact_config(self.config_path))
+        self.assertEqual(os.path.getsize(journal_path(self.config_path)), 0)
+        with open(self.config_path) as f: compacted = json.load(f)
+        self.assertEqual([ep["id"] for ep in compacted["clients"]["c1"]["endpoints"]], ["a"])
+        self.assertFalse(compact_config(self.config_path)) # Nothing left to fold
+
+        append_config_changes([{"op": "delete_endpoint", "client_id": "c1", "endpoint_id": "a"}], self.config_path)
+        self.assertEqual(load_config_from_file(self.config_path)["clients"]["c1"]["endpoints"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
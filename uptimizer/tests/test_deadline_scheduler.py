@@ -0,0 +1,101 @@
+import time
+import unittest
+import threading
+
+from app.deadline_scheduler import DeadlineScheduler
+from app.state_store import StateStore
+
+
+def _state(*endpoints):
+    return {
+        "global_settings": {"check_interval_seconds": 30, "schedule_jitter_ratio": 0.0},
+        "clients": {"c1": {"settings": {"client_type": "local"}, "endpoints": list(endpoints), "statuses": {}}},
+    }
+
+
+class DeadlineSchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.store = StateStore(_state({"id": "fast", "url": "http://a/", "check_interval_seconds": 5},
+                                       {"id": "slow", "url": "http://b/", "check_interval_seconds": 300}))
+        self.scheduler = DeadlineScheduler()
+        self.scheduler._state_store = self.store
+        self.scheduler._sync()
+
+    def _due_ids(self, now):
+        with self.scheduler._cond:
+            return sorted(item["id"] for _, item in self.scheduler._pop_due(now))
+
+    def _finish(self, *ids):
+        self.scheduler._in_flight -= {("endpoint", "c1", ep_id) for ep_id in ids}
+
+    def test_each_endpoint_fires_at_its_own_interval(self):
+        now = time.time()
+        self.assertEqual(self._due_ids(now), ["fast", "slow"])
+        self._finish("fast", "slow")
+        self.assertEqual(self._due_ids(now + 1), [])
+        self.assertEqual(self._due_ids(now + 5), ["fast"])
+        self._finish("fast")
+        self.assertEqual(self._due_ids(now + 10), ["fast"])
+
+    def test_in_flight_items_are_not_stacked(self):
+        now = time.time()
+        self._due_ids(now)
+        self.assertEqual(self._due_ids(now + 5), []) # 'fast' still running
+
+    def test_removed_endpoints_are_dropped_on_sync(self):
+        now = time.time()
+        with self.store.write() as draft: draft.client("c1")["endpoints"].pop(0)
+        self.scheduler._sync()
+        self.assertEqual(self._due_ids(now), ["slow"])
+
+    def test_only_owned_endpoints_are_scheduled(self):
+        now = time.time()
+        self.scheduler._owns = lambda endpoint_id: endpoint_id == "slow" # Another replica checks 'fast'
+        self.scheduler._sync()
+        self.assertEqual(self._due_ids(now), ["slow"])
+
+    def test_jitter_stays_around_a_fixed_anchor(self):
+        self.scheduler._global_settings = {"schedule_jitter_ratio": 0.2}
+        key = ("endpoint", "c1", "slow")
+        now = time.time()
+        anchor = self.scheduler._entries[key]["base"]
+        for run in range(1, 200): # A random walk would drift far past 0.2 * 300s by now
+            due = self.scheduler._entries[key]["due"]
+            with self.scheduler._cond: self.scheduler._pop_due(max(now, due))
+            self._finish("fast", "slow")
+            self.assertLessEqual(abs(self.scheduler._entries[key]["due"] - (anchor + run * 300)), 0.2 * 300)
+
+    def test_reloaded_endpoints_run_right_away(self):
+        now = time.time()
+        with self.store.write() as draft:
+            draft.client("c1")["statuses"] = {"fast": {"last_check_ts": now}, "slow": {"last_check_ts": now}}
+        self.scheduler._entries.clear()
+        self.scheduler._sync()
+        self.assertEqual(self._due_ids(now + 1), [])
+        with self.store.write() as draft: # Reload: every endpoint is PENDING again
+            draft.client("c1")["statuses"] = {"fast": {"status": "PENDING", "last_check_ts": 0}, "slow": {"status": "PENDING", "last_check_ts": 0}}
+        self.scheduler._sync()
+        self.assertEqual(self._due_ids(now + 1), ["fast", "slow"])
+
+    def test_batches_cancelled_on_shutdown_leave_no_in_flight_keys(self):
+        now, release = time.time(), threading.Event()
+        endpoints = [{"id": f"ep{i}", "url": "http://a/", "check_interval_seconds": 5} for i in range(8)]
+        store = StateStore(_state(*endpoints))
+        with store.write() as draft: # Due 0.3s apart: one batch each, more batches than dispatcher threads
+            draft.client("c1")["statuses"] = {f"ep{i}": {"last_check_ts": now - 5 + i * 0.3} for i in range(8)}
+        started = []
+        scheduler = DeadlineScheduler()
+        scheduler.start(lambda items, settings: (started.append(items), release.wait(5)), store)
+        deadline = time.time() + 5
+        while len(scheduler._in_flight) < 6 and time.time() < deadline: time.sleep(0.05)
+        scheduler.shutdown(wait=False) # Cancels the batches queued behind the blocked ones
+        release.set()
+        deadline = time.time() + 5
+        while scheduler._in_flight and time.time() < deadline: time.sleep(0.05)
+        self.assertEqual(scheduler._in_flight, set())
+        self.assertLess(len(started), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from app.downsampling import downsample_history, lttb_indices
+
+
+def _points(statuses, start=datetime(2026, 1, 1, tzinfo=timezone.utc), step=timedelta(seconds=5)):
+    return [
+        {"timestamp": (start + step * i).isoformat(), "status": status,
+         "response_time_ms": (100 + (i * 37) % 200) if status == "UP" else None}
+        for i, status in enumerate(statuses)
+    ]
+
+def _transitions(points):
+    return [(a["timestamp"], b["timestamp"]) for a, b in zip(points, points[1:]) if a["status"] != b["status"]]
+
+
+class DownsamplingTestCase(unittest.TestCase):
+
+    def test_lttb_keeps_endpoints_and_size(self):
+        xs = list(range(1000)); ys = [(x * 7919) % 113 for x in xs]
+        indices = lttb_indices(xs, ys, 50)
+        self.assertEqual(len(indices), 50)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertEqual(indices, sorted(set(indices)))
+
+    def test_short_series_is_returned_unchanged(self):
+        points = _points(["UP"] * 20)
+        self.assertIs(downsample_history(points, 100), points)
+        self.assertIs(downsample_history(points, None), points)
+
+    def test_status_transitions_survive_downsampling(self):
+        statuses = ["UP"] * 5000 + ["DOWN"] * 3 + ["UP"] * 4000 + ["ERROR"] + ["UP"] * 3000
+        points = _points(statuses)
+        reduced = downsample_history(points, 300)
+        self.assertLessEqual(len(reduced), 300)
+        self.assertEqual(_transitions(reduced), _transitions(points))
+        self.assertEqual((reduced[0], reduced[-1]), (points[0], points[-1]))
+
+    def test_transitions_win_over_budget(self):
+        points = _points(["UP", "DOWN"] * 50)
+        self.assertEqual(len(downsample_history(points, 10)), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import io
+import unittest
+
+from app.endpoint_bulk import BulkImportError, iter_records, plan_import, export_lines
+
+
+def _records(text, fmt='csv', max_records=100):
+    return list(iter_records(io.BytesIO(text.encode()), fmt, max_records))
+
+
+class EndpointBulkTestCase(unittest.TestCase):
+
+    def test_plan_applies_config_rules_and_keeps_order(self):
+        existing = [{"id": "a", "name": "A", "url": "http://a", "group": "G"},
+                    {"id": "b", "name": "B", "url": "http://b", "group": "G"}]
+        records = _records("action,id,name,url,group,check_interval_seconds\n"
+                           ",a,A2,http://a,G,1\n"
+                           "delete,b,,,,\n"
+                           ",,New, http://new ,,\n"
+                           "delete,zzz,,,,\n")
+        endpoints, summary = plan_import(existing, records)
+
+        self.assertEqual([ep["id"] for ep in endpoints[:1]], ["a"])
+        self.assertEqual(endpoints[0]["check_interval_seconds"], 5) # Clamped like process_config_data
+        self.assertEqual((endpoints[1]["url"], endpoints[1]["group"]), ("http://new", "Default Group"))
+        self.assertEqual({k: summary[k] for k in ("created", "updated", "deleted", "not_found")},
+                         {"created": 1, "updated": 1, "deleted": 1, "not_found": 1})
+
+    def test_invalid_records_reject_the_whole_import(self):
+        records = _records('{"id": "a", "name": "A", "url": "http://a"}\n\n'
+                           '{"name": "no url"}\n'
+                           '{"id": "a", "name": "again", "url": "http://a"}\n', fmt='jsonl')
+        with self.assertRaises(BulkImportError) as ctx: plan_import([], records)
+        self.assertEqual([error["line"] for error in ctx.exception.errors], [3, 4])
+
+        with self.assertRaises(BulkImportError): _records("name,url\na,b\nc,d\n", max_records=1)
+        with self.assertRaises(BulkImportError): _records("name,url,color\na,b,red\n")
+
+    def test_export_round_trips_unchanged(self):
+        existing = [{"id": "a", "name": "A, Inc", "url": "http://a", "group": "G", "check_timeout_seconds": 3},
+                    {"id": "b", "name": "B", "url": "http://b", "group": "G", "probe_mode": "partial", "probe_max_bytes": 4096,
+                     "assertions": [{"type": "json_path", "path": "$.status", "value": "ok"}, {"type": "max_latency_ms", "value": 800}]}]
+        for fmt in ("csv", "jsonl"):
+            exported = "".join(export_lines(existing, fmt))
+            endpoints, summary = plan_import(existing, _records(exported, fmt), mode='replace')
+            self.assertEqual(endpoints, existing)
+            self.assertEqual((summary["unchanged"], summary["deleted"]), (2, 0))
+
+    def test_ids_of_other_clients_are_regenerated(self):
+        exported = "".join(export_lines([{"id": "a", "name": "A", "url": "http://a", "group": "G"},
+                                         {"id": "b", "name": "B", "url": "http://b", "group": "G"}], 'jsonl'))
+        existing = [{"id": "b", "name": "Old B", "url": "http://b", "group": "G"}]
+        endpoints, summary = plan_import(existing, _records(exported, 'jsonl'), other_ids={"a", "b", "x"})
+        new_id = summary["renamed"]["a"]
+        self.assertEqual(list(summary["renamed"]), ["a"]) # 'b' is this client's own endpoint: updated in place
+        self.assertNotIn(new_id, {"a", "b", "x"})
+        self.assertEqual([ep["id"] for ep in endpoints], ["b", new_id])
+        self.assertEqual(summary["ids"], [new_id, "b"])
+
+        with self.assertRaises(BulkImportError): # Still a duplicate within the import
+            plan_import([], _records(exported + exported.splitlines(True)[0], 'jsonl'), other_ids={"a"})
+
+    def test_probe_mode_rules(self):
+        records = _records("name,url,probe_mode,probe_max_bytes\n"
+                           "A,http://a,HEAD,\n"
+                           "B,http://b,teapot,0\n")
+        endpoints, _ = plan_import([], records)
+        self.assertEqual(endpoints[0]["probe_mode"], "head")
+        self.assertNotIn("probe_mode", endpoints[1]) # Unknown modes drop the override (default GET)
+        self.assertEqual(endpoints[1]["probe_max_bytes"], 1)
+
+        with self.assertRaises(BulkImportError): # Body assertions need a body
+            plan_import([], _records('name,url,probe_mode,assertions\nA,http://a,head,"[{""type"": ""contains"", ""value"": ""ok""}]"\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from app.hash_ring import HashRing
+
+
+class HashRingTestCase(unittest.TestCase):
+
+    def test_keys_spread_and_only_the_lost_share_moves(self):
+        keys = [f"ep_{i}" for i in range(6000)]
+        ring = HashRing(["a", "b", "c"])
+        owners = {key: ring.owner(key) for key in keys}
+        for member in "abc":
+            self.assertAlmostEqual(list(owners.values()).count(member) / len(keys), 1 / 3, delta=0.08)
+
+        shrunk = HashRing(["a", "c"])
+        moved = [key for key in keys if shrunk.owner(key) != owners[key]]
+        self.assertTrue(all(owners[key] == "b" for key in moved)) # Only b's keys are reassigned
+        self.assertEqual(HashRing(["c", "a"]).owner("ep_1"), shrunk.owner("ep_1")) # Same answer on every replica
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import time
+import threading
+import unittest
+from contextlib import contextmanager
+from unittest import mock
+
+from app import history_writer as writer_module
+from app import database
+from app.history_writer import HistoryWriter, MAX_WRITE_ATTEMPTS
+
+
+class _FakeSession:
+    """Records the rows of each insert; fails the first `failures` inserts."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def execute(self, statement, rows):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("connection reset")
+            self.batches.append(list(rows))
+
+
+def _row(endpoint_id, status="DOWN"):
+    return {"endpoint_id": endpoint_id, "status": status, "details": None}
+
+
+class HistoryWriterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.session = _FakeSession()
+
+        @contextmanager
+        def session_scope():
+            yield self.session
+
+        for patcher in (mock.patch.object(writer_module, "session_scope", session_scope),
+                        mock.patch.object(writer_module, "time", mock.Mock(wraps=time, sleep=lambda seconds: None)), # No retry backoff
+                        mock.patch.object(writer_module.models, "ENGINE_INITIALIZED", True),
+                        mock.patch.object(writer_module.models, "DB_TABLES_CREATED", True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _writer(self, **kwargs):
+        writer = HistoryWriter(**{"batch_size": 3, "flush_interval": 0.2, "max_queue": 100, "enqueue_timeout": 0, **kwargs})
+        self.addCleanup(writer.shutdown, 1)
+        return writer
+
+    def _wait_for(self, condition, timeout=3):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline: time.sleep(0.01)
+        return condition()
+
+    def test_full_batch_is_flushed_without_waiting_for_the_interval(self):
+        writer = self._writer(flush_interval=30)
+        for i in range(3): writer.enqueue(_row(f"ep{i}"))
+        self.assertTrue(self._wait_for(lambda: self.session.batches))
+        self.assertEqual([len(batch) for batch in self.session.batches], [3])
+
+    def test_partial_batch_is_flushed_after_the_interval(self):
+        writer = self._writer()
+        writer.enqueue(_row("ep1"))
+        self.assertTrue(self._wait_for(lambda: self.session.batches))
+        self.assertEqual(self.session.batches, [[_row("ep1")]])
+        self.assertEqual(writer.written_rows, 1)
+
+    def test_failed_insert_is_retried(self):
+        self.session.failures = MAX_WRITE_ATTEMPTS - 1
+        writer = self._writer()
+        self.assertEqual(writer._write([_row("ep1")]), 1)
+        self.assertEqual(writer.dropped_rows, 0)
+
+    def test_batch_is_dropped_after_the_last_attempt_and_hooks_see_it(self):
+        self.session.failures = MAX_WRITE_ATTEMPTS
+        writer = self._writer()
+        dropped = []
+        writer.add_drop_hook(dropped.extend)
+        self.assertEqual(writer._write([_row("ep1"), _row("ep2")]), 0)
+        self.assertEqual(writer.dropped_rows, 2)
+        self.assertEqual([row["endpoint_id"] for row in dropped], ["ep1", "ep2"])
+
+    def test_full_queue_drops_the_row(self):
+        writer = self._writer(max_queue=1)
+        writer._ensure_started = lambda: None # No writer thread draining the queue
+        dropped = []
+        writer.add_drop_hook(dropped.extend)
+        self.assertTrue(writer.enqueue(_row("ep1")))
+        self.assertFalse(writer.enqueue(_row("ep2")))
+        self.assertEqual(dropped, [_row("ep2")])
+
+    def test_shutdown_flushes_queued_rows(self):
+        writer = self._writer(flush_interval=30)
+        for i in range(5): writer.enqueue(_row(f"ep{i}"))
+        writer.shutdown(timeout=1)
+        self.assertEqual(sorted(row["endpoint_id"] for batch in self.session.batches for row in batch), [f"ep{i}" for i in range(5)])
+        self.assertEqual(writer.written_rows, 5)
+
+    def test_dropped_rows_no_longer_suppress_the_next_result(self):
+        self.addCleanup(database.last_saved_status.clear)
+        database.last_saved_status.update({"ep1": {"status": "DOWN", "details": None}, "ep2": {"status": "UP", "details": None}})
+        database._forget_dropped_rows([_row("ep1"), _row("ep2")]) # ep2 was saved UP again meanwhile
+        self.assertEqual(database.last_saved_status, {"ep2": {"status": "UP", "details": None}})
+
+
+if __name__ == '__main__':
+    unittest.main()
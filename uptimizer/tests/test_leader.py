@@ -0,0 +1,103 @@
+import unittest
+from unittest import mock
+
+from app import leader as leader_module
+from app.leader import LeaderElector
+
+
+class _FakeLock:
+    """The advisory lock of a fake Postgres, shared by every connection of one test."""
+
+    def __init__(self):
+        self.holder = None
+
+
+class _FakeConnection:
+    def __init__(self, lock):
+        self.lock = lock
+        self.closed = False
+        self.ping_fails = False
+
+    def execution_options(self, **options):
+        return self
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if self.closed: raise RuntimeError("connection closed")
+        if sql == "SELECT 1":
+            if self.ping_fails: raise RuntimeError("server closed the connection unexpectedly")
+            return None
+        if sql.startswith("SELECT pg_try_advisory_lock"):
+            acquired = self.lock.holder in (None, self)
+            if acquired: self.lock.holder = self
+            return mock.Mock(scalar=lambda: acquired)
+        if sql.startswith("SELECT pg_advisory_unlock"):
+            if self.lock.holder is self: self.lock.holder = None
+            return None
+        raise AssertionError(f"unexpected statement {sql}")
+
+    def close(self):
+        self.closed = True
+        if self.lock.holder is self: self.lock.holder = None # Postgres ends the session, and the lock with it
+
+
+class LeaderElectorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = _FakeLock()
+        self.connections = []
+        def connect():
+            connection = _FakeConnection(self.lock)
+            self.connections.append(connection)
+            return connection
+        for patcher in (mock.patch.object(leader_module.models, 'engine', mock.Mock(connect=connect)),
+                        mock.patch.object(leader_module.models, 'ENGINE_INITIALIZED', True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.events = []
+
+    def _elector(self):
+        elector = LeaderElector(enabled=True, lock_key=42, poll_seconds=3600) # Rounds are driven by the test
+        elector._on_elected, elector._on_demoted = lambda: self.events.append('elected'), lambda: self.events.append('demoted')
+        return elector
+
+    def test_only_one_process_leads(self):
+        first, second = self._elector(), self._elector()
+        first._campaign(); second._campaign()
+        self.assertEqual((first.is_leader, second.is_leader), (True, False))
+        self.assertTrue(self.connections[1].closed) # A follower doesn't keep a connection between rounds
+        first._campaign() # Ping succeeds: still the leader, no new connection
+        self.assertEqual((first.is_leader, len(self.connections)), (True, 2))
+
+    def test_failed_ping_steps_down_and_a_follower_takes_over(self):
+        first, second = self._elector(), self._elector()
+        first._campaign()
+        self.connections[0].ping_fails = True
+        second._campaign() # The lock is still held until the leader's session is gone
+        self.assertFalse(second.is_leader)
+        first._campaign() # Ping fails: step down, then campaign again on a new connection
+        self.assertEqual(self.events[:2], ['elected', 'demoted'])
+        self.assertTrue(self.connections[0].closed)
+        self.assertTrue(first.is_leader) # Nobody else had the lock yet, so it was re-elected
+        first.shutdown()
+        self.assertFalse(first.is_leader)
+        second._campaign()
+        self.assertTrue(second.is_leader)
+        self.assertEqual(self.events, ['elected', 'demoted', 'elected', 'demoted', 'elected'])
+
+    def test_database_errors_leave_a_follower(self):
+        elector = self._elector()
+        with mock.patch.object(leader_module.models, 'engine', mock.Mock(connect=mock.Mock(side_effect=RuntimeError("refused")))):
+            elector._campaign()
+        self.assertFalse(elector.is_leader)
+        self.assertEqual(self.events, [])
+
+    def test_without_election_the_process_leads(self):
+        elector = LeaderElector(enabled=False)
+        elector.start(on_elected=lambda: self.events.append('elected'))
+        self.assertTrue(elector.is_leader)
+        self.assertEqual((self.events, self.connections), (['elected'], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from app.link_fetcher import CircuitBreaker, LinkFetcher
+
+
+class FakeClock:
+    def __init__(self): self.now = 1000.0
+    def __call__(self): return self.now
+
+
+class LinkFetcherTestCase(unittest.TestCase):
+
+    def test_breaker_opens_backs_off_and_recovers(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failures=3, backoff_seconds=30, max_backoff_seconds=100, clock=clock)
+        self.assertIsNone(breaker.record(False))
+        self.assertIsNone(breaker.record(False))
+        self.assertEqual(breaker.record(False), 'opened')
+        self.assertEqual(breaker.allow(), (False, 30))
+
+        clock.now += 30
+        self.assertEqual(breaker.allow(), (True, 0)) # One trial...
+        self.assertFalse(breaker.allow()[0])         # ...at a time
+        self.assertIsNone(breaker.record(False))     # Failed trial doubles the backoff
+        clock.now += 59
+        self.assertFalse(breaker.allow()[0])
+        clock.now += 1
+        self.assertTrue(breaker.allow()[0])
+        breaker.record(False)
+        clock.now += 100 # Capped at max_backoff_seconds
+        self.assertTrue(breaker.allow()[0])
+        self.assertEqual(breaker.record(True), 'closed')
+        self.assertEqual(breaker.allow(), (True, 0))
+
+    def test_fetches_run_concurrently_and_skip_open_remotes(self):
+        fetcher = LinkFetcher(max_workers=8)
+        calls = []
+        def fetch(client, global_settings):
+            calls.append(client['id'])
+            return {"error": "Connection error"} if client['remote_url'] == 'http://down' else {"ep": {"status": "UP"}}
+        clients = [{'id': 'up', 'remote_url': 'http://up/'}, {'id': 'down', 'remote_url': 'http://down'}]
+        try:
+            for _ in range(3): results = dict((client['id'], result) for client, result in fetcher.run(clients, fetch, {}))
+            self.assertEqual(results['up'], {"ep": {"status": "UP"}})
+            calls.clear()
+            results = dict((client['id'], result) for client, result in fetcher.run(clients, fetch, {}))
+            self.assertEqual(calls, ['up']) # Breaker of http://down opened after 3 failures
+            self.assertTrue(results['down']['error'].startswith("Remote unavailable"))
+        finally:
+            fetcher.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
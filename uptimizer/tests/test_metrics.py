@@ -0,0 +1,34 @@
+import unittest
+
+from app.metrics import Counter, Gauge, Histogram, Registry
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def test_render_text_format(self):
+        registry = Registry()
+        checks = Counter('checks_total', "Checks.", ['status'], registry=registry)
+        checks.labels('UP').inc(3)
+        latency = Histogram('latency_seconds', "Latency.", buckets=(0.1, 1), registry=registry)
+        for value in (0.05, 0.5, 2): latency.observe(value)
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:3], ['# HELP checks_total Checks.', '# TYPE checks_total counter', 'checks_total{status="UP"} 3'])
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="1"} 2', lines) # Buckets are cumulative
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_sum 2.55', lines)
+        self.assertIn('latency_seconds_count 3', lines)
+
+    def test_collectors_and_label_escaping(self):
+        registry = Registry()
+        def collect():
+            up = Gauge('endpoint_up', "Up.", ['name'], registry=False)
+            up.labels('say "hi"\\\n').set(1)
+            return [up]
+        registry.add_collector(collect)
+        self.assertIn('endpoint_up{name="say \\"hi\\"\\\\\\n"} 1', registry.render())
+        with self.assertRaises(ValueError): Counter('x_total', "X.", ['a'], registry=False).labels()
+
+
+if __name__ == '__main__':
+    unittest.main()
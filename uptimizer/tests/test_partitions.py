@@ -0,0 +1,69 @@
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from app import partitions
+from app.partitions import expired_partitions, partition_name, partition_range
+
+NOW = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+T0 = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def _days(first, count):
+    return [partition_name(first + timedelta(days=i), 'day') for i in range(count)]
+
+
+class _FakeSession:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+
+
+class ExpiredPartitionsTestCase(unittest.TestCase):
+
+    def test_partition_names_round_trip(self):
+        self.assertEqual(partition_range(partition_name(T0, 'day')), (T0, T0 + timedelta(days=1)))
+        self.assertEqual(partition_range(partition_name(T0, 'month')), (T0, datetime(2026, 11, 1, tzinfo=timezone.utc)))
+        self.assertIsNone(partition_range('status_history_default'))
+
+    def test_only_partitions_past_the_cutoff_and_covered_by_both_rollups(self):
+        names = _days(T0, 10) + ['status_history_default']
+        watermarks = {'hour': (T0 + timedelta(days=2), T0 + timedelta(days=9)), 'day': (T0, T0 + timedelta(days=6))}
+        self.assertEqual(expired_partitions(names, watermarks, T0 + timedelta(days=8)), _days(T0 + timedelta(days=2), 4))
+
+    def test_partial_coverage_keeps_the_partition(self):
+        watermarks = {'hour': (T0 + timedelta(hours=1), T0 + timedelta(days=5)), 'day': (T0, T0 + timedelta(days=5))}
+        self.assertEqual(expired_partitions(_days(T0, 2), watermarks, NOW), _days(T0 + timedelta(days=1), 1))
+
+    def test_legacy_history_older_than_the_backfill_is_kept(self):
+        legacy = _days(T0 - timedelta(days=500), 3) # Migrated rows, never rolled up
+        watermarks = {'hour': (T0 - timedelta(days=90), T0), 'day': (T0 - timedelta(days=400), T0)}
+        self.assertEqual(expired_partitions(legacy, watermarks, NOW), [])
+        self.assertEqual(expired_partitions(legacy, {}, NOW), [])
+        # ...until rollup retention has expired that age anyway
+        self.assertEqual(expired_partitions(legacy, watermarks, NOW, rollup_cutoff=T0 - timedelta(days=450)), legacy)
+        self.assertEqual(expired_partitions(legacy, watermarks, T0 - timedelta(days=499), rollup_cutoff=T0), legacy[:1]) # Raw retention still applies
+
+    def test_drop_uses_watermarks_and_retention(self):
+        session = _FakeSession()
+        @contextmanager
+        def session_scope(): yield session
+        names = _days(NOW.replace(hour=0) - timedelta(days=20), 21)
+        watermarks = {'hour': (NOW - timedelta(days=10), NOW), 'day': (NOW - timedelta(days=400), NOW)}
+        with mock.patch.object(partitions, 'session_scope', session_scope), \
+             mock.patch.object(partitions, 'is_partitioned', lambda s: True), \
+             mock.patch.object(partitions, 'list_partitions', lambda s: names), \
+             mock.patch.object(partitions, 'get_watermarks', lambda s: watermarks), \
+             mock.patch.object(partitions.models, 'ENGINE_INITIALIZED', True), \
+             mock.patch.object(partitions.models, 'DB_TABLES_CREATED', True):
+            dropped = partitions.drop_expired_partitions(7, now=NOW)
+        # Older than 7 days, and not before the hour rollups' start 10 days ago
+        self.assertEqual(dropped, _days(NOW.replace(hour=0) - timedelta(days=9), 2))
+        self.assertEqual(session.statements, [f'DROP TABLE IF EXISTS {name}' for name in dropped])
+
+
+if __name__ == '__main__':
+    unittest.main()
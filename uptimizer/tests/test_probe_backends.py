@@ -0,0 +1,205 @@
+import time
+import socket
+import threading
+import unittest
+from unittest import mock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from app import probe_backends
+from app.probe_backends import AiohttpProbeBackend, ProcessPoolProbeBackend, RequestsProbeBackend, partition_by_host
+
+
+STREAM_CHUNKS, STREAM_CHUNK = 10, b'x' * 16384
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.methods.append(self.command)
+        if self.path.endswith('/stream'): return self._stream()
+        if self.path.endswith('/slow'): time.sleep(0.2) # Server think time, before the headers
+        body = b'{"status": "ok", "checks": [{"name": "db", "status": "pass"}]}' if self.path.endswith('/json') else b''
+        self.send_response(200 if self.path.startswith('/ok') else 503)
+        self.send_header('Content-Type', 'application/json')
+        if self.path.endswith('/login'): self.send_header('Set-Cookie', 'session=abc; Path=/')
+        self.server.cookies_received.append(self.headers.get('Cookie'))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD': self.wfile.write(body)
+
+    do_HEAD = do_GET
+
+    def _stream(self):
+        """A body trickled out over ~0.5s (ending in 'END'), so reading all of it shows in the response time."""
+        self.send_response(200)
+        self.send_header('Content-Length', str(STREAM_CHUNKS * len(STREAM_CHUNK) + 3))
+        self.end_headers()
+        if self.command == 'HEAD': return
+        try:
+            for _ in range(STREAM_CHUNKS):
+                self.wfile.write(STREAM_CHUNK); self.wfile.flush()
+                time.sleep(0.05)
+            self.wfile.write(b'END')
+        except (BrokenPipeError, ConnectionResetError): pass # The probe stopped reading
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.cookies_received = []
+    server.methods = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ProbeBackendsTestCase(unittest.TestCase):
+
+    def test_partition_keeps_each_host_in_one_part(self):
+        endpoints = [{'id': f"ep_{i}", 'url': f"https://host{i % 40}.example:8443/path/{i}"} for i in range(400)]
+        parts = partition_by_host(endpoints, 4)
+        self.assertEqual(sorted(ep['id'] for part in parts for ep in part), sorted(ep['id'] for ep in endpoints))
+        hosts = [{ep['url'].split('/')[2] for ep in part} for part in parts]
+        self.assertEqual(sum(len(h) for h in hosts), 40) # No host is split between parts
+        self.assertTrue(all(parts)) # 40 hosts spread over every part
+        self.assertEqual(partition_by_host(endpoints, 4), parts) # Stable between batches
+
+    def test_process_backend_merges_results_from_workers(self):
+        server = _serve()
+        port = server.server_address[1]
+        backend = ProcessPoolProbeBackend()
+        try:
+            endpoints = [{'id': f"ep_{i}", 'client_id': 'c', 'url': f"http://{host}:{port}/{'ok' if i % 3 else 'fail'}/{i}"}
+                         for i, host in enumerate(['127.0.0.1', 'localhost'] * 10)]
+            settings = {'probe_processes': 2, 'check_timeout_seconds': 5}
+            results = {endpoint['id']: result['status'] for endpoint, result in backend.run_batch(endpoints, settings)}
+            self.assertEqual(results, {f"ep_{i}": 'UP' if i % 3 else 'DOWN' for i in range(20)})
+            results = list(backend.run_batch(endpoints[:3], settings)) # Workers are reused
+            self.assertEqual(len(results), 3)
+        finally:
+            backend.shutdown()
+            server.shutdown()
+
+    def test_requests_backend_phase_timings(self):
+        server = _serve()
+        try:
+            result = RequestsProbeBackend().check({'url': f"http://127.0.0.1:{server.server_address[1]}/ok/slow"}, {'check_timeout_seconds': 5})
+            self.assertEqual(result['status'], 'UP')
+            self.assertGreaterEqual(result['ttfb_ms'], 190) # The wait is the server's, not the connection's
+            self.assertLess(result['connect_ms'], 150)
+            self.assertEqual(result['tls_ms'], 0) # Plain HTTP
+            self.assertLessEqual(sum(result[field] for field in ('dns_ms', 'connect_ms', 'ttfb_ms', 'transfer_ms')), result['response_time_ms'] + 1)
+        finally:
+            server.shutdown()
+
+        with socket.socket() as unused: # Nothing listens here: fails while connecting
+            unused.bind(('127.0.0.1', 0))
+            port = unused.getsockname()[1]
+        result = RequestsProbeBackend().check({'url': f"http://127.0.0.1:{port}/"}, {'check_timeout_seconds': 5})
+        self.assertEqual(result['status'], 'DOWN')
+        self.assertIsNotNone(result['connect_ms'])
+        self.assertIsNone(result['ttfb_ms']) # Never reached
+
+    def test_requests_backend_without_urllib3_internals_records_only_the_total(self):
+        server = _serve()
+        try:
+            with mock.patch.object(probe_backends, 'URLLIB3_PHASE_TIMINGS', False):
+                result = RequestsProbeBackend().check({'url': f"http://127.0.0.1:{server.server_address[1]}/ok/slow"}, {'check_timeout_seconds': 5})
+            self.assertEqual(result['status'], 'UP')
+            self.assertGreaterEqual(result['response_time_ms'], 190)
+            self.assertEqual([result[field] for field in ('dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'transfer_ms')], [None] * 5)
+        finally:
+            server.shutdown()
+
+    def test_requests_backend_assertions(self):
+        server = _serve()
+        url = f"http://127.0.0.1:{server.server_address[1]}/ok/json"
+        backend = RequestsProbeBackend()
+        def check(assertions, **endpoint): return backend.check({'url': url, 'assertions': assertions, **endpoint}, {'check_timeout_seconds': 5})
+        try:
+            passing = [{'type': 'json_path', 'path': '$.checks[0].status', 'value': 'pass'}, {'type': 'header', 'name': 'content-type', 'pattern': 'json'}]
+            self.assertEqual(check(passing)['status'], 'UP')
+            result = check([{'type': 'contains', 'value': '"ok"'}, {'type': 'contains', 'value': 'degraded'}])
+            self.assertEqual((result['status'], result['status_code']), ('DOWN', 200))
+            self.assertEqual(result['details'], "Assertion failed: body does not contain 'degraded'")
+            result = check([{'type': 'json_path', 'path': '$.status', 'value': 'ok'}], probe_mode='partial', probe_max_bytes=10)
+            self.assertEqual(result['details'], "Assertion failed: body is not valid JSON (cut off at the body size cap)")
+            self.assertEqual(check([{'type': 'regex', 'pattern': '('}])['status'], 'ERROR')
+        finally:
+            server.shutdown()
+
+    def test_sessions_do_not_keep_cookies(self):
+        server = _serve()
+        base = f"http://127.0.0.1:{server.server_address[1]}/ok"
+        aiohttp_backend = AiohttpProbeBackend()
+        try:
+            for backend in (RequestsProbeBackend(), aiohttp_backend):
+                for path in ('/login', '/next'):
+                    results = list(backend.run_batch([{'id': 'ep', 'url': base + path}], {'check_timeout_seconds': 5}))
+                    self.assertEqual(results[0][1]['status'], 'UP')
+            self.assertEqual(server.cookies_received, [None] * 4)
+        finally:
+            aiohttp_backend.shutdown()
+            server.shutdown()
+
+    def test_aiohttp_limit_change_does_not_break_running_batches(self):
+        server = _serve()
+        backend = AiohttpProbeBackend()
+        endpoints = [{'id': f"ep_{i}", 'url': f"http://127.0.0.1:{server.server_address[1]}/ok/{i}/slow"} for i in range(6)]
+        first = []
+        try:
+            running = threading.Thread(target=lambda: first.extend(backend.run_batch(endpoints, {'check_timeout_seconds': 5, 'max_concurrent_checks': 2})))
+            running.start()
+            time.sleep(0.1) # The first batch has requests in flight on the old session
+            second = list(backend.run_batch(endpoints[:2], {'check_timeout_seconds': 5, 'max_concurrent_checks': 3}))
+            running.join(5)
+            self.assertEqual([result['status'] for _, result in first], ['UP'] * 6)
+            self.assertEqual([result['status'] for _, result in second], ['UP'] * 2)
+            self.assertEqual(backend._batches, {}) # The replaced session was closed by its last batch
+        finally:
+            backend.shutdown()
+            server.shutdown()
+
+    def test_probe_modes(self):
+        server = _serve()
+        url = f"http://127.0.0.1:{server.server_address[1]}/ok/stream"
+        aiohttp_backend = AiohttpProbeBackend()
+        try:
+            for backend in (RequestsProbeBackend(), aiohttp_backend):
+                with self.subTest(backend=backend.name):
+                    def check(probe_mode, assertions=None, **endpoint):
+                        del server.methods[:]
+                        endpoint = {'id': 'ep', 'url': url, 'probe_mode': probe_mode, 'assertions': assertions, **endpoint}
+                        (_, result), = backend.run_batch([endpoint], {'check_timeout_seconds': 5})
+                        return result, server.methods[:]
+
+                    result, methods = check('get', [{'type': 'contains', 'value': 'END'}])
+                    self.assertEqual((result['status'], methods), ('UP', ['GET']))
+                    self.assertGreaterEqual(result['response_time_ms'], 450) # Waited for the whole body
+
+                    result, methods = check('head')
+                    self.assertEqual((result['status'], result['status_code'], methods), ('UP', 200, ['HEAD']))
+                    self.assertEqual(result['transfer_ms'], 0)
+
+                    result, methods = check('headers')
+                    self.assertEqual((result['status'], methods), ('UP', ['GET']))
+                    self.assertLess(result['response_time_ms'], 300) # Closed without reading the body
+                    self.assertEqual(result['transfer_ms'], 0)
+
+                    result, methods = check('partial', probe_max_bytes=1000)
+                    self.assertEqual((result['status'], methods), ('UP', ['GET']))
+                    self.assertLess(result['response_time_ms'], 300) # Stopped at the cap
+
+                    # Assertions only see the capped body: the marker at the very end is past it
+                    result, _ = check('partial', [{'type': 'contains', 'value': 'END'}], probe_max_bytes=1000)
+                    self.assertEqual((result['status'], result['details']), ('DOWN', "Assertion failed: body does not contain 'END'"))
+                    self.assertLess(result['response_time_ms'], 300)
+                    result, _ = check('partial', [{'type': 'contains', 'value': 'xxx'}], probe_max_bytes=1000)
+                    self.assertEqual(result['status'], 'UP')
+        finally:
+            aiohttp_backend.shutdown()
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
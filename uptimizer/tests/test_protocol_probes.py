@@ -0,0 +1,63 @@
+import socket
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from app.protocol_probes import ProtocolProber, parse_target, protocol_endpoint_error, _open_socket
+from app.probe_backends import _new_timings
+
+
+def _unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ProtocolProbesTestCase(unittest.TestCase):
+
+    def test_targets(self):
+        self.assertEqual(parse_target("TLS://example.com?min_days=30")[1:], ('example.com', 443, {'min_days': '30'}))
+        self.assertEqual(parse_target("tcp://10.0.0.5:5432").port, 5432)
+        with self.assertRaises(ValueError): parse_target("tcp://10.0.0.5")
+        self.assertIsNone(protocol_endpoint_error({'url': "http://x", 'assertions': [{'type': 'contains', 'value': 'ok'}]}))
+        self.assertIsNone(protocol_endpoint_error({'url': "dns://db.internal", 'assertions': [{'type': 'max_latency_ms', 'value': 50}]}))
+        self.assertIsNotNone(protocol_endpoint_error({'url': "udp://x:53", 'assertions': [{'type': 'contains', 'value': 'ok'}]}))
+
+    def test_probes_run_concurrently(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0)); listener.listen(50)
+        echo = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        echo.bind(('127.0.0.1', 0))
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) # Bound, never answers
+        silent.bind(('127.0.0.1', 0))
+        def serve_echo():
+            while True:
+                data, address = echo.recvfrom(65535)
+                echo.sendto(data, address)
+        threading.Thread(target=serve_echo, daemon=True).start()
+        prober = ProtocolProber()
+        try:
+            endpoints = [{'id': 'open', 'url': f"tcp://127.0.0.1:{listener.getsockname()[1]}"},
+                         {'id': 'closed', 'url': f"tcp://127.0.0.1:{_unused_port()}"},
+                         {'id': 'echo', 'url': f"udp://127.0.0.1:{echo.getsockname()[1]}?payload=hi"},
+                         {'id': 'dns', 'url': "dns://localhost"}]
+            endpoints += [{'id': f"silent{i}", 'url': f"udp://127.0.0.1:{silent.getsockname()[1]}"} for i in range(20)]
+            results = {endpoint['id']: result for endpoint, result in prober.run(endpoints, {'check_timeout_seconds': 1})}
+            self.assertEqual({key: results[key]['status'] for key in ('open', 'closed', 'echo', 'dns')},
+                             {'open': 'UP', 'closed': 'DOWN', 'echo': 'UP', 'dns': 'UP'})
+            self.assertEqual(results['closed']['details'], "Connection refused")
+            self.assertEqual({results[f"silent{i}"]['details'] for i in range(20)}, {"Timeout >1s"}) # 20 timeouts, one batch
+        finally:
+            prober.shutdown()
+            for sock in (listener, echo, silent): sock.close()
+
+    def test_name_without_addresses_is_an_os_error(self):
+        async def no_addresses(*args, **kwargs): return []
+        with mock.patch.object(asyncio.BaseEventLoop, 'getaddrinfo', no_addresses):
+            with self.assertRaisesRegex(OSError, "No addresses found for empty.example"):
+                asyncio.run(_open_socket('empty.example', 80, socket.SOCK_STREAM, _new_timings()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import json
+import socket
+import threading
+import unittest
+from collections import namedtuple
+from contextlib import contextmanager
+from unittest import mock
+
+from app import result_bus
+from app.result_bus import (_payloads, publish_results, publish_config_changed, NotificationListener,
+                            MAX_PAYLOAD_BYTES, MAX_DETAILS_CHARS, RESULTS_CHANNEL, CONFIG_CHANNEL, PROCESS_ID)
+
+Notify = namedtuple('Notify', 'channel payload')
+
+
+def _result(i, details=None):
+    return {"client_id": "c1", "endpoint_id": f"ep_{i}", "status": {"status": "UP", "response_time_ms": i, "details": details}}
+
+
+class _FakeSession:
+    def __init__(self):
+        self.notified = []
+
+    def execute(self, statement, params):
+        self.notified.append((params["channel"], params["payload"]))
+
+
+class _FakeDriver:
+    """psycopg2 connection stand-in: readable (via a socketpair) while notifications are queued."""
+
+    def __init__(self):
+        self.autocommit = False
+        self.notifies = []
+        self._pending = []
+        self._reader, self._writer = socket.socketpair()
+        self.lock = threading.Lock()
+
+    def fileno(self):
+        return self._reader.fileno()
+
+    def send(self, channel, payload):
+        with self.lock: self._pending.append(Notify(channel, payload))
+        self._writer.send(b'!')
+
+    def poll(self):
+        self._reader.recv(1024)
+        with self.lock: self.notifies.extend(self._pending); self._pending.clear()
+
+
+class _FakeRawConnection:
+    def __init__(self, driver):
+        self.driver_connection = driver
+        self.listened = []
+        self.closed = False
+
+    def detach(self): pass
+
+    @contextmanager
+    def cursor(self):
+        yield mock.Mock(execute=self.listened.append)
+
+    def close(self):
+        self.closed = True
+
+
+class PayloadsTestCase(unittest.TestCase):
+
+    def test_results_are_chunked_under_the_notify_limit_in_order(self):
+        results = [_result(i, details="x" * 300) for i in range(200)]
+        payloads = list(_payloads(results))
+        self.assertGreater(len(payloads), 1)
+        for payload in payloads: self.assertLess(len(payload.encode()), min(MAX_PAYLOAD_BYTES, 8000))
+        self.assertEqual([result for payload in payloads for result in json.loads(payload)["results"]], results)
+
+    def test_long_details_are_truncated(self):
+        (payload,) = _payloads([_result(1, details="y" * 20000)])
+        details = json.loads(payload)["results"][0]["status"]["details"]
+        self.assertEqual(details, "y" * MAX_DETAILS_CHARS + "...")
+
+    def test_non_ascii_details_stay_under_the_limit(self):
+        for payload in _payloads([_result(i, details="é" * 900) for i in range(50)]):
+            self.assertLess(len(payload.encode()), 8000)
+
+    def test_publish_sends_all_payloads_in_one_transaction(self):
+        session = _FakeSession()
+        @contextmanager
+        def session_scope(): yield session
+        with mock.patch.object(result_bus, 'session_scope', session_scope), mock.patch.object(result_bus.models, 'ENGINE_INITIALIZED', True):
+            self.assertTrue(publish_results([_result(i, details="z" * 500) for i in range(40)]))
+            self.assertTrue(publish_config_changed())
+        channels = [channel for channel, _ in session.notified]
+        self.assertEqual(channels[-1], CONFIG_CHANNEL)
+        self.assertEqual(set(channels[:-1]), {RESULTS_CHANNEL})
+        self.assertEqual(json.loads(session.notified[-1][1]), {"source": PROCESS_ID})
+        with mock.patch.object(result_bus.models, 'ENGINE_INITIALIZED', False):
+            self.assertFalse(publish_results([_result(1)]))
+
+
+class NotificationListenerTestCase(unittest.TestCase):
+
+    def test_dispatches_notifications_and_survives_handler_errors(self):
+        driver = _FakeDriver()
+        connection = _FakeRawConnection(driver)
+        received, connected = [], threading.Event()
+        done = threading.Event()
+        def handler(channel, payload):
+            if payload == "bad": raise ValueError("malformed")
+            received.append((channel, payload))
+            if payload == "last": done.set()
+        listener = NotificationListener([RESULTS_CHANNEL, CONFIG_CHANNEL], handler, on_connect=connected.set)
+        with mock.patch.object(result_bus.models, 'ENGINE_INITIALIZED', True), \
+             mock.patch.object(result_bus.models, 'engine', mock.Mock(raw_connection=lambda: connection)):
+            listener.start()
+            self.assertTrue(connected.wait(5))
+            for payload in ("first", "bad", "last"): driver.send(RESULTS_CHANNEL, payload)
+            self.assertTrue(done.wait(5))
+            listener.shutdown()
+        self.assertEqual(received, [(RESULTS_CHANNEL, "first"), (RESULTS_CHANNEL, "last")])
+        self.assertEqual(connection.listened, [f"LISTEN {RESULTS_CHANNEL}", f"LISTEN {CONFIG_CHANNEL}"])
+        self.assertTrue(driver.autocommit)
+        self.assertTrue(connection.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app.rollups import (GRANULARITIES, MAX_BUCKETS_PER_RUN, floor_to, plan_window,
+                         _compact_granularity, _prune_minute_rollups)
+from app.state import ROLLUP_GRACE_SECONDS, HISTORY_FLUSH_INTERVAL_SECONDS, ROLLUP_MINUTE_RETENTION_HOURS
+
+T0 = datetime(2026, 10, 1, tzinfo=timezone.utc) # A midnight, so every granularity is aligned here
+
+
+class _FakeSession:
+    """Just enough of a Session for the compaction helpers: watermarks by key, recorded statements."""
+
+    def __init__(self, watermarks=None, earliest=None):
+        self.watermarks = watermarks or {}
+        self.earliest = earliest # min(status_history.timestamp)
+        self.statements = []
+        self.added = []
+
+    def get(self, model, key):
+        return self.watermarks.get(key)
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    def execute(self, statement, params=None):
+        self.statements.append((statement, params))
+        return SimpleNamespace(scalar=lambda: self.earliest, rowcount=7)
+
+    def rollup_params(self):
+        return [params for _, params in self.statements if params]
+
+
+class PlanWindowTestCase(unittest.TestCase):
+
+    def test_floor_to(self):
+        ts = datetime(2026, 10, 1, 13, 47, 12, tzinfo=timezone.utc)
+        self.assertEqual(floor_to(ts, 'minute'), datetime(2026, 10, 1, 13, 47, tzinfo=timezone.utc))
+        self.assertEqual(floor_to(ts, 'hour'), datetime(2026, 10, 1, 13, tzinfo=timezone.utc))
+        self.assertEqual(floor_to(ts, 'day'), T0)
+
+    def test_without_rollups_everything_is_raw(self):
+        self.assertEqual(plan_window(T0, T0 + timedelta(days=2), {}), [('raw', T0, T0 + timedelta(days=2))])
+
+    def test_uses_the_coarsest_covered_granularity(self):
+        watermarks = {g: (T0 - timedelta(days=30), T0 + timedelta(days=10)) for g in GRANULARITIES}
+        start, end = T0 + timedelta(hours=22, minutes=30), T0 + timedelta(days=3, hours=1, minutes=15, seconds=20)
+        self.assertEqual(plan_window(start, end, watermarks), [
+            ('minute', start, T0 + timedelta(hours=23)),                     # Up to the next hour boundary
+            ('hour', T0 + timedelta(hours=23), T0 + timedelta(days=1)),      # Up to the next day boundary
+            ('day', T0 + timedelta(days=1), T0 + timedelta(days=3)),
+            ('hour', T0 + timedelta(days=3), T0 + timedelta(days=3, hours=1)),
+            ('minute', T0 + timedelta(days=3, hours=1), T0 + timedelta(days=3, hours=1, minutes=15)),
+            ('raw', T0 + timedelta(days=3, hours=1, minutes=15), end),       # Partial last minute
+        ])
+
+    def test_pieces_are_contiguous_and_respect_coverage(self):
+        watermarks = {'hour': (T0, T0 + timedelta(hours=30)), 'day': (T0 - timedelta(days=5), T0 + timedelta(days=1))}
+        start, end = T0 - timedelta(days=2, hours=5), T0 + timedelta(hours=40)
+        pieces = plan_window(start, end, watermarks)
+        self.assertEqual(pieces[0][1], start)
+        self.assertEqual(pieces[-1][2], end)
+        for (_, _, previous_end), (_, piece_start, _) in zip(pieces, pieces[1:]): self.assertEqual(previous_end, piece_start)
+        for source, piece_start, piece_end in pieces:
+            if source == 'raw': continue
+            rolled_from, rolled_until = watermarks[source]
+            self.assertTrue(rolled_from <= piece_start and piece_end <= rolled_until, (source, piece_start, piece_end))
+        self.assertEqual(pieces[-1], ('raw', T0 + timedelta(hours=30), end)) # Past the hour watermark
+
+
+class CompactionTestCase(unittest.TestCase):
+
+    def _closed_until(self, now, granularity):
+        return floor_to(now - timedelta(seconds=HISTORY_FLUSH_INTERVAL_SECONDS + ROLLUP_GRACE_SECONDS), granularity)
+
+    def test_continues_from_the_watermark_and_caps_the_run(self):
+        now = T0 + timedelta(days=30)
+        session = _FakeSession({'hour': SimpleNamespace(rolled_from=T0 - timedelta(days=1), rolled_until=T0)})
+        self.assertEqual(_compact_granularity(session, 'hour', ['a', 'b'], now), MAX_BUCKETS_PER_RUN['hour'])
+        params = session.rollup_params()[0]
+        end = T0 + timedelta(hours=MAX_BUCKETS_PER_RUN['hour'])
+        self.assertEqual((params['start'], params['end'], params['last_bucket']), (T0, end, end - timedelta(hours=1)))
+        self.assertEqual(params['ids'], ['a', 'b'])
+
+    def test_open_buckets_wait_for_the_grace_period(self):
+        now = T0 + timedelta(hours=3, seconds=1) # The 02:00 bucket closed a second ago, but late rows may still land
+        session = _FakeSession({'hour': SimpleNamespace(rolled_from=T0, rolled_until=T0)})
+        buckets = _compact_granularity(session, 'hour', ['a'], now)
+        self.assertEqual(T0 + timedelta(hours=buckets), self._closed_until(now, 'hour'))
+        self.assertEqual(buckets, 2)
+
+    def test_first_run_without_history_records_an_empty_watermark(self):
+        session = _FakeSession()
+        self.assertEqual(_compact_granularity(session, 'day', ['a'], T0 + timedelta(hours=5)), 0)
+        watermark = session.added[0]
+        self.assertEqual((watermark.granularity, watermark.rolled_from, watermark.rolled_until), ('day', T0, T0))
+        self.assertEqual(session.rollup_params(), [])
+
+    def test_first_run_backfills_from_the_earliest_row(self):
+        now = T0 + timedelta(hours=5)
+        session = _FakeSession(earliest=T0 + timedelta(hours=1, minutes=20))
+        self.assertEqual(_compact_granularity(session, 'hour', ['a'], now), 3) # 01:00 .. 04:00
+        self.assertEqual(session.rollup_params()[0]['start'], T0 + timedelta(hours=1))
+
+    def test_minute_rollups_past_retention_are_pruned(self):
+        now = T0 + timedelta(days=10)
+        watermark = SimpleNamespace(rolled_from=T0, rolled_until=now)
+        self.assertEqual(_prune_minute_rollups(_FakeSession({'minute': watermark}), now), 7)
+        self.assertEqual(watermark.rolled_from, now - timedelta(hours=ROLLUP_MINUTE_RETENTION_HOURS))
+
+
+if __name__ == '__main__':
+    unittest.main()
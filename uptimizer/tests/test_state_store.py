@@ -0,0 +1,49 @@
+import unittest
+
+from app.state_store import StateStore
+
+
+def _state():
+    return {
+        "global_settings": {"check_interval_seconds": 30},
+        "clients": {
+            "c1": {"settings": {"name": "One"}, "endpoints": [{"id": "a"}], "statuses": {"a": {"status": "UP"}}},
+            "c2": {"settings": {"name": "Two"}, "endpoints": [{"id": "b"}], "statuses": {"b": {"status": "UP"}}},
+        },
+        "last_updated": 0,
+    }
+
+
+class StateStoreTestCase(unittest.TestCase):
+
+    def test_published_snapshots_are_not_modified(self):
+        store = StateStore(_state())
+        before = store.snapshot()
+        with store.write() as draft:
+            draft.statuses("c1")["a"] = {"status": "DOWN"}
+            draft.client("c1")["endpoints"][0]["name"] = "renamed"
+            draft["last_updated"] = 5
+        after = store.snapshot()
+
+        self.assertEqual((before["version"], after["version"]), (0, 1))
+        self.assertEqual(before["clients"]["c1"]["statuses"]["a"]["status"], "UP")
+        self.assertNotIn("name", before["clients"]["c1"]["endpoints"][0])
+        self.assertEqual(after["clients"]["c1"]["statuses"]["a"]["status"], "DOWN")
+        self.assertIs(after["clients"]["c2"], before["clients"]["c2"]) # Untouched clients are shared
+
+    def test_failed_or_empty_writes_publish_nothing(self):
+        store = StateStore(_state())
+        with self.assertRaises(RuntimeError):
+            with store.write() as draft:
+                draft.remove_client("c1")
+                raise RuntimeError("save failed")
+        with store.write() as draft:
+            draft.client("c2")["settings"]["name"] = "unchanged?"
+            draft.discard()
+        self.assertEqual(store.version, 0)
+        self.assertIn("c1", store.snapshot()["clients"])
+        self.assertEqual(store.snapshot()["clients"]["c2"]["settings"]["name"], "Two")
+
+
+if __name__ == '__main__':
+    unittest.main()
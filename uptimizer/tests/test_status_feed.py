@@ -0,0 +1,84 @@
+import unittest
+
+from app.status_feed import StatusFeed, fold_changes, status_changed
+
+
+def _change(endpoint_id, status):
+    return {"client_id": "c1", "endpoint_id": endpoint_id, "status": {"status": status}}
+
+
+class StatusFeedTestCase(unittest.TestCase):
+
+    def test_resume_from_cursor(self):
+        feed = StatusFeed(max_batches=10)
+        feed.publish([_change('a', 'UP')], 1.0)
+        cursor = feed.cursor()
+        feed.publish([_change('a', 'DOWN')], 2.0)
+        self.assertEqual(feed.publish([], 3.0), 2) # Runs without changes keep the version (and ETag)
+
+        batches = feed.since(feed.parse_cursor(cursor))
+        self.assertEqual([seq for seq, _, _ in batches], [2])
+        self.assertEqual(fold_changes(batches), ([_change('a', 'DOWN')], 2.0))
+        self.assertEqual(feed.since(feed.version), [])
+
+    def test_reset_forces_snapshot(self):
+        feed = StatusFeed(max_batches=10)
+        feed.publish([_change('a', 'UP')], 1.0)
+        before_reset = feed.version
+        feed.reset() # e.g. endpoint deleted
+        feed.publish([_change('b', 'UP')], 2.0)
+        self.assertIsNone(feed.since(before_reset))
+        self.assertEqual(len(feed.since(before_reset + 1)), 1)
+        self.assertNotEqual(feed.etag(before_reset), feed.etag(feed.version))
+
+    def test_client_delta_with_tombstones(self):
+        feed = StatusFeed(max_batches=10)
+        feed.publish([_change('a', 'UP'), _change('b', 'UP')], 1.0)
+        seq = feed.version
+        feed.publish([_change('a', 'DOWN'), {"client_id": "c2", "endpoint_id": "x", "status": {"status": "UP"}}], 2.0)
+        feed.reset('c1', removed=['b'])                        # Endpoint deleted
+        feed.reset('c1', statuses={'n': {"status": "PENDING"}}) # Endpoint added
+        feed.reset('c2')                                       # Other client recreated: not our concern
+        self.assertIsNone(feed.since(seq))
+        self.assertEqual(feed.client_since(seq, 'c1'),
+                         ({'a': {"status": "DOWN"}, 'n': {"status": "PENDING"}}, ['b'], feed.version))
+        self.assertIsNone(feed.client_since(seq, 'c2')) # Needs a snapshot
+        self.assertEqual(feed.client_since(feed.version, 'c1'), ({}, [], feed.version))
+        feed.reset() # Config reload
+        self.assertIsNone(feed.client_since(seq, 'c1'))
+
+    def test_stale_cursor_needs_snapshot(self):
+        feed = StatusFeed(max_batches=2)
+        for i in range(5): feed.publish([_change('a', str(i))], float(i))
+        self.assertIsNone(feed.since(1)) # Evicted from the ring buffer
+        self.assertIsNone(feed.parse_cursor(StatusFeed().cursor(3))) # Cursor from another process
+
+    def test_only_change_fields_count_as_changes(self):
+        old = {"status": "UP", "status_code": 200, "details": "OK", "response_time_ms": 12}
+        self.assertFalse(status_changed(old, dict(old, extra="ignored")))
+        self.assertFalse(status_changed(old, dict(old, response_time_ms=49))) # Latency alone is not a change
+        self.assertTrue(status_changed(old, dict(old, status="DOWN")))
+        self.assertTrue(status_changed(None, old))
+
+    def test_latency_updates_are_coalesced_into_refresh_batches(self):
+        feed = StatusFeed(max_batches=10, refresh_interval=60)
+        fast, slow = dict(_change('a', 'UP'), status={"status": "UP", "response_time_ms": 5}), dict(_change('a', 'UP'), status={"status": "UP", "response_time_ms": 9})
+        self.assertEqual(feed.publish([], 1.0, [fast]), 0) # Held back
+        self.assertEqual(feed.publish([], 2.0, [slow, _change('b', 'UP')]), 0)
+        feed._last_refresh -= 60 # The refresh interval passes
+        self.assertEqual(feed.publish([_change('c', 'DOWN')], 3.0, [_change('c', 'DOWN')]), 1)
+        changes, _ = fold_changes(feed.since(0))
+        self.assertEqual(sorted((c["endpoint_id"], c["status"].get("response_time_ms")) for c in changes), [('a', 9), ('b', None), ('c', None)])
+        self.assertEqual(feed.publish([], 4.0, [fast]), 1) # Next refresh waits a full interval again
+
+    def test_reset_drops_held_back_results(self):
+        feed = StatusFeed(max_batches=10, refresh_interval=60)
+        feed.publish([], 1.0, [_change('a', 'UP'), {"client_id": "c2", "endpoint_id": "x", "status": {"status": "UP"}}])
+        seq = feed.reset('c1', removed=['a'])
+        feed._last_refresh -= 60
+        self.assertEqual(feed.publish([], 2.0), seq + 1)
+        self.assertEqual([c["endpoint_id"] for c in feed.since(seq)[0][1]], ['x']) # The removed endpoint doesn't come back
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import random
+import unittest
+
+from app.uptime_accumulator import UptimeAccumulator
+
+WINDOW = 1000
+
+
+def _expected_percentage(events, now):
+    """Brute-force reference: walks every segment like the DB calculation does."""
+    start = now - WINDOW
+    up = 0.0
+    for i, (ts, status) in enumerate(events):
+        seg_end = events[i + 1][0] if i + 1 < len(events) else now
+        if status == 'UP': up += max(0.0, min(seg_end, now) - max(ts, start))
+    return round(up / WINDOW * 100, 2)
+
+
+class UptimeAccumulatorTestCase(unittest.TestCase):
+
+    def test_matches_full_recalculation(self):
+        rng = random.Random(7)
+        acc = UptimeAccumulator(window_seconds=WINDOW)
+        events, ts = [], 0.0
+        for _ in range(2000):
+            ts += rng.uniform(0.5, 20)
+            status = rng.choice(['UP', 'UP', 'UP', 'DOWN', 'ERROR'])
+            acc.record('ep', status, ts)
+            events.append((ts, status))
+            if rng.random() < 0.1:
+                now = ts + rng.uniform(0, 5)
+                self.assertAlmostEqual(acc.uptime_percentages(['ep'], now)['ep'], _expected_percentage(events, now), places=1)
+
+    def test_unknown_and_new_endpoints_are_not_up(self):
+        acc = UptimeAccumulator(window_seconds=WINDOW)
+        acc.record('ep', 'UP', 500.0)
+        result = acc.uptime_percentages(['ep', 'missing'], 1000.0)
+        self.assertEqual(result, {'ep': 50.0, 'missing': 0.0})
+
+    def test_warm_keeps_results_recorded_meanwhile(self):
+        acc = UptimeAccumulator(window_seconds=WINDOW)
+        acc.record('ep', 'DOWN', 900.0)
+        acc.warm({'ep': [(0.0, 'UP')]}, now=950.0) # DB saw UP since before the window
+        self.assertEqual(acc.uptime_percentages(['ep'], 1000.0)['ep'], 90.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import uuid
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql
+
+from app import models
+from app.models import StatusHistory, session_scope
+from app.database import _bulk_up_seconds
+from app.uptime_accumulator import UptimeAccumulator
+
+WINDOW = 1000
+END = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+START = END - timedelta(seconds=WINDOW)
+
+# (endpoint, seconds relative to START, status): the semantics /api/statistics relies on
+EVENTS = [
+    ('carried_up', -500, 'UP'), ('carried_up', -100, 'UP'),     # Latest row before the window counts from START: all 1000s
+    ('carried_down', -50, 'DOWN'), ('carried_down', 300, 'UP'), # DOWN carried in, UP from 300 to END: 700s
+    ('last_to_end', 100, 'UP'), ('last_to_end', 400, 'ERROR'), ('last_to_end', 900, 'UP'), # 300s + last segment to END 100s
+    ('inside_only', 250, 'UP'), ('inside_only', 750, 'DOWN'),   # Nothing before the window: unknown time isn't UP, 500s
+    ('old_only', -2000, 'DOWN'),                                # Only a row long before the window: DOWN all along
+]
+EXPECTED_UP_SECONDS = {'carried_up': 1000, 'carried_down': 700, 'last_to_end': 400, 'inside_only': 500, 'old_only': 0}
+
+
+class _CapturingSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        return self.rows
+
+
+class BulkUpSecondsQueryTestCase(unittest.TestCase):
+
+    def test_query_builds_for_postgres_and_maps_rows(self):
+        session = _CapturingSession([SimpleNamespace(endpoint_id='a', up_seconds=12.5), SimpleNamespace(endpoint_id='b', up_seconds=None)])
+        self.assertEqual(_bulk_up_seconds(session, ['a', 'b'], START, END), {'a': 12.5, 'b': 0.0})
+        sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+        self.assertIn('lead(', sql.lower()) # Segments end at the next event...
+        self.assertIn('LATERAL', sql)       # ...and the status before the window is one index seek per endpoint
+
+    def test_accumulator_agrees_on_the_reference_events(self):
+        accumulator = UptimeAccumulator(window_seconds=WINDOW)
+        for name, offset, status in EVENTS: accumulator.record(name, status, (START + timedelta(seconds=offset)).timestamp())
+        self.assertEqual(accumulator.uptime_percentages(list(EXPECTED_UP_SECONDS), END.timestamp()),
+                         {name: seconds / WINDOW * 100 for name, seconds in EXPECTED_UP_SECONDS.items()})
+
+
+@unittest.skipUnless(models.ENGINE_INITIALIZED, "needs the Postgres database (DB_* settings)")
+class BulkUpSecondsDatabaseTestCase(unittest.TestCase):
+    """Runs the real query; the uptime accumulator claims the same semantics, so both must agree."""
+
+    def setUp(self):
+        models.create_db_tables()
+        from app.partitions import ensure_partitions
+        ensure_partitions() # The default partition takes rows outside the range partitions
+        prefix = f"test_{uuid.uuid4().hex[:8]}_"
+        self.ids = {name: prefix + name for name in EXPECTED_UP_SECONDS}
+        with session_scope() as session:
+            session.add_all(StatusHistory(endpoint_id=self.ids[name], status=status, timestamp=START + timedelta(seconds=offset))
+                            for name, offset, status in EVENTS)
+        self.addCleanup(self._delete_rows)
+
+    def _delete_rows(self):
+        with session_scope() as session:
+            session.execute(delete(StatusHistory).where(StatusHistory.endpoint_id.in_(list(self.ids.values()))))
+
+    def test_segments_and_window_edges(self):
+        with session_scope() as session:
+            up_seconds = _bulk_up_seconds(session, list(self.ids.values()) + ['test_missing'], START, END)
+        self.assertEqual({name: round(up_seconds.get(ep_id, 0)) for name, ep_id in self.ids.items()}, EXPECTED_UP_SECONDS)
+        self.assertEqual(up_seconds.get('test_missing', 0), 0)
+
+        accumulator = UptimeAccumulator(window_seconds=WINDOW)
+        for name, offset, status in EVENTS: accumulator.record(self.ids[name], status, (START + timedelta(seconds=offset)).timestamp())
+        percentages = accumulator.uptime_percentages(list(self.ids.values()), END.timestamp())
+        for name, ep_id in self.ids.items():
+            self.assertAlmostEqual(percentages[ep_id], round(up_seconds.get(ep_id, 0) / WINDOW * 100, 2), places=1, msg=name)
+
+
+if __name__ == '__main__':
+    unittest.main()